@@ -0,0 +1,158 @@
+"""
+Benchmark: httplib2 vs pooled httpx transport for Google API calls
+
+Starts a local keep-alive HTTP server standing in for googleapis.com and
+measures requests/sec of googleapiclient requests executed through:
+- httplib2: googleapiclient's default transport, one Http per service
+- httpx: HttpxHttp over the shared GoogleHTTPPool
+
+Each transport is measured with a single caller and with concurrent callers,
+both with long-lived services (one per thread, as the service pool hands them
+out) and with a new service per call (cold pool / new tenant: httplib2 opens
+a new connection, httpx reuses the shared pool). The server runs in its own
+process so it does not compete with the client for the GIL.
+
+Plaintext loopback hides connection setup cost; --tls serves HTTPS with a
+throwaway self-signed certificate (needs the openssl CLI) so new connections
+pay a TLS handshake as they do against googleapis.com.
+
+Usage:
+    python -m benchmarks.bench_google_transport [--requests 2000] [--threads 8] [--tls]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import ssl
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httplib2
+
+from src.auth.google_transport import GoogleHTTPPool, HttpxHttp
+from src.tools.discovery import get_discovery_registry
+
+RESPONSE = json.dumps({"id": "18c0ffee", "threadId": "18c0ffee", "labelIds": ["INBOX", "UNREAD"]}).encode()
+
+
+class _GoogleStandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Send headers and body in one segment (avoids Nagle / delayed ACK stalls)
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _service(http, base_url: str):
+    service = get_discovery_registry().build("gmail", "v1", http=http)
+    service._baseUrl = base_url
+    return service
+
+
+def _self_signed_cert(directory: Path) -> tuple[Path, Path]:
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-addext", "subjectAltName=IP:127.0.0.1",
+         "-keyout", str(key), "-out", str(cert)],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+
+def _serve(port, cert: str | None, key: str | None) -> None:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _GoogleStandIn)
+    if cert:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    port.value = server.server_port
+    server.serve_forever()
+
+
+def _run(make_http, base_url: str, requests: int, threads: int, fresh: bool) -> float:
+    """Execute `requests` messages.get calls over `threads` callers; returns requests/sec"""
+    per_thread = requests // threads
+
+    def worker(_) -> None:
+        service = _service(make_http(), base_url)
+        for i in range(per_thread):
+            if fresh:
+                service.close()
+                service = _service(make_http(), base_url)
+            service.users().messages().get(userId="me", id=str(i), format="metadata").execute()
+        service.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+    return per_thread * threads / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+
+    cert = key = None
+    if args.tls:
+        cert, key = _self_signed_cert(Path(tempfile.mkdtemp()))
+
+    port = multiprocessing.Value("i", 0)
+    server = multiprocessing.Process(
+        target=_serve, args=(port, cert and str(cert), key and str(key)), daemon=True
+    )
+    server.start()
+    while not port.value:
+        time.sleep(0.01)
+    scheme = "https" if args.tls else "http"
+    base_url = f"{scheme}://127.0.0.1:{port.value}/gmail/v1/"
+
+    pool = GoogleHTTPPool(verify=ssl.create_default_context(cafile=str(cert)) if cert else True)
+
+    def make_httplib2() -> httplib2.Http:
+        # Same settings as googleapiclient.http.build_http()
+        http = httplib2.Http(timeout=60, ca_certs=str(cert) if cert else None)
+        http.redirect_codes = http.redirect_codes - {308}
+        return http
+
+    transports = {
+        "httplib2": make_httplib2,
+        "httpx": lambda: HttpxHttp(pool),
+    }
+    get_discovery_registry().preload()
+
+    print(f"{'transport':<10} {'services':<9} {'threads':>7} {'req/s':>10}")
+    try:
+        for fresh in (False, True):
+            for threads in (1, args.threads):
+                for name, make_http in transports.items():
+                    _run(make_http, base_url, 50 * threads, threads, fresh)  # warm up
+                    rate = _run(make_http, base_url, args.requests, threads, fresh)
+                    kind = "per-call" if fresh else "reused"
+                    print(f"{name:<10} {kind:<9} {threads:>7} {rate:>10.0f}")
+    finally:
+        pool.close()
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
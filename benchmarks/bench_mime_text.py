@@ -0,0 +1,112 @@
+"""
+Benchmark: bounded MIME text extraction vs full decode
+
+Builds large synthetic Gmail payloads and measures time and peak memory of
+extracting a 10,000 character body:
+- legacy: the previous extractor (decode the whole first text/plain part,
+  then slice)
+- bounded: src.tools.mime_text.extract_text (incremental decode that stops
+  at the budget, HTML conversion)
+
+Payloads:
+- plain: one 5 MB text/plain part
+- alternative: 5 MB text/plain + 5 MB text/html alternatives
+- html-only: one 5 MB text/html part (legacy returns nothing)
+- deep: 20 nested multipart levels with 200 attachments and a 1 MB body
+
+Usage:
+    python -m benchmarks.bench_mime_text [--runs 20] [--budget 10000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import time
+import tracemalloc
+from collections.abc import Callable
+from typing import Any
+
+from src.tools.mime_text import extract_text
+
+PARAGRAPH = "The quick brown fox jumps over the lazy dog. " * 20 + "\n"
+HTML_PARAGRAPH = (
+    '<p style="margin:0">The <b>quick</b> brown fox jumps over the <a href="https://example.com">lazy dog</a>. '
+    * 10 + "</p>\n"
+)
+
+
+def legacy_extract_text(payload: dict[str, Any]) -> str:
+    body = payload.get("body", {})
+    data = body.get("data")
+    if data and payload.get("mimeType") == "text/plain":
+        return base64.urlsafe_b64decode(data).decode("utf-8", errors="ignore")
+    for part in payload.get("parts") or []:
+        text = legacy_extract_text(part)
+        if text:
+            return text
+    return ""
+
+
+def _part(mime: str, text: str, size: int) -> dict[str, Any]:
+    content = (text * (size // len(text) + 1))[:size].encode("utf-8")
+    return {"mimeType": mime, "filename": "", "body": {"data": base64.urlsafe_b64encode(content).decode("ascii")}}
+
+
+def _multipart(mime: str, *parts: dict[str, Any]) -> dict[str, Any]:
+    return {"mimeType": mime, "filename": "", "body": {}, "parts": list(parts)}
+
+
+def _attachment(index: int) -> dict[str, Any]:
+    return {"mimeType": "application/pdf", "filename": f"file{index}.pdf", "body": {"attachmentId": f"a{index}"}}
+
+
+def build_payloads() -> dict[str, dict[str, Any]]:
+    mb = 1024 * 1024
+    deep = _multipart("multipart/alternative", _part("text/plain", PARAGRAPH, mb), _part("text/html", HTML_PARAGRAPH, mb))
+    for level in range(20):
+        deep = _multipart("multipart/mixed", *[_attachment(level * 10 + n) for n in range(10)], deep)
+    return {
+        "plain": _part("text/plain", PARAGRAPH, 5 * mb),
+        "alternative": _multipart(
+            "multipart/alternative", _part("text/plain", PARAGRAPH, 5 * mb), _part("text/html", HTML_PARAGRAPH, 5 * mb)
+        ),
+        "html-only": _part("text/html", HTML_PARAGRAPH, 5 * mb),
+        "deep": deep,
+    }
+
+
+def measure(extract: Callable[[dict[str, Any]], str], payload: dict[str, Any], runs: int) -> tuple[float, float, int]:
+    """Mean ms per extraction, peak MB allocated, characters returned"""
+    text = extract(payload)
+    start = time.perf_counter()
+    for _ in range(runs):
+        extract(payload)
+    elapsed = (time.perf_counter() - start) / runs * 1000
+
+    tracemalloc.start()
+    extract(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / (1024 * 1024), len(text)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--budget", type=int, default=10000)
+    args = parser.parse_args()
+
+    extractors = {
+        "legacy": lambda payload: legacy_extract_text(payload)[:args.budget],
+        "bounded": lambda payload: extract_text(payload, budget=args.budget),
+    }
+    print(f"{'payload':<12} {'extractor':<9} {'ms/op':>9} {'peak MB':>9} {'chars':>7}")
+    for name, payload in build_payloads().items():
+        for label, extract in extractors.items():
+            ms, peak, chars = measure(extract, payload, args.runs)
+            print(f"{name:<12} {label:<9} {ms:>9.2f} {peak:>9.2f} {chars:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,33 @@ Supports two authentication modes:
 2. Local File (legacy): Traditional file-based OAuth with local credentials.json
 
 Mode is controlled by AUTH_MODE environment variable in config.py
+
+Credentials are cached in process memory (keyed by tenant and scopes) and
+reused until their access token gets close to expiry or Google rejects it.
 """
 
 from __future__ import annotations
 import pathlib
-from typing import Sequence
+import threading
+import time
+from datetime import timezone
+from typing import Optional, Sequence
+from google.auth.exceptions import RefreshError
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 
 # Import configuration
+from src.auth.google_transport import build_google_http
 from src.config import (
     AUTH_MODE,
     GOOGLE_CREDENTIALS_PATH,
     GOOGLE_TOKEN_PATH,
     GOOGLE_SCOPES,
+    GOOGLE_CREDS_CACHE_ENABLED,
+    GOOGLE_CREDS_EXPIRY_MARGIN,
+    GOOGLE_CREDS_DEFAULT_TTL,
     is_oma_backend_mode,
     is_local_file_mode,
 )
@@ -30,8 +42,97 @@ CREDS_PATH = pathlib.Path(GOOGLE_CREDENTIALS_PATH)
 TOKEN_PATH = pathlib.Path(GOOGLE_TOKEN_PATH)
 SCOPES: Sequence[str] = GOOGLE_SCOPES
 
+# Tenant used when the server runs for a single user
+DEFAULT_TENANT = "default"
+
+CacheKey = tuple[str, tuple[str, ...]]
 
-def get_google_creds() -> Credentials:
+
+class CredentialCache:
+    """
+    Thread-safe in-process cache of Google credentials
+
+    Entries are keyed by (tenant, scopes) and considered fresh until the
+    access token is within `margin` seconds of its expiry.
+    """
+
+    def __init__(self, margin: float = GOOGLE_CREDS_EXPIRY_MARGIN, default_ttl: float = GOOGLE_CREDS_DEFAULT_TTL):
+        """
+        Args:
+            margin: Seconds before token expiry at which an entry is treated as stale
+            default_ttl: Lifetime assumed for credentials without an expiry
+        """
+        self.margin = margin
+        self.default_ttl = default_ttl
+        self._entries: dict[CacheKey, tuple[Credentials, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(tenant: Optional[str] = None, scopes: Sequence[str] = SCOPES) -> CacheKey:
+        """Build cache key from tenant and scopes (scope order does not matter)"""
+        return (tenant or DEFAULT_TENANT, tuple(sorted(scopes)))
+
+    def _expires_at(self, creds: Credentials) -> float:
+        """Unix timestamp at which the credentials' access token expires"""
+        if creds.expiry is None:
+            return time.time() + self.default_ttl
+        expiry = creds.expiry
+        if expiry.tzinfo is None:
+            # google-auth keeps expiry as naive UTC
+            expiry = expiry.replace(tzinfo=timezone.utc)
+        return expiry.timestamp()
+
+    def get(self, key: CacheKey) -> Optional[Credentials]:
+        """Return cached credentials if they are not close to expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        creds, expires_at = entry
+        if creds.expiry is not None:
+            # Token may have been refreshed in place by AuthorizedHttp
+            expires_at = self._expires_at(creds)
+        if expires_at - time.time() <= self.margin:
+            return None
+        return creds
+
+    def put(self, key: CacheKey, creds: Credentials) -> None:
+        """Store credentials under key"""
+        with self._lock:
+            self._entries[key] = (creds, self._expires_at(creds))
+
+    def invalidate(self, key: Optional[CacheKey] = None) -> None:
+        """Drop one entry, or all entries if key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def expiring(self) -> dict[CacheKey, float]:
+        """Map of cached keys to the unix timestamp at which they expire"""
+        with self._lock:
+            entries = list(self._entries.items())
+        # As in get(): refreshed-in-place expiry if known, else the expiry recorded by put()
+        return {
+            key: self._expires_at(creds) if creds.expiry is not None else expires_at
+            for key, (creds, expires_at) in entries
+        }
+
+
+_creds_cache = CredentialCache()
+
+
+def get_credential_cache() -> CredentialCache:
+    """Get the global credential cache"""
+    return _creds_cache
+
+
+def get_google_creds(
+    tenant: Optional[str] = None,
+    use_cache: bool = True,
+    oma_token: Optional[str] = None,
+) -> Credentials:
     """
     Get Google OAuth credentials using configured authentication mode
 
@@ -39,6 +140,14 @@ def get_google_creds() -> Credentials:
     - oma_backend: Fetch credentials from OMA backend (server-to-server)
     - local_file: Use local credentials.json and token.json (legacy)
 
+    Credentials are served from the in-process cache while their access token
+    is valid for longer than GOOGLE_CREDS_EXPIRY_MARGIN seconds.
+
+    Args:
+        tenant: Tenant the credentials belong to (default: single-user tenant)
+        use_cache: Set False to bypass the cache and always fetch fresh credentials
+        oma_token: Tenant's OMA access token (multi-tenant mode)
+
     Returns:
         google.oauth2.credentials.Credentials object
 
@@ -46,15 +155,107 @@ def get_google_creds() -> Credentials:
         ValueError: If OMA backend is not configured or Google account not connected
         FileNotFoundError: If local credentials file not found (local_file mode)
     """
+    key = CredentialCache.make_key(tenant)
+    if use_cache and GOOGLE_CREDS_CACHE_ENABLED:
+        creds = _creds_cache.get(key)
+        if creds is not None:
+            return creds
+
+    creds = _fetch_google_creds(tenant, oma_token)
+    if GOOGLE_CREDS_CACHE_ENABLED:
+        _creds_cache.put(key, creds)
+    return creds
+
+
+def refresh_google_creds(tenant: Optional[str] = None, lead: float = 0.0) -> Credentials:
+    """
+    Renew cached credentials of a tenant ahead of expiry
+
+    Refetches credentials from the source. The source may hand back the token
+    it already had, so unless the fetched token outlives the cache margin plus
+    lead (the caller's refresh window), it is refreshed directly with Google.
+    Used by the background token refresher.
+    """
+    key = CredentialCache.make_key(tenant)
+    creds = get_google_creds(tenant, use_cache=False)
+    extended = _creds_cache._expires_at(creds) - time.time() > _creds_cache.margin + lead
+    if not extended and creds.refresh_token and creds.client_id and creds.client_secret:
+        creds.refresh(Request())
+        _creds_cache.put(key, creds)
+    return creds
+
+
+def invalidate_google_creds(tenant: Optional[str] = None) -> None:
+    """Drop cached credentials of a tenant so the next call refetches them"""
+    _creds_cache.invalidate(CredentialCache.make_key(tenant))
+
+
+def get_authorized_http(tenant: Optional[str] = None, credentials: Optional[Credentials] = None) -> AuthorizedHttp:
+    """
+    Get an authorized HTTP transport for googleapiclient services
+
+    Usage:
+        build("gmail", "v1", http=get_authorized_http())
+
+    Args:
+        tenant: Tenant whose credentials are used (default: single-user tenant)
+        credentials: Credentials to start with (default: get_google_creds(tenant))
+
+    Returns:
+        AuthorizedHttp (over the GOOGLE_HTTP_TRANSPORT transport) that
+        refetches credentials when Google answers 401
+    """
+    creds = credentials or get_google_creds(tenant)
+    return _CacheAwareAuthorizedHttp(creds, tenant=tenant, http=build_google_http())
+
+
+class _CacheAwareAuthorizedHttp(AuthorizedHttp):
+    """
+    AuthorizedHttp that falls back to the credential source on auth failure
+
+    AuthorizedHttp already refreshes the access token in place on 401. If that
+    refresh fails, or Google still answers 401, the cached credentials are
+    dropped and the request is retried once with freshly fetched ones.
+    """
+
+    def __init__(self, credentials: Credentials, tenant: Optional[str] = None, **kwargs):
+        super().__init__(credentials, **kwargs)
+        self.tenant = tenant
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        # Nested calls come from AuthorizedHttp's own refresh-and-retry loop
+        if "_credential_refresh_attempt" in kwargs:
+            return super().request(uri, method, body=body, headers=headers, **kwargs)
+
+        body_position = body.tell() if hasattr(body, "tell") and hasattr(body, "seek") else None
+        try:
+            response, content = super().request(uri, method, body=body, headers=headers, **kwargs)
+            if response.status != 401:
+                return response, content
+            print("[google_auth] Google returned 401, refetching credentials...")
+        except RefreshError as e:
+            print(f"[google_auth] Credential refresh failed ({e}), refetching credentials...")
+
+        invalidate_google_creds(self.tenant)
+        self.credentials = get_google_creds(self.tenant)
+        if body_position is not None:
+            body.seek(body_position)
+        return super().request(uri, method, body=body, headers=headers, **kwargs)
+
+
+def _fetch_google_creds(tenant: Optional[str] = None, oma_token: Optional[str] = None) -> Credentials:
+    """Fetch credentials from the configured source, bypassing the cache"""
     if is_oma_backend_mode():
-        return _get_google_creds_from_oma()
+        if tenant == DEFAULT_TENANT:
+            tenant = None
+        return _get_google_creds_from_oma(tenant, oma_token)
     elif is_local_file_mode():
         return _get_google_creds_from_local_file()
     else:
         raise ValueError(f"Unknown AUTH_MODE: {AUTH_MODE}")
 
 
-def _get_google_creds_from_oma() -> Credentials:
+def _get_google_creds_from_oma(tenant: Optional[str] = None, oma_token: Optional[str] = None) -> Credentials:
     """
     Get credentials from OMA backend (server-to-server OAuth)
 
@@ -64,7 +265,7 @@ def _get_google_creds_from_oma() -> Credentials:
     from src.auth.oma_client import get_google_creds_from_oma
 
     try:
-        return get_google_creds_from_oma()
+        return get_google_creds_from_oma(tenant, oma_token)
     except ValueError as e:
         raise ValueError(
             f"Failed to get Google credentials from OMA backend: {e}\n\n"
@@ -0,0 +1,274 @@
+"""
+Pooled HTTP Transport for Google APIs
+
+googleapiclient talks to Google through an httplib2.Http-compatible object
+(anything with request(uri, method, body, headers, ...) returning
+(httplib2.Response, content)). By default every service gets its own
+httplib2.Http with its own connections.
+
+HttpxHttp implements that interface on top of one process-wide httpx.Client:
+- keep-alive connections are shared by all services and tenants
+  (credentials are injected per request by AuthorizedHttp, not per connection)
+- pool size, keep-alive and timeouts come from GOOGLE_HTTP_* settings
+- at most GOOGLE_HTTP_MAX_PER_HOST requests run against one host at a time
+- HTTP/2 is used when the optional h2 package is installed
+- a client certificate added with add_certificate moves that service to a
+  pool of its own, so the certificate is never presented for others
+
+Opt-in with GOOGLE_HTTP_TRANSPORT=httpx; httplib2 is the default.
+"""
+
+from __future__ import annotations
+import socket
+import ssl
+import threading
+from typing import Any, Optional, Union
+from urllib.parse import urljoin, urlsplit
+
+import httplib2
+import httpx
+from googleapiclient.http import build_http
+
+from src import config
+from src.auth.oma_client import _h2_available
+
+# Redirects followed like httplib2 does for googleapiclient; 308 is excluded
+# because resumable uploads use it as "resume incomplete"
+REDIRECT_CODES = frozenset({300, 301, 302, 303, 307})
+
+
+class GoogleHTTPPool:
+    """Shared httpx connection pool with a per-host concurrency limit"""
+
+    def __init__(
+        self,
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        max_per_host: int = config.GOOGLE_HTTP_MAX_PER_HOST,
+        http2: Optional[bool] = None,
+        verify: Union[bool, ssl.SSLContext] = True,
+        cert: Optional[tuple[str, str, Optional[str]]] = None,
+    ):
+        """
+        Args:
+            limits: Connection pool limits (default from GOOGLE_HTTP_* settings)
+            timeout: Request timeouts (default from GOOGLE_HTTP_*_TIMEOUT settings)
+            max_per_host: Maximum concurrent requests to one host
+            http2: Use HTTP/2 if the h2 package is installed (default from GOOGLE_HTTP2)
+            verify: SSL verification (False, or an SSLContext trusting custom CAs)
+            cert: Client certificate presented to servers, as (certfile, keyfile, password)
+        """
+        self.limits = limits or httpx.Limits(
+            max_connections=config.GOOGLE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.GOOGLE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.GOOGLE_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout or httpx.Timeout(config.GOOGLE_HTTP_TIMEOUT, connect=config.GOOGLE_HTTP_CONNECT_TIMEOUT)
+        self.max_per_host = max(max_per_host, 1)
+        self.http2 = (config.GOOGLE_HTTP2 if http2 is None else http2) and _h2_available()
+        self.verify = verify
+        self.cert = cert
+
+        self._client: Optional[httpx.Client] = None
+        self._hosts: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """Shared HTTP client (created on first use)"""
+        if self._client is None or self._client.is_closed:
+            with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.Client(
+                        verify=_tls_context(self.verify, self.cert) if self.cert else self.verify,
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        http2=self.http2,
+                        follow_redirects=False,
+                    )
+        return self._client
+
+    def host_slot(self, host: str) -> threading.BoundedSemaphore:
+        """Semaphore limiting concurrent requests to host"""
+        slot = self._hosts.get(host)
+        if slot is None:
+            with self._lock:
+                slot = self._hosts.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+        return slot
+
+    def close(self) -> None:
+        """Close the connection pool (reopened lazily on next use)"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+
+class HttpxHttp:
+    """httplib2.Http-compatible adapter over a GoogleHTTPPool"""
+
+    def __init__(self, pool: Optional[GoogleHTTPPool] = None):
+        """
+        Args:
+            pool: Connection pool to use (default: process-wide pool)
+        """
+        self.pool = pool or get_google_http_pool()
+        # Attributes googleapiclient / google-auth-httplib2 read or set on httplib2.Http
+        self.timeout: Optional[float] = None
+        self.follow_redirects = True
+        self.redirect_codes = set(REDIRECT_CODES)
+        self.connections: dict[str, Any] = {}
+        self._cert_pools: dict[str, GoogleHTTPPool] = {}  # Domain ("" for any) -> pool presenting its certificate
+
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Union[bytes, str, None] = None,
+        headers: Optional[dict[str, Any]] = None,
+        redirections: int = httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type: Any = None,
+    ) -> tuple[httplib2.Response, bytes]:
+        """
+        Perform a request the way httplib2.Http.request does
+
+        Returns:
+            (httplib2.Response, content)
+
+        Raises:
+            socket.timeout: On connect/read/pool timeout
+            ConnectionError: On other transport failures
+            httplib2.RedirectLimit: If redirects exceed redirections
+        """
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        request_headers = {k: str(v) for k, v in (headers or {}).items()}
+
+        for _ in range(redirections + 1):
+            response = self._send(uri, method, body, request_headers)
+            location = response.headers.get("location")
+            follow = (
+                self.follow_redirects
+                and location
+                and response.status_code in self.redirect_codes
+                and (method in ("GET", "HEAD") or response.status_code == 303)
+            )
+            if not follow:
+                return _to_httplib2(response), response.content
+            uri = urljoin(uri, location)
+            if response.status_code == 303 and method not in ("GET", "HEAD"):
+                method, body = "GET", None
+                request_headers.pop("content-type", None)
+                request_headers.pop("content-length", None)
+
+        raise httplib2.RedirectLimit(
+            "Redirected more times than redirection_limit allows.",
+            _to_httplib2(response),
+            response.content,
+        )
+
+    def _send(self, uri: str, method: str, body: Optional[bytes], headers: dict[str, str]) -> httpx.Response:
+        host = urlsplit(uri).hostname or ""
+        pool = self._cert_pools.get(host) or self._cert_pools.get("") or self.pool
+        slot = pool.host_slot(urlsplit(uri).netloc)
+        if not slot.acquire(timeout=pool.timeout.pool):
+            raise socket.timeout(f"Too many concurrent requests to {urlsplit(uri).netloc}")
+        try:
+            if self.timeout is not None:
+                return pool.client.request(method, uri, content=body, headers=headers, timeout=self.timeout)
+            return pool.client.request(method, uri, content=body, headers=headers)
+        except httpx.TimeoutException as e:
+            raise socket.timeout(str(e)) from e
+        except httpx.TransportError as e:
+            raise ConnectionError(str(e)) from e
+        finally:
+            slot.release()
+
+    def add_certificate(self, key: str, cert: str, domain: str, password: Optional[str] = None) -> None:
+        """
+        Present a client certificate to domain ("" for every host), like httplib2.Http.add_certificate
+
+        Connections of the shared pool are reused by other services and
+        tenants, so requests to domain go through a pool of this adapter's own.
+        """
+        pool = self.pool
+        self._cert_pools[domain] = GoogleHTTPPool(
+            limits=pool.limits,
+            timeout=pool.timeout,
+            max_per_host=pool.max_per_host,
+            http2=pool.http2,
+            verify=pool.verify,
+            cert=(cert, key, password),
+        )
+
+    def close(self) -> None:
+        """Close the pools of added certificates; the shared pool is left open for other services"""
+        pools, self._cert_pools = self._cert_pools, {}
+        for pool in pools.values():
+            pool.close()
+
+
+def _tls_context(verify: Union[bool, ssl.SSLContext], cert: tuple[str, str, Optional[str]]) -> ssl.SSLContext:
+    """TLS context presenting cert and verifying servers as verify asks"""
+    if isinstance(verify, ssl.SSLContext):
+        raise ValueError("Load the client certificate into the SSLContext given as verify")
+    context = ssl.create_default_context()
+    if not verify:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    certfile, keyfile, password = cert
+    context.load_cert_chain(certfile, keyfile, password)
+    return context
+
+
+def _to_httplib2(response: httpx.Response) -> httplib2.Response:
+    """Convert an httpx response into the httplib2.Response googleapiclient expects"""
+    info: dict[str, str] = {k.lower(): v for k, v in response.headers.items()}
+    # httpx already decoded the body; mirror httplib2's bookkeeping for that
+    if "content-encoding" in info:
+        info["-content-encoding"] = info.pop("content-encoding")
+        info["content-length"] = str(len(response.content))
+    info["status"] = str(response.status_code)
+    info.setdefault("content-location", str(response.url))
+    result = httplib2.Response(info)
+    result.reason = response.reason_phrase
+    result.version = 20 if response.http_version == "HTTP/2" else 11
+    return result
+
+
+# Global instance (lazy initialization)
+_pool: Optional[GoogleHTTPPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_google_http_pool() -> GoogleHTTPPool:
+    """
+    Get or create global Google API connection pool
+
+    Returns:
+        GoogleHTTPPool instance
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = GoogleHTTPPool()
+    return _pool
+
+
+def close_google_http_pool() -> None:
+    """Close the global Google API connection pool (if created)"""
+    if _pool is not None:
+        _pool.close()
+
+
+def build_google_http() -> Any:
+    """
+    Build the unauthorized transport for a googleapiclient service
+
+    Returns:
+        httplib2.Http, or HttpxHttp if GOOGLE_HTTP_TRANSPORT=httpx
+    """
+    if config.GOOGLE_HTTP_TRANSPORT == "httpx":
+        return HttpxHttp()
+    return build_http()
@@ -6,25 +6,176 @@ to obtain Google OAuth credentials for server-to-server communication.
 """
 
 from __future__ import annotations
+import asyncio
+import base64
+import json
 import os
+import threading
 from typing import Optional
-from datetime import datetime
+from datetime import datetime, timezone
 import httpx
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials
 
+from src import config
+from src.auth.singleflight import SingleFlight
+
 load_dotenv()
 
 
+def _h2_available() -> bool:
+    """Check whether the optional h2 package needed for HTTP/2 is installed"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _parse_expiry(value: str) -> datetime:
+    """
+    Parse ISO format token expiry into naive UTC datetime
+
+    google-auth compares Credentials.expiry against naive UTC time,
+    so timezone-aware values would break Credentials.expired.
+    """
+    expiry = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if expiry.tzinfo is not None:
+        expiry = expiry.astimezone(timezone.utc).replace(tzinfo=None)
+    return expiry
+
+
+def _jwt_claims(token: str) -> dict:
+    """
+    Read the claims of a JWT without verifying it
+
+    Returns:
+        Claims, or {} if token is not a JWT
+    """
+    try:
+        payload = token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (IndexError, TypeError, ValueError):
+        return {}
+    return claims if isinstance(claims, dict) else {}
+
+
+def _jwt_expiry(token: str) -> Optional[float]:
+    """
+    Read the exp claim (unix timestamp) of a JWT without verifying it
+
+    Returns:
+        Expiry timestamp, or None if token is not a JWT or has no exp claim
+    """
+    try:
+        return float(_jwt_claims(token)["exp"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class OMAHTTPPools:
+    """
+    Long-lived sync and async HTTP connection pools for OMA backend
+
+    Clients are created on first use (keep-alive, HTTP/2 when available) and
+    reused by every request. One instance can be shared by many OMAAuthClient
+    objects, e.g. one per tenant in multi-tenant mode.
+    """
+
+    def __init__(
+        self,
+        verify_ssl: bool = True,
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        http2: Optional[bool] = None,
+    ):
+        """
+        Args:
+            verify_ssl: Whether to verify SSL certificates
+            limits: Connection pool limits (default from OMA_HTTP_* settings)
+            timeout: Request timeouts (default from OMA_HTTP_*_TIMEOUT settings)
+            http2: Use HTTP/2 if the h2 package is installed (default from OMA_HTTP2)
+        """
+        self.verify_ssl = verify_ssl
+        self.limits = limits or httpx.Limits(
+            max_connections=config.OMA_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.OMA_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=config.OMA_HTTP_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout or httpx.Timeout(config.OMA_HTTP_TIMEOUT, connect=config.OMA_HTTP_CONNECT_TIMEOUT)
+        self.http2 = (config.OMA_HTTP2 if http2 is None else http2) and _h2_available()
+
+        self._client: Optional[httpx.Client] = None
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        """Shared sync HTTP client (created on first use)"""
+        if self._client is None or self._client.is_closed:
+            with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.Client(
+                        verify=self.verify_ssl,
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        http2=self.http2,
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Shared async HTTP client (created on first use)"""
+        if self._async_client is None or self._async_client.is_closed:
+            with self._lock:
+                if self._async_client is None or self._async_client.is_closed:
+                    self._async_client = httpx.AsyncClient(
+                        verify=self.verify_ssl,
+                        limits=self.limits,
+                        timeout=self.timeout,
+                        http2=self.http2,
+                    )
+        return self._async_client
+
+    def close(self) -> None:
+        """Close the sync connection pool (reopened lazily on next use)"""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
+
+    async def aclose(self) -> None:
+        """Close both connection pools (reopened lazily on next use)"""
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+        if async_client is not None:
+            await async_client.aclose()
+        self.close()
+
+
 class OMAAuthClient:
-    """Client for authenticating with OMA backend and obtaining Google credentials"""
+    """
+    Client for authenticating with OMA backend and obtaining Google credentials
+
+    HTTP requests go through long-lived connection pools (OMAHTTPPools), either
+    owned by this client or shared with other clients. Call close()/aclose()
+    on shutdown to release them.
+
+    Concurrent credential fetches and access token refreshes are coalesced
+    (single-flight): callers arriving while one is in progress share its result.
+    """
 
     def __init__(
         self,
         base_url: Optional[str] = None,
         access_token: Optional[str] = None,
         refresh_token: Optional[str] = None,
-        verify_ssl: bool = True
+        verify_ssl: bool = True,
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+        http2: Optional[bool] = None,
+        pools: Optional[OMAHTTPPools] = None,
+        export_env: bool = False,
     ):
         """
         Initialize OMA Authentication Client
@@ -34,11 +185,21 @@ class OMAAuthClient:
             access_token: User's access token for OMA backend (default from env OMA_ACCESS_TOKEN)
             refresh_token: User's refresh token for auto-refresh (default from env MCP_REFRESH_TOKEN)
             verify_ssl: Whether to verify SSL certificates (default True, set False for dev)
+            limits: Connection pool limits (default from OMA_HTTP_* settings)
+            timeout: Request timeouts (default from OMA_HTTP_*_TIMEOUT settings)
+            http2: Use HTTP/2 if the h2 package is installed (default from OMA_HTTP2)
+            pools: Shared connection pools (verify_ssl/limits/timeout/http2 are ignored if given)
+            export_env: Write refreshed access tokens to OMA_ACCESS_TOKEN (process-default client
+                only; a tenant's token must stay on its own client)
         """
         self.base_url = (base_url or os.getenv("OMA_BACKEND_URL", "https://rndaibot.ru/apib/v1")).rstrip("/")
         self.access_token = access_token or os.getenv("OMA_ACCESS_TOKEN")
         self.refresh_token = refresh_token or os.getenv("MCP_REFRESH_TOKEN")
-        self.verify_ssl = verify_ssl
+        self.pools = pools or OMAHTTPPools(verify_ssl=verify_ssl, limits=limits, timeout=timeout, http2=http2)
+        self.export_env = export_env
+
+        self._token_lock = threading.Lock()
+        self._flight = SingleFlight()
 
         if not self.access_token:
             raise ValueError(
@@ -46,50 +207,130 @@ class OMAAuthClient:
                 "or pass access_token parameter."
             )
 
-    def _get_headers(self) -> dict[str, str]:
+    @property
+    def verify_ssl(self) -> bool:
+        return self.pools.verify_ssl
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return self.pools.limits
+
+    @property
+    def http2(self) -> bool:
+        return self.pools.http2
+
+    @property
+    def client(self) -> httpx.Client:
+        """Shared sync HTTP client"""
+        return self.pools.client
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Shared async HTTP client"""
+        return self.pools.async_client
+
+    def close(self) -> None:
+        """Close the sync connection pool (reopened lazily on next use)"""
+        self.pools.close()
+
+    async def aclose(self) -> None:
+        """Close both connection pools (reopened lazily on next use)"""
+        await self.pools.aclose()
+
+    def set_tokens(self, access_token: str, refresh_token: Optional[str] = None) -> None:
+        """Replace the OMA tokens (e.g. with fresher ones presented by the tenant)"""
+        with self._token_lock:
+            self.access_token = access_token
+            if refresh_token:
+                self.refresh_token = refresh_token
+
+    def _get_headers(self, access_token: Optional[str] = None) -> dict[str, str]:
         """Get HTTP headers with authorization"""
         return {
-            "Authorization": f"Bearer {self.access_token}",
+            "Authorization": f"Bearer {access_token or self.access_token}",
             "Content-Type": "application/json"
         }
 
-    def _refresh_access_token(self) -> bool:
+    def access_token_expiry(self) -> Optional[float]:
+        """Unix timestamp at which the current OMA access token expires (None if unknown)"""
+        return _jwt_expiry(self.access_token) if self.access_token else None
+
+    def subject(self) -> Optional[str]:
+        """
+        OMA user id of the access token, confirmed by OMA
+
+        OMA is asked to accept the token (GET /google/status) first, whatever
+        the token carries. The user id is then read from the token's sub (or
+        user_id) claim, which is not verified here.
+
+        Returns:
+            User id, or None if the (accepted) token carries none
+
+        Raises:
+            ValueError: If OMA rejects the token
+            httpx.HTTPError: If the request fails
+        """
+        response = self.client.get(f"{self.base_url}/google/status", headers=self._get_headers())
+        if response.status_code == 401:
+            raise ValueError("Unauthorized: OMA rejected the access token.")
+        response.raise_for_status()
+        claims = _jwt_claims(self.access_token)
+        subject = claims.get("sub") or claims.get("user_id")
+        return str(subject) if subject else None
+
+    def flight_stats(self) -> dict[str, dict[str, int]]:
+        """Single-flight counters (calls, executions, coalesced) per operation"""
+        return self._flight.stats()
+
+    def _refresh_access_token(self, stale_token: Optional[str] = None) -> bool:
         """
         Refresh access token using refresh token
 
+        Concurrent callers share one refresh request. If stale_token (the token
+        that got 401) was already replaced by another caller, no refresh is made.
+
+        Args:
+            stale_token: Access token that was rejected by OMA backend
+
         Returns:
             True if refresh succeeded, False otherwise
         """
+        if stale_token is not None and self.access_token != stale_token:
+            return True
+        return self._flight.do("refresh", self._do_refresh_access_token)
+
+    def _do_refresh_access_token(self) -> bool:
+        """Perform the /auth/refresh request (single-flight leader only)"""
         if not self.refresh_token:
             print("[OMAAuthClient] No refresh token available, cannot refresh access token")
             return False
 
         try:
             print("[OMAAuthClient] Refreshing access token using refresh token...")
-            with httpx.Client(verify=self.verify_ssl) as client:
-                response = client.post(
-                    f"{self.base_url}/auth/refresh",
-                    json={"refresh_token": self.refresh_token},
-                    headers={"Content-Type": "application/json"},
-                    timeout=30.0
-                )
+            response = self.client.post(
+                f"{self.base_url}/auth/refresh",
+                json={"refresh_token": self.refresh_token},
+                headers={"Content-Type": "application/json"},
+            )
 
-                if response.status_code == 200:
-                    data = response.json()
-                    new_access_token = data.get("access_token")
-                    if new_access_token:
+            if response.status_code == 200:
+                data = response.json()
+                new_access_token = data.get("access_token")
+                if new_access_token:
+                    with self._token_lock:
                         self.access_token = new_access_token
-                        # Update environment variable for other parts of code
-                        os.environ["OMA_ACCESS_TOKEN"] = new_access_token
-                        print(f"[OMAAuthClient] Access token refreshed successfully: {new_access_token[:20]}...")
-                        return True
-                    else:
-                        print("[OMAAuthClient] No access_token in refresh response")
-                        return False
+                        if self.export_env:
+                            # Update environment variable for other parts of code
+                            os.environ["OMA_ACCESS_TOKEN"] = new_access_token
+                    print(f"[OMAAuthClient] Access token refreshed successfully: {new_access_token[:20]}...")
+                    return True
                 else:
-                    print(f"[OMAAuthClient] Failed to refresh token: HTTP {response.status_code}")
-                    print(f"[OMAAuthClient] Response: {response.text}")
+                    print("[OMAAuthClient] No access_token in refresh response")
                     return False
+            else:
+                print(f"[OMAAuthClient] Failed to refresh token: HTTP {response.status_code}")
+                print(f"[OMAAuthClient] Response: {response.text}")
+                return False
 
         except Exception as e:
             print(f"[OMAAuthClient] Error refreshing access token: {e}")
@@ -107,56 +348,35 @@ class OMAAuthClient:
             httpx.HTTPError: If request fails
             ValueError: If credentials are not found or invalid
         """
-        async with httpx.AsyncClient(verify=self.verify_ssl) as client:
-            response = await client.get(
-                f"{self.base_url}/google/credentials",
-                headers=self._get_headers(),
-                timeout=30.0
-            )
-
-            # Handle 401 Unauthorized - try to refresh token
-            if response.status_code == 401:
-                print("[OMAAuthClient] Received 401 Unauthorized, attempting to refresh access token...")
-                if self._refresh_access_token():
-                    print("[OMAAuthClient] Token refreshed, retrying request...")
-                    # Retry with new token
-                    response = await client.get(
-                        f"{self.base_url}/google/credentials",
-                        headers=self._get_headers(),
-                        timeout=30.0
-                    )
-                else:
-                    raise ValueError(
-                        "Access token expired and refresh failed. "
-                        "Please re-authenticate or check refresh token."
-                    )
+        return await self._flight.ado("credentials", self._fetch_google_credentials)
+
+    async def _fetch_google_credentials(self) -> Credentials:
+        """Perform the /google/credentials request (single-flight leader only)"""
+        client = self.async_client
+        token = self.access_token
+        response = await client.get(
+            f"{self.base_url}/google/credentials",
+            headers=self._get_headers(token),
+        )
 
-            if response.status_code == 404:
+        # Handle 401 Unauthorized - try to refresh token
+        if response.status_code == 401:
+            print("[OMAAuthClient] Received 401 Unauthorized, attempting to refresh access token...")
+            # Joins the thread-level refresh flight without blocking the event loop
+            if await asyncio.to_thread(self._refresh_access_token, token):
+                print("[OMAAuthClient] Token refreshed, retrying request...")
+                # Retry with new token
+                response = await client.get(
+                    f"{self.base_url}/google/credentials",
+                    headers=self._get_headers(),
+                )
+            else:
                 raise ValueError(
-                    "Google account not connected. User must connect their Google account "
-                    "through the web interface first."
+                    "Access token expired and refresh failed. "
+                    "Please re-authenticate or check refresh token."
                 )
 
-            response.raise_for_status()
-            data = response.json()
-
-        # Create Google Credentials object
-        credentials = Credentials(
-            token=data["access_token"],
-            refresh_token=data.get("refresh_token"),
-            token_uri="https://oauth2.googleapis.com/token",
-            client_id=os.getenv("GOOGLE_CLIENT_ID"),
-            client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-            scopes=data.get("scopes", [])
-        )
-
-        # Set expiry if provided
-        if data.get("token_expiry"):
-            # Parse ISO format datetime
-            expiry = datetime.fromisoformat(data["token_expiry"].replace("Z", "+00:00"))
-            credentials.expiry = expiry
-
-        return credentials
+        return self._credentials_from_response(response)
 
     def get_google_credentials_sync(self) -> Credentials:
         """
@@ -166,38 +386,46 @@ class OMAAuthClient:
         Returns:
             google.oauth2.credentials.Credentials object ready for use with Google APIs
         """
-        with httpx.Client(verify=self.verify_ssl) as client:
-            response = client.get(
-                f"{self.base_url}/google/credentials",
-                headers=self._get_headers(),
-                timeout=30.0
-            )
-
-            # Handle 401 Unauthorized - try to refresh token
-            if response.status_code == 401:
-                print("[OMAAuthClient] Received 401 Unauthorized, attempting to refresh access token...")
-                if self._refresh_access_token():
-                    print("[OMAAuthClient] Token refreshed, retrying request...")
-                    # Retry with new token
-                    response = client.get(
-                        f"{self.base_url}/google/credentials",
-                        headers=self._get_headers(),
-                        timeout=30.0
-                    )
-                else:
-                    raise ValueError(
-                        "Access token expired and refresh failed. "
-                        "Please re-authenticate or check refresh token."
-                    )
+        return self._flight.do("credentials", self._fetch_google_credentials_sync)
+
+    def _fetch_google_credentials_sync(self) -> Credentials:
+        """Perform the /google/credentials request (single-flight leader only)"""
+        client = self.client
+        token = self.access_token
+        response = client.get(
+            f"{self.base_url}/google/credentials",
+            headers=self._get_headers(token),
+        )
 
-            if response.status_code == 404:
+        # Handle 401 Unauthorized - try to refresh token
+        if response.status_code == 401:
+            print("[OMAAuthClient] Received 401 Unauthorized, attempting to refresh access token...")
+            if self._refresh_access_token(token):
+                print("[OMAAuthClient] Token refreshed, retrying request...")
+                # Retry with new token
+                response = client.get(
+                    f"{self.base_url}/google/credentials",
+                    headers=self._get_headers(),
+                )
+            else:
                 raise ValueError(
-                    "Google account not connected. User must connect their Google account "
-                    "through the web interface first."
+                    "Access token expired and refresh failed. "
+                    "Please re-authenticate or check refresh token."
                 )
 
-            response.raise_for_status()
-            data = response.json()
+        return self._credentials_from_response(response)
+
+    @staticmethod
+    def _credentials_from_response(response: httpx.Response) -> Credentials:
+        """Build Google Credentials from a /google/credentials response"""
+        if response.status_code == 404:
+            raise ValueError(
+                "Google account not connected. User must connect their Google account "
+                "through the web interface first."
+            )
+
+        response.raise_for_status()
+        data = response.json()
 
         # Create Google Credentials object
         credentials = Credentials(
@@ -211,8 +439,7 @@ class OMAAuthClient:
 
         # Set expiry if provided
         if data.get("token_expiry"):
-            expiry = datetime.fromisoformat(data["token_expiry"].replace("Z", "+00:00"))
-            credentials.expiry = expiry
+            credentials.expiry = _parse_expiry(data["token_expiry"])
 
         return credentials
 
@@ -223,18 +450,30 @@ class OMAAuthClient:
         Returns:
             Dict with gmail_connected and calendar_connected status
         """
-        async with httpx.AsyncClient(verify=self.verify_ssl) as client:
-            response = await client.get(
-                f"{self.base_url}/google/status",
-                headers=self._get_headers(),
-                timeout=30.0
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self.async_client.get(
+            f"{self.base_url}/google/status",
+            headers=self._get_headers(),
+        )
+        response.raise_for_status()
+        return response.json()
 
 
-# Global instance (lazy initialization)
+# Global instances (lazy initialization)
 _oma_client: Optional[OMAAuthClient] = None
+_oma_pools: Optional[OMAHTTPPools] = None
+
+
+def get_oma_pools() -> OMAHTTPPools:
+    """
+    Get or create connection pools shared by all OMA clients of this process
+
+    Returns:
+        OMAHTTPPools instance
+    """
+    global _oma_pools
+    if _oma_pools is None:
+        _oma_pools = OMAHTTPPools(verify_ssl=config.OMA_VERIFY_SSL)
+    return _oma_pools
 
 
 def get_oma_client() -> OMAAuthClient:
@@ -246,17 +485,40 @@ def get_oma_client() -> OMAAuthClient:
     """
     global _oma_client
     if _oma_client is None:
-        _oma_client = OMAAuthClient()
+        _oma_client = OMAAuthClient(pools=get_oma_pools(), export_env=True)
     return _oma_client
 
 
-def get_google_creds_from_oma() -> Credentials:
+def close_oma_client() -> None:
+    """Close connection pools shared by OMA clients (sync shutdown hook)"""
+    if _oma_pools is not None:
+        _oma_pools.close()
+
+
+def get_oma_flight_stats() -> dict[str, dict[str, int]]:
+    """Single-flight counters of the global OMA client ({} if not created yet)"""
+    if _oma_client is None:
+        return {}
+    return _oma_client.flight_stats()
+
+
+async def aclose_oma_client() -> None:
+    """Close connection pools shared by OMA clients (async shutdown hook)"""
+    if _oma_pools is not None:
+        await _oma_pools.aclose()
+
+
+def get_google_creds_from_oma(tenant: Optional[str] = None, access_token: Optional[str] = None) -> Credentials:
     """
     Convenience function to get Google credentials from OMA backend
 
     This replaces the old get_google_creds() function that used local token files.
     Now credentials are managed centrally by OMA backend.
 
+    Args:
+        tenant: Tenant id in multi-tenant mode (default: process-wide OMA_ACCESS_TOKEN user)
+        access_token: Tenant's OMA access token (registers the tenant if needed)
+
     Returns:
         google.oauth2.credentials.Credentials object
 
@@ -266,5 +528,9 @@ def get_google_creds_from_oma() -> Credentials:
         >>> from googleapiclient.discovery import build
         >>> gmail = build("gmail", "v1", credentials=creds)
     """
-    client = get_oma_client()
+    if tenant is None:
+        client = get_oma_client()
+    else:
+        from src.auth.tenant import get_tenant_registry
+        client = get_tenant_registry().oma_client(tenant, access_token)
     return client.get_google_credentials_sync()
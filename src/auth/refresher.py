@@ -0,0 +1,162 @@
+"""
+Background Token Refresher
+
+Daemon thread that keeps credentials warm so the request path never blocks
+on a refresh:
+- OMA access token: refreshed through OMAAuthClient._refresh_access_token
+  (single-flight) before its JWT exp claim is reached
+- Google credentials: cached entries are renewed before the credential cache
+  would consider them stale
+
+Refreshes are scheduled TOKEN_REFRESH_LEAD seconds ahead, minus a random
+jitter of up to TOKEN_REFRESH_JITTER seconds, so many tenants/processes do
+not refresh in lockstep.
+
+Enabled with TOKEN_REFRESHER_ENABLED=true; started together with the server.
+"""
+
+from __future__ import annotations
+import random
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from src import config
+from src.auth.google_auth import get_credential_cache, refresh_google_creds
+from src.auth.oma_client import OMAAuthClient, get_oma_client
+
+# Shortest sleep between checks, protects against tight loops on failures
+MIN_INTERVAL = 30.0
+
+
+def _default_oma_clients() -> Iterable[OMAAuthClient]:
+    """OMA clients whose access tokens the refresher maintains"""
+    if not config.is_oma_backend_mode():
+        return []
+    if config.is_multi_tenant_mode():
+        from src.auth.tenant import get_tenant_registry
+        return [state.oma_client for state in get_tenant_registry().tenants()]
+    return [get_oma_client()]
+
+
+class TokenRefresher:
+    """Refresh OMA and Google tokens ahead of expiry in a background thread"""
+
+    def __init__(
+        self,
+        lead: float = config.TOKEN_REFRESH_LEAD,
+        jitter: float = config.TOKEN_REFRESH_JITTER,
+        max_interval: float = config.TOKEN_REFRESH_MAX_INTERVAL,
+        oma_clients: Callable[[], Iterable[OMAAuthClient]] = _default_oma_clients,
+    ):
+        """
+        Args:
+            lead: Seconds before a token's deadline at which it is refreshed
+            jitter: Maximum random seconds subtracted from each scheduled refresh
+            max_interval: Maximum sleep between checks
+            oma_clients: Callable returning the OMA clients to maintain
+        """
+        self.lead = lead
+        self.jitter = jitter
+        self.max_interval = max_interval
+        self.oma_clients = oma_clients
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start the refresher thread (no-op if already running)"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-refresher", daemon=True)
+            self._thread.start()
+        print("[TokenRefresher] Started")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the refresher thread and wait for it to exit"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        if thread is not None:
+            thread.join(timeout)
+            print("[TokenRefresher] Stopped")
+
+    def _run(self) -> None:
+        delay = 0.0
+        while not self._stop.wait(delay):
+            try:
+                delay = self.refresh_due()
+            except Exception as e:
+                print(f"[TokenRefresher] Refresh cycle failed: {e}")
+                delay = MIN_INTERVAL
+            delay = min(max(delay, MIN_INTERVAL), self.max_interval)
+
+    def _deadlines(self) -> list[tuple[float, Callable[[], object]]]:
+        """(deadline, refresh action) for every token the refresher maintains"""
+        deadlines: list[tuple[float, Callable[[], object]]] = []
+        for client in self.oma_clients():
+            expiry = client.access_token_expiry()
+            if expiry is not None and client.refresh_token:
+                token = client.access_token
+                deadlines.append((expiry, lambda c=client, t=token: c._refresh_access_token(t)))
+
+        cache = get_credential_cache()
+        for (tenant, _scopes), expires_at in cache.expiring().items():
+            # Cache stops serving an entry `margin` seconds before expiry
+            # A renewal must outlive the (jittered) window, or the entry stays due
+            deadlines.append(
+                (expires_at - cache.margin, lambda t=tenant: refresh_google_creds(t, self.lead + self.jitter))
+            )
+        return deadlines
+
+    def refresh_due(self) -> float:
+        """
+        Refresh every token whose deadline is within the lead window
+
+        Returns:
+            Seconds until the next token enters its (jittered) lead window
+        """
+        now = time.time()
+        next_delay = self.max_interval
+        for deadline, refresh in self._deadlines():
+            refresh_at = deadline - self.lead - random.uniform(0, self.jitter)
+            if refresh_at <= now:
+                try:
+                    refresh()
+                except Exception as e:
+                    print(f"[TokenRefresher] Refresh failed: {e}")
+            else:
+                next_delay = min(next_delay, refresh_at - now)
+        return next_delay
+
+
+# Global instance (lazy initialization)
+_refresher: Optional[TokenRefresher] = None
+
+
+def start_token_refresher() -> Optional[TokenRefresher]:
+    """
+    Start the global refresher if TOKEN_REFRESHER_ENABLED (idempotent)
+
+    Returns:
+        Running TokenRefresher, or None if disabled
+    """
+    global _refresher
+    if not config.TOKEN_REFRESHER_ENABLED:
+        return None
+    if _refresher is None:
+        _refresher = TokenRefresher()
+    _refresher.start()
+    return _refresher
+
+
+def stop_token_refresher() -> None:
+    """Stop the global refresher if it is running"""
+    if _refresher is not None:
+        _refresher.stop()
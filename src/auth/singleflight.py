@@ -0,0 +1,124 @@
+"""
+Single-flight call coalescing
+
+Concurrent calls that share a key are collapsed into one execution: the first
+caller (leader) runs the function, everyone arriving while it is in flight
+waits for and receives the leader's result (or exception).
+
+Works for threads (do) and asyncio coroutines (ado). Sync and async flights
+are tracked separately; async code that needs to join a sync flight can call
+do() through asyncio.to_thread().
+"""
+
+from __future__ import annotations
+import asyncio
+import threading
+from concurrent.futures import Future
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class FlightStats:
+    """Counters for one flight key"""
+    calls: int = 0
+    executions: int = 0
+    coalesced: int = 0
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into one execution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, Future] = {}
+        self._async_calls: dict[tuple[asyncio.AbstractEventLoop, Hashable], asyncio.Future] = {}
+        self._stats: dict[Hashable, FlightStats] = {}
+
+    def _record(self, key: Hashable, leader: bool) -> None:
+        """Update counters (caller holds self._lock)"""
+        stats = self._stats.setdefault(key, FlightStats())
+        stats.calls += 1
+        if leader:
+            stats.executions += 1
+        else:
+            stats.coalesced += 1
+
+    def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Run fn, or wait for an in-flight call with the same key
+
+        Args:
+            key: Flight key; calls with equal keys are coalesced
+            fn: Function to run if no call with this key is in flight
+
+        Returns:
+            Result of fn (shared by all coalesced callers)
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+            self._record(key, leader)
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+        return result
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await fn(), or wait for an in-flight coroutine with the same key
+
+        Args:
+            key: Flight key; calls with equal keys on the same event loop are coalesced
+            fn: Coroutine function to await if no call with this key is in flight
+
+        Returns:
+            Result of fn() (shared by all coalesced callers)
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            future = self._async_calls.get(flight_key)
+            leader = future is None
+            if leader:
+                future = loop.create_future()
+                self._async_calls[flight_key] = future
+            self._record(key, leader)
+
+        if not leader:
+            return await asyncio.shield(future)
+
+        try:
+            result = await fn()
+        except BaseException as e:
+            with self._lock:
+                self._async_calls.pop(flight_key, None)
+            future.set_exception(e)
+            # Waiters receive the exception; avoid "never retrieved" warnings
+            future.exception()
+            raise
+        with self._lock:
+            self._async_calls.pop(flight_key, None)
+        future.set_result(result)
+        return result
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Counters per key: calls, executions and coalesced calls"""
+        with self._lock:
+            return {str(key): asdict(stats) for key, stats in self._stats.items()}
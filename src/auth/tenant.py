@@ -0,0 +1,275 @@
+"""
+Tenant Resolution and Registry for Multi-Tenant Mode
+
+In multi-tenant mode (MCP_MULTI_TENANT=true) one server process serves many
+users. Every MCP request carries the user's OMA access token, either as
+`Authorization: Bearer <token>` or in the MCP_TENANT_TOKEN_HEADER header.
+
+The tenant id is derived from the OMA user id the token carries (its sub
+claim), so a rotated token keeps the user's tenant and everything cached for
+it. Every token is confirmed with OMA before it gets a tenant; tokens OMA
+rejects are refused. A confirmed token is trusted until its exp claim, and
+for at most MCP_TENANT_TOKEN_TTL seconds, then OMA is asked again. Tokens
+without a user id get a tenant of their own, derived from a hash of the
+token. Each tenant gets an OMAAuthClient sharing the process-wide connection
+pools, and its tokens are replaced by fresher ones presented by later
+requests.
+Tenants are kept in an LRU registry of at most MCP_MAX_TENANTS; evicted
+tenants lose their cached credentials, and evict listeners drop what other
+layers keep for them.
+
+In single-tenant mode everything runs under the pinned default tenant.
+"""
+
+from __future__ import annotations
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+from src import config
+from src.auth.google_auth import DEFAULT_TENANT, invalidate_google_creds
+from src.auth.oma_client import OMAAuthClient, _jwt_expiry, get_oma_pools
+from src.auth.singleflight import SingleFlight
+
+# Access tokens whose tenant id is remembered, per tenant kept
+_TOKENS_PER_TENANT = 4
+
+
+@dataclass
+class TenantIdentity:
+    """Tenant resolved from an inbound MCP request"""
+    tenant_id: str
+    access_token: str
+    refresh_token: Optional[str] = None
+
+
+@dataclass
+class TenantState:
+    """Per-tenant state kept by the registry"""
+    tenant_id: str
+    oma_client: Optional[OMAAuthClient] = None
+    last_used: float = field(default_factory=time.time)
+
+
+class TenantRegistry:
+    """Thread-safe LRU registry of tenant state"""
+
+    def __init__(self, max_tenants: Optional[int] = None):
+        """
+        Args:
+            max_tenants: Maximum tenants kept (default MCP_MAX_TENANTS)
+        """
+        self.max_tenants = max(max_tenants or config.MCP_MAX_TENANTS, 1)
+        self._tenants: OrderedDict[str, TenantState] = OrderedDict()
+        self._default = TenantState(DEFAULT_TENANT)
+        self._lock = threading.RLock()
+        self._evict_listeners: list[Callable[[TenantState], None]] = []
+        self._token_tenants: OrderedDict[str, tuple[str, float]] = OrderedDict()  # Token hash -> (tenant id, trusted until)
+        self._flight = SingleFlight()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tenants)
+
+    def add_evict_listener(self, listener: Callable[[TenantState], None]) -> None:
+        """Call listener(state) whenever a tenant is evicted"""
+        self._evict_listeners.append(listener)
+
+    def tenant_id_for(self, access_token: str) -> str:
+        """
+        Tenant id of an OMA access token
+
+        The token is confirmed with OMA, then trusted until it expires (at most
+        MCP_TENANT_TOKEN_TTL seconds). Tokens carrying an OMA user id map to
+        the user's tenant; other tokens get a tenant of their own.
+
+        Raises:
+            ValueError: If OMA rejects the token
+        """
+        key = tenant_id_for_token(access_token)
+        with self._lock:
+            entry = self._token_tenants.get(key)
+            if entry is not None:
+                tenant_id, trusted_until = entry
+                if time.time() < trusted_until:
+                    self._token_tenants.move_to_end(key)
+                    return tenant_id
+                # Expired, or revoked since: OMA decides again
+                del self._token_tenants[key]
+        return self._flight.do(key, lambda: self._resolve_token(key, access_token))
+
+    def _resolve_token(self, key: str, access_token: str) -> str:
+        subject = OMAAuthClient(access_token=access_token, pools=get_oma_pools()).subject()
+        tenant_id = tenant_id_for_subject(subject) if subject else key
+        trusted_until = time.time() + config.MCP_TENANT_TOKEN_TTL
+        expiry = _jwt_expiry(access_token)
+        if expiry is not None:
+            trusted_until = min(trusted_until, expiry)
+        with self._lock:
+            self._token_tenants[key] = (tenant_id, trusted_until)
+            while len(self._token_tenants) > self.max_tenants * _TOKENS_PER_TENANT:
+                self._token_tenants.popitem(last=False)
+        return tenant_id
+
+    def state(self, tenant_id: Optional[str] = None) -> TenantState:
+        """
+        Get state of a registered tenant (or the default tenant)
+
+        Raises:
+            ValueError: If tenant is not registered (e.g. evicted)
+        """
+        if tenant_id is None or tenant_id == DEFAULT_TENANT:
+            return self._default
+        with self._lock:
+            state = self._tenants.get(tenant_id)
+            if state is None:
+                raise ValueError(f"Unknown tenant {tenant_id}; it must be resolved from a request first.")
+            self._tenants.move_to_end(tenant_id)
+            state.last_used = time.time()
+            return state
+
+    def register(self, tenant_id: str, access_token: str, refresh_token: Optional[str] = None) -> TenantState:
+        """
+        Register a tenant (or mark it recently used) and evict over capacity
+
+        Args:
+            tenant_id: Tenant id
+            access_token: Tenant's OMA access token
+            refresh_token: Tenant's OMA refresh token, if the request provided one
+
+        Returns:
+            TenantState of the tenant
+        """
+        evicted: list[TenantState] = []
+        with self._lock:
+            state = self._tenants.get(tenant_id)
+            if state is None:
+                client = OMAAuthClient(access_token=access_token, refresh_token=refresh_token, pools=get_oma_pools())
+                # Never fall back to the process-wide MCP_REFRESH_TOKEN for a tenant
+                client.refresh_token = refresh_token
+                state = TenantState(tenant_id, oma_client=client)
+                self._tenants[tenant_id] = state
+            else:
+                client = state.oma_client
+                if access_token != client.access_token and _is_fresher(access_token, client.access_token):
+                    client.set_tokens(access_token, refresh_token)
+                elif refresh_token and client.refresh_token != refresh_token:
+                    client.set_tokens(client.access_token, refresh_token)
+            self._tenants.move_to_end(tenant_id)
+            state.last_used = time.time()
+
+            while len(self._tenants) > self.max_tenants:
+                _, old = self._tenants.popitem(last=False)
+                evicted.append(old)
+
+        for old in evicted:
+            self._evict(old)
+        return state
+
+    def oma_client(self, tenant_id: str, access_token: Optional[str] = None) -> OMAAuthClient:
+        """OMA client of a tenant, registering it first if access_token is given"""
+        if access_token:
+            return self.register(tenant_id, access_token).oma_client
+        return self.state(tenant_id).oma_client
+
+    def tenants(self) -> list[TenantState]:
+        """Snapshot of registered tenants (least recently used first)"""
+        with self._lock:
+            return list(self._tenants.values())
+
+    def _evict(self, state: TenantState) -> None:
+        print(f"[TenantRegistry] Evicting tenant {state.tenant_id}")
+        invalidate_google_creds(state.tenant_id)
+        for listener in self._evict_listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                print(f"[TenantRegistry] Evict listener failed: {e}")
+
+
+def tenant_id_for_token(access_token: str) -> str:
+    """Derive a tenant id from an OMA access token (for tokens without a user id)"""
+    return "t-" + hashlib.sha256(access_token.encode("utf-8")).hexdigest()[:32]
+
+
+def tenant_id_for_subject(subject: str) -> str:
+    """Derive a stable tenant id from an OMA user id"""
+    return "u-" + hashlib.sha256(subject.encode("utf-8")).hexdigest()[:32]
+
+
+def _is_fresher(token: str, current: str) -> bool:
+    """Whether token expires no earlier than current (unknown expiries count as fresher)"""
+    expiry, current_expiry = _jwt_expiry(token), _jwt_expiry(current)
+    return expiry is None or current_expiry is None or expiry >= current_expiry
+
+
+def _request_headers() -> Optional[dict[str, str]]:
+    """Headers of the inbound HTTP request handled by this MCP call, if any"""
+    from mcp.server.lowlevel.server import request_ctx
+
+    try:
+        request = request_ctx.get().request
+    except LookupError:
+        return None
+    headers = getattr(request, "headers", None)
+    if headers is None:
+        return None
+    return {k.lower(): v for k, v in headers.items()}
+
+
+def resolve_tenant() -> Optional[TenantIdentity]:
+    """
+    Resolve the tenant of the current MCP request
+
+    Returns:
+        TenantIdentity in multi-tenant mode, None in single-tenant mode
+
+    The token is confirmed with OMA before the tenant is registered, so a
+    request with an invalid token never evicts another tenant.
+
+    Raises:
+        ValueError: If the request carries no OMA access token, or OMA rejects it
+    """
+    if not config.is_multi_tenant_mode():
+        return None
+
+    headers = _request_headers() or {}
+    access_token = headers.get(config.MCP_TENANT_TOKEN_HEADER.lower())
+    if not access_token:
+        scheme, _, credentials = headers.get("authorization", "").partition(" ")
+        if scheme.lower() == "bearer":
+            access_token = credentials.strip()
+    if not access_token:
+        raise ValueError(
+            "Unauthorized: multi-tenant mode requires the user's OMA access token "
+            f"(Authorization: Bearer <token> or {config.MCP_TENANT_TOKEN_HEADER} header)."
+        )
+
+    refresh_token = headers.get(config.MCP_TENANT_REFRESH_HEADER.lower())
+    registry = get_tenant_registry()
+    identity = TenantIdentity(registry.tenant_id_for(access_token), access_token, refresh_token)
+    registry.register(identity.tenant_id, access_token, refresh_token)
+    return identity
+
+
+# Global instance (lazy initialization)
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_tenant_registry() -> TenantRegistry:
+    """
+    Get or create global tenant registry
+
+    Returns:
+        TenantRegistry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = TenantRegistry()
+    return _registry
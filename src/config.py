@@ -40,6 +40,18 @@ OMA_ACCESS_TOKEN = os.getenv("OMA_ACCESS_TOKEN")
 # SSL verification (set to False for development with self-signed certificates)
 OMA_VERIFY_SSL = os.getenv("OMA_VERIFY_SSL", "true").lower() == "true"
 
+# Connection pool of the OMA backend HTTP clients (shared by all requests)
+OMA_HTTP_MAX_CONNECTIONS = int(os.getenv("OMA_HTTP_MAX_CONNECTIONS", "100"))
+OMA_HTTP_MAX_KEEPALIVE = int(os.getenv("OMA_HTTP_MAX_KEEPALIVE", "20"))
+OMA_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("OMA_HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# OMA backend timeouts in seconds (connect / everything else)
+OMA_HTTP_CONNECT_TIMEOUT = float(os.getenv("OMA_HTTP_CONNECT_TIMEOUT", "10"))
+OMA_HTTP_TIMEOUT = float(os.getenv("OMA_HTTP_TIMEOUT", "30"))
+
+# Use HTTP/2 for OMA backend when the optional h2 package is installed
+OMA_HTTP2 = os.getenv("OMA_HTTP2", "true").lower() == "true"
+
 
 # ============================================================================
 # Legacy Local File Authentication Configuration
@@ -89,6 +101,242 @@ def get_google_scopes() -> list[str]:
 
 GOOGLE_SCOPES = get_google_scopes()
 
+# Directory with bundled Google API discovery documents (<api>.googleapis.com.json)
+# Services are built from these offline instead of fetching discovery at runtime
+GOOGLE_DISCOVERY_DIR = os.getenv(
+    "GOOGLE_DISCOVERY_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "specs")
+)
+
+
+# ============================================================================
+# Google API HTTP Transport
+# ============================================================================
+
+# Transport used by Gmail / Calendar services:
+# - "httplib2" (default): googleapiclient's own, one connection set per service
+# - "httpx" (opt-in): shared keep-alive connection pool (HTTP/2 when h2 is installed)
+GOOGLE_HTTP_TRANSPORT = os.getenv("GOOGLE_HTTP_TRANSPORT", "httplib2").lower()
+
+# Connection pool shared by all services and tenants
+GOOGLE_HTTP_MAX_CONNECTIONS = int(os.getenv("GOOGLE_HTTP_MAX_CONNECTIONS", "100"))
+GOOGLE_HTTP_MAX_KEEPALIVE = int(os.getenv("GOOGLE_HTTP_MAX_KEEPALIVE", "20"))
+GOOGLE_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GOOGLE_HTTP_KEEPALIVE_EXPIRY", "60"))
+
+# Maximum concurrent requests to a single host (e.g. gmail.googleapis.com)
+GOOGLE_HTTP_MAX_PER_HOST = int(os.getenv("GOOGLE_HTTP_MAX_PER_HOST", "20"))
+
+# Google API timeouts in seconds (connect / everything else)
+GOOGLE_HTTP_CONNECT_TIMEOUT = float(os.getenv("GOOGLE_HTTP_CONNECT_TIMEOUT", "10"))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "60"))
+
+# Use HTTP/2 for Google APIs when the optional h2 package is installed
+GOOGLE_HTTP2 = os.getenv("GOOGLE_HTTP2", "true").lower() == "true"
+
+
+# ============================================================================
+# Gmail Batch Requests and Concurrent Fetching
+# ============================================================================
+
+# Per-message fan-out (e.g. metadata of listed messages) is sent through the
+# batch endpoint with this many sub-requests per HTTP call (max 100; Gmail
+# rate-limits batches of more than 50)
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+
+# Full messages of bulk reads are fetched concurrently, at most this many per
+# tool call, on a worker pool of GMAIL_FETCH_MAX_THREADS threads shared by all calls
+GMAIL_FETCH_CONCURRENCY = int(os.getenv("GMAIL_FETCH_CONCURRENCY", "8"))
+GMAIL_FETCH_MAX_THREADS = int(os.getenv("GMAIL_FETCH_MAX_THREADS", "32"))
+
+
+# ============================================================================
+# Gmail Message Cache
+# ============================================================================
+
+# Keep parsed message content (headers, snippet, text) on disk; Gmail message
+# content never changes for an id, so repeat reads are served locally.
+# Labels are never cached.
+GMAIL_CACHE_ENABLED = os.getenv("GMAIL_CACHE_ENABLED", "true").lower() == "true"
+
+# SQLite database holding the cache (contains mail content - keep it private)
+GMAIL_CACHE_PATH = os.getenv("GMAIL_CACHE_PATH", "data/gmail_cache.sqlite3")
+
+# Maximum cache size in MB (least recently used messages are evicted)
+GMAIL_CACHE_MAX_MB = int(os.getenv("GMAIL_CACHE_MAX_MB", "256"))
+
+
+# ============================================================================
+# Gmail Mailbox Sync
+# ============================================================================
+
+# Keep a local copy of mailbox state (ids, threads, labels, dates) current
+# with users.history.list; unread listings are answered from it
+GMAIL_SYNC_ENABLED = os.getenv("GMAIL_SYNC_ENABLED", "true").lower() == "true"
+
+# SQLite database holding mailbox state (no mail content)
+GMAIL_SYNC_PATH = os.getenv("GMAIL_SYNC_PATH", "data/gmail_mailbox.sqlite3")
+
+# Newest messages tracked by a full sync (older mail is queried from Gmail)
+GMAIL_SYNC_MAX_MESSAGES = int(os.getenv("GMAIL_SYNC_MAX_MESSAGES", "5000"))
+
+# Minimum seconds between history checks of one mailbox
+GMAIL_SYNC_MIN_INTERVAL = float(os.getenv("GMAIL_SYNC_MIN_INTERVAL", "5"))
+
+# Gmail quota units per second the background backfill of listed messages
+# may spend per mailbox (Gmail allows 250 per user; one message get costs 5)
+GMAIL_SYNC_UNITS_PER_SECOND = float(os.getenv("GMAIL_SYNC_UNITS_PER_SECOND", "150"))
+
+
+# ============================================================================
+# Gmail Local Search Index
+# ============================================================================
+
+# Index messages read through the tools and fetched by the mailbox sync
+# (SQLite FTS5) for gmail_local_search
+GMAIL_SEARCH_ENABLED = os.getenv("GMAIL_SEARCH_ENABLED", "true").lower() == "true"
+
+# SQLite database holding the index (contains mail content - keep it private)
+GMAIL_SEARCH_PATH = os.getenv("GMAIL_SEARCH_PATH", "data/gmail_search.sqlite3")
+
+
+# ============================================================================
+# Gmail Message Upload
+# ============================================================================
+
+# Outgoing messages up to this size are sent in one request; larger ones
+# (attachments) are streamed from disk through a resumable upload
+GMAIL_UPLOAD_SIMPLE_MAX_KB = int(os.getenv("GMAIL_UPLOAD_SIMPLE_MAX_KB", "1024"))
+
+# Resumable upload chunk size in MB (memory used per upload)
+GMAIL_UPLOAD_CHUNK_MB = int(os.getenv("GMAIL_UPLOAD_CHUNK_MB", "4"))
+
+# Attempts to resume an interrupted upload from the last confirmed offset
+GMAIL_UPLOAD_RETRIES = int(os.getenv("GMAIL_UPLOAD_RETRIES", "5"))
+
+
+# ============================================================================
+# Gmail Attachment Download
+# ============================================================================
+
+# Directory of downloaded attachments, stored once per content hash
+# (contains mail content - keep it private)
+GMAIL_ATTACHMENTS_PATH = os.getenv("GMAIL_ATTACHMENTS_PATH", "data/gmail_attachments")
+
+# Attachments of one message downloaded at the same time
+GMAIL_ATTACHMENT_CONCURRENCY = int(os.getenv("GMAIL_ATTACHMENT_CONCURRENCY", "4"))
+
+
+# ============================================================================
+# Gmail Label Registry
+# ============================================================================
+
+# Seconds a tenant's label names and ids (users.labels.list) are reused
+# before they are reloaded; new labels are picked up sooner by mailbox sync
+GMAIL_LABELS_TTL = float(os.getenv("GMAIL_LABELS_TTL", "300"))
+
+
+# ============================================================================
+# Calendar Sync
+# ============================================================================
+
+# Keep a local copy of calendar events current with events.list syncTokens;
+# upcoming, range and lookup queries are answered from it
+CALENDAR_SYNC_ENABLED = os.getenv("CALENDAR_SYNC_ENABLED", "true").lower() == "true"
+
+# SQLite database holding the events
+CALENDAR_SYNC_PATH = os.getenv("CALENDAR_SYNC_PATH", "data/calendar_events.sqlite3")
+
+# Minimum seconds between delta requests for one calendar
+CALENDAR_SYNC_MIN_INTERVAL = float(os.getenv("CALENDAR_SYNC_MIN_INTERVAL", "5"))
+
+# Days of past events a full sync lists (earlier ranges are asked of Google);
+# bounds the expansion of long-running recurring events
+CALENDAR_SYNC_PAST_DAYS = float(os.getenv("CALENDAR_SYNC_PAST_DAYS", "90"))
+
+
+# ============================================================================
+# Calendar Agenda
+# ============================================================================
+
+# Calendars whose events calendar_agenda fetches at the same time
+CALENDAR_AGENDA_CONCURRENCY = int(os.getenv("CALENDAR_AGENDA_CONCURRENCY", "4"))
+
+
+# ============================================================================
+# Google Credential Cache
+# ============================================================================
+
+# Keep Google credentials in process memory instead of fetching them from
+# OMA backend (or token file) on every tool call
+GOOGLE_CREDS_CACHE_ENABLED = os.getenv("GOOGLE_CREDS_CACHE_ENABLED", "true").lower() == "true"
+
+# Refetch cached credentials when their access token expires within this many seconds
+GOOGLE_CREDS_EXPIRY_MARGIN = int(os.getenv("GOOGLE_CREDS_EXPIRY_MARGIN", "300"))
+
+# Lifetime assumed for credentials returned without an expiry (seconds)
+GOOGLE_CREDS_DEFAULT_TTL = int(os.getenv("GOOGLE_CREDS_DEFAULT_TTL", "3000"))
+
+
+# ============================================================================
+# Background Token Refresher
+# ============================================================================
+
+# Refresh cached Google credentials and the OMA access token in a background
+# thread ahead of expiry, so tool calls never wait for a refresh
+TOKEN_REFRESHER_ENABLED = os.getenv("TOKEN_REFRESHER_ENABLED", "false").lower() == "true"
+
+# Refresh this many seconds before a token would be refetched on the request path
+TOKEN_REFRESH_LEAD = int(os.getenv("TOKEN_REFRESH_LEAD", "300"))
+
+# Random spread (seconds) subtracted from each scheduled refresh
+TOKEN_REFRESH_JITTER = int(os.getenv("TOKEN_REFRESH_JITTER", "60"))
+
+# Upper bound for the refresher's sleep between checks (seconds)
+TOKEN_REFRESH_MAX_INTERVAL = int(os.getenv("TOKEN_REFRESH_MAX_INTERVAL", "300"))
+
+
+# ============================================================================
+# Multi-Tenant Mode
+# ============================================================================
+
+# Serve many users from one process. Each MCP request must carry the user's
+# OMA access token (Authorization: Bearer <token> or MCP_TENANT_TOKEN_HEADER).
+# Requires AUTH_MODE=oma_backend; OMA_ACCESS_TOKEN is not used.
+MCP_MULTI_TENANT = os.getenv("MCP_MULTI_TENANT", "false").lower() == "true"
+
+# Request headers carrying the tenant's OMA access / refresh token
+MCP_TENANT_TOKEN_HEADER = os.getenv("MCP_TENANT_TOKEN_HEADER", "X-OMA-Token")
+MCP_TENANT_REFRESH_HEADER = os.getenv("MCP_TENANT_REFRESH_HEADER", "X-OMA-Refresh-Token")
+
+# Maximum number of tenants kept in memory (least recently used are evicted)
+MCP_MAX_TENANTS = int(os.getenv("MCP_MAX_TENANTS", "256"))
+
+# Seconds a token's tenant is trusted before OMA is asked to accept the token
+# again (never beyond the token's own expiry)
+MCP_TENANT_TOKEN_TTL = float(os.getenv("MCP_TENANT_TOKEN_TTL", "300"))
+
+
+# ============================================================================
+# Google API Service Pool
+# ============================================================================
+
+# Built Gmail / Calendar services (and their keep-alive connections to
+# googleapis.com) are pooled per tenant and credentials. A service is used by
+# one tool call at a time, since httplib2.Http is not thread-safe.
+
+# Maximum services per tenant, API and credentials
+# (should be at least GMAIL_FETCH_CONCURRENCY, or concurrent fetches wait for services)
+SERVICE_POOL_MAX_PER_KEY = int(os.getenv("SERVICE_POOL_MAX_PER_KEY", "8"))
+
+# Maximum services across all keys (idle ones are evicted to make room)
+SERVICE_POOL_MAX_TOTAL = int(os.getenv("SERVICE_POOL_MAX_TOTAL", "64"))
+
+# Close services left idle for this many seconds
+SERVICE_POOL_IDLE_TIMEOUT = int(os.getenv("SERVICE_POOL_IDLE_TIMEOUT", "300"))
+
+# Seconds a tool call waits for a service when the pool is exhausted
+SERVICE_POOL_CHECKOUT_TIMEOUT = int(os.getenv("SERVICE_POOL_CHECKOUT_TIMEOUT", "30"))
+
 
 # ============================================================================
 # Validation
@@ -96,8 +344,11 @@ GOOGLE_SCOPES = get_google_scopes()
 
 def validate_config() -> None:
     """Validate configuration based on selected auth mode"""
+    if MCP_MULTI_TENANT and AUTH_MODE != "oma_backend":
+        raise ValueError("MCP_MULTI_TENANT=true requires AUTH_MODE=oma_backend.")
+
     if AUTH_MODE == "oma_backend":
-        if not OMA_ACCESS_TOKEN:
+        if not OMA_ACCESS_TOKEN and not MCP_MULTI_TENANT:
             raise ValueError(
                 "OMA_ACCESS_TOKEN environment variable is required when AUTH_MODE=oma_backend. "
                 "Please login to OMA backend and set your access token."
@@ -159,3 +410,8 @@ def is_oma_backend_mode() -> bool:
 def is_local_file_mode() -> bool:
     """Check if using local file authentication"""
     return AUTH_MODE == "local_file"
+
+
+def is_multi_tenant_mode() -> bool:
+    """Check if one process serves many tenants"""
+    return MCP_MULTI_TENANT
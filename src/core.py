@@ -2,6 +2,8 @@ import logging
 from logging.handlers import RotatingFileHandler
 import sys
 import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 from pythonjsonlogger.json import JsonFormatter  
 
 from mcp.server.fastmcp import FastMCP
@@ -19,9 +21,40 @@ from src import config
 #         scopes=["read", "write", "execute"]
 #     )
 
+# Number of MCP sessions currently inside app_lifespan
+_active_sessions = 0
+
+
+@asynccontextmanager
+async def app_lifespan(server: FastMCP) -> AsyncIterator[None]:
+    """
+    FastMCP lifespan owning process-wide resources
+
+    FastMCP enters the lifespan once per session (SSE / streamable HTTP), so
+    shared resources are released only when the last active session ends.
+    They are recreated lazily on next use. The background token refresher
+    (if enabled) is started on first entry and keeps running.
+    """
+    global _active_sessions
+    from src.auth.refresher import start_token_refresher
+    start_token_refresher()
+
+    _active_sessions += 1
+    try:
+        yield
+    finally:
+        _active_sessions -= 1
+        if _active_sessions == 0:
+            from src.auth.google_transport import close_google_http_pool
+            from src.auth.oma_client import aclose_oma_client
+            await aclose_oma_client()
+            close_google_http_pool()
+
+
 # Initialize FastMCP with HTTP transport and authentication
 mcp = FastMCP(
-    name="MCPGoogle"
+    name="MCPGoogle",
+    lifespan=app_lifespan,
 )
 
 def setup_logging():
@@ -15,6 +15,13 @@ import logging
 from src.core import mcp  # Shared FastMCP instance
 from src.core import setup_logging
 from src import config
+from src.auth.google_transport import close_google_http_pool
+from src.auth.oma_client import close_oma_client, get_oma_flight_stats
+from src.auth.refresher import start_token_refresher, stop_token_refresher
+from src.auth.tenant import get_tenant_registry
+from src.tools.discovery import get_discovery_registry
+from src.tools.fetch import shutdown_fetch_executor
+from src.tools.service_pool import close_service_pool, get_service_pool
 from starlette.responses import JSONResponse
 from starlette.middleware.cors import CORSMiddleware
 
@@ -30,6 +37,9 @@ from src.tools.gmail_tool import (
 
 from src.tools.calendar_tool import calendar_upcoming
 
+# Parse bundled discovery documents once at startup (no network access)
+get_discovery_registry().preload()
+
 
 @mcp.custom_route("/health", methods=["GET"])
 async def health_check(request):
@@ -38,7 +48,11 @@ async def health_check(request):
         "status": "healthy",
         "service": "mcp-google-hub",
         # "auth_enabled": config.MCP_AUTH_TOKEN is not None,
-        "transport": config.MCP_TRANSPORT
+        "transport": config.MCP_TRANSPORT,
+        "oma_singleflight": get_oma_flight_stats(),
+        "multi_tenant": config.is_multi_tenant_mode(),
+        "tenants": len(get_tenant_registry()),
+        "service_pool": get_service_pool().stats(),
     })
 
 
@@ -72,8 +86,16 @@ if __name__ == "__main__":
     print(f"CORS Origins: {config.MCP_CORS_ORIGINS}")
     
     setup_logging()
+    start_token_refresher()
 
-    mcp.run(
-        transport=config.MCP_TRANSPORT,
-        port=config.MCP_PORT
-    )
\ No newline at end of file
+    try:
+        mcp.run(
+            transport=config.MCP_TRANSPORT,
+            port=config.MCP_PORT
+        )
+    finally:
+        stop_token_refresher()
+        shutdown_fetch_executor()
+        close_service_pool()
+        close_google_http_pool()
+        close_oma_client()
\ No newline at end of file
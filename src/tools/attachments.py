@@ -0,0 +1,145 @@
+"""
+Gmail Attachment Store
+
+Attachments downloaded through gmail_download_attachments are decoded
+straight to disk and kept in a content-addressed store:
+
+- base64url bodies are decoded DECODE_CHUNK characters at a time into a
+  temporary file while their SHA-256 is computed, so no decoded copy of an
+  attachment is ever held in memory
+- files are stored once per content hash
+  (GMAIL_ATTACHMENTS_PATH/<sha256[:2]>/<sha256>): the same file forwarded,
+  re-sent or attached to several messages takes the space of one
+- a finished file is moved into place atomically, so concurrent downloads of
+  the same content never leave a partial file behind
+
+Gmail returns an attachment body as one base64url string in a JSON response,
+so its encoded text is in memory while it is written; nothing else depends
+on the attachment size.
+"""
+
+from __future__ import annotations
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+from src import config
+
+# base64url characters decoded per write (multiple of 4)
+DECODE_CHUNK = 64 * 1024
+
+
+class AttachmentStore:
+    """Content-addressed directory of attachment files"""
+
+    def __init__(self, root: Union[str, Path] = config.GMAIL_ATTACHMENTS_PATH):
+        """
+        Args:
+            root: Directory holding the stored files
+        """
+        self.root = Path(root)
+        self._tmp = self.root / "tmp"
+        self._tmp.mkdir(parents=True, exist_ok=True)
+
+    def path_of(self, digest: str) -> Path:
+        """Location of the file with SHA-256 digest (hex)"""
+        return self.root / digest[:2] / digest
+
+    def put(self, data: str) -> tuple[str, int]:
+        """
+        Decode base64url data into the store
+
+        Args:
+            data: base64url text (padding optional)
+
+        Returns:
+            (SHA-256 hex digest, decoded size in bytes)
+
+        Raises:
+            binascii.Error: If data is not valid base64url
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                for start in range(0, len(data), DECODE_CHUNK):
+                    piece = data[start:start + DECODE_CHUNK]
+                    if start + DECODE_CHUNK >= len(data):
+                        piece += "=" * (-len(piece) % 4)
+                    chunk = base64.urlsafe_b64decode(piece)
+                    digest.update(chunk)
+                    tmp.write(chunk)
+                    size += len(chunk)
+            path = self.path_of(digest.hexdigest())
+            if path.exists():
+                os.unlink(tmp_name)
+            else:
+                path.parent.mkdir(exist_ok=True)
+                os.replace(tmp_name, path)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+        return digest.hexdigest(), size
+
+    def export(self, digest: str, directory: Union[str, Path], filename: str) -> Path:
+        """
+        Make a stored file available as directory/filename
+
+        The file is copied, so changes to the export never reach the shared
+        stored file. Only the last component of filename is used, so a sender-chosen name
+        cannot point outside directory. An existing file of another content
+        is kept and the name gets a numeric suffix.
+
+        Returns:
+            Path of the exported file
+        """
+        directory = Path(directory).expanduser()
+        directory.mkdir(parents=True, exist_ok=True)
+        source = self.path_of(digest)
+        name = Path(Path(filename.replace("\\", "/")).name)
+        if str(name) in ("", ".", ".."):
+            name = Path(f"attachment-{digest[:12]}")
+        target = directory / name
+        counter = 1
+        while target.exists():
+            if _sha256(target) == digest:
+                return target
+            target = directory / f"{name.stem} ({counter}){name.suffix}"
+            counter += 1
+        shutil.copyfile(source, target)
+        return target
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# Global instance (lazy initialization)
+_store: Optional[AttachmentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_attachment_store() -> AttachmentStore:
+    """
+    Get or create global attachment store
+
+    Returns:
+        Attachment store at GMAIL_ATTACHMENTS_PATH
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AttachmentStore()
+    return _store
@@ -0,0 +1,129 @@
+"""
+Batch execution of Google API requests
+
+Fan-out over many ids (e.g. one messages.get per listed message) is sent
+through the API's batch endpoint: up to GMAIL_BATCH_SIZE sub-requests share
+one HTTP round trip. Results come back in request order, each with either its
+response or the error of that sub-request, so one failing item does not fail
+the whole call.
+
+Sub-requests rejected with a retryable status (rate limit, 5xx) are resent
+in a follow-up batch. Background fan-out can be paced to a per-second quota
+with a QuotaThrottle, so it leaves room for interactive calls.
+"""
+
+from __future__ import annotations
+import random
+import threading
+import time
+from typing import Any, Optional, Sequence
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+
+from src import config
+
+# Maximum sub-requests Google accepts in one batch
+MAX_BATCH_SIZE = 100
+
+# Statuses worth resending (rate limits, transient server errors)
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+BatchResult = tuple[Optional[Any], Optional[Exception]]
+
+
+class QuotaThrottle:
+    """Token bucket pacing requests to a quota of units per second (e.g. Gmail's per-user quota)"""
+
+    def __init__(self, units_per_second: float, burst: Optional[float] = None):
+        """
+        Args:
+            units_per_second: Units replenished per second
+            burst: Units that may be spent at once after an idle period (default: one second's worth)
+        """
+        self.rate = max(units_per_second, 1e-9)
+        self.capacity = max(burst or 0.0, units_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, units: float) -> float:
+        """
+        Spend units, waiting until the quota allows them
+
+        Returns:
+            Seconds waited
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve now, so concurrent callers queue up behind this one
+            self._tokens -= units
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+def execute_batch(
+    service: Any,
+    requests: Sequence[HttpRequest],
+    batch_size: int = config.GMAIL_BATCH_SIZE,
+    retries: int = 1,
+    backoff: float = 0.5,
+) -> list[BatchResult]:
+    """
+    Execute requests through the service's batch endpoint
+
+    Args:
+        service: Service the requests were created from
+        requests: Requests to execute
+        batch_size: Sub-requests per HTTP call (capped at MAX_BATCH_SIZE)
+        retries: Follow-up batches for sub-requests failing with a retryable status
+        backoff: Base delay (seconds) before a follow-up batch, doubled each round
+
+    Returns:
+        (response, error) per request, in request order; exactly one of them is None
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    results: list[BatchResult] = [(None, None)] * len(requests)
+    pending = list(range(len(requests)))
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff * 2 ** (attempt - 1) * (1 + random.random()))
+        for start in range(0, len(pending), batch_size):
+            _execute_chunk(service, requests, pending[start:start + batch_size], results)
+        pending = [i for i in pending if _retryable(results[i][1])]
+        if not pending:
+            break
+    return results
+
+
+def _execute_chunk(
+    service: Any,
+    requests: Sequence[HttpRequest],
+    indexes: list[int],
+    results: list[BatchResult],
+) -> None:
+    """Send one batch; a single request is sent directly"""
+    if len(indexes) == 1:
+        index = indexes[0]
+        try:
+            results[index] = (requests[index].execute(), None)
+        except HttpError as e:
+            results[index] = (None, e)
+        return
+
+    def callback(request_id: str, response: Any, exception: Optional[Exception]) -> None:
+        results[int(request_id)] = (None, exception) if exception is not None else (response, None)
+
+    batch = service.new_batch_http_request(callback=callback)
+    for index in indexes:
+        batch.add(requests[index], request_id=str(index))
+    batch.execute()
+
+
+def _retryable(error: Optional[Exception]) -> bool:
+    return isinstance(error, HttpError) and error.resp.status in RETRYABLE_STATUS
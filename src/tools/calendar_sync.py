@@ -0,0 +1,467 @@
+"""
+Incremental Calendar Sync
+
+Keeps a local copy of each tenant's calendar events in SQLite and brings it
+up to date with events.list(syncToken=...), so upcoming, range and lookup
+queries are answered locally after one small delta request instead of a
+full listing on every poll.
+
+- first use (or an expired syncToken, answered with 410 Gone) runs a full
+  sync: events ending after CALENDAR_SYNC_PAST_DAYS ago are listed
+  (recurring events expanded into instances) and the nextSyncToken stored;
+  ranges starting before that window are asked of Google
+- later calls fetch only events changed since the stored token; cancelled
+  events are removed
+- Google is asked at most once per CALENDAR_SYNC_MIN_INTERVAL seconds per
+  calendar; the calendar tools expire that interval after their own changes
+- all-day events and times without an offset are placed in the calendar's
+  time zone, as returned by the listing
+- events are indexed by start time; a range query reads only events starting
+  after the range start minus the calendar's longest event
+- each event's ETag is kept so updates can be made conditional (If-Match)
+  without reading the event first
+
+Enabled with CALENDAR_SYNC_ENABLED (default true).
+"""
+
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone, tzinfo
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from googleapiclient.errors import HttpError
+
+from src import config
+
+# Partial-response mask: only what the tools return (status for deletions, etag for updates)
+EVENT_FIELDS = "id,status,etag,summary,start,end,location"
+_LIST_FIELDS = f"items({EVENT_FIELDS}),nextPageToken,nextSyncToken,timeZone"
+
+# Keys of a stored event
+EVENT_KEYS = ("id", "summary", "start", "end", "location")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS calendars (
+    tenant TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    sync_token TEXT NOT NULL,
+    synced_at REAL NOT NULL,
+    max_span REAL NOT NULL,
+    time_zone TEXT,
+    synced_from REAL,
+    PRIMARY KEY (tenant, calendar_id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    tenant TEXT NOT NULL,
+    calendar_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    start_ts REAL NOT NULL,
+    end_ts REAL NOT NULL,
+    etag TEXT,
+    event TEXT NOT NULL,
+    PRIMARY KEY (tenant, calendar_id, id)
+);
+CREATE INDEX IF NOT EXISTS events_start ON events (tenant, calendar_id, start_ts);
+"""
+
+
+def timestamp_of(when: dict[str, Any], zone: Optional[tzinfo] = None) -> Optional[float]:
+    """
+    POSIX timestamp of an event start or end
+
+    A dateTime without an offset is in its timeZone; all-day dates start at
+    midnight in zone (the calendar's time zone). Both fall back to UTC.
+    """
+    value = when.get("dateTime") or when.get("date")
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        local = zone_of(when.get("timeZone")) if when.get("dateTime") else None
+        moment = moment.replace(tzinfo=local or zone or timezone.utc)
+    return moment.timestamp()
+
+
+def zone_of(tzid: Optional[str]) -> Optional[tzinfo]:
+    """IANA time zone by name, or None if unknown"""
+    if not tzid:
+        return None
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+@dataclass
+class CalendarInfo:
+    """Sync bookkeeping of one calendar"""
+    sync_token: str  # Empty when Google returned none: the next sync is a full one
+    synced_at: float
+    time_zone: Optional[str] = None
+    synced_from: Optional[float] = None  # Events ending before this were not listed (None: all were)
+
+
+class CalendarStore:
+    """Thread-safe SQLite store of calendar events per tenant and calendar"""
+
+    def __init__(self, path: Union[str, Path] = config.CALENDAR_SYNC_PATH):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a process-local store)
+        """
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def info(self, tenant: str, calendar_id: str) -> Optional[CalendarInfo]:
+        """Sync bookkeeping of a calendar, or None if never synced"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT sync_token, synced_at, time_zone, synced_from FROM calendars "
+                "WHERE tenant = ? AND calendar_id = ?",
+                (tenant, calendar_id),
+            ).fetchone()
+        return CalendarInfo(*row) if row else None
+
+    def expire(self, tenant: str, calendar_id: str) -> None:
+        """Make the next sync of a calendar ask Google regardless of the interval"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE calendars SET synced_at = 0 WHERE tenant = ? AND calendar_id = ?", (tenant, calendar_id)
+            )
+
+    def replace(
+        self,
+        tenant: str,
+        calendar_id: str,
+        events: Iterable[dict[str, Any]],
+        sync_token: str,
+        time_zone: Optional[str] = None,
+        synced_from: Optional[float] = None,
+    ) -> None:
+        """
+        Replace all events of a calendar (full sync)
+
+        Args:
+            time_zone: Calendar's time zone (all-day events are placed in it)
+            synced_from: Start of the listed window (events ending before it were not listed)
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("DELETE FROM events WHERE tenant = ? AND calendar_id = ?", (tenant, calendar_id))
+                self._db.execute("DELETE FROM calendars WHERE tenant = ? AND calendar_id = ?", (tenant, calendar_id))
+                max_span = self._upsert_locked(tenant, calendar_id, events, zone_of(time_zone))
+                self._set_info_locked(tenant, calendar_id, sync_token, max_span, time_zone, synced_from)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def apply(
+        self,
+        tenant: str,
+        calendar_id: str,
+        upserts: Iterable[dict[str, Any]],
+        deletes: Iterable[str],
+        sync_token: str,
+        time_zone: Optional[str] = None,
+    ) -> None:
+        """Apply changed and cancelled events and store the new syncToken (and time zone, if given)"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(
+                    "DELETE FROM events WHERE tenant = ? AND calendar_id = ? AND id = ?",
+                    [(tenant, calendar_id, event_id) for event_id in deletes],
+                )
+                zone = zone_of(time_zone) or self._zone_locked(tenant, calendar_id)
+                max_span = self._upsert_locked(tenant, calendar_id, upserts, zone)
+                # Never shrinks on deletion: a larger span only widens range scans
+                max_span = max(max_span, self._max_span_locked(tenant, calendar_id))
+                self._set_info_locked(tenant, calendar_id, sync_token, max_span, time_zone)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def put(self, tenant: str, calendar_id: str, event: dict[str, Any]) -> None:
+        """Store an event changed by this server (tracked calendars only; the syncToken is kept)"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if self._max_span_locked(tenant, calendar_id, default=None) is not None:
+                    max_span = self._upsert_locked(tenant, calendar_id, [event], self._zone_locked(tenant, calendar_id))
+                    self._db.execute(
+                        "UPDATE calendars SET max_span = MAX(max_span, ?) WHERE tenant = ? AND calendar_id = ?",
+                        (max_span, tenant, calendar_id),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def etag(self, tenant: str, calendar_id: str, event_id: str) -> Optional[str]:
+        """ETag of a stored event as last synced"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT etag FROM events WHERE tenant = ? AND calendar_id = ? AND id = ?",
+                (tenant, calendar_id, event_id),
+            ).fetchone()
+        return row[0] if row else None
+
+    def between(
+        self,
+        tenant: str,
+        calendar_id: str,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> list[dict[str, Any]]:
+        """
+        Events overlapping [start, end), ordered by start time
+
+        Args:
+            start: Earliest end of a returned event (None: no lower bound)
+            end: Latest start of a returned event, exclusive (None: no upper bound)
+            limit: Maximum number of events
+        """
+        sql = "SELECT event FROM events WHERE tenant = ? AND calendar_id = ?"
+        params: list[Any] = [tenant, calendar_id]
+        with self._lock:
+            if start is not None:
+                # Events overlapping start began at most max_span before it
+                sql += " AND start_ts >= ? AND end_ts > ?"
+                params += [start - self._max_span_locked(tenant, calendar_id), start]
+            if end is not None:
+                sql += " AND start_ts < ?"
+                params.append(end)
+            sql += " ORDER BY start_ts, id"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(limit)
+            rows = self._db.execute(sql, params).fetchall()
+        return [json.loads(event) for (event,) in rows]
+
+    def get(self, tenant: str, calendar_id: str, event_id: str) -> Optional[dict[str, Any]]:
+        """Stored event by id"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT event FROM events WHERE tenant = ? AND calendar_id = ? AND id = ?",
+                (tenant, calendar_id, event_id),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def forget(self, tenant: str, calendar_id: Optional[str] = None) -> None:
+        """Drop stored events of a calendar, or of all calendars of a tenant"""
+        where, params = ("tenant = ?", (tenant,)) if calendar_id is None else (
+            "tenant = ? AND calendar_id = ?", (tenant, calendar_id)
+        )
+        with self._lock:
+            self._db.execute(f"DELETE FROM events WHERE {where}", params)
+            self._db.execute(f"DELETE FROM calendars WHERE {where}", params)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def _upsert_locked(
+        self, tenant: str, calendar_id: str, events: Iterable[dict[str, Any]], zone: Optional[tzinfo]
+    ) -> float:
+        """Store events (all-day ones placed in zone), return the longest duration among them"""
+        max_span = 0.0
+        for event in events:
+            start = timestamp_of(event.get("start") or {}, zone)
+            end = timestamp_of(event.get("end") or {}, zone)
+            if start is None:
+                continue
+            end = max(end if end is not None else start, start)
+            max_span = max(max_span, end - start)
+            self._db.execute(
+                "INSERT OR REPLACE INTO events (tenant, calendar_id, id, start_ts, end_ts, etag, event) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    tenant, calendar_id, event["id"], start, end, event.get("etag"),
+                    json.dumps({k: event.get(k) for k in EVENT_KEYS}),
+                ),
+            )
+        return max_span
+
+    def _max_span_locked(self, tenant: str, calendar_id: str, default: Optional[float] = 0.0) -> Optional[float]:
+        """Longest event duration of a calendar (default if it was never synced)"""
+        row = self._db.execute(
+            "SELECT max_span FROM calendars WHERE tenant = ? AND calendar_id = ?", (tenant, calendar_id)
+        ).fetchone()
+        return row[0] if row else default
+
+    def _zone_locked(self, tenant: str, calendar_id: str) -> Optional[tzinfo]:
+        """Stored time zone of a calendar"""
+        row = self._db.execute(
+            "SELECT time_zone FROM calendars WHERE tenant = ? AND calendar_id = ?", (tenant, calendar_id)
+        ).fetchone()
+        return zone_of(row[0]) if row else None
+
+    def _set_info_locked(
+        self,
+        tenant: str,
+        calendar_id: str,
+        sync_token: str,
+        max_span: float,
+        time_zone: Optional[str],
+        synced_from: Optional[float] = None,
+    ) -> None:
+        # synced_from is set by the full sync creating the row and kept by later deltas
+        self._db.execute(
+            "INSERT INTO calendars (tenant, calendar_id, sync_token, synced_at, max_span, time_zone, synced_from) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (tenant, calendar_id) DO UPDATE SET sync_token = excluded.sync_token, "
+            "synced_at = excluded.synced_at, max_span = excluded.max_span, "
+            "time_zone = COALESCE(excluded.time_zone, calendars.time_zone)",
+            (tenant, calendar_id, sync_token, time.time(), max_span, time_zone, synced_from),
+        )
+
+
+class CalendarSync:
+    """Keeps CalendarStore current from Google Calendar (full sync, then syncToken deltas)"""
+
+    def __init__(
+        self,
+        store: CalendarStore,
+        min_interval: float = config.CALENDAR_SYNC_MIN_INTERVAL,
+        past_days: float = config.CALENDAR_SYNC_PAST_DAYS,
+    ):
+        """
+        Args:
+            store: Local event store
+            min_interval: Minimum seconds between delta requests for a calendar
+            past_days: Days before now a full sync lists events from
+        """
+        self.store = store
+        self.min_interval = min_interval
+        self.past_days = past_days
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _calendar_lock(self, tenant: str, calendar_id: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault((tenant, calendar_id), threading.Lock())
+
+    def sync(self, tenant: str, calendar_id: str, service: Any) -> str:
+        """
+        Bring a calendar's local events up to date
+
+        Args:
+            tenant: Tenant owning the calendar
+            calendar_id: Calendar to sync (e.g. "primary")
+            service: Calendar service of the tenant
+
+        Returns:
+            "full", "incremental" or "fresh" (checked within min_interval, nothing done)
+        """
+        with self._calendar_lock(tenant, calendar_id):
+            info = self.store.info(tenant, calendar_id)
+            if info is None or not info.sync_token:
+                self.full_sync(tenant, calendar_id, service)
+                return "full"
+            if time.time() - info.synced_at < self.min_interval:
+                return "fresh"
+            try:
+                items, sync_token, time_zone = self._list(service, calendar_id, sync_token=info.sync_token)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                print(f"[CalendarSync] syncToken of {calendar_id} expired, running full sync")
+                self.full_sync(tenant, calendar_id, service)
+                return "full"
+            deleted = [item["id"] for item in items if item.get("status") == "cancelled"]
+            changed = [item for item in items if item.get("status") != "cancelled"]
+            self.store.apply(tenant, calendar_id, changed, deleted, sync_token, time_zone)
+            return "incremental"
+
+    def full_sync(self, tenant: str, calendar_id: str, service: Any) -> None:
+        """Rebuild a calendar's events from a listing of the last past_days onwards"""
+        synced_from = time.time() - self.past_days * 86400
+        items, sync_token, time_zone = self._list(
+            service, calendar_id, time_min=datetime.fromtimestamp(synced_from, timezone.utc)
+        )
+        events = [item for item in items if item.get("status") != "cancelled"]
+        self.store.replace(tenant, calendar_id, events, sync_token, time_zone, synced_from)
+        print(f"[CalendarSync] Full sync of {len(events)} events in {calendar_id}")
+
+    @staticmethod
+    def _list(
+        service: Any,
+        calendar_id: str,
+        sync_token: Optional[str] = None,
+        time_min: Optional[datetime] = None,
+    ) -> tuple[list[dict[str, Any]], str, Optional[str]]:
+        """
+        All pages of events.list, the nextSyncToken and the calendar's time zone
+
+        Lists changes since sync_token if given, else events ending after time_min.
+        Deltas cover every changed event, whatever window the full listing had.
+        The token is "" if the last page carries none.
+        """
+        events = service.events()
+        items: list[dict[str, Any]] = []
+        page_token = None
+        while True:
+            resp = events.list(
+                calendarId=calendar_id,
+                singleEvents=True,
+                maxResults=2500,
+                syncToken=sync_token,
+                timeMin=time_min.isoformat() if time_min else None,
+                pageToken=page_token,
+                fields=_LIST_FIELDS,
+            ).execute()
+            items += resp.get("items", [])
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                sync_token = resp.get("nextSyncToken") or ""
+                if not sync_token:
+                    print(f"[CalendarSync] No nextSyncToken for {calendar_id}, next sync is a full sync")
+                return items, sync_token, resp.get("timeZone")
+
+    def expire(self, tenant: str, calendar_id: str) -> None:
+        """Record that a calendar changed through this server (the next sync fetches the delta)"""
+        self.store.expire(tenant, calendar_id)
+
+
+# Global instance (lazy initialization)
+_sync: Optional[CalendarSync] = None
+_sync_lock = threading.Lock()
+
+
+def get_calendar_sync() -> Optional[CalendarSync]:
+    """
+    Get or create global calendar sync engine
+
+    Events of evicted tenants are dropped with the tenant.
+
+    Returns:
+        CalendarSync instance, or None if CALENDAR_SYNC_ENABLED is false
+    """
+    global _sync
+    if not config.CALENDAR_SYNC_ENABLED:
+        return None
+    if _sync is None:
+        with _sync_lock:
+            if _sync is None:
+                from src.auth.tenant import get_tenant_registry
+
+                sync = CalendarSync(CalendarStore())
+                get_tenant_registry().add_evict_listener(lambda state: sync.store.forget(state.tenant_id))
+                _sync = sync
+    return _sync
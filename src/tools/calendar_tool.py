@@ -1,14 +1,149 @@
 from __future__ import annotations
-from datetime import datetime, timezone
+import heapq
+import os
+import time
+from datetime import datetime, time as day_time, timezone
+from itertools import islice
+from operator import itemgetter
 from pathlib import Path
-from typing import Any, Dict, List, Sequence
-from googleapiclient.discovery import build
+from typing import Any, Dict, Iterable, Iterator, List, Sequence
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from googleapiclient.errors import HttpError
+from src import config
 from src.core import mcp
-from ..auth.google_auth import get_google_creds
+from .calendar_sync import EVENT_FIELDS, EVENT_KEYS, get_calendar_sync, timestamp_of, zone_of
+from .fetch import fetch_concurrently
+from .freebusy import free_slots, merge_intervals, query_busy, working_windows
+from .ics import ICS_EVENT_FIELDS, IcsWriter
+from .services import checkout_service, current_tenant
 
-def _build_calendar_service():
-    creds = get_google_creds()
-    return build("calendar", "v3", credentials=creds)
+# Partial-response masks: only the fields the tools return are sent back
+_EVENT_LIST_FIELDS = "items(id,summary,start,end,location),nextPageToken"
+# Agenda pages also carry the calendar's time zone, in which all-day events start
+_EVENT_AGENDA_FIELDS = f"{_EVENT_LIST_FIELDS},timeZone"
+_EVENT_ICS_LIST_FIELDS = f"items({ICS_EVENT_FIELDS}),nextPageToken"
+_EVENT_LINK_FIELDS = "id,htmlLink"
+_EVENT_FIELDS = "id,summary,start,end,location"
+_CALENDAR_LIST_FIELDS = "items(id,selected),nextPageToken"
+# Updated event: what the local store keeps, plus the link returned to the caller
+_EVENT_UPDATE_FIELDS = f"{EVENT_FIELDS},htmlLink"
+
+# Conditional updates retried after the event changed concurrently (412) in fields the update does not set
+UPDATE_CONFLICT_RETRIES = 3
+
+def _calendar_service():
+    return checkout_service("calendar", "v3")
+
+def _synced_calendar(calendar_id: str = "primary"):
+    """Calendar sync engine with calendar_id brought up to date, or None if sync is disabled or failed"""
+    sync = get_calendar_sync()
+    if sync:
+        with _calendar_service() as service:
+            try:
+                sync.sync(current_tenant(), calendar_id, service)
+            except Exception as e:
+                print(f"[calendar] Calendar sync failed, asking Google: {e}")
+                return None
+    return sync
+
+def _expire_synced(calendar_id: str = "primary") -> None:
+    """Make the next calendar query fetch the change just made"""
+    sync = get_calendar_sync()
+    if sync:
+        sync.expire(current_tenant(), calendar_id)
+
+def _list_events(time_min: datetime, time_max: datetime | None, max_events: int) -> List[Dict[str, Any]]:
+    """Events from events.list ordered by start (pages until max_events)"""
+    events: List[Dict[str, Any]] = []
+    page_token = None
+    with _calendar_service() as service:
+        while len(events) < max_events:
+            resp = _list_events_page(service, "primary", time_min, time_max, max_events - len(events), page_token)
+            events += [{key: e.get(key) for key in EVENT_KEYS} for e in resp.get("items", [])]
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+    return events
+
+def _list_events_page(
+    service,
+    calendar_id: str,
+    time_min: datetime,
+    time_max: datetime | None,
+    max_events: int,
+    page_token: str | None,
+    fields: str = _EVENT_LIST_FIELDS,
+) -> Dict[str, Any]:
+    return service.events().list(
+        calendarId=calendar_id,
+        timeMin=time_min.isoformat(),
+        timeMax=time_max.isoformat() if time_max else None,
+        maxResults=min(2500, max_events),
+        singleEvents=True,
+        orderBy="startTime",
+        pageToken=page_token,
+        fields=fields,
+    ).execute()
+
+def _selected_calendars() -> List[str]:
+    """Ids of the calendars shown in the user's calendar list"""
+    calendar_ids: List[str] = []
+    page_token = None
+    with _calendar_service() as service:
+        while True:
+            resp = service.calendarList().list(
+                minAccessRole="reader", pageToken=page_token, fields=_CALENDAR_LIST_FIELDS
+            ).execute()
+            calendar_ids += [c["id"] for c in resp.get("items", []) if c.get("selected")]
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                return calendar_ids
+
+def _calendar_stream(
+    calendar_id: str, first_page: Dict[str, Any], time_min: datetime, time_max: datetime | None, max_events: int
+) -> Iterator[tuple[float, Dict[str, Any]]]:
+    """(start timestamp, event) of one calendar in start order; further pages are fetched only when consumed"""
+    # All-day events start at midnight in the calendar's time zone
+    zone = zone_of(first_page.get("timeZone"))
+    page = first_page
+    while True:
+        for e in page.get("items", []):
+            start = timestamp_of(e.get("start") or {}, zone) or 0.0
+            yield start, {**{key: e.get(key) for key in EVENT_KEYS}, "calendar": calendar_id}
+        if not page.get("nextPageToken"):
+            return
+        with _calendar_service() as service:
+            page = _list_events_page(
+                service, calendar_id, time_min, time_max, max_events, page["nextPageToken"], _EVENT_AGENDA_FIELDS
+            )
+
+def _moment(value: str) -> datetime:
+    """Time given to a tool ("2026-01-05" or ISO 8601; UTC without an offset)"""
+    return datetime.fromtimestamp(timestamp_of(_normalize_datetime(value)), timezone.utc)
+
+def _local_moment(value: str, zone: ZoneInfo) -> datetime:
+    """Time given to a tool ("2026-01-05" or ISO 8601), in zone without an offset"""
+    moment = datetime.fromisoformat(value)
+    return moment if moment.tzinfo else moment.replace(tzinfo=zone)
+
+def _write_ics(
+    destination_path: str, events: Iterable[Dict[str, Any]], period: tuple[datetime, datetime] | None = None
+) -> tuple[Path, int]:
+    """Stream events into an .ics file; it appears only once complete"""
+    dest = Path(destination_path).expanduser()
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    partial = dest.with_name(dest.name + ".part")
+    try:
+        with partial.open("w", encoding="utf-8", newline="") as stream:
+            writer = IcsWriter(stream, period)
+            for event in events:
+                writer.write_event(event)
+            writer.close()
+        os.replace(partial, dest)
+    except BaseException:
+        partial.unlink(missing_ok=True)
+        raise
+    return dest, writer.count
 
 def _normalize_datetime(dt: str | datetime, default_tz: str = "UTC") -> Dict[str, Any]:
     if isinstance(dt, datetime):
@@ -21,28 +156,121 @@ def _normalize_datetime(dt: str | datetime, default_tz: str = "UTC") -> Dict[str
 
 @mcp.tool(name="calendar_upcoming", description="List upcoming events from the primary calendar.")
 def calendar_upcoming(max_events: int = 10) -> List[Dict[str, Any]]:
-    service = _build_calendar_service()
-    now = datetime.now(timezone.utc).isoformat()
-    events_result = service.events().list(
-        calendarId="primary",
-        timeMin=now,
-        maxResults=max_events,
-        singleEvents=True,
-        orderBy="startTime",
-    ).execute()
-    items = events_result.get("items", [])
-    out = []
-    for e in items:
-        out.append(
+    sync = _synced_calendar()
+    if sync:
+        return sync.store.between(current_tenant(), "primary", start=time.time(), limit=max_events)
+    return _list_events(datetime.now(timezone.utc), None, max_events)
+
+@mcp.tool(
+    name="calendar_list_events",
+    description="List events of the primary calendar overlapping a time range (dates or ISO 8601 times, UTC without an offset).",
+)
+def calendar_list_events(time_min: str, time_max: str, max_events: int = 250) -> List[Dict[str, Any]]:
+    start, end = _moment(time_min), _moment(time_max)
+    sync = _synced_calendar()
+    if sync:
+        info = sync.store.info(current_tenant(), "primary")
+        # Ranges reaching before the synced window are asked of Google
+        if info.synced_from is None or start.timestamp() >= info.synced_from:
+            return sync.store.between(current_tenant(), "primary", start.timestamp(), end.timestamp(), max_events)
+    return _list_events(start, end, max_events)
+
+@mcp.tool(name="calendar_get_event", description="Get an event of the primary calendar by id.")
+def calendar_get_event(event_id: str) -> Dict[str, Any]:
+    sync = _synced_calendar()
+    if sync:
+        event = sync.store.get(current_tenant(), "primary", event_id)
+        if event is not None:
+            return event
+    # Not synced (e.g. a cancelled event or sync disabled): ask Google
+    with _calendar_service() as service:
+        event = service.events().get(calendarId="primary", eventId=event_id, fields=_EVENT_FIELDS).execute()
+    return {key: event.get(key) for key in EVENT_KEYS}
+
+@mcp.tool(
+    name="calendar_find_free_slots",
+    description=(
+        "Find free meeting slots shared by the primary calendar and attendees (emails or calendar ids) "
+        "within working hours, from one free/busy query. Times without an offset are in time_zone."
+    ),
+)
+def calendar_find_free_slots(
+    time_min: str,
+    time_max: str,
+    duration_minutes: int = 30,
+    attendees: Sequence[str] | None = None,
+    time_zone: str = "UTC",
+    working_hours: str = "09:00-17:00",
+    include_weekends: bool = False,
+    max_slots: int = 5,
+) -> Dict[str, Any]:
+    try:
+        zone = ZoneInfo(time_zone)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown time zone: {time_zone}")
+    try:
+        day_start, day_end = (day_time.fromisoformat(part.strip()) for part in working_hours.split("-"))
+    except ValueError:
+        raise ValueError(f"working_hours must look like '09:00-17:00', got {working_hours!r}")
+    if day_end <= day_start:
+        raise ValueError("working_hours must end after they start")
+    if duration_minutes <= 0:
+        raise ValueError("duration_minutes must be positive")
+    start, end = _local_moment(time_min, zone), _local_moment(time_max, zone)
+    if end <= start:
+        raise ValueError("time_max must be after time_min")
+
+    calendar_ids = list(dict.fromkeys(["primary", *(attendees or [])]))
+    with _calendar_service() as service:
+        busy, errors = query_busy(service, calendar_ids, start, end)
+    windows = working_windows(start, end, zone, day_start, day_end, weekends=include_weekends)
+    slots = islice(free_slots(merge_intervals(busy), windows, duration_minutes * 60), max_slots)
+    return {
+        "time_zone": time_zone,
+        "slots": [
             {
-                "id": e.get("id"),
-                "summary": e.get("summary"),
-                "start": e.get("start"),
-                "end": e.get("end"),
-                "location": e.get("location"),
+                "start": datetime.fromtimestamp(slot_start, zone).isoformat(),
+                "end": datetime.fromtimestamp(slot_end, zone).isoformat(),
             }
-        )
-    return out
+            for slot_start, slot_end in slots
+        ],
+        # Calendars whose busy times are unknown (not found, not shared): their attendees may not be free
+        "errors": errors,
+    }
+
+@mcp.tool(
+    name="calendar_agenda",
+    description=(
+        "List events of several calendars (default: those selected in the calendar list) merged in time order "
+        "(dates or ISO 8601 times, UTC without an offset; time_min defaults to now)."
+    ),
+)
+def calendar_agenda(
+    time_min: str | None = None,
+    time_max: str | None = None,
+    max_events: int = 50,
+    calendar_ids: Sequence[str] | None = None,
+) -> Dict[str, Any]:
+    start = _moment(time_min) if time_min else datetime.now(timezone.utc)
+    end = _moment(time_max) if time_max else None
+    calendars = list(dict.fromkeys(calendar_ids)) if calendar_ids else _selected_calendars()
+
+    def first_page(calendar_id: str) -> Dict[str, Any]:
+        with _calendar_service() as service:
+            return _list_events_page(service, calendar_id, start, end, max_events, None, _EVENT_AGENDA_FIELDS)
+
+    # First pages concurrently; no calendar can contribute more than max_events, so usually no second page is needed
+    pages = fetch_concurrently(calendars, first_page, concurrency=config.CALENDAR_AGENDA_CONCURRENCY)
+    streams = []
+    errors: Dict[str, str] = {}
+    for calendar_id, (page, error) in zip(calendars, pages):
+        if error is not None:
+            errors[calendar_id] = str(error)
+        else:
+            streams.append(_calendar_stream(calendar_id, page, start, end, max_events))
+    # k-way merge of the per-calendar streams; stops reading (and paging) once max_events are taken
+    events = [event for _, event in islice(heapq.merge(*streams, key=itemgetter(0)), max_events)]
+    return {"events": events, "errors": errors}
 
 @mcp.tool(name="calendar_create_event", description="Create an event in the primary calendar.")
 def calendar_create_event(
@@ -54,24 +282,27 @@ def calendar_create_event(
     attendees: Sequence[str] | None = None,
     reminders_minutes: Sequence[int] | None = None,
 ) -> Dict[str, Any]:
-    service = _build_calendar_service()
-    body: Dict[str, Any] = {
-        "summary": summary,
-        "start": _normalize_datetime(start),
-        "end": _normalize_datetime(end),
-    }
-    if description:
-        body["description"] = description
-    if location:
-        body["location"] = location
-    if attendees:
-        body["attendees"] = [{"email": email} for email in attendees]
-    if reminders_minutes:
-        body["reminders"] = {
-            "useDefault": False,
-            "overrides": [{"method": "popup", "minutes": minutes} for minutes in reminders_minutes],
+    with _calendar_service() as service:
+        body: Dict[str, Any] = {
+            "summary": summary,
+            "start": _normalize_datetime(start),
+            "end": _normalize_datetime(end),
         }
-    created = service.events().insert(calendarId="primary", body=body, sendUpdates="all").execute()
+        if description:
+            body["description"] = description
+        if location:
+            body["location"] = location
+        if attendees:
+            body["attendees"] = [{"email": email} for email in attendees]
+        if reminders_minutes:
+            body["reminders"] = {
+                "useDefault": False,
+                "overrides": [{"method": "popup", "minutes": minutes} for minutes in reminders_minutes],
+            }
+        created = service.events().insert(
+            calendarId="primary", body=body, sendUpdates="all", fields=_EVENT_LINK_FIELDS
+        ).execute()
+    _expire_synced()
     return {"id": created.get("id"), "htmlLink": created.get("htmlLink")}
 
 @mcp.tool(name="calendar_update_event", description="Update fields of an existing event.")
@@ -85,14 +316,15 @@ def calendar_update_event(
     attendees: Sequence[str] | None = None,
     reminders_minutes: Sequence[int] | None = None,
 ) -> Dict[str, Any]:
-    service = _build_calendar_service()
-    event = service.events().get(calendarId="primary", eventId=event_id).execute()
+    # Patch sends only the changed fields, no need to read the event first
+    event: Dict[str, Any] = {}
     if summary is not None:
         event["summary"] = summary
+    # Patch merges nested objects: clear the other of date/dateTime so an event can switch between all-day and timed
     if start is not None:
-        event["start"] = _normalize_datetime(start)
+        event["start"] = {"date": None, "dateTime": None, **_normalize_datetime(start)}
     if end is not None:
-        event["end"] = _normalize_datetime(end)
+        event["end"] = {"date": None, "dateTime": None, **_normalize_datetime(end)}
     if description is not None:
         event["description"] = description
     if location is not None:
@@ -104,44 +336,102 @@ def calendar_update_event(
             "useDefault": False,
             "overrides": [{"method": "popup", "minutes": minutes} for minutes in reminders_minutes],
         }
-    updated = service.events().update(
-        calendarId="primary",
-        eventId=event_id,
-        body=event,
-        sendUpdates="all",
-    ).execute()
+    sync = get_calendar_sync()
+    tenant = current_tenant()
+    # ETag as of the last sync: the update fails (412) if the event changed since
+    etag = sync.store.etag(tenant, "primary", event_id) if sync else None
+    known = sync.store.get(tenant, "primary", event_id) if etag else None
+    with _calendar_service() as service:
+        for attempt in range(UPDATE_CONFLICT_RETRIES + 1):
+            request = service.events().patch(
+                calendarId="primary",
+                eventId=event_id,
+                body=event,
+                sendUpdates="all",
+                fields=_EVENT_UPDATE_FIELDS,
+            )
+            if etag:
+                request.headers["If-Match"] = etag
+            try:
+                updated = request.execute()
+                break
+            except HttpError as e:
+                if e.resp.status != 412 or attempt == UPDATE_CONFLICT_RETRIES:
+                    raise
+            if known is None:
+                # Stored ETag without the event: nothing to compare the current version with
+                raise ValueError(
+                    f"Conflict: event {event_id} was changed concurrently and is not in the local store; "
+                    "read it again before updating."
+                )
+            # Changed concurrently: reapply the patch only if the fields it sets were left alone.
+            # Only fields the store keeps can be compared; any other field counts as changed.
+            current = service.events().get(
+                calendarId="primary", eventId=event_id, fields=",".join(["etag", *event])
+            ).execute()
+            changed = [
+                key for key in event
+                if key not in EVENT_KEYS or key not in known or current.get(key) != known[key]
+            ]
+            if changed:
+                raise ValueError(
+                    f"Conflict: event {event_id} was changed concurrently ({', '.join(changed)}); "
+                    "read it again before updating."
+                )
+            print(f"[calendar_update_event] Event {event_id} changed concurrently, retrying")
+            etag, known = current["etag"], {key: current.get(key) for key in event if key in EVENT_KEYS}
+    if sync:
+        sync.store.put(tenant, "primary", updated)
     return {"id": updated.get("id"), "htmlLink": updated.get("htmlLink")}
 
 @mcp.tool(name="calendar_delete_event", description="Delete an event from the primary calendar.")
 def calendar_delete_event(event_id: str, send_updates: bool = False) -> Dict[str, Any]:
-    service = _build_calendar_service()
-    service.events().delete(
-        calendarId="primary",
-        eventId=event_id,
-        sendUpdates="all" if send_updates else "none",
-    ).execute()
+    with _calendar_service() as service:
+        service.events().delete(
+            calendarId="primary",
+            eventId=event_id,
+            sendUpdates="all" if send_updates else "none",
+        ).execute()
+    _expire_synced()
     return {"status": "deleted", "id": event_id}
 
 @mcp.tool(name="calendar_export_event", description="Export an event as a locally stored .ics file.")
 def calendar_export_event(event_id: str, destination_path: str) -> Dict[str, Any]:
-    service = _build_calendar_service()
-    event = service.events().get(calendarId="primary", eventId=event_id).execute()
-    dest = Path(destination_path).expanduser()
-    dest.parent.mkdir(parents=True, exist_ok=True)
-
-    lines = [
-        "BEGIN:VCALENDAR",
-        "VERSION:2.0",
-        "PRODID:-//MCP Hub Ricardo//Calendar Export//ES",
-        "BEGIN:VEVENT",
-        f"UID:{event.get('id')}",
-        f"SUMMARY:{event.get('summary','')}",
-        f"DTSTART:{event.get('start',{}).get('dateTime', event.get('start',{}).get('date',''))}",
-        f"DTEND:{event.get('end',{}).get('dateTime', event.get('end',{}).get('date',''))}",
-        f"LOCATION:{event.get('location','')}",
-        f"DESCRIPTION:{event.get('description','')}",
-        "END:VEVENT",
-        "END:VCALENDAR",
-    ]
-    dest.write_text("\r\n".join(lines), encoding="utf-8")
+    with _calendar_service() as service:
+        event = service.events().get(calendarId="primary", eventId=event_id, fields=ICS_EVENT_FIELDS).execute()
+    dest, _ = _write_ics(destination_path, [event])
     return {"saved_to": str(dest)}
+
+@mcp.tool(
+    name="calendar_export_range",
+    description=(
+        "Export the events of a calendar in a time range (dates or ISO 8601 times, UTC without an offset) "
+        "as a locally stored .ics file, keeping recurrence rules."
+    ),
+)
+def calendar_export_range(
+    time_min: str, time_max: str, destination_path: str, calendar_id: str = "primary"
+) -> Dict[str, Any]:
+    start, end = _moment(time_min), _moment(time_max)
+
+    def events() -> Iterator[Dict[str, Any]]:
+        # Recurring events as series (RRULE/EXDATE) plus their modified and cancelled instances
+        page_token = None
+        with _calendar_service() as service:
+            while True:
+                resp = service.events().list(
+                    calendarId=calendar_id,
+                    timeMin=start.isoformat(),
+                    timeMax=end.isoformat(),
+                    maxResults=2500,
+                    singleEvents=False,
+                    pageToken=page_token,
+                    fields=_EVENT_ICS_LIST_FIELDS,
+                ).execute()
+                yield from resp.get("items", [])
+                page_token = resp.get("nextPageToken")
+                if not page_token:
+                    return
+
+    dest, count = _write_ics(destination_path, events(), period=(start, end))
+    return {"saved_to": str(dest), "events": count}
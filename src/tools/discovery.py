@@ -0,0 +1,115 @@
+"""
+Offline Google API Discovery Registry
+
+googleapiclient.discovery.build() fetches (or reads from its cache) and
+JSON-parses a discovery document on every call.
+
+The registry instead:
+- loads the bundled discovery documents from specs/ (falling back to the
+  copies shipped with googleapiclient) once, at startup, without network
+- builds services with the public build_from_document() from the parsed
+  document, so no googleapiclient internals are relied on
+
+Usage:
+    service = get_discovery_registry().build("gmail", "v1", http=http)
+"""
+
+from __future__ import annotations
+import json
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+from googleapiclient import discovery_cache
+from googleapiclient.discovery import Resource, build_from_document
+
+from src import config
+
+# APIs used by the tools, loaded at startup
+BUNDLED_APIS: tuple[tuple[str, str], ...] = (("gmail", "v1"), ("calendar", "v3"))
+
+
+class DiscoveryModel:
+    """Parsed discovery document of one API version"""
+
+    def __init__(self, document: dict[str, Any]):
+        self.document = document
+        self.name = document["name"]
+        self.version = document["version"]
+
+    def build(self, http: Any) -> Resource:
+        """Build a service on top of http (an httplib2.Http-compatible object)"""
+        return build_from_document(self.document, http=http)
+
+
+class DiscoveryRegistry:
+    """Thread-safe registry of parsed discovery documents"""
+
+    def __init__(self, spec_dir: Optional[Path] = None):
+        """
+        Args:
+            spec_dir: Directory with bundled documents named <api>.googleapis.com.json
+        """
+        self.spec_dir = Path(spec_dir or config.GOOGLE_DISCOVERY_DIR)
+        self._models: dict[tuple[str, str], DiscoveryModel] = {}
+        self._lock = threading.Lock()
+
+    def _read_document(self, api: str, version: str) -> dict[str, Any]:
+        path = self.spec_dir / f"{api}.googleapis.com.json"
+        if path.exists():
+            document = json.loads(path.read_text(encoding="utf-8"))
+            if document.get("version") == version:
+                return document
+            print(f"[DiscoveryRegistry] {path} is {api} {document.get('version')}, not {version}; using packaged copy")
+        packaged = discovery_cache.get_static_doc(api, version)
+        if packaged is None:
+            raise ValueError(f"No bundled discovery document for {api} {version}")
+        return json.loads(packaged)
+
+    def model(self, api: str, version: str) -> DiscoveryModel:
+        """Parsed model of an API (loaded on first use if not preloaded)"""
+        key = (api, version)
+        model = self._models.get(key)
+        if model is None:
+            with self._lock:
+                model = self._models.get(key)
+                if model is None:
+                    model = DiscoveryModel(self._read_document(api, version))
+                    self._models[key] = model
+        return model
+
+    def preload(self, apis: Iterable[tuple[str, str]] = BUNDLED_APIS) -> None:
+        """Load and parse documents up front (call at startup)"""
+        for api, version in apis:
+            self.model(api, version)
+
+    def build(self, api: str, version: str, http: Any) -> Resource:
+        """
+        Build a Google API service without network access
+
+        Args:
+            api: API name, e.g. "gmail"
+            version: API version, e.g. "v1"
+            http: httplib2.Http-compatible (authorized) transport
+
+        Returns:
+            googleapiclient Resource
+        """
+        return self.model(api, version).build(http)
+
+
+# Global instance (lazy initialization)
+_registry: Optional[DiscoveryRegistry] = None
+
+
+def get_discovery_registry() -> DiscoveryRegistry:
+    """
+    Get or create global discovery registry
+
+    Returns:
+        DiscoveryRegistry instance
+    """
+    global _registry
+    if _registry is None:
+        _registry = DiscoveryRegistry()
+    return _registry
@@ -0,0 +1,105 @@
+"""
+Concurrent bounded fetching for MCP tools
+
+Tools that read many items (e.g. full messages by id) run the per-item
+fetches on a shared worker pool instead of one after another, so wall-clock
+time follows the slowest item rather than the sum of all of them:
+
+- at most `concurrency` items of one call are in flight at a time
+- all calls share one process-wide pool of GMAIL_FETCH_MAX_THREADS threads
+- results come back in input order, each with its value or its exception
+- workers run in a copy of the caller's context, so contextvars such as the
+  current MCP request (used to resolve the tenant) are visible to them
+
+Each fetch checks out its own Google API service from the service pool, so
+workers never share an httplib2.Http.
+"""
+
+from __future__ import annotations
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+from src import config
+
+T = TypeVar("T")
+
+FetchResult = tuple[Optional[Any], Optional[Exception]]
+
+
+def fetch_concurrently(
+    items: Sequence[T],
+    fetch: Callable[[T], Any],
+    concurrency: int = config.GMAIL_FETCH_CONCURRENCY,
+) -> list[FetchResult]:
+    """
+    Run fetch(item) for every item with bounded concurrency
+
+    Args:
+        items: Items to fetch
+        fetch: Function fetching one item (called from worker threads)
+        concurrency: Maximum items of this call fetched at the same time
+
+    Returns:
+        (value, error) per item, in input order; exactly one of them is None
+    """
+    results: list[FetchResult] = [(None, None)] * len(items)
+    workers = max(1, min(concurrency, len(items)))
+
+    if workers <= 1:
+        for index, item in enumerate(items):
+            results[index] = _fetch_one(fetch, item)
+        return results
+
+    next_index = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def worker() -> None:
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            results[index] = _fetch_one(fetch, items[index])
+
+    executor = _get_executor()
+    # One context copy per worker: a Context cannot be entered by two threads at once
+    futures = [executor.submit(contextvars.copy_context().run, worker) for _ in range(workers)]
+    wait(futures)
+    for future in futures:
+        future.result()
+    return results
+
+
+def _fetch_one(fetch: Callable[[T], Any], item: T) -> FetchResult:
+    try:
+        return fetch(item), None
+    except Exception as e:
+        return None, e
+
+
+# Global instance (lazy initialization)
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=config.GMAIL_FETCH_MAX_THREADS,
+                    thread_name_prefix="fetch",
+                )
+    return _executor
+
+
+def shutdown_fetch_executor() -> None:
+    """Stop the shared worker pool (recreated lazily on next use)"""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,159 @@
+"""
+Free/Busy Slot Finder
+
+Finds meeting slots from one freebusy.query covering every calendar asked
+about (the organizer's and the attendees'), instead of listing each
+calendar's events:
+
+- busy intervals of all calendars are merged by one sorted sweep
+  (O(n log n)), so overlapping and adjacent meetings become one interval
+- working hours are applied per day in the requested time zone (so a
+  DST change moves them with the wall clock), optionally skipping weekends
+- free time inside working hours is walked in order against the merged
+  intervals and cut into slots starting on a SLOT_STEP_MINUTES grid; the
+  earliest slots are returned, and the walk stops once enough are found
+- calendars freebusy cannot read (unknown, not shared) are reported rather
+  than silently treated as free
+"""
+
+from __future__ import annotations
+from datetime import date, datetime, time, timedelta, tzinfo
+from typing import Any, Iterable, Iterator, Sequence
+
+from .calendar_sync import timestamp_of
+
+# Calendars per freebusy.query (the API's limit)
+FREEBUSY_MAX_CALENDARS = 50
+
+# Slot starts are aligned to this many minutes
+SLOT_STEP_MINUTES = 15
+
+_FREEBUSY_FIELDS = "calendars(busy,errors(reason))"
+
+Interval = tuple[float, float]  # (start, end) as POSIX timestamps
+
+
+def query_busy(
+    service: Any,
+    calendar_ids: Sequence[str],
+    start: datetime,
+    end: datetime,
+) -> tuple[list[Interval], dict[str, str]]:
+    """
+    Busy intervals of calendars from freebusy.query
+
+    Args:
+        service: Calendar service
+        calendar_ids: Calendar ids or attendee emails
+        start: Start of the range
+        end: End of the range
+
+    Returns:
+        Tuple of (busy intervals of all calendars, unsorted; calendar id -> error reason)
+    """
+    busy: list[Interval] = []
+    errors: dict[str, str] = {}
+    for offset in range(0, len(calendar_ids), FREEBUSY_MAX_CALENDARS):
+        chunk = calendar_ids[offset:offset + FREEBUSY_MAX_CALENDARS]
+        resp = service.freebusy().query(
+            body={
+                "timeMin": start.isoformat(),
+                "timeMax": end.isoformat(),
+                "items": [{"id": calendar_id} for calendar_id in chunk],
+            },
+            fields=_FREEBUSY_FIELDS,
+        ).execute()
+        for calendar_id, calendar in resp.get("calendars", {}).items():
+            if calendar.get("errors"):
+                errors[calendar_id] = calendar["errors"][0].get("reason", "unknown")
+            busy += [
+                (timestamp_of({"dateTime": b["start"]}), timestamp_of({"dateTime": b["end"]}))
+                for b in calendar.get("busy", [])
+            ]
+    return busy, errors
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """Sorted, disjoint union of intervals (overlapping or touching ones are joined)"""
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def working_windows(
+    start: datetime,
+    end: datetime,
+    zone: tzinfo,
+    day_start: time,
+    day_end: time,
+    weekends: bool = False,
+) -> Iterator[Interval]:
+    """
+    Working hours between start and end, in order
+
+    Args:
+        start: Start of the range (timezone-aware)
+        end: End of the range (timezone-aware)
+        zone: Time zone the working hours are in
+        day_start: Start of the working day (local time)
+        day_end: End of the working day (local time)
+        weekends: Whether Saturdays and Sundays are working days
+
+    Yields:
+        (start, end) of each day's working hours, clipped to the range
+    """
+    low, high = start.timestamp(), end.timestamp()
+    day: date = start.astimezone(zone).date()
+    while True:
+        opens = datetime.combine(day, day_start, zone).timestamp()
+        if opens >= high:
+            return
+        if weekends or day.weekday() < 5:
+            closes = datetime.combine(day, day_end, zone).timestamp()
+            if closes > low:
+                yield max(opens, low), min(closes, high)
+        day += timedelta(days=1)
+
+
+def free_slots(
+    busy: Sequence[Interval],
+    windows: Iterable[Interval],
+    duration: float,
+    step: float = SLOT_STEP_MINUTES * 60,
+) -> Iterator[Interval]:
+    """
+    Non-overlapping free slots, earliest first
+
+    Args:
+        busy: Merged busy intervals (see merge_intervals)
+        windows: Times slots may fall in, in order and disjoint
+        duration: Slot length in seconds
+        step: Slot starts are rounded up to a multiple of this many seconds
+
+    Yields:
+        (start, end) of each slot
+    """
+    index = 0
+    for window_start, window_end in windows:
+        # Busy intervals ending before the window can be skipped for good: windows are in order
+        while index < len(busy) and busy[index][1] <= window_start:
+            index += 1
+        cursor = window_start
+        gaps = index
+        while cursor < window_end:
+            gap_end = window_end
+            if gaps < len(busy) and busy[gaps][0] < window_end:
+                gap_end = max(busy[gaps][0], cursor)
+            slot = -(-cursor // step) * step  # First aligned start in the gap
+            while slot + duration <= gap_end:
+                yield slot, slot + duration
+                slot = -(-(slot + duration) // step) * step
+            if gap_end == window_end:
+                break
+            cursor = busy[gaps][1]
+            gaps += 1
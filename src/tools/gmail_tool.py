@@ -1,54 +1,174 @@
 from __future__ import annotations
-import mimetypes
-from base64 import urlsafe_b64decode, urlsafe_b64encode
+import time
 from email.message import EmailMessage
-from pathlib import Path
 from typing import Any, Dict, List, Sequence
-from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from src import config
 from src.core import mcp
-from ..auth.google_auth import get_google_creds
-
-def _build_gmail_service():
-    creds = get_google_creds()
-    return build("gmail", "v1", credentials=creds)
-
-def _summarize_message(service, message_id: str) -> Dict[str, Any]:
-    msg = service.users().messages().get(
-        userId="me",
-        id=message_id,
-        format="metadata",
-        metadataHeaders=["From", "Subject", "Date"],
-    ).execute()
-    headers = {h["name"]: h["value"] for h in msg.get("payload", {}).get("headers", [])}
-    return {
+from .attachments import get_attachment_store
+from .batch import execute_batch
+from .fetch import fetch_concurrently
+from .labels import get_label_registry
+from .mailbox_sync import get_mailbox_sync
+from .message_cache import get_message_cache
+from .mime_text import extract_text_bounded, strip_quotes as _strip_quotes
+from .mime_upload import StreamedMessage, upload_message
+from .search_index import LocalQuery, get_search_index, parse_query
+from .services import checkout_service, current_tenant
+
+_SUMMARY_FIELDS = ("id", "from", "subject", "date")
+
+# Format tiers a caller can request, from cheapest to most complete
+FORMATS = ("minimal", "metadata", "full")
+
+# Keys of the content returned per format
+_FORMAT_KEYS = {
+    "minimal": ("id", "threadId", "labelIds", "snippet"),
+    "metadata": ("id", "from", "to", "subject", "date", "snippet"),
+    "full": ("id", "from", "to", "subject", "date", "snippet", "text"),
+}
+
+# Partial-response masks: only the fields each format is built from are sent back
+_MESSAGE_FIELDS = {
+    "minimal": "id,threadId,labelIds,snippet",
+    "metadata": "id,snippet,payload/headers",
+    "full": "id,snippet,payload(mimeType,filename,headers,body/data,parts)",
+}
+_LIST_FIELDS = "messages/id,nextPageToken"
+_THREAD_FIELDS = {format: f"id,messages({fields})" for format, fields in _MESSAGE_FIELDS.items()}
+
+# messages.batchModify takes at most this many ids per request
+BATCH_MODIFY_MAX = 1000
+
+_METADATA_HEADERS = ["From", "To", "Subject", "Date"]
+
+# Body text returned per message; thread bodies are read further so quotes are stripped before the cut
+_TEXT_BUDGET = 10000
+_QUOTED_TEXT_BUDGET = 4 * _TEXT_BUDGET
+
+# MIME tree of a message without headers (masked three levels deep, deeper parts in full)
+_PART_FIELDS = "partId,mimeType,filename,body(attachmentId,size,data)"
+_ATTACHMENT_TREE_FIELDS = f"payload({_PART_FIELDS},parts({_PART_FIELDS},parts({_PART_FIELDS},parts)))"
+
+def _gmail_service():
+    return checkout_service("gmail", "v1")
+
+def _check_format(format: str) -> None:
+    if format not in FORMATS:
+        raise ValueError(f"format must be one of {FORMATS}, got {format!r}")
+
+def _get_request(service, message_id: str, format: str):
+    params: Dict[str, Any] = {"userId": "me", "id": message_id, "format": format, "fields": _MESSAGE_FIELDS[format]}
+    if format == "metadata":
+        params["metadataHeaders"] = _METADATA_HEADERS
+    return service.users().messages().get(**params)
+
+def _content(
+    message_id: str, msg: Dict[str, Any], format: str, budget: int = _TEXT_BUDGET
+) -> tuple[Dict[str, Any], bool]:
+    """Tool output of a message fetched with format, and whether its body text was cut at the budget"""
+    if format == "minimal":
+        return {
+            "id": message_id,
+            "threadId": msg.get("threadId"),
+            "labelIds": msg.get("labelIds", []),
+            "snippet": msg.get("snippet"),
+        }, False
+    payload = msg.get("payload", {})
+    headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
+    content = {
         "id": message_id,
         "from": headers.get("From"),
+        "to": headers.get("To"),
         "subject": headers.get("Subject"),
         "date": headers.get("Date"),
+        "snippet": msg.get("snippet"),
     }
+    truncated = False
+    if format == "full":
+        content["text"], truncated = extract_text_bounded(payload, budget=budget)
+    return content, truncated
 
-def _extract_text(payload: Dict[str, Any]) -> str:
-    body = payload.get("body", {})
-    data = body.get("data")
-    if data and payload.get("mimeType") == "text/plain":
-        return urlsafe_b64decode(data).decode("utf-8", errors="ignore")
-    for part in payload.get("parts") or []:
-        text = _extract_text(part)
-        if text:
-            return text
-    return ""
+def _remember(
+    tenant: str, message_id: str, format: str, content: Dict[str, Any], msg: Dict[str, Any], truncated: bool = False
+) -> None:
+    """Cache and index fetched content (minimal content is all volatile and is not kept)"""
+    if format == "minimal":
+        return
+    cache = get_message_cache()
+    if cache:
+        cache.put(tenant, message_id, format, content)
+    index = get_search_index()
+    if index:
+        body = f"{content['snippet'] or ''}\n{content['text']}" if format == "full" else content["snippet"]
+        has_attachment = _has_attachment(msg.get("payload", {})) if format == "full" else None
+        index.add(
+            tenant, message_id, format, content["from"], content["to"], content["subject"], body, has_attachment, truncated
+        )
+
+def _project(content: Dict[str, Any], format: str) -> Dict[str, Any]:
+    """Content restricted to the keys of format (cached richer entries carry more)"""
+    return {key: content.get(key) for key in _FORMAT_KEYS[format]}
+
+def _fetch_contents(service, tenant: str, message_ids: Sequence[str], format: str) -> Dict[str, Dict[str, Any]]:
+    """Content fetched through batch requests, cached and indexed (per-message errors kept)"""
+    fetched: Dict[str, Dict[str, Any]] = {}
+    requests = [_get_request(service, message_id, format) for message_id in message_ids]
+    for message_id, (msg, error) in zip(message_ids, execute_batch(service, requests)):
+        if error is not None:
+            fetched[message_id] = {"id": message_id, "error": str(error)}
+            continue
+        fetched[message_id], truncated = _content(message_id, msg, format)
+        _remember(tenant, message_id, format, fetched[message_id], msg, truncated)
+    return fetched
+
+def _read_batched(service, message_ids: Sequence[str], format: str) -> List[Dict[str, Any]]:
+    """Content of many messages: cached ones locally, the rest through batch requests (per-message errors kept)"""
+    cache = get_message_cache() if format != "minimal" else None
+    tenant = current_tenant()
+    cached = cache.get_many(tenant, message_ids, format) if cache else {}
+    missing = [message_id for message_id in message_ids if message_id not in cached]
+    fetched = _fetch_contents(service, tenant, missing, format)
+    return [
+        _project(cached[message_id], format) if message_id in cached else fetched[message_id]
+        for message_id in message_ids
+    ]
+
+def _summarize_messages(service, message_ids: Sequence[str]) -> List[Dict[str, Any]]:
+    """Summaries (id, from, subject, date) of many messages, read at metadata tier"""
+    return [
+        message if "error" in message else {key: message.get(key) for key in _SUMMARY_FIELDS}
+        for message in _read_batched(service, message_ids, "metadata")
+    ]
+
+def _has_attachment(payload: Dict[str, Any]) -> bool:
+    if payload.get("filename"):
+        return True
+    return any(_has_attachment(part) for part in payload.get("parts") or [])
 
 @mcp.tool(name="gmail_list_unread", description="List unread emails (INBOX).")
 def gmail_list_unread(max_results: int = 10) -> List[Dict[str, Any]]:
     """Returns sender, subject, date and message id."""
-    service = _build_gmail_service()
-    resp = service.users().messages().list(
-        userId="me",
-        labelIds=["INBOX", "UNREAD"],
-        maxResults=max_results,
-    ).execute()
-    messages = resp.get("messages", [])
-    return [_summarize_message(service, m["id"]) for m in messages]
+    with _gmail_service() as service:
+        sync = get_mailbox_sync()
+        if sync:
+            tenant = current_tenant()
+            try:
+                sync.sync(tenant, service)
+                message_ids = sync.list_ids(tenant, ["INBOX", "UNREAD"], max_results)
+            except Exception as e:
+                print(f"[gmail_list_unread] Mailbox sync failed, listing from Gmail: {e}")
+                message_ids = None
+            if message_ids is not None:
+                return _summarize_messages(service, message_ids)
+        resp = service.users().messages().list(
+            userId="me",
+            labelIds=["INBOX", "UNREAD"],
+            maxResults=max_results,
+            fields=_LIST_FIELDS,
+        ).execute()
+        messages = resp.get("messages", [])
+        return _summarize_messages(service, [m["id"] for m in messages])
 
 @mcp.tool(
     name="gmail_search_messages",
@@ -64,84 +184,189 @@ def gmail_search_messages(query_text: str, max_results: int = 10) -> List[Dict[s
     - "has:attachment" - emails with attachments
     - "newer_than:7d" - emails from last 7 days
     """
-    service = _build_gmail_service()
-    resp = service.users().messages().list(
-        userId="me",
-        q=query_text,
-        maxResults=max_results,
-    ).execute()
-    messages = resp.get("messages", [])
-    return [_summarize_message(service, m["id"]) for m in messages]
+    with _gmail_service() as service:
+        resp = service.users().messages().list(
+            userId="me",
+            q=query_text,
+            maxResults=max_results,
+            fields=_LIST_FIELDS,
+        ).execute()
+        messages = resp.get("messages", [])
+        return _summarize_messages(service, [m["id"] for m in messages])
 
-@mcp.tool(name="gmail_get_message", description="Get the body (text) of a single email by id.")
-def gmail_get_message(message_id: str) -> Dict[str, Any]:
-    """Get full content of a single email message."""
-    service = _build_gmail_service()
-    msg = service.users().messages().get(userId="me", id=message_id, format="full").execute()
-    payload = msg.get("payload", {})
-    headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
-    body_text = _extract_text(payload)
-    return {
-        "id": message_id,
-        "from": headers.get("From"),
-        "to": headers.get("To"),
-        "subject": headers.get("Subject"),
-        "date": headers.get("Date"),
-        "snippet": msg.get("snippet"),
-        "text": body_text[:10000],
-    }
+def _local_search(service, tenant: str, query: LocalQuery, max_results: int) -> List[str] | None:
+    """Ids matching query from sync state and the search index, or None if they cannot answer it"""
+    sync = get_mailbox_sync()
+    index = get_search_index()
+    if sync is None or (index is None and query.tier):
+        return None
+    sync.sync(tenant, service)
+    since = int((time.time() - query.newer_than) * 1000) if query.newer_than is not None else None
+    # Gmail search leaves out spam and trash
+    candidates = sync.candidates(
+        tenant,
+        query.with_labels,
+        without_labels=[*query.without_labels, "SPAM", "TRASH"],
+        since=since,
+    )
+    if candidates is None:
+        return None
+    if not query.tier:
+        ids = candidates.ids[:max_results]
+        return ids if candidates.complete or len(ids) == max_results else None
+
+    # Headers are indexed by the mailbox sync backfill; messages not indexed yet send the query to Gmail
+    tiers = index.tiers(tenant, candidates.ids)
+    matches = index.match(tenant, query)
+    truncated = index.truncated(tenant, candidates.ids) if query.body_terms else set()
+    found: List[str] = []
+    # Newest first: the answer is settled once max_results matches precede every unknown candidate
+    for message_id in candidates.ids:
+        if message_id in matches:
+            found.append(message_id)
+            if len(found) == max_results:
+                return found
+        elif message_id not in tiers or (
+            query.tier == "full" and (tiers[message_id] != "full" or message_id in truncated)
+        ):
+            # Not (fully) indexed: it may match
+            return None
+    return found if candidates.complete else None
+
+@mcp.tool(
+    name="gmail_local_search",
+    description="Fast email search answered from a local index of the mailbox (milliseconds). Supports from:, to:, subject:, is:unread, is:read, is:starred, is:important, newer_than:<n>d/m/y, has:attachment and plain words; other queries are passed to Gmail. Returns message metadata (id, from, subject, date)."
+)
+def gmail_local_search(query_text: str, max_results: int = 10) -> List[Dict[str, Any]]:
+    """
+    Search emails locally, falling back to Gmail search.
+
+    Plain words and has:attachment are matched against messages read in full
+    before; if a candidate that could match was never read in full, the
+    query goes to Gmail.
+    """
+    query = parse_query(query_text)
+    if query is not None:
+        with _gmail_service() as service:
+            try:
+                message_ids = _local_search(service, current_tenant(), query, max_results)
+            except Exception as e:
+                print(f"[gmail_local_search] Local search failed, searching Gmail: {e}")
+                message_ids = None
+            if message_ids is not None:
+                return _summarize_messages(service, message_ids)
+    return gmail_search_messages(query_text, max_results)
+
+def _read_message(message_id: str, format: str = "full") -> Dict[str, Any]:
+    """Content of one message (checks out its own service, safe to call from workers)"""
+    _check_format(format)
+    cache = get_message_cache() if format != "minimal" else None
+    tenant = current_tenant()
+    cached = cache.get(tenant, message_id, format) if cache else None
+    if cached is not None:
+        return _project(cached, format)
+
+    with _gmail_service() as service:
+        msg = _get_request(service, message_id, format).execute()
+    content, truncated = _content(message_id, msg, format)
+    _remember(tenant, message_id, format, content, msg, truncated)
+    return content
+
+@mcp.tool(
+    name="gmail_get_message",
+    description="Get a single email by id. format: 'minimal' (labels and snippet), 'metadata' (headers and snippet) or 'full' (adds the body text, default)."
+)
+def gmail_get_message(message_id: str, format: str = "full") -> Dict[str, Any]:
+    """Get content of a single email message at the requested format tier."""
+    return _read_message(message_id, format)
 
 @mcp.tool(
     name="gmail_get_messages_bulk",
-    description="Get full content of multiple emails by their IDs (up to 50 messages). Returns from, to, subject, date, snippet and full text for each message."
+    description="Get multiple emails by their IDs (up to 50 messages). format: 'minimal' (labels and snippet), 'metadata' (from, to, subject, date, snippet) or 'full' (adds the full text, default)."
 )
-def gmail_get_messages_bulk(message_ids: List[str], max_messages: int = 50) -> List[Dict[str, Any]]:
+def gmail_get_messages_bulk(message_ids: List[str], max_messages: int = 50, format: str = "full") -> List[Dict[str, Any]]:
     """
-    Get full content of multiple email messages in bulk.
+    Get content of multiple email messages in bulk.
+
+    Full messages are fetched concurrently (up to GMAIL_FETCH_CONCURRENCY at a
+    time); minimal and metadata tiers are small and go through batch requests.
 
     Args:
         message_ids: List of message IDs to retrieve
         max_messages: Maximum number of messages to retrieve (default 50)
+        format: "minimal", "metadata" or "full"
 
     Returns:
-        List of message objects with full content
+        List of message objects, in the order of message_ids
     """
-    service = _build_gmail_service()
-
+    _check_format(format)
     # Limit to max_messages
     ids_to_fetch = message_ids[:max_messages]
 
-    results = []
-    for msg_id in ids_to_fetch:
-        try:
-            msg = service.users().messages().get(userId="me", id=msg_id, format="full").execute()
-            payload = msg.get("payload", {})
-            headers = {h["name"]: h["value"] for h in payload.get("headers", [])}
-            body_text = _extract_text(payload)
+    if format != "full":
+        with _gmail_service() as service:
+            return _read_batched(service, ids_to_fetch, format)
 
-            results.append({
-                "id": msg_id,
-                "from": headers.get("From"),
-                "to": headers.get("To"),
-                "subject": headers.get("Subject"),
-                "date": headers.get("Date"),
-                "snippet": msg.get("snippet"),
-                "text": body_text[:10000],  # Limit each message to 10k chars
-            })
-        except Exception as e:
+    results = []
+    for msg_id, (message, error) in zip(ids_to_fetch, fetch_concurrently(ids_to_fetch, _read_message)):
+        if error is not None:
             # Include error info but continue processing other messages
             results.append({
                 "id": msg_id,
-                "error": str(e),
+                "error": str(error),
             })
+        else:
+            results.append(message)
 
     return results
 
+@mcp.tool(
+    name="gmail_get_thread",
+    description="Get all emails of a conversation in one request. format: 'minimal', 'metadata' or 'full' (default). strip_quotes removes quoted earlier messages from each body (default true)."
+)
+def gmail_get_thread(thread_id: str, format: str = "full", strip_quotes: bool = True) -> Dict[str, Any]:
+    """
+    Get every message of a thread with one users.threads.get request.
+
+    Messages are extracted like gmail_get_message (and cached and indexed the
+    same way). Replies quote the messages before them, so with strip_quotes
+    only the new text of each body is returned.
+
+    Args:
+        thread_id: Thread ID
+        format: "minimal", "metadata" or "full"
+        strip_quotes: Drop quoted replies from body text (full format)
+
+    Returns:
+        Thread id and its messages, oldest first
+    """
+    _check_format(format)
+    params: Dict[str, Any] = {"userId": "me", "id": thread_id, "format": format, "fields": _THREAD_FIELDS[format]}
+    if format == "metadata":
+        params["metadataHeaders"] = _METADATA_HEADERS
+    with _gmail_service() as service:
+        thread = service.users().threads().get(**params).execute()
+
+    tenant = current_tenant()
+    stripping = strip_quotes and format == "full"
+    messages = []
+    for msg in thread.get("messages", []):
+        content, truncated = _content(msg["id"], msg, format, _QUOTED_TEXT_BUDGET if stripping else _TEXT_BUDGET)
+        text = content.get("text", "")
+        if len(text) > _TEXT_BUDGET:
+            # Cached and indexed as gmail_get_message returns it
+            content, truncated = {**content, "text": text[:_TEXT_BUDGET]}, True
+        _remember(tenant, msg["id"], format, content, msg, truncated)
+        if stripping:
+            content = {**content, "text": _strip_quotes(text)[:_TEXT_BUDGET]}
+        messages.append(content)
+    return {"id": thread_id, "messages": messages}
+
 @mcp.tool(
     name="gmail_search_and_read",
-    description="Search for emails using Gmail query syntax and immediately retrieve their full content (up to 50 messages). Combines search and bulk read in one operation."
+    description="Search for emails using Gmail query syntax and immediately retrieve their content (up to 50 messages). Combines search and bulk read in one operation. format: 'minimal', 'metadata' or 'full' (default)."
 )
-def gmail_search_and_read(query_text: str, max_results: int = 10) -> List[Dict[str, Any]]:
+def gmail_search_and_read(query_text: str, max_results: int = 10, format: str = "full") -> List[Dict[str, Any]]:
     """
     Search for emails and immediately get their full content.
     This is more efficient than calling search + get_messages_bulk separately.
@@ -149,21 +374,23 @@ def gmail_search_and_read(query_text: str, max_results: int = 10) -> List[Dict[s
     Args:
         query_text: Gmail search query (e.g., "subject:invoice", "from:example.com")
         max_results: Maximum number of messages to retrieve (max 50)
+        format: "minimal", "metadata" or "full"
 
     Returns:
-        List of messages with full content
+        List of messages with content of the requested format
     """
+    _check_format(format)
     # Limit to 50 messages max
     max_results = min(max_results, 50)
 
-    service = _build_gmail_service()
-
     # Search for messages
-    resp = service.users().messages().list(
-        userId="me",
-        q=query_text,
-        maxResults=max_results,
-    ).execute()
+    with _gmail_service() as service:
+        resp = service.users().messages().list(
+            userId="me",
+            q=query_text,
+            maxResults=max_results,
+            fields=_LIST_FIELDS,
+        ).execute()
 
     messages = resp.get("messages", [])
     if not messages:
@@ -172,32 +399,183 @@ def gmail_search_and_read(query_text: str, max_results: int = 10) -> List[Dict[s
     # Get message IDs
     message_ids = [m["id"] for m in messages]
 
-    # Fetch full content for all messages
-    return gmail_get_messages_bulk(message_ids, max_messages=max_results)
+    # Fetch content for all messages
+    return gmail_get_messages_bulk(message_ids, max_messages=max_results, format=format)
 
-@mcp.tool(name="gmail_modify_message", description="Add or remove labels on a Gmail message.")
+def _modify_labels(
+    message_ids: Sequence[str],
+    add_labels: Sequence[str] | None = None,
+    remove_labels: Sequence[str] | None = None,
+    strict: bool = False,
+) -> List[Dict[str, Any]]:
+    """
+    Add and remove labels on messages, one request per chunk of BATCH_MODIFY_MAX ids
+
+    Chunks go through messages.batchModify; a lone message goes through
+    messages.modify, which costs the same one request and also returns its
+    label set. A failed chunk does not stop the others unless strict, where
+    its HttpError is raised.
+
+    Labels may be given by name or id (see labels.LabelRegistry).
+
+    Returns:
+        Status of each chunk: start, count and "ok" (with labelIds for a lone
+        message) or "error" with the message
+    """
+    if not add_labels and not remove_labels:
+        raise ValueError("Must specify add_labels or remove_labels.")
+    message_ids = list(dict.fromkeys(message_ids))
+
+    tenant = current_tenant()
+    sync = get_mailbox_sync()
+    registry = get_label_registry()
+    results: List[Dict[str, Any]] = []
+    with _gmail_service() as service:
+        add_labels = registry.resolve(tenant, service, add_labels or [])
+        remove_labels = registry.resolve(tenant, service, remove_labels or [])
+        body: Dict[str, Any] = {}
+        if add_labels:
+            body["addLabelIds"] = add_labels
+        if remove_labels:
+            body["removeLabelIds"] = remove_labels
+        messages = service.users().messages()
+        for start in range(0, len(message_ids), BATCH_MODIFY_MAX):
+            chunk = message_ids[start:start + BATCH_MODIFY_MAX]
+            result: Dict[str, Any] = {"start": start, "count": len(chunk), "status": "ok"}
+            try:
+                if len(chunk) == 1:
+                    resp = messages.modify(userId="me", id=chunk[0], body=body, fields="id,labelIds").execute()
+                    result["labelIds"] = resp.get("labelIds", [])
+                else:
+                    messages.batchModify(userId="me", body={"ids": chunk, **body}).execute()
+            except HttpError as e:
+                if e.resp.status == 404:
+                    # Possibly a label deleted since the registry loaded it
+                    registry.invalidate(tenant)
+                if strict:
+                    raise
+                result.update(status="error", error=str(e))
+                results.append(result)
+                continue
+            if sync:
+                if "labelIds" in result:
+                    sync.note_labels(tenant, chunk[0], result["labelIds"])
+                else:
+                    sync.note_label_change(tenant, chunk, add_labels, remove_labels)
+            results.append(result)
+    return results
+
+def _bulk_result(message_ids: Sequence[str], chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    modified = sum(chunk["count"] for chunk in chunks if chunk["status"] == "ok")
+    return {"requested": len(message_ids), "modified": modified, "chunks": chunks}
+
+@mcp.tool(name="gmail_modify_message", description="Add or remove labels on a Gmail message. Labels may be given by name or id.")
 def gmail_modify_message(
     message_id: str,
     add_labels: Sequence[str] | None = None,
     remove_labels: Sequence[str] | None = None,
 ) -> Dict[str, Any]:
-    if not add_labels and not remove_labels:
-        raise ValueError("Must specify add_labels or remove_labels.")
-    service = _build_gmail_service()
-    body: Dict[str, Any] = {}
-    if add_labels:
-        body["addLabelIds"] = list(add_labels)
-    if remove_labels:
-        body["removeLabelIds"] = list(remove_labels)
-    resp = service.users().messages().modify(userId="me", id=message_id, body=body).execute()
-    return {"id": resp.get("id"), "labelIds": resp.get("labelIds", [])}
+    chunk = _modify_labels([message_id], add_labels, remove_labels, strict=True)[0]
+    return {"id": message_id, "labelIds": chunk["labelIds"]}
+
+@mcp.tool(
+    name="gmail_modify_messages_bulk",
+    description="Add or remove labels on many Gmail messages (up to 1000 per request, larger lists are chunked). Labels may be given by name or id.",
+)
+def gmail_modify_messages_bulk(
+    message_ids: List[str],
+    add_labels: Sequence[str] | None = None,
+    remove_labels: Sequence[str] | None = None,
+) -> Dict[str, Any]:
+    """Returns how many messages were modified and the status of each chunk."""
+    return _bulk_result(message_ids, _modify_labels(message_ids, add_labels, remove_labels))
+
+def _read_labels(archive: bool) -> List[str]:
+    return ["UNREAD", "INBOX"] if archive else ["UNREAD"]
 
 @mcp.tool(name="gmail_mark_as_read", description="Mark an email as read and optionally archive it.")
 def gmail_mark_as_read(message_id: str, archive: bool = False) -> Dict[str, Any]:
-    remove = ["UNREAD"]
-    if archive:
-        remove.append("INBOX")
-    return gmail_modify_message(message_id=message_id, remove_labels=remove)
+    return gmail_modify_message(message_id=message_id, remove_labels=_read_labels(archive))
+
+@mcp.tool(name="gmail_mark_as_read_bulk", description="Mark many emails as read and optionally archive them.")
+def gmail_mark_as_read_bulk(message_ids: List[str], archive: bool = False) -> Dict[str, Any]:
+    """Returns how many messages were modified and the status of each chunk."""
+    return _bulk_result(message_ids, _modify_labels(message_ids, remove_labels=_read_labels(archive)))
+
+def _attachment_parts(part: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parts of a MIME tree that are attachments (have a filename and a body)"""
+    found = []
+    body = part.get("body") or {}
+    if part.get("filename") and (body.get("attachmentId") or body.get("data")):
+        found.append(part)
+    for child in part.get("parts") or []:
+        found.extend(_attachment_parts(child))
+    return found
+
+def _download_attachment(message_id: str, part: Dict[str, Any]) -> tuple[str, int]:
+    """Store one attachment part (checks out its own service, safe to call from workers)"""
+    body = part.get("body") or {}
+    data = body.get("data")
+    if not data:
+        with _gmail_service() as service:
+            data = service.users().messages().attachments().get(
+                userId="me", messageId=message_id, id=body["attachmentId"], fields="data"
+            ).execute()["data"]
+    return get_attachment_store().put(data)
+
+@mcp.tool(
+    name="gmail_download_attachments",
+    description="Download the attachments of an email to disk. Optionally only the given filenames, copied into save_dir.",
+)
+def gmail_download_attachments(
+    message_id: str,
+    save_dir: str | None = None,
+    filenames: Sequence[str] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Download attachments of a message.
+
+    Attachments are downloaded concurrently (up to GMAIL_ATTACHMENT_CONCURRENCY
+    at a time) and decoded to disk in chunks. Files are kept once per content
+    hash in GMAIL_ATTACHMENTS_PATH.
+
+    Args:
+        message_id: Message ID
+        save_dir: Directory the files are also placed in, under their filenames
+        filenames: Only download attachments with these filenames
+
+    Returns:
+        filename, mimeType, size, sha256 and path of each attachment (or its error)
+    """
+    with _gmail_service() as service:
+        msg = service.users().messages().get(
+            userId="me", id=message_id, format="full", fields=_ATTACHMENT_TREE_FIELDS
+        ).execute()
+    parts = _attachment_parts(msg.get("payload", {}))
+    if filenames is not None:
+        parts = [part for part in parts if part["filename"] in filenames]
+
+    store = get_attachment_store()
+    results = []
+    downloads = fetch_concurrently(
+        parts, lambda part: _download_attachment(message_id, part), concurrency=config.GMAIL_ATTACHMENT_CONCURRENCY
+    )
+    for part, (stored, error) in zip(parts, downloads):
+        if error is not None:
+            results.append({"filename": part["filename"], "error": str(error)})
+            continue
+        digest, size = stored
+        path = store.path_of(digest)
+        if save_dir:
+            path = store.export(digest, save_dir, part["filename"])
+        results.append({
+            "filename": part["filename"],
+            "mimeType": part.get("mimeType"),
+            "size": size,
+            "sha256": digest,
+            "path": str(path),
+        })
+    return results
 
 @mcp.tool(name="gmail_send_message", description="Send a simple email with optional CC/BCC and attachments.")
 def gmail_send_message(
@@ -210,7 +588,6 @@ def gmail_send_message(
     thread_id: str | None = None,
     reply_to_message_id: str | None = None,
 ) -> Dict[str, Any]:
-    service = _build_gmail_service()
     message = EmailMessage()
     message["To"] = to
     message["Subject"] = subject
@@ -223,22 +600,10 @@ def gmail_send_message(
         message["References"] = reply_to_message_id
     message.set_content(body)
 
-    for attachment in attachments or []:
-        path = Path(attachment).expanduser()
-        if not path.exists() or not path.is_file():
-            raise FileNotFoundError(f"Attachment not found: {path}")
-        mime_type, _ = mimetypes.guess_type(str(path))
-        maintype, subtype = (mime_type or "application/octet-stream").split("/", 1)
-        message.add_attachment(
-            path.read_bytes(),
-            maintype=maintype,
-            subtype=subtype,
-            filename=path.name,
-        )
-
-    encoded = urlsafe_b64encode(message.as_bytes()).decode("utf-8")
-    payload: Dict[str, Any] = {"raw": encoded}
+    metadata: Dict[str, Any] = {}
     if thread_id:
-        payload["threadId"] = thread_id
-    resp = service.users().messages().send(userId="me", body=payload).execute()
+        metadata["threadId"] = thread_id
+    # Attachments are streamed from disk while uploading, never loaded whole
+    with StreamedMessage(message, attachments or []) as streamed, _gmail_service() as service:
+        resp = upload_message(service, streamed, metadata, fields="id,threadId,labelIds")
     return {"id": resp.get("id"), "threadId": resp.get("threadId"), "labelIds": resp.get("labelIds", [])}
@@ -0,0 +1,243 @@
+"""
+Streaming iCalendar (RFC 5545) Writer
+
+Writes calendar events to a text stream one VEVENT at a time, so exporting
+a calendar costs one events.list page of memory however many events it has:
+
+- content lines are folded at 75 octets (never inside a UTF-8 sequence)
+  and end with CRLF
+- TEXT values (SUMMARY, DESCRIPTION, LOCATION) are escaped
+- recurring events keep their RRULE/EXRULE/RDATE/EXDATE lines as Google
+  returns them; modified instances become VEVENTs with the series UID and
+  a RECURRENCE-ID, cancelled ones are marked STATUS:CANCELLED
+- times with a time zone are written with TZID (so recurrences follow the
+  zone's DST), others in UTC; a VTIMEZONE with the zone's offset changes
+  over the exported period is written at the end for each TZID used
+"""
+
+from __future__ import annotations
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterator, Optional, TextIO
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+PRODID = "-//MCP Hub Ricardo//Calendar Export//ES"
+
+# Partial-response mask: what a VEVENT is made of
+ICS_EVENT_FIELDS = (
+    "id,iCalUID,status,summary,description,location,start,end,recurrence,"
+    "originalStartTime,created,updated,sequence"
+)
+
+# Octets per content line, excluding the CRLF (RFC 5545 3.1)
+LINE_LIMIT = 75
+
+_TZID = re.compile(r"TZID=([^;:]+)")
+_STATUS = {"confirmed": "CONFIRMED", "tentative": "TENTATIVE", "cancelled": "CANCELLED"}
+
+
+def escape_text(value: str) -> str:
+    """Escape a TEXT property value"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+        .replace("\r", "\\n")
+    )
+
+
+def fold(line: str) -> str:
+    """Content line folded at LINE_LIMIT octets, with its CRLF"""
+    data = line.encode("utf-8")
+    if len(data) <= LINE_LIMIT:
+        return line + "\r\n"
+    parts = []
+    start, limit = 0, LINE_LIMIT
+    while start < len(data):
+        end = min(start + limit, len(data))
+        while end < len(data) and data[end] & 0xC0 == 0x80:
+            end -= 1  # Continuation byte: fold before the character instead
+        parts.append(data[start:end].decode("utf-8"))
+        start, limit = end, LINE_LIMIT - 1  # Continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+class IcsWriter:
+    """Writes a VCALENDAR to a stream (opened with newline="") event by event"""
+
+    def __init__(self, stream: TextIO, period: Optional[tuple[datetime, datetime]] = None):
+        """
+        Args:
+            stream: Text stream the calendar is written to
+            period: Exported time range (aware); VTIMEZONEs cover it, as recurring
+                events starting before it have instances inside it
+        """
+        self.stream = stream
+        self.count = 0
+        self._period = period
+        self._zones: dict[str, tuple[datetime, datetime]] = {}  # TZID -> period its offsets are needed for
+        self._line("BEGIN:VCALENDAR")
+        self._line("VERSION:2.0")
+        self._line(f"PRODID:{PRODID}")
+        self._line("CALSCALE:GREGORIAN")
+
+    def write_event(self, event: dict[str, Any]) -> bool:
+        """
+        Write one event as a VEVENT
+
+        Args:
+            event: Event resource (fields of ICS_EVENT_FIELDS)
+
+        Returns:
+            Whether it was written (cancelled events that are not instances of a series are skipped)
+        """
+        original = event.get("originalStartTime")
+        if event.get("status") == "cancelled" and not original:
+            return False
+        start = event.get("start") or original
+        if not start:
+            return False
+
+        self._line("BEGIN:VEVENT")
+        self._line(f"UID:{event.get('iCalUID') or event['id']}")
+        self._line(f"DTSTAMP:{_utc(event.get('updated')) or _utc_now()}")
+        self._time("DTSTART", start)
+        if event.get("end") and event.get("status") != "cancelled":
+            self._time("DTEND", event["end"])
+        if original:
+            self._time("RECURRENCE-ID", original)
+        for name, key in (("SUMMARY", "summary"), ("DESCRIPTION", "description"), ("LOCATION", "location")):
+            if event.get(key):
+                self._line(f"{name}:{escape_text(event[key])}")
+        if event.get("status") in _STATUS:
+            self._line(f"STATUS:{_STATUS[event['status']]}")
+        if event.get("sequence"):
+            self._line(f"SEQUENCE:{event['sequence']}")
+        for name, key in (("CREATED", "created"), ("LAST-MODIFIED", "updated")):
+            if _utc(event.get(key)):
+                self._line(f"{name}:{_utc(event[key])}")
+        for rule in event.get("recurrence") or []:
+            # Already RFC 5545 content lines (RRULE:..., EXDATE;TZID=...:...)
+            for tzid in _TZID.findall(rule.split(":", 1)[0]):
+                self._need_zone(tzid, start)
+            self._line(rule)
+        self._line("END:VEVENT")
+        self.count += 1
+        return True
+
+    def close(self) -> None:
+        """Write the VTIMEZONEs of the zones used and end the calendar"""
+        for tzid, (first, last) in self._zones.items():
+            for line in vtimezone(tzid, first, last):
+                self._line(line)
+        self._line("END:VCALENDAR")
+
+    def _time(self, name: str, when: dict[str, Any]) -> None:
+        if when.get("date"):
+            self._line(f"{name};VALUE=DATE:{when['date'].replace('-', '')}")
+            return
+        moment = datetime.fromisoformat(when["dateTime"])
+        zone = _zone(when.get("timeZone"))
+        if zone is not None:
+            local = moment.replace(tzinfo=zone) if moment.tzinfo is None else moment.astimezone(zone)
+            self._need_zone(when["timeZone"], when)
+            self._line(f"{name};TZID={when['timeZone']}:{local.strftime('%Y%m%dT%H%M%S')}")
+        else:
+            if moment.tzinfo is None:
+                moment = moment.replace(tzinfo=timezone.utc)
+            self._line(f"{name}:{moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}")
+
+    def _need_zone(self, tzid: str, when: dict[str, Any]) -> None:
+        value = when.get("dateTime") or when.get("date")
+        moment = datetime.fromisoformat(value) if value else datetime.now(timezone.utc)
+        if moment.tzinfo is None:
+            moment = moment.replace(tzinfo=timezone.utc)
+        first, last = self._zones.get(tzid) or self._period or (moment, moment)
+        self._zones[tzid] = (min(first, moment), max(last, moment))
+
+    def _line(self, line: str) -> None:
+        self.stream.write(fold(line))
+
+
+def vtimezone(tzid: str, first: datetime, last: datetime) -> Iterator[str]:
+    """
+    VTIMEZONE lines of an IANA zone: its offset at first and every offset change until last
+
+    Unknown zones yield nothing.
+    """
+    zone = _zone(tzid)
+    if zone is None:
+        return
+    start = first.astimezone(timezone.utc) - timedelta(days=1)
+    end = last.astimezone(timezone.utc) + timedelta(days=1)
+    yield "BEGIN:VTIMEZONE"
+    yield f"TZID:{tzid}"
+    yield from _observance(zone, start, _offset_at(zone, start))
+    day = start
+    while day < end:
+        following = day + timedelta(days=1)
+        if _offset_at(zone, day) != _offset_at(zone, following):
+            yield from _observance(zone, _transition(zone, day, following), _offset_at(zone, day))
+        day = following
+    yield "END:VTIMEZONE"
+
+
+def _observance(zone: ZoneInfo, onset: datetime, offset_from: timedelta) -> Iterator[str]:
+    """STANDARD or DAYLIGHT component of the offset starting at onset (UTC)"""
+    local = onset.astimezone(zone)
+    kind = "DAYLIGHT" if local.dst() else "STANDARD"
+    yield f"BEGIN:{kind}"
+    # Onset in the local time in effect before it
+    yield f"DTSTART:{(onset + offset_from).strftime('%Y%m%dT%H%M%S')}"
+    yield f"TZOFFSETFROM:{_offset(offset_from)}"
+    yield f"TZOFFSETTO:{_offset(local.utcoffset())}"
+    if local.tzname():
+        yield f"TZNAME:{local.tzname()}"
+    yield f"END:{kind}"
+
+
+def _transition(zone: ZoneInfo, low: datetime, high: datetime) -> datetime:
+    """First UTC second in (low, high] whose offset differs from low's"""
+    before = _offset_at(zone, low)
+    while high - low > timedelta(seconds=1):
+        middle = low + (high - low) / 2
+        if _offset_at(zone, middle) == before:
+            low = middle
+        else:
+            high = middle
+    return high.replace(microsecond=0)
+
+
+def _offset_at(zone: ZoneInfo, moment: datetime) -> timedelta:
+    """UTC offset of zone at an aware moment"""
+    return moment.astimezone(zone).utcoffset()
+
+
+def _offset(offset: timedelta) -> str:
+    minutes = int(offset.total_seconds()) // 60
+    sign = "-" if minutes < 0 else "+"
+    return f"{sign}{abs(minutes) // 60:02d}{abs(minutes) % 60:02d}"
+
+
+def _zone(tzid: Optional[str]) -> Optional[ZoneInfo]:
+    if not tzid:
+        return None
+    try:
+        return ZoneInfo(tzid)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _utc(value: Optional[str]) -> Optional[str]:
+    if not value:
+        return None
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
@@ -0,0 +1,155 @@
+"""
+Gmail Label Registry
+
+Label tools accept label names ("Receipts", "inbox") as well as ids
+("Label_12", "INBOX"). Names are resolved locally from a per-tenant copy of
+users.labels.list:
+
+- system labels (INBOX, UNREAD, STARRED, ...) resolve without any request
+- a tenant's labels are loaded once and kept for GMAIL_LABELS_TTL seconds
+- a name or id that is not known triggers one reload (the label may be new)
+  before it is reported as unknown, so a typo fails locally instead of as a
+  Gmail error
+- the copy is dropped when mailbox sync sees label ids it does not contain,
+  on a full mailbox resync, and when Gmail answers a label change with 404
+"""
+
+from __future__ import annotations
+import threading
+import time
+from typing import Any, Iterable, Optional, Sequence
+
+from src import config
+
+SYSTEM_LABELS = frozenset({
+    "CHAT", "DRAFT", "IMPORTANT", "INBOX", "SENT", "SPAM", "STARRED", "TRASH", "UNREAD",
+    "CATEGORY_FORUMS", "CATEGORY_PERSONAL", "CATEGORY_PROMOTIONS", "CATEGORY_SOCIAL", "CATEGORY_UPDATES",
+})
+
+_LABEL_FIELDS = "labels(id,name)"
+
+
+class _Labels:
+    """Labels of one tenant as loaded at one time"""
+
+    def __init__(self, labels: Iterable[dict[str, Any]]):
+        self.loaded_at = time.monotonic()
+        self.ids: set[str] = set()
+        self.by_key: dict[str, str] = {}  # Lowercased name -> id
+        for label in labels:
+            self.ids.add(label["id"])
+            self.by_key.setdefault(label["name"].lower(), label["id"])
+
+    def lookup(self, label: str) -> Optional[str]:
+        if label in self.ids:
+            return label
+        return self.by_key.get(label.lower())
+
+
+class LabelRegistry:
+    """Thread-safe per-tenant cache of label names and ids"""
+
+    def __init__(self, ttl: float = config.GMAIL_LABELS_TTL):
+        """
+        Args:
+            ttl: Seconds a tenant's labels are used before they are reloaded
+        """
+        self.ttl = ttl
+        self._tenants: dict[str, _Labels] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, tenant: str, service: Any, labels: Sequence[str]) -> list[str]:
+        """
+        Label ids of label names or ids
+
+        Args:
+            tenant: Tenant the labels belong to
+            service: Gmail service of the tenant (used only to load labels)
+            labels: Label names (case-insensitive) or ids
+
+        Returns:
+            Label ids, in the order of labels
+
+        Raises:
+            ValueError: If a label is neither a known name nor a known id
+        """
+        resolved = [_system_label(label) for label in labels]
+        if all(resolved):
+            return resolved
+
+        known = self._current(tenant)
+        reloaded = known is None
+        if known is None:
+            known = self._load(tenant, service)
+        resolved = [label_id or known.lookup(label) for label, label_id in zip(labels, resolved)]
+        if not all(resolved) and not reloaded:
+            # Possibly created since the labels were loaded
+            known = self._load(tenant, service)
+            resolved = [label_id or known.lookup(label) for label, label_id in zip(labels, resolved)]
+
+        missing = [label for label, label_id in zip(labels, resolved) if not label_id]
+        if missing:
+            raise ValueError(f"Unknown Gmail label(s): {', '.join(missing)}")
+        return resolved
+
+    def note_label_ids(self, tenant: str, label_ids: Iterable[str]) -> None:
+        """Drop a tenant's labels if label_ids (e.g. seen by mailbox sync) contains one they lack"""
+        with self._lock:
+            known = self._tenants.get(tenant)
+            if known is None:
+                return
+            if any(label_id not in known.ids and label_id not in SYSTEM_LABELS for label_id in label_ids):
+                del self._tenants[tenant]
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        """Drop the labels of a tenant, or of all tenants"""
+        with self._lock:
+            if tenant is None:
+                self._tenants.clear()
+            else:
+                self._tenants.pop(tenant, None)
+
+    def _current(self, tenant: str) -> Optional[_Labels]:
+        with self._lock:
+            known = self._tenants.get(tenant)
+            if known is not None and time.monotonic() - known.loaded_at < self.ttl:
+                return known
+            return None
+
+    def _load(self, tenant: str, service: Any) -> _Labels:
+        resp = service.users().labels().list(userId="me", fields=_LABEL_FIELDS).execute()
+        known = _Labels(resp.get("labels", []))
+        with self._lock:
+            self._tenants[tenant] = known
+        return known
+
+
+def _system_label(label: str) -> Optional[str]:
+    upper = label.upper()
+    return upper if upper in SYSTEM_LABELS else None
+
+
+# Global instance (lazy initialization)
+_registry: Optional[LabelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_label_registry() -> LabelRegistry:
+    """
+    Get or create global label registry
+
+    Labels of evicted tenants are dropped with the tenant.
+
+    Returns:
+        LabelRegistry instance
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                from src.auth.tenant import get_tenant_registry
+
+                registry = LabelRegistry()
+                get_tenant_registry().add_evict_listener(lambda state: registry.invalidate(state.tenant_id))
+                _registry = registry
+    return _registry
@@ -0,0 +1,760 @@
+"""
+Incremental Gmail Mailbox Sync
+
+Keeps a local copy of each tenant's mailbox state (message ids, thread ids,
+label sets, internal dates) in SQLite and brings it up to date with
+users.history.list from the last stored historyId, so listings such as
+"unread in INBOX" are answered locally after one cheap history call instead
+of a messages.list plus one get per message.
+
+- first use (or an expired historyId, answered with 404) runs a full sync:
+  the ids of the newest GMAIL_SYNC_MAX_MESSAGES messages are listed (a few
+  messages.list pages, no per-message gets) and stored as pending
+- label sets and dates of pending messages are backfilled newest first by a
+  background thread, in batches of GMAIL_BATCH_SIZE paced to
+  GMAIL_SYNC_UNITS_PER_SECOND quota units, so tool calls never wait for it;
+  each batch is stored as it arrives, so a rate limit or error only pauses
+  the backfill until the next sync call restarts it. Gets are made at
+  metadata format (same quota cost as minimal), and their headers feed the
+  local search index
+- later calls apply history records (messages added / deleted, labels
+  added / removed) from the stored historyId
+- history is checked at most once per GMAIL_SYNC_MIN_INTERVAL seconds
+- until the backfill is done, or if the full sync stopped at
+  GMAIL_SYNC_MAX_MESSAGES, the local state only covers recent mail; queries
+  that cannot be answered completely from it return None and callers fall
+  back to Gmail
+
+Enabled with GMAIL_SYNC_ENABLED (default true).
+"""
+
+from __future__ import annotations
+import queue
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterable, Optional, Sequence, Union
+
+from googleapiclient.errors import HttpError
+
+from src import config
+from src.tools.batch import QuotaThrottle, execute_batch
+from src.tools.labels import get_label_registry
+from src.tools.search_index import get_search_index
+
+HISTORY_TYPES = ["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"]
+
+# Gmail quota units of one messages.get
+GET_UNITS = 5
+
+# Partial-response masks: only what the local state and search index are built from
+_MESSAGE_FIELDS = "id,threadId,labelIds,internalDate,snippet,payload/headers"
+_INDEXED_HEADERS = ["From", "To", "Subject"]
+_HISTORY_FIELDS = (
+    "history(messagesAdded/message(id,threadId,labelIds),messagesDeleted/message/id,"
+    "labelsAdded(labelIds,message(id,threadId,labelIds)),labelsRemoved(labelIds,message(id,threadId,labelIds))),"
+    "nextPageToken,historyId"
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mailbox (
+    tenant TEXT PRIMARY KEY,
+    history_id TEXT NOT NULL,
+    complete INTEGER NOT NULL,
+    synced_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    tenant TEXT NOT NULL,
+    id TEXT NOT NULL,
+    thread_id TEXT,
+    internal_date INTEGER,
+    pending INTEGER,
+    PRIMARY KEY (tenant, id)
+);
+CREATE INDEX IF NOT EXISTS messages_date ON messages (tenant, internal_date);
+CREATE INDEX IF NOT EXISTS messages_pending ON messages (tenant, pending);
+CREATE TABLE IF NOT EXISTS message_labels (
+    tenant TEXT NOT NULL,
+    label TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (tenant, label, id)
+);
+CREATE INDEX IF NOT EXISTS message_labels_id ON message_labels (tenant, id);
+"""
+
+
+@dataclass
+class MessageState:
+    """Locally tracked state of one message"""
+    id: str
+    thread_id: Optional[str] = None
+    label_ids: tuple[str, ...] = ()
+    internal_date: Optional[int] = None
+
+
+@dataclass
+class Candidates:
+    """Tracked messages matching label and date filters"""
+    ids: list[str]  # Newest first
+    complete: bool  # False: older matches may exist beyond local state, only leading ids are certain
+
+
+@dataclass
+class MailboxInfo:
+    """Sync bookkeeping of one tenant's mailbox"""
+    history_id: str
+    listed_all: bool  # The full sync listed every message
+    synced_at: float
+    pending: int = 0  # Messages whose labels and date are not fetched yet
+    pending_new: int = 0  # Of those, messages added after the full sync
+
+    @property
+    def complete(self) -> bool:
+        """Whether local state holds every message"""
+        return self.listed_all and self.pending == 0
+
+
+class MailboxStore:
+    """Thread-safe SQLite store of mailbox state per tenant"""
+
+    def __init__(self, path: Union[str, Path] = config.GMAIL_SYNC_PATH):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a process-local store)
+        """
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def info(self, tenant: str) -> Optional[MailboxInfo]:
+        """Sync bookkeeping of a tenant, or None if never synced"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT history_id, complete, synced_at FROM mailbox WHERE tenant = ?", (tenant,)
+            ).fetchone()
+            if row is None:
+                return None
+            pending, pending_new = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(pending = 0), 0) FROM messages WHERE tenant = ? AND pending IS NOT NULL",
+                (tenant,),
+            ).fetchone()
+        return MailboxInfo(row[0], bool(row[1]), row[2], pending, pending_new)
+
+    def touch(self, tenant: str) -> None:
+        """Record that the tenant's state was checked against Gmail now"""
+        with self._lock:
+            self._db.execute("UPDATE mailbox SET synced_at = ? WHERE tenant = ?", (time.time(), tenant))
+
+    def replace(
+        self,
+        tenant: str,
+        messages: Iterable[MessageState],
+        history_id: str,
+        complete: bool,
+        pending: Sequence[MessageState] = (),
+    ) -> None:
+        """
+        Replace a tenant's whole state (full sync)
+
+        Args:
+            messages: Messages with known labels and dates
+            complete: Whether messages and pending are every message of the mailbox
+            pending: Listed messages whose labels and dates are fetched later, newest first
+        """
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute("DELETE FROM messages WHERE tenant = ?", (tenant,))
+                self._db.execute("DELETE FROM message_labels WHERE tenant = ?", (tenant,))
+                self._upsert_locked(tenant, messages)
+                self._db.executemany(
+                    "INSERT OR IGNORE INTO messages (tenant, id, thread_id, pending) VALUES (?, ?, ?, ?)",
+                    [(tenant, message.id, message.thread_id, position) for position, message in enumerate(pending, 1)],
+                )
+                self._set_info_locked(tenant, history_id, complete)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def apply(
+        self,
+        tenant: str,
+        upserts: Iterable[MessageState],
+        label_updates: dict[str, tuple[str, ...]],
+        deletes: Iterable[str],
+        history_id: str,
+    ) -> None:
+        """Apply incremental changes and advance the stored historyId"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._upsert_locked(tenant, upserts)
+                for message_id, label_ids in label_updates.items():
+                    self._set_labels_locked(tenant, message_id, label_ids)
+                for message_id in deletes:
+                    self._db.execute("DELETE FROM messages WHERE tenant = ? AND id = ?", (tenant, message_id))
+                    self._db.execute("DELETE FROM message_labels WHERE tenant = ? AND id = ?", (tenant, message_id))
+                complete = self._db.execute(
+                    "SELECT complete FROM mailbox WHERE tenant = ?", (tenant,)
+                ).fetchone()[0]
+                self._set_info_locked(tenant, history_id, bool(complete))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def pending_ids(self, tenant: str, limit: int) -> list[str]:
+        """Ids of messages whose labels and dates are not fetched yet, messages added since the full sync first"""
+        with self._lock:
+            return [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT id FROM messages WHERE tenant = ? AND pending IS NOT NULL ORDER BY pending LIMIT ?",
+                    (tenant, limit),
+                ).fetchall()
+            ]
+
+    def fill(self, tenant: str, messages: Iterable[MessageState], missing: Iterable[str] = ()) -> None:
+        """Store fetched states of pending messages and drop those that no longer exist"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for message in messages:
+                    self._upsert_locked(tenant, [message])
+                    self._db.execute(
+                        "UPDATE messages SET pending = NULL WHERE tenant = ? AND id = ?", (tenant, message.id)
+                    )
+                for message_id in missing:
+                    self._db.execute("DELETE FROM messages WHERE tenant = ? AND id = ?", (tenant, message_id))
+                    self._db.execute("DELETE FROM message_labels WHERE tenant = ? AND id = ?", (tenant, message_id))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def set_labels(self, tenant: str, message_id: str, label_ids: Sequence[str]) -> None:
+        """Replace the label set of a tracked message (untracked ids are ignored)"""
+        with self._lock:
+            if self._db.execute(
+                "SELECT 1 FROM messages WHERE tenant = ? AND id = ?", (tenant, message_id)
+            ).fetchone():
+                self._set_labels_locked(tenant, message_id, label_ids)
+
+    def relabel(
+        self, tenant: str, message_ids: Sequence[str], add: Sequence[str] = (), remove: Sequence[str] = ()
+    ) -> None:
+        """Add and remove labels on tracked messages (untracked ids are ignored)"""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for start in range(0, len(message_ids), 500):
+                    chunk = list(message_ids[start:start + 500])
+                    marks = ",".join("?" * len(chunk))
+                    if remove:
+                        self._db.execute(
+                            f"DELETE FROM message_labels WHERE tenant = ? AND id IN ({marks}) "
+                            f"AND label IN ({','.join('?' * len(remove))})",
+                            (tenant, *chunk, *remove),
+                        )
+                    if add:
+                        tracked = self._db.execute(
+                            f"SELECT id FROM messages WHERE tenant = ? AND id IN ({marks})", (tenant, *chunk)
+                        ).fetchall()
+                        self._db.executemany(
+                            "INSERT OR IGNORE INTO message_labels (tenant, label, id) VALUES (?, ?, ?)",
+                            [(tenant, label, message_id) for (message_id,) in tracked for label in add],
+                        )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def labels_of(self, tenant: str, message_ids: Sequence[str]) -> dict[str, tuple[str, ...]]:
+        """Current label sets of tracked messages"""
+        labels: dict[str, list[str]] = {}
+        with self._lock:
+            for start in range(0, len(message_ids), 500):
+                chunk = list(message_ids[start:start + 500])
+                rows = self._db.execute(
+                    f"SELECT id, label FROM message_labels WHERE tenant = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (tenant, *chunk),
+                ).fetchall()
+                for message_id, label in rows:
+                    labels.setdefault(message_id, []).append(label)
+        return {message_id: tuple(sorted(ids)) for message_id, ids in labels.items()}
+
+    def query(
+        self,
+        tenant: str,
+        label_ids: Sequence[str] = (),
+        limit: Optional[int] = None,
+        without_labels: Sequence[str] = (),
+        since: Optional[int] = None,
+    ) -> list[str]:
+        """Ids of fetched messages carrying all label_ids and none of without_labels (internal date >= since), newest first"""
+        sql, params = self._filter_sql(tenant, label_ids, without_labels, since)
+        sql = f"SELECT m.id FROM messages m WHERE {sql} ORDER BY m.internal_date DESC, m.id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            return [row[0] for row in self._db.execute(sql, params).fetchall()]
+
+    def oldest_date(self, tenant: str) -> Optional[int]:
+        """Internal date of the oldest fetched message"""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(internal_date) FROM messages WHERE tenant = ? AND pending IS NULL", (tenant,)
+            ).fetchone()[0]
+
+    def forget(self, tenant: str) -> None:
+        """Drop a tenant's state (next sync is a full sync)"""
+        with self._lock:
+            for table in ("messages", "message_labels", "mailbox"):
+                self._db.execute(f"DELETE FROM {table} WHERE tenant = ?", (tenant,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _filter_sql(
+        tenant: str,
+        label_ids: Sequence[str],
+        without_labels: Sequence[str] = (),
+        since: Optional[int] = None,
+    ) -> tuple[str, list[Any]]:
+        clauses = ["m.tenant = ?", "m.pending IS NULL"]
+        params: list[Any] = [tenant]
+        for label in label_ids:
+            clauses.append("m.id IN (SELECT id FROM message_labels WHERE tenant = ? AND label = ?)")
+            params += [tenant, label]
+        for label in without_labels:
+            clauses.append("m.id NOT IN (SELECT id FROM message_labels WHERE tenant = ? AND label = ?)")
+            params += [tenant, label]
+        if since is not None:
+            clauses.append("m.internal_date >= ?")
+            params.append(since)
+        return " AND ".join(clauses), params
+
+    def _upsert_locked(self, tenant: str, messages: Iterable[MessageState]) -> None:
+        # New messages without a date (added per history) are pending, ahead of the full sync's backlog
+        for message in messages:
+            self._db.execute(
+                "INSERT INTO messages (tenant, id, thread_id, internal_date, pending) "
+                "VALUES (?, ?, ?, ?, CASE WHEN ? IS NULL THEN 0 END) "
+                "ON CONFLICT (tenant, id) DO UPDATE SET thread_id = excluded.thread_id, "
+                "internal_date = COALESCE(excluded.internal_date, messages.internal_date)",
+                (tenant, message.id, message.thread_id, message.internal_date, message.internal_date),
+            )
+            self._set_labels_locked(tenant, message.id, message.label_ids)
+
+    def _set_labels_locked(self, tenant: str, message_id: str, label_ids: Sequence[str]) -> None:
+        self._db.execute("DELETE FROM message_labels WHERE tenant = ? AND id = ?", (tenant, message_id))
+        self._db.executemany(
+            "INSERT OR IGNORE INTO message_labels (tenant, label, id) VALUES (?, ?, ?)",
+            [(tenant, label, message_id) for label in label_ids],
+        )
+
+    def _set_info_locked(self, tenant: str, history_id: str, complete: bool) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO mailbox (tenant, history_id, complete, synced_at) VALUES (?, ?, ?, ?)",
+            (tenant, str(history_id), int(complete), time.time()),
+        )
+
+
+def _message_state(message: dict[str, Any]) -> MessageState:
+    internal_date = message.get("internalDate")
+    return MessageState(
+        id=message["id"],
+        thread_id=message.get("threadId"),
+        label_ids=tuple(message.get("labelIds", [])),
+        internal_date=int(internal_date) if internal_date is not None else None,
+    )
+
+
+class _Worker:
+    """Daemon thread running submitted jobs one at a time"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._jobs: queue.Queue[Callable[[], None]] = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, job: Callable[[], None]) -> None:
+        self._jobs.put(job)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            job = self._jobs.get()
+            try:
+                job()
+            except Exception as e:
+                print(f"[MailboxSync] Background job failed: {e}")
+
+
+def _checkout_gmail(tenant: str) -> ContextManager[Any]:
+    from src.tools.services import checkout_tenant_service
+
+    return checkout_tenant_service(tenant, "gmail", "v1")
+
+
+class MailboxSync:
+    """Keeps MailboxStore current from Gmail (full sync, then history; backfill in the background)"""
+
+    def __init__(
+        self,
+        store: MailboxStore,
+        max_messages: int = config.GMAIL_SYNC_MAX_MESSAGES,
+        min_interval: float = config.GMAIL_SYNC_MIN_INTERVAL,
+        batch_size: int = config.GMAIL_BATCH_SIZE,
+        units_per_second: float = config.GMAIL_SYNC_UNITS_PER_SECOND,
+        checkout: Callable[[str], ContextManager[Any]] = _checkout_gmail,
+        submit: Optional[Callable[[Callable[[], None]], None]] = None,
+    ):
+        """
+        Args:
+            store: Local mailbox state
+            max_messages: Messages listed by a full sync (newest first)
+            min_interval: Minimum seconds between history checks of a tenant
+            batch_size: Gets per batch call
+            units_per_second: Gmail quota units per second the backfill may use per tenant
+            checkout: Context manager yielding a Gmail service of a tenant (used by the backfill)
+            submit: Runs a backfill job (default: on a background thread)
+        """
+        self.store = store
+        self.max_messages = max_messages
+        self.min_interval = min_interval
+        self.batch_size = batch_size
+        self.units_per_second = units_per_second
+        self.checkout = checkout
+        self.submit = submit or _Worker("mailbox-backfill").submit
+        self._locks: dict[str, threading.Lock] = {}
+        self._throttles: dict[str, QuotaThrottle] = {}
+        self._backfilling: set[str] = set()
+        self._locks_lock = threading.Lock()
+
+    def _tenant_lock(self, tenant: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(tenant, threading.Lock())
+
+    def _throttle(self, tenant: str) -> QuotaThrottle:
+        with self._locks_lock:
+            throttle = self._throttles.get(tenant)
+            if throttle is None:
+                throttle = QuotaThrottle(self.units_per_second, burst=self.batch_size * GET_UNITS)
+                self._throttles[tenant] = throttle
+            return throttle
+
+    def sync(self, tenant: str, service: Any) -> str:
+        """
+        Bring a tenant's local state up to date
+
+        History is checked; messages still pending afterwards are backfilled in the background.
+
+        Args:
+            tenant: Tenant (mailbox) to sync
+            service: Gmail service of the tenant
+
+        Returns:
+            "full", "incremental" or "fresh" (history checked within min_interval)
+        """
+        with self._tenant_lock(tenant):
+            info = self.store.info(tenant)
+            if info is None:
+                self.full_sync(tenant, service)
+                kind = "full"
+            elif time.time() - info.synced_at < self.min_interval:
+                kind = "fresh"
+            else:
+                try:
+                    self._incremental_sync(tenant, service, info.history_id)
+                    kind = "incremental"
+                except HttpError as e:
+                    if e.resp.status != 404:
+                        raise
+                    print(f"[MailboxSync] historyId {info.history_id} expired, running full sync")
+                    self.full_sync(tenant, service)
+                    kind = "full"
+        if self.store.pending_ids(tenant, 1):
+            self._schedule_backfill(tenant)
+        return kind
+
+    def full_sync(self, tenant: str, service: Any) -> None:
+        """Rebuild a tenant's state from messages.list (ids only; labels and dates are backfilled)"""
+        # Read historyId first: changes made while listing are replayed by the next sync
+        history_id = service.users().getProfile(userId="me", fields="historyId").execute()["historyId"]
+
+        messages = service.users().messages()
+        listed: list[dict[str, Any]] = []
+        page_token = None
+        while len(listed) < self.max_messages:
+            resp = messages.list(
+                userId="me",
+                maxResults=min(500, self.max_messages - len(listed)),
+                pageToken=page_token,
+                fields="messages(id,threadId),nextPageToken",
+            ).execute()
+            listed += resp.get("messages", [])
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+        complete = page_token is None
+
+        pending = [MessageState(m["id"], m.get("threadId")) for m in listed]
+        self.store.replace(tenant, [], history_id, complete, pending=pending)
+        get_label_registry().invalidate(tenant)
+        print(f"[MailboxSync] Full sync listed {len(pending)} messages (complete={complete})")
+
+    def _schedule_backfill(self, tenant: str) -> None:
+        with self._locks_lock:
+            if tenant in self._backfilling:
+                return
+            self._backfilling.add(tenant)
+        self.submit(lambda: self._run_backfill(tenant))
+
+    def _run_backfill(self, tenant: str) -> None:
+        try:
+            with self.checkout(tenant) as service:
+                while self.backfill(tenant, service):
+                    pass
+        except Exception as e:
+            print(f"[MailboxSync] Backfill of {tenant} stopped: {e}")
+        finally:
+            with self._locks_lock:
+                self._backfilling.discard(tenant)
+
+    def backfill(self, tenant: str, service: Any) -> bool:
+        """
+        Fetch labels and dates of one batch of pending messages, paced to the quota
+
+        Returns:
+            Whether to go on (the batch succeeded and more messages are pending)
+        """
+        message_ids = self.store.pending_ids(tenant, self.batch_size)
+        if not message_ids:
+            return False
+        # Waits for quota without holding the tenant lock, so syncs of tool calls go ahead
+        self._throttle(tenant).acquire(len(message_ids) * GET_UNITS)
+        with self._tenant_lock(tenant):
+            states, missing, error = self._fetch_states(service, tenant, message_ids, self.batch_size)
+            self.store.fill(tenant, states, missing)
+        get_label_registry().note_label_ids(tenant, {label for state in states for label in state.label_ids})
+        if error is not None:
+            # Rate limited or failing: what was fetched is kept, the rest waits for the next sync call
+            print(f"[MailboxSync] Backfill paused: {error}")
+            return False
+        return len(message_ids) == self.batch_size
+
+    def _incremental_sync(self, tenant: str, service: Any, start_history_id: str) -> None:
+        upserts: dict[str, MessageState] = {}
+        label_updates: dict[str, tuple[str, ...]] = {}
+        deleted: set[str] = set()
+        label_deltas: dict[str, tuple[set[str], set[str]]] = {}
+
+        history = service.users().history()
+        page_token = None
+        while True:
+            resp = history.list(
+                userId="me",
+                startHistoryId=start_history_id,
+                historyTypes=HISTORY_TYPES,
+                maxResults=500,
+                pageToken=page_token,
+                fields=_HISTORY_FIELDS,
+            ).execute()
+            for record in resp.get("history", []):
+                for added in record.get("messagesAdded", []):
+                    state = _message_state(added["message"])
+                    upserts[state.id] = state
+                    deleted.discard(state.id)
+                    label_updates.pop(state.id, None)
+                for removed in record.get("messagesDeleted", []):
+                    message_id = removed["message"]["id"]
+                    deleted.add(message_id)
+                    upserts.pop(message_id, None)
+                    label_updates.pop(message_id, None)
+                for kind in ("labelsAdded", "labelsRemoved"):
+                    for change in record.get(kind, []):
+                        self._record_label_change(kind, change, upserts, label_updates, label_deltas)
+            page_token = resp.get("nextPageToken")
+            if not page_token:
+                break
+
+        # Label changes reported without the resulting label set are applied to stored labels
+        pending_deltas = [m for m in label_deltas if m not in label_updates and m not in upserts and m not in deleted]
+        stored = self.store.labels_of(tenant, pending_deltas)
+        for message_id in pending_deltas:
+            added, removed = label_deltas[message_id]
+            label_updates[message_id] = tuple(sorted((set(stored.get(message_id, ())) | added) - removed))
+
+        # History does not carry internalDate: added messages are stored pending and backfilled
+        self.store.apply(tenant, upserts.values(), label_updates, deleted, resp["historyId"])
+
+        # A label id the registry lacks means labels were created since it loaded them
+        seen = {label for state in upserts.values() for label in state.label_ids}
+        seen.update(label for label_ids in label_updates.values() for label in label_ids)
+        get_label_registry().note_label_ids(tenant, seen)
+
+    @staticmethod
+    def _record_label_change(
+        kind: str,
+        change: dict[str, Any],
+        upserts: dict[str, MessageState],
+        label_updates: dict[str, tuple[str, ...]],
+        label_deltas: dict[str, tuple[set[str], set[str]]],
+    ) -> None:
+        message = change["message"]
+        message_id = message["id"]
+        if "labelIds" in message:
+            # Message carries its label set after the change
+            label_ids = tuple(message["labelIds"])
+            if message_id in upserts:
+                upserts[message_id].label_ids = label_ids
+            else:
+                label_updates[message_id] = label_ids
+            return
+        added, removed = label_deltas.setdefault(message_id, (set(), set()))
+        changed = set(change.get("labelIds", []))
+        if kind == "labelsAdded":
+            added |= changed
+            removed -= changed
+        else:
+            removed |= changed
+            added -= changed
+        if message_id in upserts:
+            state = upserts[message_id]
+            state.label_ids = tuple(sorted((set(state.label_ids) | added) - removed))
+        elif message_id in label_updates:
+            label_updates[message_id] = tuple(sorted((set(label_updates[message_id]) | added) - removed))
+
+    @staticmethod
+    def _fetch_states(
+        service: Any, tenant: str, message_ids: Sequence[str], batch_size: int
+    ) -> tuple[list[MessageState], list[str], Optional[Exception]]:
+        """
+        Label sets and dates of messages (format=metadata, batched); headers are indexed
+
+        Returns:
+            (states, ids of vanished messages, first other error)
+        """
+        messages = service.users().messages()
+        requests = [
+            messages.get(
+                userId="me", id=message_id, format="metadata", metadataHeaders=_INDEXED_HEADERS, fields=_MESSAGE_FIELDS
+            )
+            for message_id in message_ids
+        ]
+        index = get_search_index()
+        states: list[MessageState] = []
+        missing: list[str] = []
+        failure: Optional[Exception] = None
+        for message_id, (message, error) in zip(message_ids, execute_batch(service, requests, batch_size=batch_size)):
+            if error is None:
+                states.append(_message_state(message))
+                if index:
+                    headers = {h["name"]: h["value"] for h in message.get("payload", {}).get("headers", [])}
+                    index.add(
+                        tenant, message_id, "metadata",
+                        headers.get("From"), headers.get("To"), headers.get("Subject"), message.get("snippet"),
+                    )
+            elif isinstance(error, HttpError) and error.resp.status == 404:
+                missing.append(message_id)
+            elif failure is None:
+                failure = error
+        return states, missing, failure
+
+    def note_labels(self, tenant: str, message_id: str, label_ids: Sequence[str]) -> None:
+        """Record a label change made by this server before history reports it"""
+        self.store.set_labels(tenant, message_id, label_ids)
+
+    def note_label_change(
+        self, tenant: str, message_ids: Sequence[str], add: Sequence[str] = (), remove: Sequence[str] = ()
+    ) -> None:
+        """Record labels added and removed by this server on many messages (batchModify returns no label sets)"""
+        self.store.relabel(tenant, message_ids, add, remove)
+
+    def list_ids(self, tenant: str, label_ids: Sequence[str], limit: int) -> Optional[list[str]]:
+        """
+        Newest message ids carrying all label_ids, from local state
+
+        Returns:
+            Ids, or None if local state may be missing older matches
+        """
+        info = self.store.info(tenant)
+        if info is None or info.pending_new:
+            return None
+        ids = self.store.query(tenant, label_ids, limit)
+        if len(ids) < limit and not info.complete:
+            return None
+        return ids
+
+    def candidates(
+        self,
+        tenant: str,
+        label_ids: Sequence[str] = (),
+        without_labels: Sequence[str] = (),
+        since: Optional[int] = None,
+    ) -> Optional[Candidates]:
+        """
+        Tracked messages matching label and date filters, newest first
+
+        Fetched messages are the newest of the mailbox, so when local state is
+        partial the ids are still the newest matches; only older ones may be
+        missing (none if since reaches no further back than local state).
+
+        Args:
+            since: Oldest internal date (ms since epoch) to include
+
+        Returns:
+            Candidates, or None if local state may be missing new matches
+        """
+        info = self.store.info(tenant)
+        if info is None or info.pending_new:
+            return None
+        complete = info.complete
+        if not complete and since is not None:
+            oldest = self.store.oldest_date(tenant)
+            complete = oldest is not None and oldest <= since
+        return Candidates(self.store.query(tenant, label_ids, without_labels=without_labels, since=since), complete)
+
+
+# Global instance (lazy initialization)
+_sync: Optional[MailboxSync] = None
+_sync_lock = threading.Lock()
+
+
+def get_mailbox_sync() -> Optional[MailboxSync]:
+    """
+    Get or create global mailbox sync engine
+
+    State of evicted tenants is dropped with the tenant.
+
+    Returns:
+        MailboxSync instance, or None if GMAIL_SYNC_ENABLED is false
+    """
+    global _sync
+    if not config.GMAIL_SYNC_ENABLED:
+        return None
+    if _sync is None:
+        with _sync_lock:
+            if _sync is None:
+                from src.auth.tenant import get_tenant_registry
+
+                sync = MailboxSync(MailboxStore())
+                get_tenant_registry().add_evict_listener(lambda state: sync.store.forget(state.tenant_id))
+                _sync = sync
+    return _sync
@@ -0,0 +1,207 @@
+"""
+Persistent Gmail Message Cache
+
+A Gmail message's content never changes for a given id, so parsed message
+content (headers, snippet, extracted text) is kept on disk in SQLite and
+served locally on repeat reads instead of being downloaded again.
+
+- entries are keyed by (tenant, message id, tier); a request for a tier is
+  also served by a richer tier ("full" contains everything "metadata" has)
+- labels are volatile (read/unread, archived, ...) and are never cached
+- the cache is bounded by GMAIL_CACHE_MAX_MB; least recently used entries
+  are evicted first
+- errors are not cached
+
+Enabled with GMAIL_CACHE_ENABLED (default true). The cache holds mail content,
+so GMAIL_CACHE_PATH should point to storage as private as the mailbox itself.
+"""
+
+from __future__ import annotations
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional, Union
+
+from src import config
+
+# Format tiers from least to most complete
+TIERS: tuple[str, ...] = ("metadata", "full")
+
+# Fields that change over a message's life and must be read from Gmail
+VOLATILE_FIELDS = frozenset({"labelIds", "labels"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    tenant TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (tenant, id, tier)
+);
+CREATE INDEX IF NOT EXISTS messages_last_used ON messages (last_used);
+"""
+
+
+class MessageCache:
+    """Thread-safe SQLite cache of parsed Gmail messages with size-based LRU eviction"""
+
+    def __init__(self, path: Union[str, Path] = config.GMAIL_CACHE_PATH, max_bytes: Optional[int] = None):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a process-local cache)
+            max_bytes: Maximum total size of cached entries (default GMAIL_CACHE_MAX_MB)
+        """
+        self.path = str(path)
+        self.max_bytes = max_bytes if max_bytes is not None else config.GMAIL_CACHE_MAX_MB * 1024 * 1024
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def _tiers_serving(tier: str) -> tuple[str, ...]:
+        """Tiers whose entries can answer a request for tier"""
+        return TIERS[TIERS.index(tier):]
+
+    def get(self, tenant: str, message_id: str, tier: str) -> Optional[dict[str, Any]]:
+        """
+        Cached message content
+
+        Args:
+            tenant: Tenant (mailbox) the message belongs to
+            message_id: Gmail message id
+            tier: Requested format tier ("metadata" or "full")
+
+        Returns:
+            Content dict, or None if not cached
+        """
+        return self.get_many(tenant, [message_id], tier).get(message_id)
+
+    def get_many(self, tenant: str, message_ids: Iterable[str], tier: str) -> dict[str, dict[str, Any]]:
+        """Cached content of several messages (missing ids are left out)"""
+        ids = list(dict.fromkeys(message_ids))
+        if not ids:
+            return {}
+        tiers = self._tiers_serving(tier)
+        found: dict[str, dict[str, Any]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT id, tier, data FROM messages WHERE tenant = ? "
+                    f"AND id IN ({','.join('?' * len(chunk))}) "
+                    f"AND tier IN ({','.join('?' * len(tiers))})",
+                    (tenant, *chunk, *tiers),
+                ).fetchall()
+                for message_id, _tier, data in rows:
+                    found.setdefault(message_id, json.loads(data))
+            if found:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE messages SET last_used = ? WHERE tenant = ? AND id = ?",
+                    [(now, tenant, message_id) for message_id in found],
+                )
+            self._hits += len(found)
+            self._misses += len(ids) - len(found)
+        return found
+
+    def put(self, tenant: str, message_id: str, tier: str, content: dict[str, Any]) -> None:
+        """
+        Store message content (volatile fields are dropped)
+
+        Args:
+            tenant: Tenant (mailbox) the message belongs to
+            message_id: Gmail message id
+            tier: Format tier the content was fetched with
+            content: Parsed message content
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown format tier {tier!r}; expected one of {TIERS}")
+        data = json.dumps({k: v for k, v in content.items() if k not in VOLATILE_FIELDS}, ensure_ascii=False)
+        size = len(data.encode("utf-8"))
+        with self._lock:
+            old = self._db.execute(
+                "SELECT size FROM messages WHERE tenant = ? AND id = ? AND tier = ?",
+                (tenant, message_id, tier),
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO messages (tenant, id, tier, data, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (tenant, message_id, tier, data, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """Drop least recently used entries until the cache is 10% under its limit"""
+        target = int(self.max_bytes * 0.9)
+        rows = self._db.execute("SELECT rowid, size FROM messages ORDER BY last_used").fetchall()
+        evict = []
+        for rowid, size in rows:
+            if self._size <= target:
+                break
+            evict.append((rowid,))
+            self._size -= size
+        self._db.executemany("DELETE FROM messages WHERE rowid = ?", evict)
+
+    def invalidate(self, tenant: Optional[str] = None, message_id: Optional[str] = None) -> None:
+        """Drop cached entries of a message, a tenant, or everything"""
+        where, params = [], []
+        if tenant is not None:
+            where.append("tenant = ?")
+            params.append(tenant)
+        if message_id is not None:
+            where.append("id = ?")
+            params.append(message_id)
+        clause = f" WHERE {' AND '.join(where)}" if where else ""
+        with self._lock:
+            self._db.execute(f"DELETE FROM messages{clause}", params)
+            self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM messages").fetchone()[0]
+
+    def stats(self) -> dict[str, int]:
+        """Cache counters"""
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+            return {"entries": entries, "bytes": self._size, "hits": self._hits, "misses": self._misses}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# Global instance (lazy initialization)
+_cache: Optional[MessageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_message_cache() -> Optional[MessageCache]:
+    """
+    Get or create global message cache
+
+    Entries of evicted tenants are dropped with the tenant.
+
+    Returns:
+        MessageCache instance, or None if GMAIL_CACHE_ENABLED is false
+    """
+    global _cache
+    if not config.GMAIL_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                from src.auth.tenant import get_tenant_registry
+
+                cache = MessageCache()
+                get_tenant_registry().add_evict_listener(lambda state: cache.invalidate(tenant=state.tenant_id))
+                _cache = cache
+    return _cache
@@ -0,0 +1,337 @@
+"""
+Bounded Text Extraction from Gmail MIME Payloads
+
+Tools return at most a few thousand characters of a message body, so the
+body is decoded incrementally and extraction stops as soon as the character
+budget is reached: a 5 MB newsletter costs a few chunks of base64 decoding,
+not the whole part.
+
+- multipart/alternative: the best alternative is used (text/plain, else
+  text/html); empty plain parts are skipped
+- other multipart types: text parts are concatenated in order
+- attachments (parts with a filename) are ignored
+- text/html is converted to text by a streaming converter (block elements
+  become line breaks, script/style are dropped, entities are decoded)
+- each part is decoded with the charset of its Content-Type (UTF-8 when
+  missing or unknown)
+
+strip_quotes() removes the quoted history replies carry (the "On ... wrote:"
+block, "> " lines, Outlook's "Original Message" header), which repeats
+earlier messages of a thread.
+"""
+
+from __future__ import annotations
+import base64
+import codecs
+import html
+import re
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+
+# Base64 characters decoded per step (at least; multiple of 4)
+CHUNK_SIZE = 16 * 1024
+
+_CHARSET = re.compile(r'charset\s*=\s*"?([^";\s]+)', re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+# Start of the quoted history of a reply
+_REPLY_HEADER = re.compile(
+    r"^(?:On\s[^\n]{1,200}?(?:\n[^\n]{0,200}?)?\swrote:[ \t]*$"  # Gmail, Apple Mail (may wrap over two lines)
+    r"|-{2,}\s*Original Message\s*-{2,}"  # Outlook
+    r"|From:[^\n]*\n(?:(?:Sent|Date):[^\n]*\n)(?:[^\n]*\n){0,4}?Subject:)",  # Outlook without separator
+    re.MULTILINE,
+)
+_TAG = re.compile(r"""<(/?)([a-zA-Z][a-zA-Z0-9:-]*)((?:[^>"']|"[^"]*"|'[^']*')*)>""")
+_DECLARATION = re.compile(r"<[!?][^>]*>")
+# Start of a tag or declaration cut off by the end of a chunk
+_PARTIAL_TAG = re.compile(r"""<(?:/?(?:[a-zA-Z][a-zA-Z0-9:-]*(?:[^>"']|"[^"]*"|'[^']*')*(?:"[^"]*|'[^']*)?)?|[!?][^>]*)\Z""")
+# Longest tag kept across chunks; a "<" without ">" after this is text
+_MAX_TAG = 64 * 1024
+
+# Elements ending a line, and those separated by a blank line
+_BLOCK_TAGS = frozenset({
+    "address", "article", "aside", "blockquote", "br", "dd", "div", "dl", "dt", "footer", "form",
+    "header", "hr", "li", "main", "nav", "ol", "pre", "section", "table", "td", "th", "tr", "ul",
+})
+_PARAGRAPH_TAGS = frozenset({"p", "h1", "h2", "h3", "h4", "h5", "h6"})
+# Elements whose content is not text
+_SKIP_TAGS = frozenset({"noscript", "script", "style", "template", "title"})
+
+
+def extract_text(payload: dict[str, Any], budget: int = 10000) -> str:
+    """
+    Body text of a Gmail message payload (format="full")
+
+    Args:
+        payload: Message payload (MIME tree with base64url body data)
+        budget: Maximum number of characters returned
+
+    Returns:
+        Text of the message, at most budget characters
+    """
+    return extract_text_bounded(payload, budget)[0]
+
+
+def extract_text_bounded(payload: dict[str, Any], budget: int = 10000) -> tuple[str, bool]:
+    """
+    Body text of a Gmail message payload and whether the budget cut it short
+
+    Returns:
+        (text of at most budget characters, True if body text was left out)
+    """
+    texts: list[str] = []
+    _, cut = _collect(payload, budget, texts)
+    text = "\n\n".join(texts)
+    return text[:budget], cut or len(text) > budget
+
+
+def strip_quotes(text: str) -> str:
+    """
+    Text of a reply without the quoted messages it carries
+
+    Everything from the reply header ("On ... wrote:", "Original Message")
+    on is dropped, as are remaining "> " quoted lines. Text that is nothing
+    but a quote is returned unchanged.
+    """
+    match = _REPLY_HEADER.search(text)
+    stripped = text[:match.start()] if match else text
+    lines = [line for line in stripped.splitlines() if not line.lstrip().startswith(">")]
+    stripped = _BLANK_LINES.sub("\n\n", "\n".join(lines)).strip()
+    return stripped or text
+
+
+def _collect(part: dict[str, Any], budget: int, texts: list[str]) -> tuple[int, bool]:
+    """Append texts of part, return the budget left and whether text was left out"""
+    if part.get("filename"):
+        return budget, False
+    mime = (part.get("mimeType") or "").lower()
+    if mime.startswith("multipart/"):
+        children = part.get("parts") or []
+        if mime == "multipart/alternative":
+            best = _best_alternative(children)
+            children = [best] if best is not None else []
+        cut = False
+        for child in children:
+            budget, child_cut = _collect(child, budget, texts)
+            cut = cut or child_cut
+        return budget, cut
+    if mime in ("text/plain", "text/html") and _has_data(part):
+        if budget <= 0:
+            return budget, True
+        converter = _plain_text if mime == "text/plain" else _html_text
+        text, full = converter(part["body"]["data"], _charset(part), budget)
+        text = text.strip()
+        if text:
+            texts.append(text)
+            budget -= len(text) + 2  # separator
+        return budget, full
+    return budget, False
+
+
+def _has_data(part: dict[str, Any]) -> bool:
+    return bool((part.get("body") or {}).get("data"))
+
+
+def _score(part: dict[str, Any]) -> int:
+    """Preference of an alternative: 2 plain text, 1 HTML, 0 nothing readable"""
+    if part.get("filename"):
+        return 0
+    mime = (part.get("mimeType") or "").lower()
+    if mime.startswith("multipart/"):
+        return max((_score(child) for child in part.get("parts") or []), default=0)
+    if not _has_data(part):
+        return 0
+    return {"text/plain": 2, "text/html": 1}.get(mime, 0)
+
+
+def _best_alternative(parts: list[dict[str, Any]]) -> Optional[dict[str, Any]]:
+    best, best_score = None, 0
+    for part in parts:
+        score = _score(part)
+        if score > best_score:
+            best, best_score = part, score
+    return best
+
+
+def _charset(part: dict[str, Any]) -> str:
+    for header in part.get("headers") or []:
+        if header.get("name", "").lower() == "content-type":
+            match = _CHARSET.search(header.get("value", ""))
+            if match:
+                try:
+                    return codecs.lookup(match.group(1)).name
+                except LookupError:
+                    break
+    return "utf-8"
+
+
+def _decoded_chunks(data: str, first_chunk: int) -> Iterator[bytes]:
+    """base64url data decoded a chunk at a time (growing chunks)"""
+    size = max(4, first_chunk - first_chunk % 4)
+    start = 0
+    while start < len(data):
+        piece = data[start:start + size]
+        start += size
+        if start >= len(data):
+            piece += "=" * (-len(piece) % 4)
+        yield base64.urlsafe_b64decode(piece)
+        size = min(size * 2, 1024 * 1024)
+
+
+def _plain_text(data: str, charset: str, budget: int) -> tuple[str, bool]:
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    texts: list[str] = []
+    length = 0
+    # Enough base64 for budget ASCII characters; more chunks follow if needed
+    for raw in _decoded_chunks(data, max(CHUNK_SIZE, budget * 4 // 3 + 4)):
+        text = decoder.decode(raw)
+        texts.append(text)
+        length += len(text)
+        if length >= budget:
+            break
+    else:
+        texts.append(decoder.decode(b"", final=True))
+    text = "".join(texts)
+    # A body filling the budget exactly counts as cut
+    return text[:budget], len(text) >= budget
+
+
+def _html_text(data: str, charset: str, budget: int) -> tuple[str, bool]:
+    decoder = codecs.getincrementaldecoder(charset)(errors="replace")
+    converter = HTMLText(budget)
+    for raw in _decoded_chunks(data, CHUNK_SIZE):
+        converter.feed(decoder.decode(raw))
+        if converter.full:
+            break
+    else:
+        converter.feed(decoder.decode(b"", final=True))
+    converter.close()
+    return converter.text(), converter.full
+
+
+class HTMLText:
+    """
+    Streaming HTML to text converter that stops collecting at a character budget
+
+    A regex tokenizer rather than html.parser: it only needs tag names and
+    text, and runs several times faster on markup-heavy mail.
+    """
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self._texts: list[str] = []
+        self._length = 0
+        self._pre = 0
+        self._newlines = 2  # At start of text: no leading line breaks
+        self._rest = ""  # Unconsumed tail of the last chunk (incomplete tag or entity)
+        self._skip_until: Optional[re.Pattern] = None  # End tag of the script/style being skipped
+
+    @property
+    def full(self) -> bool:
+        return self._length >= self.budget
+
+    def feed(self, data: str) -> None:
+        self._rest = self._consume(self._rest + data, final=False)
+
+    def close(self) -> None:
+        self._consume(self._rest, final=True)
+        self._rest = ""
+
+    def _consume(self, buf: str, final: bool) -> str:
+        """Convert buf, return the tail to keep for the next chunk"""
+        pos, end = 0, len(buf)
+        while pos < end and not self.full:
+            if self._skip_until is not None:
+                match = self._skip_until.search(buf, pos)
+                if match is None:
+                    return "" if final else buf[max(pos, end - 32):]
+                pos = match.end()
+                self._skip_until = None
+                continue
+
+            lt = buf.find("<", pos)
+            text_end = end if lt < 0 else lt
+            if text_end > pos:
+                text = buf[pos:text_end]
+                if lt < 0 and not final:
+                    # Keep an entity cut by the chunk boundary for the next chunk
+                    amp = text.rfind("&")
+                    if amp >= 0 and ";" not in text[amp:] and len(text) - amp < 32:
+                        self._data(text[:amp])
+                        return text[amp:]
+                self._data(text)
+            if lt < 0:
+                return ""
+
+            if buf.startswith("<!--", lt):
+                close = buf.find("-->", lt + 4)
+                if close < 0:
+                    return "" if final else buf[lt:]
+                pos = close + 3
+                continue
+            match = _TAG.match(buf, lt)
+            if match is None:
+                if not final and end - lt < _MAX_TAG and _PARTIAL_TAG.match(buf, lt):
+                    return buf[lt:]
+                declaration = _DECLARATION.match(buf, lt)
+                if declaration is None:
+                    self._data("<")  # A literal "<" in text
+                    pos = lt + 1
+                else:
+                    pos = declaration.end()
+                continue
+            pos = match.end()
+            self._tag(match.group(2).lower(), bool(match.group(1)), match.group(3).rstrip().endswith("/"))
+        return ""
+
+    def _tag(self, tag: str, closing: bool, self_closing: bool) -> None:
+        if tag in _SKIP_TAGS:
+            if not closing and not self_closing:
+                self._skip_until = _end_tag(tag)
+        elif tag in _PARAGRAPH_TAGS:
+            self._break(2)
+        elif tag in _BLOCK_TAGS:
+            self._break(1)
+            if tag == "li" and not closing:
+                self._append("- ")
+            elif tag == "pre" and not self_closing:
+                self._pre = max(0, self._pre + (-1 if closing else 1))
+
+    def _data(self, data: str) -> None:
+        if self.full or not data:
+            return
+        if "&" in data:
+            data = html.unescape(data)
+        if not self._pre:
+            data = _WHITESPACE.sub(" ", data)
+            if self._newlines:
+                data = data.lstrip(" ")
+        if data:
+            self._append(data)
+
+    def _append(self, text: str) -> None:
+        if self.full:
+            return
+        self._texts.append(text)
+        self._length += len(text)
+        self._newlines = 0
+
+    def _break(self, count: int) -> None:
+        if self.full:
+            return
+        if self._texts and self._texts[-1].endswith(" "):
+            self._texts[-1] = self._texts[-1].rstrip(" ")
+        missing = count - self._newlines
+        if missing > 0:
+            self._texts.append("\n" * missing)
+            self._length += missing
+            self._newlines = count
+
+    def text(self) -> str:
+        """Converted text (at most budget characters)"""
+        return _BLANK_LINES.sub("\n\n", "".join(self._texts)).strip()[:self.budget]
+
+
+@lru_cache(maxsize=None)
+def _end_tag(tag: str) -> re.Pattern:
+    return re.compile(rf"</{tag}\s*>", re.IGNORECASE)
@@ -0,0 +1,238 @@
+"""
+Streaming MIME Messages and Resumable Gmail Upload
+
+Outgoing mail with attachments used to be built fully in memory
+(read_bytes() of every file, as_bytes() of the message, base64 of that into
+a JSON "raw" field): about 3x the attachment size at peak, and capped by
+the 5 MB simple-upload limit.
+
+StreamedMessage serializes only the message skeleton (headers, text body,
+MIME boundaries) up front; attachment bodies are base64-encoded from disk on
+demand for any byte range, so the message can be read chunk by chunk from
+any offset. upload_message() sends it:
+
+- messages up to GMAIL_UPLOAD_SIMPLE_MAX_KB go in one messages.send call
+  with a "raw" body (one request)
+- larger messages use Gmail's resumable media upload in chunks of
+  GMAIL_UPLOAD_CHUNK_MB; a failed chunk is retried from the offset Gmail
+  confirmed, so memory stays around one chunk whatever the attachment size
+"""
+
+from __future__ import annotations
+import base64
+import bisect
+import mimetypes
+import os
+import time
+import uuid
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Sequence, Union
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaUpload
+from httplib2 import HttpLib2Error
+
+from src import config
+
+# MIME base64 lines: 57 input bytes -> 76 characters, "\n" between lines
+_LINE_INPUT = 57
+_LINE_OUTPUT = 76
+_LINE_STRIDE = _LINE_OUTPUT + 1
+
+# Statuses worth resuming after (everything else is the request's fault)
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class _Base64File:
+    """Attachment body: base64 of a file, in 76-character lines, produced on demand"""
+
+    def __init__(self, path: Path):
+        self.file: BinaryIO = open(path, "rb")
+        self.input_size = os.fstat(self.file.fileno()).st_size
+        lines = -(-self.input_size // _LINE_INPUT)
+        self.size = 4 * -(-self.input_size // 3) + max(lines - 1, 0)
+
+    def read(self, offset: int, length: int) -> bytes:
+        first = offset // _LINE_STRIDE
+        # A range ending on a line break needs the next line for the "\n"
+        last = (offset + length) // _LINE_STRIDE
+        self.file.seek(first * _LINE_INPUT)
+        raw = self.file.read((last - first + 1) * _LINE_INPUT)
+        expected = min((last - first + 1) * _LINE_INPUT, self.input_size - first * _LINE_INPUT)
+        if len(raw) != expected:
+            raise OSError(f"Attachment {self.file.name} changed while sending")
+        encoded = b"\n".join(
+            base64.b64encode(raw[start:start + _LINE_INPUT]) for start in range(0, len(raw), _LINE_INPUT)
+        )
+        start = offset - first * _LINE_STRIDE
+        return encoded[start:start + length]
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class StreamedMessage:
+    """RFC 822 message whose attachment bodies are read from disk on demand"""
+
+    def __init__(self, message: EmailMessage, attachments: Sequence[Union[str, Path]] = ()):
+        """
+        Args:
+            message: Message with headers and text body (no attachments)
+            attachments: Files attached to the message
+
+        Raises:
+            FileNotFoundError: If an attachment is not a readable file
+        """
+        files: list[_Base64File] = []
+        markers: list[bytes] = []
+        try:
+            for attachment in attachments:
+                path = Path(attachment).expanduser()
+                if not path.is_file():
+                    raise FileNotFoundError(f"Attachment not found: {path}")
+                files.append(_Base64File(path))
+                markers.append(self._attach_placeholder(message, path))
+        except BaseException:
+            for file in files:
+                file.close()
+            raise
+
+        # Skeleton bytes with each attachment body replaced by its file
+        skeleton = message.as_bytes()
+        self._segments: list[Union[bytes, _Base64File]] = []
+        for marker, file in zip(markers, files):
+            before, skeleton = skeleton.split(marker, 1)
+            self._segments += [before, file]
+        self._segments.append(skeleton)
+
+        self._starts: list[int] = []
+        self.size = 0
+        for segment in self._segments:
+            self._starts.append(self.size)
+            self.size += len(segment) if isinstance(segment, bytes) else segment.size
+
+    @staticmethod
+    def _attach_placeholder(message: EmailMessage, path: Path) -> bytes:
+        mime_type, _ = mimetypes.guess_type(str(path))
+        marker = f"attachment-{uuid.uuid4().hex}"
+        part = EmailMessage()
+        part["Content-Type"] = mime_type or "application/octet-stream"
+        part["Content-Transfer-Encoding"] = "base64"
+        part.add_header("Content-Disposition", "attachment", filename=path.name)
+        part.set_payload(marker)
+        if not message.is_multipart():
+            message.make_mixed()
+        message.attach(part)
+        return marker.encode("ascii")
+
+    def read(self, offset: int, length: int) -> bytes:
+        """Bytes [offset, offset + length) of the serialized message"""
+        end = min(offset + length, self.size)
+        chunks = []
+        index = bisect.bisect_right(self._starts, offset) - 1
+        while offset < end:
+            segment, start = self._segments[index], self._starts[index]
+            count = min(end, start + (len(segment) if isinstance(segment, bytes) else segment.size)) - offset
+            if count > 0:
+                if isinstance(segment, bytes):
+                    chunks.append(segment[offset - start:offset - start + count])
+                else:
+                    chunks.append(segment.read(offset - start, count))
+                offset += count
+            index += 1
+        return b"".join(chunks)
+
+    def close(self) -> None:
+        for segment in self._segments:
+            if not isinstance(segment, bytes):
+                segment.close()
+
+    def __enter__(self) -> "StreamedMessage":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class MessageUpload(MediaUpload):
+    """Resumable media upload of a StreamedMessage (read a chunk at a time)"""
+
+    def __init__(self, message: StreamedMessage, chunksize: int):
+        super().__init__()
+        self._message = message
+        self._chunksize = chunksize
+
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def mimetype(self) -> str:
+        return "message/rfc822"
+
+    def size(self) -> int:
+        return self._message.size
+
+    def resumable(self) -> bool:
+        return True
+
+    def getbytes(self, begin: int, length: int) -> bytes:
+        return self._message.read(begin, length)
+
+    def has_stream(self) -> bool:
+        return False
+
+
+def upload_message(
+    service: Any,
+    message: StreamedMessage,
+    metadata: Optional[dict[str, Any]] = None,
+    fields: Optional[str] = None,
+    chunk_size: int = config.GMAIL_UPLOAD_CHUNK_MB * 1024 * 1024,
+    simple_max: int = config.GMAIL_UPLOAD_SIMPLE_MAX_KB * 1024,
+    retries: int = config.GMAIL_UPLOAD_RETRIES,
+    backoff: float = 1.0,
+) -> dict[str, Any]:
+    """
+    Send a message through users.messages.send
+
+    Args:
+        service: Gmail service
+        message: Message to send
+        metadata: Message resource fields besides the content (e.g. threadId)
+        fields: Partial-response mask of the sent message
+        chunk_size: Bytes per resumable upload request (multiple of 256 KiB)
+        simple_max: Largest message sent in a single request
+        retries: Attempts to resume after a failed chunk
+        backoff: Seconds before the first resume (doubles each time)
+
+    Returns:
+        Sent message resource
+    """
+    messages = service.users().messages()
+    if message.size <= simple_max:
+        raw = base64.urlsafe_b64encode(message.read(0, message.size)).decode("ascii")
+        return messages.send(userId="me", body={**(metadata or {}), "raw": raw}, fields=fields).execute()
+
+    request = messages.send(
+        userId="me",
+        body=metadata or None,
+        media_body=MessageUpload(message, chunk_size),
+        fields=fields,
+    )
+    response = None
+    failures = 0
+    while response is None:
+        try:
+            # num_retries repeats a chunk answered with 429/5xx
+            _, response = request.next_chunk(num_retries=retries)
+            failures = 0
+        except (HttpError, HttpLib2Error, OSError) as e:
+            if isinstance(e, HttpError) and e.resp.status not in RETRYABLE_STATUS:
+                raise
+            failures += 1
+            if failures > retries:
+                raise
+            # The next call asks Gmail for the confirmed offset and resumes there
+            print(f"[upload_message] Upload interrupted at {request.resumable_progress} bytes, resuming: {e}")
+            time.sleep(backoff * 2 ** (failures - 1))
+    return response
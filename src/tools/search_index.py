@@ -0,0 +1,297 @@
+"""
+Local Full-Text Search Index over Gmail Messages
+
+Messages read through the tools (summaries and full reads) and the headers
+fetched by the mailbox sync backfill are indexed in an SQLite FTS5 table, so
+repetitive lookups such as "from:alice subject:invoice" are answered locally
+in milliseconds instead of by a Gmail search.
+
+- documents are keyed by (tenant, message id) and carry the format tier they
+  were indexed from: "metadata" (From, To, Subject, snippet) or "full"
+  (adds the body text and whether the message has attachments)
+- bodies longer than the text the tools return are indexed in part and
+  marked truncated: a body word missing from them proves nothing
+- parse_query() understands a subset of Gmail query syntax; queries outside
+  it return None and are sent to Gmail instead
+- labels and dates are not indexed: they come from the mailbox sync state
+  (see mailbox_sync.py)
+
+Enabled with GMAIL_SEARCH_ENABLED (default true). The index holds mail
+content, so GMAIL_SEARCH_PATH should point to storage as private as the
+mailbox itself.
+"""
+
+from __future__ import annotations
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from src import config
+
+# Format tiers from least to most complete (same as the message cache)
+TIERS: tuple[str, ...] = ("metadata", "full")
+
+# Gmail operators answered from the index, by indexed column
+_COLUMNS = {"from": "sender", "to": "recipients", "subject": "subject"}
+
+# is: operators answered from sync state, as (label, present)
+_IS_LABELS = {
+    "unread": ("UNREAD", True),
+    "read": ("UNREAD", False),
+    "starred": ("STARRED", True),
+    "important": ("IMPORTANT", True),
+}
+
+_NEWER_THAN_UNITS = {"d": 86400, "m": 30 * 86400, "y": 365 * 86400}
+
+_TOKEN = re.compile(r'(\w+):("[^"]*"|\S+)|"([^"]*)"|(\S+)')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    docid INTEGER PRIMARY KEY,
+    tenant TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tier TEXT NOT NULL,
+    has_attachment INTEGER,
+    truncated INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (tenant, id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    sender, recipients, subject, body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+@dataclass
+class LocalQuery:
+    """Gmail query reduced to what the index and sync state can answer"""
+    terms: list[tuple[Optional[str], str]] = field(default_factory=list)  # (column or None for any, phrase)
+    with_labels: list[str] = field(default_factory=list)
+    without_labels: list[str] = field(default_factory=list)
+    newer_than: Optional[int] = None  # seconds
+    has_attachment: bool = False
+
+    @property
+    def tier(self) -> Optional[str]:
+        """Least index tier needed to answer the query (None: no index needed)"""
+        if self.has_attachment or any(column is None for column, _ in self.terms):
+            return "full"
+        return "metadata" if self.terms else None
+
+    @property
+    def body_terms(self) -> bool:
+        """Whether some term may match in the body"""
+        return any(column is None for column, _ in self.terms)
+
+    def fts_expression(self) -> Optional[str]:
+        """FTS5 MATCH expression of the text terms"""
+        parts = []
+        for column, phrase in self.terms:
+            quoted = '"' + phrase.replace('"', '""') + '"'
+            parts.append(f"{column} : {quoted}" if column else quoted)
+        return " AND ".join(parts) or None
+
+
+def parse_query(text: str) -> Optional[LocalQuery]:
+    """
+    Parse a Gmail search query
+
+    Supports from:, to:, subject:, is:unread/read/starred/important,
+    newer_than:<n>d|m|y, has:attachment and bare words or "quoted phrases"
+    (all combined with AND).
+
+    Returns:
+        LocalQuery, or None if the query uses anything else
+    """
+    query = LocalQuery()
+    for match in _TOKEN.finditer(text):
+        operator, value, phrase, word = match.groups()
+        if operator is not None:
+            operator = operator.lower()
+            value = value.strip('"')
+            if operator in _COLUMNS:
+                if not _searchable(value):
+                    return None
+                query.terms.append((_COLUMNS[operator], value))
+            elif operator == "is" and value.lower() in _IS_LABELS:
+                label, present = _IS_LABELS[value.lower()]
+                (query.with_labels if present else query.without_labels).append(label)
+            elif operator == "has" and value.lower() == "attachment":
+                query.has_attachment = True
+            elif operator == "newer_than" and re.fullmatch(r"\d+[dmy]", value.lower()):
+                seconds = int(value[:-1]) * _NEWER_THAN_UNITS[value[-1].lower()]
+                query.newer_than = seconds if query.newer_than is None else min(query.newer_than, seconds)
+            else:
+                return None
+        elif phrase is not None:
+            if not _searchable(phrase):
+                return None
+            query.terms.append((None, phrase))
+        else:
+            # Boolean operators, negation, grouping and wildcards are left to Gmail
+            if word in ("OR", "AND", "AROUND") or word[0] in "-({}+" or not _searchable(word):
+                return None
+            query.terms.append((None, word))
+    return query
+
+
+def _searchable(text: str) -> bool:
+    return any(ch.isalnum() for ch in text)
+
+
+class SearchIndex:
+    """Thread-safe SQLite FTS5 index of message text per tenant"""
+
+    def __init__(self, path: Union[str, Path] = config.GMAIL_SEARCH_PATH):
+        """
+        Args:
+            path: SQLite database file (":memory:" for a process-local index)
+        """
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def add(
+        self,
+        tenant: str,
+        message_id: str,
+        tier: str,
+        sender: Optional[str],
+        recipients: Optional[str],
+        subject: Optional[str],
+        body: Optional[str],
+        has_attachment: Optional[bool] = None,
+        truncated: bool = False,
+    ) -> None:
+        """
+        Index a message (an existing "full" document is never replaced by "metadata")
+
+        Args:
+            tenant: Tenant (mailbox) the message belongs to
+            message_id: Gmail message id
+            tier: Format tier the fields come from
+            sender, recipients, subject: Header values
+            body: Body text ("full") or snippet ("metadata")
+            has_attachment: Whether the message has attachments (None if unknown)
+            truncated: Whether body is only the start of the body text
+        """
+        if tier not in TIERS:
+            raise ValueError(f"Unknown format tier {tier!r}; expected one of {TIERS}")
+        values = (sender or "", recipients or "", subject or "", body or "")
+        with self._lock:
+            row = self._db.execute(
+                "SELECT docid, tier FROM documents WHERE tenant = ? AND id = ?", (tenant, message_id)
+            ).fetchone()
+            if row and TIERS.index(row[1]) > TIERS.index(tier):
+                return
+            self._db.execute("BEGIN")
+            try:
+                if row:
+                    docid = row[0]
+                    self._db.execute(
+                        "UPDATE documents SET tier = ?, has_attachment = ?, truncated = ? WHERE docid = ?",
+                        (tier, has_attachment, int(truncated), docid),
+                    )
+                    self._db.execute("DELETE FROM documents_fts WHERE rowid = ?", (docid,))
+                else:
+                    docid = self._db.execute(
+                        "INSERT INTO documents (tenant, id, tier, has_attachment, truncated) VALUES (?, ?, ?, ?, ?)",
+                        (tenant, message_id, tier, has_attachment, int(truncated)),
+                    ).lastrowid
+                self._db.execute(
+                    "INSERT INTO documents_fts (rowid, sender, recipients, subject, body) VALUES (?, ?, ?, ?, ?)",
+                    (docid, *values),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def tiers(self, tenant: str, message_ids: Iterable[str]) -> dict[str, str]:
+        """Tier each indexed message was indexed from (unindexed ids are left out)"""
+        return {message_id: tier for message_id, (tier, _) in self._documents(tenant, message_ids).items()}
+
+    def truncated(self, tenant: str, message_ids: Iterable[str]) -> set[str]:
+        """Ids of indexed messages whose body was indexed in part"""
+        return {message_id for message_id, (_, truncated) in self._documents(tenant, message_ids).items() if truncated}
+
+    def _documents(self, tenant: str, message_ids: Iterable[str]) -> dict[str, tuple[str, bool]]:
+        ids = list(message_ids)
+        found: dict[str, tuple[str, bool]] = {}
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT id, tier, truncated FROM documents WHERE tenant = ? AND id IN ({','.join('?' * len(chunk))})",
+                    (tenant, *chunk),
+                ).fetchall()
+                found.update((message_id, (tier, bool(truncated))) for message_id, tier, truncated in rows)
+        return found
+
+    def match(self, tenant: str, query: LocalQuery) -> set[str]:
+        """Ids of indexed messages matching the query's text terms and has:attachment"""
+        expression = query.fts_expression()
+        sql = "SELECT id FROM documents WHERE tenant = ?"
+        params: list = [tenant]
+        if expression:
+            # Subquery so FTS5 runs the match once instead of once per document
+            sql += " AND docid IN (SELECT rowid FROM documents_fts WHERE documents_fts MATCH ?)"
+            params.append(expression)
+        if query.has_attachment:
+            sql += " AND has_attachment = 1"
+        with self._lock:
+            return {row[0] for row in self._db.execute(sql, params).fetchall()}
+
+    def forget(self, tenant: str) -> None:
+        """Drop a tenant's documents"""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM documents_fts WHERE rowid IN (SELECT docid FROM documents WHERE tenant = ?)", (tenant,)
+            )
+            self._db.execute("DELETE FROM documents WHERE tenant = ?", (tenant,))
+
+    def stats(self) -> dict[str, int]:
+        """Index counters"""
+        with self._lock:
+            return {"documents": self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# Global instance (lazy initialization)
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_search_index() -> Optional[SearchIndex]:
+    """
+    Get or create global search index
+
+    Documents of evicted tenants are dropped with the tenant.
+
+    Returns:
+        SearchIndex instance, or None if GMAIL_SEARCH_ENABLED is false
+    """
+    global _index
+    if not config.GMAIL_SEARCH_ENABLED:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                from src.auth.tenant import get_tenant_registry
+
+                index = SearchIndex()
+                get_tenant_registry().add_evict_listener(lambda state: index.forget(state.tenant_id))
+                _index = index
+    return _index
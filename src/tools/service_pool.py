@@ -0,0 +1,301 @@
+"""
+Thread-safe Google API Service Pool
+
+A googleapiclient service sits on an httplib2.Http, which is not
+thread-safe, so a service must not be shared by concurrent tool calls.
+Instead of building a new service (and TLS session) per call, services are
+pooled:
+
+- checkout() hands out an idle service for the key, or builds one
+- checkin() returns it for reuse by the next call
+- services are keyed by (tenant, api, version) and the credentials they were
+  built with; when a tenant's credentials change, services built for the old
+  ones are closed instead of reused
+- each key holds at most max_per_key services and the pool at most
+  max_total; when exhausted, checkout() waits for a checkin
+- services idle longer than idle_timeout are closed
+
+Usage:
+    with get_service_pool().lease(key, creds, factory) as service:
+        service.users().messages().list(userId="me").execute()
+"""
+
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+import httplib2
+
+from src import config
+
+# (tenant, api, version)
+PoolKey = tuple[str, str, str]
+
+
+@dataclass
+class _Bucket:
+    """Services of one key"""
+    credentials: Any = None
+    idle: list["_Pooled"] = field(default_factory=list)
+    in_use: int = 0
+
+
+@dataclass
+class _Pooled:
+    """A pooled service and what it was built for"""
+    service: Any
+    key: PoolKey
+    credentials: Any
+    bucket: _Bucket
+    idle_since: float = 0.0
+
+
+class ServicePool:
+    """Check out / check in pool of Google API services"""
+
+    def __init__(
+        self,
+        max_per_key: int = config.SERVICE_POOL_MAX_PER_KEY,
+        max_total: int = config.SERVICE_POOL_MAX_TOTAL,
+        idle_timeout: float = config.SERVICE_POOL_IDLE_TIMEOUT,
+        checkout_timeout: float = config.SERVICE_POOL_CHECKOUT_TIMEOUT,
+    ):
+        """
+        Args:
+            max_per_key: Maximum services per (tenant, api, version)
+            max_total: Maximum services in the pool (idle + checked out)
+            idle_timeout: Seconds after which idle services are closed
+            checkout_timeout: Seconds checkout() waits when the pool is exhausted
+        """
+        self.max_per_key = max(max_per_key, 1)
+        self.max_total = max(max_total, 1)
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._buckets: dict[PoolKey, _Bucket] = {}
+        self._leased: dict[int, _Pooled] = {}
+        self._total = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._created = 0
+        self._reused = 0
+        self._evicted = 0
+
+    def checkout(self, key: PoolKey, credentials: Any, factory: Callable[[Any], Any]) -> Any:
+        """
+        Take a service for key, building one with factory(credentials) if none is idle
+
+        Args:
+            key: (tenant, api, version)
+            credentials: Credentials the service must use
+            factory: Builds a new service from credentials
+
+        Returns:
+            Service, to be returned with checkin()
+
+        Raises:
+            TimeoutError: If no service became available within checkout_timeout
+        """
+        deadline = time.monotonic() + self.checkout_timeout
+        to_close: list[_Pooled] = []
+        pooled: Optional[_Pooled] = None
+        try:
+            with self._cond:
+                while True:
+                    to_close += self._expire_idle_locked(time.time())
+                    bucket = self._buckets.setdefault(key, _Bucket())
+                    if bucket.credentials is not credentials:
+                        # Credentials changed: services built for the old ones are stale
+                        bucket.credentials = credentials
+                        to_close += self._drop_idle_locked(bucket)
+                    if bucket.idle:
+                        pooled = bucket.idle.pop()
+                        bucket.in_use += 1
+                        self._reused += 1
+                        break
+                    if bucket.in_use < self.max_per_key:
+                        if self._total >= self.max_total:
+                            victim = self._pop_lru_idle_locked()
+                            if victim is not None:
+                                to_close.append(victim)
+                        if self._total < self.max_total:
+                            bucket.in_use += 1
+                            self._total += 1
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No Google API service available for {key[1]} {key[2]} within {self.checkout_timeout}s")
+                    self._cond.wait(remaining)
+        finally:
+            self._close_all(to_close)
+
+        if pooled is None:
+            try:
+                service = factory(credentials)
+            except BaseException:
+                with self._cond:
+                    bucket.in_use -= 1
+                    self._total -= 1
+                    self._cond.notify()
+                raise
+            pooled = _Pooled(service, key, credentials, bucket)
+            with self._cond:
+                self._created += 1
+
+        with self._cond:
+            self._leased[id(pooled.service)] = pooled
+        return pooled.service
+
+    def checkin(self, service: Any, discard: bool = False) -> None:
+        """
+        Return a checked out service to the pool
+
+        Args:
+            service: Service obtained from checkout()
+            discard: Close the service instead of keeping it (e.g. after a transport error)
+        """
+        with self._cond:
+            pooled = self._leased.pop(id(service), None)
+            if pooled is None:
+                return
+            bucket = pooled.bucket
+            bucket.in_use -= 1
+            keep = (
+                not discard
+                and not self._closed
+                and self._buckets.get(pooled.key) is bucket
+                and bucket.credentials is pooled.credentials
+            )
+            if keep:
+                pooled.idle_since = time.time()
+                bucket.idle.append(pooled)
+            else:
+                self._total -= 1
+            self._cond.notify()
+        if not keep:
+            self._close_all([pooled])
+
+    @contextmanager
+    def lease(self, key: PoolKey, credentials: Any, factory: Callable[[Any], Any]) -> Iterator[Any]:
+        """Context manager around checkout() / checkin()"""
+        service = self.checkout(key, credentials, factory)
+        discard = False
+        try:
+            yield service
+        except (OSError, httplib2.HttpLib2Error):
+            # Connection state is unknown after a transport failure
+            discard = True
+            raise
+        finally:
+            self.checkin(service, discard=discard)
+
+    def evict_idle(self) -> int:
+        """Close services idle for longer than idle_timeout; returns how many were closed"""
+        with self._cond:
+            expired = self._expire_idle_locked(time.time())
+        self._close_all(expired)
+        return len(expired)
+
+    def invalidate(self, tenant: Optional[str] = None) -> None:
+        """
+        Close services of a tenant (or all services)
+
+        Checked out services are closed when they are checked in.
+        """
+        with self._cond:
+            keys = [k for k in self._buckets if tenant is None or k[0] == tenant]
+            dropped: list[_Pooled] = []
+            for key in keys:
+                dropped += self._drop_idle_locked(self._buckets.pop(key))
+            self._cond.notify_all()
+        self._close_all(dropped)
+
+    def close(self) -> None:
+        """Close all idle services; checked out ones are closed on checkin"""
+        with self._cond:
+            self._closed = True
+        self.invalidate()
+
+    def stats(self) -> dict[str, int]:
+        """Pool counters"""
+        with self._cond:
+            idle = sum(len(b.idle) for b in self._buckets.values())
+            return {
+                "idle": idle,
+                "in_use": len(self._leased),
+                "created": self._created,
+                "reused": self._reused,
+                "evicted": self._evicted,
+            }
+
+    def _drop_idle_locked(self, bucket: _Bucket) -> list[_Pooled]:
+        dropped, bucket.idle = bucket.idle, []
+        self._total -= len(dropped)
+        return dropped
+
+    def _expire_idle_locked(self, now: float) -> list[_Pooled]:
+        expired: list[_Pooled] = []
+        for key, bucket in list(self._buckets.items()):
+            if bucket.idle:
+                keep = [p for p in bucket.idle if now - p.idle_since < self.idle_timeout]
+                expired += [p for p in bucket.idle if now - p.idle_since >= self.idle_timeout]
+                bucket.idle = keep
+            if not bucket.idle and not bucket.in_use:
+                del self._buckets[key]
+        self._total -= len(expired)
+        self._evicted += len(expired)
+        return expired
+
+    def _pop_lru_idle_locked(self) -> Optional[_Pooled]:
+        """Remove the least recently used idle service of any key"""
+        victim: Optional[_Pooled] = None
+        for bucket in self._buckets.values():
+            if bucket.idle and (victim is None or bucket.idle[0].idle_since < victim.idle_since):
+                victim = bucket.idle[0]
+        if victim is not None:
+            victim.bucket.idle.remove(victim)
+            self._total -= 1
+            self._evicted += 1
+        return victim
+
+    @staticmethod
+    def _close_all(pooled: list[_Pooled]) -> None:
+        for p in pooled:
+            try:
+                p.service.close()
+            except Exception as e:
+                print(f"[ServicePool] Failed to close {p.key[1]} service: {e}")
+
+
+# Global instance (lazy initialization)
+_pool: Optional[ServicePool] = None
+_pool_lock = threading.Lock()
+
+
+def get_service_pool() -> ServicePool:
+    """
+    Get or create global service pool
+
+    Services of evicted tenants are closed with the tenant.
+
+    Returns:
+        ServicePool instance
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from src.auth.tenant import get_tenant_registry
+
+                pool = ServicePool()
+                get_tenant_registry().add_evict_listener(lambda state: pool.invalidate(state.tenant_id))
+                _pool = pool
+    return _pool
+
+
+def close_service_pool() -> None:
+    """Close the global service pool (if created)"""
+    if _pool is not None:
+        _pool.close()
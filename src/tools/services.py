@@ -0,0 +1,69 @@
+"""
+Google API service construction for MCP tools
+
+Services are built for the tenant of the current MCP request and kept in the
+service pool (see service_pool.py), so tool calls reuse a warm service (and
+its keep-alive connection to googleapis.com) until the tenant's credentials
+change, the service sits idle too long or the tenant is evicted. A service is
+checked out by one call at a time, so concurrent calls never share an
+httplib2.Http. Services are built offline from the bundled discovery
+documents (see discovery.py).
+"""
+
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from ..auth.google_auth import DEFAULT_TENANT, get_authorized_http, get_google_creds
+from ..auth.tenant import resolve_tenant
+from .discovery import get_discovery_registry
+from .service_pool import get_service_pool
+
+
+def current_tenant() -> str:
+    """Tenant id of the current MCP request (DEFAULT_TENANT in single-tenant mode)"""
+    identity = resolve_tenant()
+    return identity.tenant_id if identity else DEFAULT_TENANT
+
+
+@contextmanager
+def checkout_service(api: str, version: str) -> Iterator[Any]:
+    """
+    Check out a Google API service for the current tenant
+
+    Args:
+        api: API name, e.g. "gmail"
+        version: API version, e.g. "v1"
+
+    Yields:
+        googleapiclient Resource, returned to the pool on exit
+    """
+    identity = resolve_tenant()
+    tenant = identity.tenant_id if identity else None
+    with _checkout(tenant, api, version, identity.access_token if identity else None) as service:
+        yield service
+
+
+@contextmanager
+def checkout_tenant_service(tenant: str, api: str, version: str) -> Iterator[Any]:
+    """
+    Check out a Google API service for a known tenant outside an MCP request (background work)
+
+    Raises:
+        ValueError: If the tenant is no longer registered (e.g. evicted)
+    """
+    with _checkout(None if tenant == DEFAULT_TENANT else tenant, api, version, None) as service:
+        yield service
+
+
+@contextmanager
+def _checkout(tenant: Optional[str], api: str, version: str, oma_token: Optional[str]) -> Iterator[Any]:
+    creds = get_google_creds(tenant, oma_token=oma_token)
+
+    def build(credentials: Any) -> Any:
+        http = get_authorized_http(tenant, credentials=credentials)
+        return get_discovery_registry().build(api, version, http=http)
+
+    key = (tenant or DEFAULT_TENANT, api, version)
+    with get_service_pool().lease(key, creds, build) as service:
+        yield service
@@ -0,0 +1,116 @@
+"""
+Tests for the in-process Google credential cache
+
+Tests expiry margin handling, keying by tenant/scopes and invalidation.
+"""
+
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from google.oauth2.credentials import Credentials
+
+from src.auth import google_auth
+from src.auth.google_auth import CredentialCache
+
+
+def _creds(expires_in: float | None) -> Credentials:
+    creds = Credentials(token="token")
+    if expires_in is not None:
+        expiry = datetime.now(timezone.utc) + timedelta(seconds=expires_in)
+        creds.expiry = expiry.replace(tzinfo=None)
+    return creds
+
+
+class TestCredentialCache:
+    """Test CredentialCache freshness rules"""
+
+    def test_fresh_entry_is_returned(self):
+        """Test credentials far from expiry are served from cache"""
+        cache = CredentialCache(margin=300)
+        key = cache.make_key("alice")
+        creds = _creds(3600)
+        cache.put(key, creds)
+        assert cache.get(key) is creds
+
+    def test_entry_within_margin_is_stale(self):
+        """Test credentials expiring within the margin are not served"""
+        cache = CredentialCache(margin=300)
+        key = cache.make_key("alice")
+        cache.put(key, _creds(120))
+        assert cache.get(key) is None
+
+    def test_in_place_refresh_extends_entry(self):
+        """Test a token refreshed in place by AuthorizedHttp is picked up"""
+        cache = CredentialCache(margin=300)
+        key = cache.make_key("alice")
+        creds = _creds(120)
+        cache.put(key, creds)
+        creds.expiry = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
+        assert cache.get(key) is creds
+
+    def test_missing_expiry_uses_default_ttl(self):
+        """Test credentials without expiry live for default_ttl"""
+        cache = CredentialCache(margin=300, default_ttl=3000)
+        key = cache.make_key()
+        creds = _creds(None)
+        cache.put(key, creds)
+        assert cache.get(key) is creds
+
+        short = CredentialCache(margin=300, default_ttl=60)
+        short.put(key, creds)
+        assert short.get(key) is None
+
+    def test_expiring_keeps_default_ttl_expiry(self):
+        """Test credentials without expiry report the expiry recorded when cached, not a moving one"""
+        cache = CredentialCache(margin=300, default_ttl=3000)
+        key = cache.make_key()
+        with patch.object(google_auth.time, "time", return_value=1000.0):
+            cache.put(key, _creds(None))
+        with patch.object(google_auth.time, "time", return_value=2000.0):
+            assert cache.expiring() == {key: 4000.0}
+
+    def test_key_ignores_scope_order(self):
+        """Test scopes are normalized in cache keys"""
+        assert CredentialCache.make_key("t", ["b", "a"]) == CredentialCache.make_key("t", ["a", "b"])
+        assert CredentialCache.make_key(None) == CredentialCache.make_key(google_auth.DEFAULT_TENANT)
+
+    def test_invalidate(self):
+        """Test invalidation of one key and of the whole cache"""
+        cache = CredentialCache(margin=0)
+        alice, bob = cache.make_key("alice"), cache.make_key("bob")
+        cache.put(alice, _creds(3600))
+        cache.put(bob, _creds(3600))
+
+        cache.invalidate(alice)
+        assert cache.get(alice) is None
+        assert cache.get(bob) is not None
+
+        cache.invalidate()
+        assert cache.get(bob) is None
+
+
+class TestGetGoogleCreds:
+    """Test get_google_creds cache integration"""
+
+    @pytest.fixture(autouse=True)
+    def clear_cache(self):
+        google_auth.get_credential_cache().invalidate()
+        yield
+        google_auth.get_credential_cache().invalidate()
+
+    def test_second_call_hits_cache(self):
+        """Test credentials are fetched once while valid"""
+        with patch.object(google_auth, "_fetch_google_creds", return_value=_creds(3600)) as fetch:
+            first = google_auth.get_google_creds()
+            second = google_auth.get_google_creds()
+        assert first is second
+        assert fetch.call_count == 1
+
+    def test_invalidate_forces_refetch(self):
+        """Test invalidate_google_creds makes the next call refetch"""
+        with patch.object(google_auth, "_fetch_google_creds", side_effect=[_creds(3600), _creds(3600)]) as fetch:
+            first = google_auth.get_google_creds()
+            google_auth.invalidate_google_creds()
+            second = google_auth.get_google_creds()
+        assert first is not second
+        assert fetch.call_count == 2
@@ -0,0 +1,135 @@
+"""
+Tests for the pooled httpx transport for Google APIs
+
+Tests httplib2 compatibility (responses, redirects, errors), per-host limits
+and use through AuthorizedHttp / googleapiclient.
+"""
+
+import socket
+import threading
+
+import httplib2
+import httpx
+import pytest
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+
+from src.auth.google_transport import GoogleHTTPPool, HttpxHttp
+from src.tools.discovery import DiscoveryRegistry
+
+
+def _http(handler, **pool_kwargs) -> HttpxHttp:
+    pool = GoogleHTTPPool(**pool_kwargs)
+    pool._client = httpx.Client(transport=httpx.MockTransport(handler))
+    return HttpxHttp(pool)
+
+
+class TestHttpxHttp:
+    """Test HttpxHttp behaves like httplib2.Http for googleapiclient"""
+
+    def test_response_is_httplib2_compatible(self):
+        """Test status, lowercase headers and content are returned like httplib2"""
+        http = _http(lambda request: httpx.Response(200, headers={"Content-Type": "application/json"}, content=b"{}"))
+        response, content = http.request("https://gmail.googleapis.com/x")
+        assert isinstance(response, httplib2.Response)
+        assert response.status == 200
+        assert response["content-type"] == "application/json"
+        assert content == b"{}"
+
+    def test_request_body_and_headers_are_sent(self):
+        """Test method, body and headers reach the server"""
+        seen = {}
+
+        def handler(request):
+            seen.update(method=request.method, body=request.content, auth=request.headers["authorization"])
+            return httpx.Response(204)
+
+        http = _http(handler)
+        http.request("https://gmail.googleapis.com/x", "POST", body='{"a": 1}', headers={"authorization": "Bearer t"})
+        assert seen == {"method": "POST", "body": b'{"a": 1}', "auth": "Bearer t"}
+
+    def test_get_follows_redirect(self):
+        """Test GET requests follow redirects"""
+        def handler(request):
+            if request.url.path == "/old":
+                return httpx.Response(302, headers={"Location": "/new"})
+            return httpx.Response(200, content=b"moved")
+
+        _, content = _http(handler).request("https://example.com/old")
+        assert content == b"moved"
+
+    def test_resume_incomplete_is_not_followed(self):
+        """Test 308 (resumable upload progress) is returned, not followed"""
+        http = _http(lambda request: httpx.Response(308, headers={"Location": "/elsewhere", "Range": "bytes=0-9"}))
+        response, _ = http.request("https://example.com/upload", "PUT", body=b"x")
+        assert response.status == 308
+        assert response["range"] == "bytes=0-9"
+
+    def test_transport_errors_map_to_socket_errors(self):
+        """Test httpx errors surface as the exceptions googleapiclient retries on"""
+        def timeout(request):
+            raise httpx.ReadTimeout("slow", request=request)
+
+        def refused(request):
+            raise httpx.ConnectError("refused", request=request)
+
+        with pytest.raises(socket.timeout):
+            _http(timeout).request("https://example.com/")
+        with pytest.raises(ConnectionError):
+            _http(refused).request("https://example.com/")
+
+    def test_per_host_limit(self):
+        """Test requests to one host wait for a free slot"""
+        release = threading.Event()
+        http = _http(lambda request: (release.wait(1), httpx.Response(200))[1],
+                     max_per_host=1, timeout=httpx.Timeout(5, pool=0.05))
+        worker = threading.Thread(target=http.request, args=("https://example.com/a",))
+        worker.start()
+        try:
+            with pytest.raises(socket.timeout):
+                http.request("https://example.com/b")
+            # Other hosts are not affected
+            release.set()
+            assert http.request("https://other.example.com/")[0].status == 200
+        finally:
+            release.set()
+            worker.join()
+
+    def test_close_keeps_shared_pool_open(self):
+        """Test closing one service's transport leaves the pool usable"""
+        http = _http(lambda request: httpx.Response(200))
+        http.close()
+        assert not http.pool.client.is_closed
+
+    def test_client_certificate_gets_own_pool(self):
+        """Test requests to a certificate's domain use a pool of their own, others the shared one"""
+        http = _http(lambda request: httpx.Response(200, content=b"shared"))
+        http.add_certificate("client.key", "client.pem", "mtls.googleapis.com")
+        cert_pool = http._cert_pools["mtls.googleapis.com"]
+        assert cert_pool is not http.pool and cert_pool.cert == ("client.pem", "client.key", None)
+        cert_pool._client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=b"cert")))
+        assert http.request("https://mtls.googleapis.com/x")[1] == b"cert"
+        assert http.request("https://gmail.googleapis.com/x")[1] == b"shared"
+        http.close()
+        assert cert_pool._client is None and not http.pool.client.is_closed
+
+    def test_client_certificate_is_loaded(self, tmp_path):
+        """Test a pool with a certificate loads it into its TLS context"""
+        pool = GoogleHTTPPool(cert=(str(tmp_path / "missing.pem"), str(tmp_path / "missing.key"), None))
+        with pytest.raises(FileNotFoundError):
+            _ = pool.client
+
+    def test_googleapiclient_service_over_httpx(self):
+        """Test a service executes through AuthorizedHttp over HttpxHttp"""
+        seen = {}
+
+        def handler(request):
+            seen["auth"] = request.headers["authorization"]
+            seen["path"] = request.url.path
+            return httpx.Response(200, json={"id": "abc"})
+
+        authed = AuthorizedHttp(Credentials(token="google-token"), http=_http(handler))
+        service = DiscoveryRegistry().build("gmail", "v1", http=authed)
+        result = service.users().messages().get(userId="me", id="abc").execute()
+        assert result == {"id": "abc"}
+        assert seen == {"auth": "Bearer google-token", "path": "/gmail/v1/users/me/messages/abc"}
@@ -0,0 +1,88 @@
+"""
+Tests for OMAAuthClient connection pooling
+
+Tests that HTTP clients are long-lived, shared and closed by shutdown hooks,
+and that refreshed tokens stay on the client that refreshed them.
+"""
+
+import os
+
+import pytest
+import httpx
+
+from src.auth.oma_client import OMAAuthClient
+
+
+@pytest.fixture
+def oma_client():
+    client = OMAAuthClient(base_url="https://oma.test/api/v1", access_token="test-token")
+    yield client
+    client.close()
+
+
+class TestOMAClientPools:
+    """Test sync and async pool lifecycle"""
+
+    def test_sync_client_is_reused(self, oma_client):
+        """Test the same httpx.Client serves every request"""
+        assert oma_client.client is oma_client.client
+        assert isinstance(oma_client.client, httpx.Client)
+
+    def test_close_reopens_lazily(self, oma_client):
+        """Test close() releases the pool and next use creates a new one"""
+        first = oma_client.client
+        oma_client.close()
+        assert first.is_closed
+        second = oma_client.client
+        assert second is not first
+        assert not second.is_closed
+
+    @pytest.mark.asyncio
+    async def test_aclose_closes_both_pools(self, oma_client):
+        """Test aclose() shuts down async and sync pools"""
+        sync_client = oma_client.client
+        async_client = oma_client.async_client
+        assert oma_client.async_client is async_client
+
+        await oma_client.aclose()
+        assert sync_client.is_closed
+        assert async_client.is_closed
+
+    def test_pool_settings_are_applied(self):
+        """Test custom limits and timeouts are kept on the client"""
+        limits = httpx.Limits(max_connections=5, max_keepalive_connections=2)
+        timeout = httpx.Timeout(3.0, connect=1.0)
+        client = OMAAuthClient(access_token="t", limits=limits, timeout=timeout, http2=False)
+        assert client.limits is limits
+        assert client.client.timeout == timeout
+        assert client.http2 is False
+        client.close()
+
+
+class TestTokenRefresh:
+    """Test where refreshed access tokens are kept"""
+
+    @staticmethod
+    def _refreshing(**kwargs) -> OMAAuthClient:
+        client = OMAAuthClient(base_url="https://oma.test/api/v1", access_token="old", refresh_token="rt", **kwargs)
+        client.pools._client = httpx.Client(
+            transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"access_token": "new"}))
+        )
+        return client
+
+    def test_tenant_token_stays_on_client(self, monkeypatch):
+        """Test a client that is not the process default leaves OMA_ACCESS_TOKEN alone"""
+        monkeypatch.setenv("OMA_ACCESS_TOKEN", "process-token")
+        client = self._refreshing()
+        assert client._refresh_access_token()
+        assert client.access_token == "new"
+        assert os.environ["OMA_ACCESS_TOKEN"] == "process-token"
+        client.close()
+
+    def test_process_default_exports_token(self, monkeypatch):
+        """Test the process-default client publishes its refreshed token"""
+        monkeypatch.setenv("OMA_ACCESS_TOKEN", "old")
+        client = self._refreshing(export_env=True)
+        assert client._refresh_access_token()
+        assert os.environ["OMA_ACCESS_TOKEN"] == "new"
+        client.close()
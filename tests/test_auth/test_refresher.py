@@ -0,0 +1,135 @@
+"""
+Tests for the background token refresher
+
+Tests scheduling of OMA access token and cached Google credential refreshes.
+"""
+
+import base64
+import json
+import time
+from datetime import datetime, timedelta, timezone
+from unittest.mock import Mock, patch
+
+import pytest
+from google.oauth2.credentials import Credentials
+
+from src.auth import google_auth, refresher
+from src.auth.oma_client import OMAAuthClient, _jwt_expiry
+from src.auth.refresher import TokenRefresher
+
+
+def _jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"sub": "alice", "exp": exp}).encode()).rstrip(b"=")
+    return f"header.{payload.decode()}.signature"
+
+
+def _creds(expires_in: float) -> Credentials:
+    creds = Credentials(token="token")
+    creds.expiry = (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).replace(tzinfo=None)
+    return creds
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    google_auth.get_credential_cache().invalidate()
+    yield
+    google_auth.get_credential_cache().invalidate()
+
+
+class TestJWTExpiry:
+    """Test exp claim parsing"""
+
+    def test_reads_exp_claim(self):
+        """Test exp is read from JWT payload"""
+        assert _jwt_expiry(_jwt(1234567890)) == 1234567890
+
+    def test_non_jwt_returns_none(self):
+        """Test opaque tokens have unknown expiry"""
+        assert _jwt_expiry("opaque-token") is None
+
+
+class TestTokenRefresher:
+    """Test refresh_due scheduling"""
+
+    def _oma_client(self, expires_in: float) -> OMAAuthClient:
+        client = OMAAuthClient(access_token=_jwt(time.time() + expires_in), refresh_token="rt")
+        client._refresh_access_token = Mock(return_value=True)
+        return client
+
+    def test_expiring_oma_token_is_refreshed(self):
+        """Test OMA token inside the lead window is refreshed"""
+        client = self._oma_client(expires_in=60)
+        token = client.access_token
+        r = TokenRefresher(lead=300, jitter=0, oma_clients=lambda: [client])
+        r.refresh_due()
+        client._refresh_access_token.assert_called_once_with(token)
+
+    def test_fresh_oma_token_is_scheduled(self):
+        """Test next check is scheduled for when the token enters the lead window"""
+        client = self._oma_client(expires_in=1000)
+        r = TokenRefresher(lead=300, jitter=0, max_interval=3600, oma_clients=lambda: [client])
+        delay = r.refresh_due()
+        client._refresh_access_token.assert_not_called()
+        assert 690 < delay <= 700
+
+    def test_expiring_google_creds_are_refreshed(self):
+        """Test cached credentials about to go stale are renewed"""
+        cache = google_auth.get_credential_cache()
+        cache.put(cache.make_key("alice"), _creds(cache.margin + 60))
+        r = TokenRefresher(lead=300, jitter=0, oma_clients=lambda: [])
+        with patch.object(refresher, "refresh_google_creds") as refresh:
+            r.refresh_due()
+        refresh.assert_called_once_with("alice", 300)
+
+    @staticmethod
+    def _refreshable(expires_in: float) -> Credentials:
+        creds = Credentials(token="old", refresh_token="rt", client_id="id", client_secret="secret")
+        creds.expiry = (datetime.now(timezone.utc) + timedelta(seconds=expires_in)).replace(tzinfo=None)
+        return creds
+
+    def _renew(self, creds, new_expires_in: float = 3600):
+        creds.token = "renewed"
+        creds.expiry = self._refreshable(new_expires_in).expiry
+
+    def test_unchanged_source_token_is_refreshed_with_google(self, monkeypatch):
+        """Test the real refresh renews with Google when the source returns the same expiring token"""
+        cache = google_auth.get_credential_cache()
+        key = cache.make_key("alice")
+        expiring = self._refreshable(cache.margin + 60)
+        cache.put(key, expiring)
+        monkeypatch.setattr(google_auth, "_fetch_google_creds", lambda tenant, oma_token=None: expiring)
+        monkeypatch.setattr(Credentials, "refresh", lambda creds, request: self._renew(creds))
+        r = TokenRefresher(lead=300, jitter=0, max_interval=3600, oma_clients=lambda: [])
+
+        r.refresh_due()
+        assert cache.get(key).token == "renewed"
+        assert r.refresh_due() > 2900
+
+    def test_extended_source_token_skips_google(self, monkeypatch):
+        """Test no Google refresh is made when the source hands back a longer-lived token"""
+        cache = google_auth.get_credential_cache()
+        cache.put(cache.make_key("alice"), self._refreshable(cache.margin + 60))
+        monkeypatch.setattr(google_auth, "_fetch_google_creds", lambda tenant, oma_token=None: self._refreshable(3600))
+        refresh = Mock()
+        monkeypatch.setattr(Credentials, "refresh", refresh)
+        TokenRefresher(lead=300, jitter=0, oma_clients=lambda: []).refresh_due()
+        refresh.assert_not_called()
+        assert cache.get(cache.make_key("alice")).expiry > datetime.now() + timedelta(minutes=50)
+
+    def test_refresh_errors_do_not_stop_cycle(self):
+        """Test one failing refresh does not prevent the others"""
+        failing = self._oma_client(expires_in=10)
+        failing._refresh_access_token.side_effect = RuntimeError("down")
+        healthy = self._oma_client(expires_in=10)
+        r = TokenRefresher(lead=300, jitter=0, oma_clients=lambda: [failing, healthy])
+        r.refresh_due()
+        healthy._refresh_access_token.assert_called_once()
+
+    def test_start_and_stop(self):
+        """Test the thread starts once and stops"""
+        r = TokenRefresher(oma_clients=lambda: [])
+        r.start()
+        r.start()
+        assert r.running
+        r.stop()
+        assert not r.running
@@ -0,0 +1,133 @@
+"""
+Tests for single-flight call coalescing
+
+Tests thread and asyncio coalescing, error propagation, counters and
+OMA token refresh storms.
+"""
+
+import asyncio
+import threading
+import time
+
+import httpx
+import pytest
+
+from src.auth.oma_client import OMAAuthClient
+from src.auth.singleflight import SingleFlight
+
+
+class TestSingleFlightThreads:
+    """Test coalescing across threads"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test N threads with the same key run fn once and get the same result"""
+        flight = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        executions = []
+
+        def work():
+            executions.append(1)
+            started.set()
+            release.wait(5)
+            return object()
+
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", work)))
+        leader.start()
+        started.wait(5)
+        waiters = [threading.Thread(target=lambda: results.append(flight.do("k", work))) for _ in range(9)]
+        for t in waiters:
+            t.start()
+        time.sleep(0.05)
+        release.set()
+        for t in [leader, *waiters]:
+            t.join(5)
+
+        assert len(executions) == 1
+        assert len(results) == 10
+        assert all(r is results[0] for r in results)
+        assert flight.stats()["k"] == {"calls": 10, "executions": 1, "coalesced": 9}
+
+    def test_exception_is_shared_and_flight_cleared(self):
+        """Test waiters receive the leader's exception and the key is reusable"""
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            flight.do("k", fail)
+        assert flight.do("k", lambda: 42) == 42
+
+    def test_different_keys_do_not_coalesce(self):
+        """Test calls with different keys run independently"""
+        flight = SingleFlight()
+        assert flight.do("a", lambda: 1) == 1
+        assert flight.do("b", lambda: 2) == 2
+        assert flight.stats()["a"]["coalesced"] == 0
+
+
+class TestSingleFlightAsync:
+    """Test coalescing across coroutines"""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_coroutines_share_one_execution(self):
+        """Test concurrent awaits with the same key run fn once"""
+        flight = SingleFlight()
+        executions = []
+
+        async def work():
+            executions.append(1)
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*(flight.ado("k", work) for _ in range(5)))
+        assert results == ["result"] * 5
+        assert len(executions) == 1
+        assert flight.stats()["k"]["coalesced"] == 4
+
+    @pytest.mark.asyncio
+    async def test_async_exception_propagates_to_waiters(self):
+        """Test every coalesced coroutine receives the exception"""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("boom")
+
+        results = await asyncio.gather(*(flight.ado("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+
+class TestOMARefreshCoalescing:
+    """Test OMAAuthClient refresh storm protection"""
+
+    def test_refresh_storm_makes_one_request(self, monkeypatch):
+        """Test concurrent 401s trigger a single /auth/refresh call"""
+        refresh_calls = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path.endswith("/auth/refresh"):
+                refresh_calls.append(1)
+                time.sleep(0.05)
+                return httpx.Response(200, json={"access_token": "new-token"})
+            return httpx.Response(404)
+
+        client = OMAAuthClient(base_url="https://oma.test/api/v1", access_token="old-token", refresh_token="rt")
+        client.pools._client = httpx.Client(transport=httpx.MockTransport(handler))
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(client._refresh_access_token("old-token")))
+            for _ in range(10)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(5)
+
+        assert results == [True] * 10
+        assert len(refresh_calls) == 1
+        assert client.access_token == "new-token"
+        client.close()
@@ -0,0 +1,255 @@
+"""
+Tests for multi-tenant resolution and the tenant registry
+
+Tests tenant id derivation from request headers, token validation and
+expiry, LRU eviction and per-tenant cache invalidation.
+"""
+
+import base64
+import json
+import time
+from types import SimpleNamespace
+from datetime import datetime, timedelta, timezone
+
+import httpx
+import pytest
+from google.oauth2.credentials import Credentials
+from mcp.server.lowlevel.server import request_ctx
+
+from src import config
+from src.auth import google_auth, tenant
+from src.auth.oma_client import OMAHTTPPools
+from src.auth.tenant import TenantRegistry, resolve_tenant, tenant_id_for_subject, tenant_id_for_token
+
+
+@pytest.fixture
+def multi_tenant(monkeypatch):
+    monkeypatch.setattr(config, "MCP_MULTI_TENANT", True)
+
+
+@pytest.fixture
+def request_headers():
+    """Run code as if handling an MCP request with the given headers"""
+    tokens = []
+
+    def set_headers(headers: dict[str, str]):
+        tokens.append(request_ctx.set(SimpleNamespace(request=SimpleNamespace(headers=headers))))
+
+    yield set_headers
+    for token in reversed(tokens):
+        request_ctx.reset(token)
+
+
+def jwt(**claims) -> str:
+    """Unsigned JWT carrying claims"""
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).decode().rstrip("=")
+    return f"e30.{payload}.sig"
+
+
+@pytest.fixture
+def oma_status(monkeypatch):
+    """OMA pools answering /google/status: 200 unless the token is listed in .rejected"""
+    calls = []
+    rejected = set()
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        token = request.headers["Authorization"].removeprefix("Bearer ")
+        calls.append(token)
+        return httpx.Response(401 if token in rejected else 200, json={"connected": True})
+
+    pools = OMAHTTPPools()
+    pools._client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(tenant, "get_oma_pools", lambda: pools)
+    return SimpleNamespace(calls=calls, rejected=rejected)
+
+
+class TestResolveTenant:
+    """Test tenant resolution from the inbound request"""
+
+    def test_single_tenant_mode_returns_none(self):
+        """Test resolution is skipped unless MCP_MULTI_TENANT is on"""
+        assert resolve_tenant() is None
+
+    def test_bearer_token(self, multi_tenant, request_headers, oma_status):
+        """Test tenant token is read from Authorization: Bearer"""
+        request_headers({"Authorization": "Bearer alice-token"})
+        identity = resolve_tenant()
+        assert identity.access_token == "alice-token"
+        assert identity.tenant_id == tenant_id_for_token("alice-token")
+
+    def test_tenant_header_takes_precedence(self, multi_tenant, request_headers, oma_status):
+        """Test X-OMA-Token and refresh token headers"""
+        request_headers({
+            "Authorization": "Bearer other",
+            "X-OMA-Token": "bob-token",
+            "X-OMA-Refresh-Token": "bob-refresh",
+        })
+        identity = resolve_tenant()
+        assert identity.access_token == "bob-token"
+        assert identity.refresh_token == "bob-refresh"
+
+    def test_missing_token_is_rejected(self, multi_tenant, request_headers):
+        """Test requests without a tenant token are refused"""
+        request_headers({})
+        with pytest.raises(ValueError, match="Unauthorized"):
+            resolve_tenant()
+
+    def test_rejected_tokens_cannot_evict_tenants(self, multi_tenant, request_headers, oma_status, monkeypatch):
+        """Test tokens OMA refuses are never registered, so they cannot push real tenants out"""
+        registry = TenantRegistry(max_tenants=2)
+        monkeypatch.setattr(tenant, "_registry", registry)
+        request_headers({"Authorization": f"Bearer {jwt(sub='bob')}"})
+        bob = resolve_tenant().tenant_id
+        for n in range(5):
+            oma_status.rejected.add(f"junk-{n}")
+            request_headers({"Authorization": f"Bearer junk-{n}"})
+            with pytest.raises(ValueError, match="Unauthorized"):
+                resolve_tenant()
+        assert [s.tenant_id for s in registry.tenants()] == [bob]
+
+    def test_tenant_ids_differ_per_token(self):
+        """Test different tokens never share a tenant id"""
+        assert tenant_id_for_token("a") != tenant_id_for_token("b")
+        assert tenant_id_for_token("a") == tenant_id_for_token("a")
+
+
+class TestTenantIdentity:
+    """Test tenant ids derived from the OMA user id"""
+
+    def test_rotated_tokens_share_tenant(self, oma_status):
+        """Test tokens of the same user map to one tenant"""
+        registry = TenantRegistry(max_tenants=4)
+        first = registry.tenant_id_for(jwt(sub="alice", exp=1000))
+        second = registry.tenant_id_for(jwt(sub="alice", exp=2000))
+        assert first == second == tenant_id_for_subject("alice")
+        assert registry.tenant_id_for(jwt(sub="bob", exp=1000)) != first
+
+    def test_oma_is_asked_once_per_token(self, oma_status):
+        """Test the token is confirmed with OMA only on first sight"""
+        registry = TenantRegistry(max_tenants=4)
+        token = jwt(sub="alice")
+        for _ in range(3):
+            registry.tenant_id_for(token)
+        assert oma_status.calls == [token]
+
+    def test_rejected_token(self, oma_status):
+        """Test a token OMA refuses is not mapped to the user's tenant"""
+        token = jwt(sub="alice")
+        oma_status.rejected.add(token)
+        with pytest.raises(ValueError, match="Unauthorized"):
+            TenantRegistry(max_tenants=4).tenant_id_for(token)
+
+    def test_token_without_user_id(self, oma_status):
+        """Test opaque tokens are confirmed with OMA, then get a tenant of their own"""
+        assert TenantRegistry(max_tenants=4).tenant_id_for("opaque") == tenant_id_for_token("opaque")
+        assert oma_status.calls == ["opaque"]
+        oma_status.rejected.add("forged")
+        with pytest.raises(ValueError, match="Unauthorized"):
+            TenantRegistry(max_tenants=4).tenant_id_for("forged")
+
+    def test_expired_token_is_checked_again(self, oma_status):
+        """Test a token past its exp claim is not resolved from the mapping"""
+        registry = TenantRegistry(max_tenants=4)
+        token = jwt(sub="alice", exp=time.time() - 3600)
+        registry.tenant_id_for(token)
+        oma_status.rejected.add(token)
+        with pytest.raises(ValueError, match="Unauthorized"):
+            registry.tenant_id_for(token)
+        with pytest.raises(ValueError, match="Unauthorized"):
+            registry.tenant_id_for(token)
+        assert oma_status.calls == [token] * 3
+
+    def test_mapping_is_trusted_for_ttl(self, oma_status, monkeypatch):
+        """Test a long-lived token is confirmed with OMA again after MCP_TENANT_TOKEN_TTL"""
+        registry = TenantRegistry(max_tenants=4)
+        token = jwt(sub="alice", exp=time.time() + 86400)
+        registry.tenant_id_for(token)
+        registry.tenant_id_for(token)
+        assert oma_status.calls == [token]
+        monkeypatch.setattr(config, "MCP_TENANT_TOKEN_TTL", 0)
+        registry = TenantRegistry(max_tenants=4)
+        registry.tenant_id_for(token)
+        registry.tenant_id_for(token)
+        assert oma_status.calls == [token] * 3
+
+    def test_fresher_token_replaces_client_token(self, oma_status):
+        """Test a later request with a fresher token updates the tenant's client"""
+        registry = TenantRegistry(max_tenants=4)
+        old, new = jwt(sub="alice", exp=1000), jwt(sub="alice", exp=2000)
+        client = registry.register("u", new).oma_client
+        registry.register("u", old)
+        assert client.access_token == new
+        registry.register("u", jwt(sub="alice", exp=3000))
+        assert client.access_token == jwt(sub="alice", exp=3000)
+
+
+class TestTenantRegistry:
+    """Test LRU registry behaviour"""
+
+    def test_lru_eviction(self):
+        """Test least recently used tenant is evicted over capacity"""
+        registry = TenantRegistry(max_tenants=2)
+        registry.register("a", "token-a")
+        registry.register("b", "token-b")
+        registry.state("a")
+        registry.register("c", "token-c")
+
+        assert [s.tenant_id for s in registry.tenants()] == ["a", "c"]
+        with pytest.raises(ValueError):
+            registry.state("b")
+
+    def test_eviction_drops_credentials_and_notifies(self):
+        """Test evicted tenant loses cached credentials and evict listeners are called"""
+        registry = TenantRegistry(max_tenants=1)
+        registry.register("a", "token-a")
+
+        cache = google_auth.get_credential_cache()
+        creds = Credentials(token="t")
+        creds.expiry = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
+        cache.put(cache.make_key("a"), creds)
+
+        evicted = []
+        registry.add_evict_listener(lambda s: evicted.append(s.tenant_id))
+        registry.register("b", "token-b")
+
+        assert evicted == ["a"]
+        assert cache.get(cache.make_key("a")) is None
+
+    def test_eviction_forgets_stores(self, monkeypatch):
+        """Test stores created by the getters drop an evicted tenant's rows"""
+        from src.tools import search_index
+
+        registry = TenantRegistry(max_tenants=1)
+        monkeypatch.setattr(tenant, "_registry", registry)
+        monkeypatch.setattr(config, "GMAIL_SEARCH_ENABLED", True)
+        monkeypatch.setattr(search_index, "_index", None)
+        store = search_index.SearchIndex
+        monkeypatch.setattr(search_index, "SearchIndex", lambda: store(":memory:"))
+        index = search_index.get_search_index()
+        forgotten = []
+        monkeypatch.setattr(index, "forget", forgotten.append)
+
+        registry.register("a", "token-a")
+        registry.register("b", "token-b")
+        assert forgotten == ["a"]
+
+    def test_tenant_client_does_not_use_process_refresh_token(self, monkeypatch):
+        """Test tenants never inherit MCP_REFRESH_TOKEN of the process"""
+        monkeypatch.setenv("MCP_REFRESH_TOKEN", "process-refresh")
+        registry = TenantRegistry(max_tenants=4)
+        client = registry.register("a", "token-a").oma_client
+        assert client.refresh_token is None
+        assert client.access_token == "token-a"
+
+    def test_tenant_clients_share_pools(self):
+        """Test all tenant OMA clients use the same connection pools"""
+        registry = TenantRegistry(max_tenants=4)
+        a = registry.register("a", "token-a").oma_client
+        b = registry.register("b", "token-b").oma_client
+        assert a.pools is b.pools
+
+    def test_default_tenant_is_pinned(self):
+        """Test the default tenant is always available"""
+        registry = TenantRegistry(max_tenants=1)
+        assert registry.state(None) is registry.state(google_auth.DEFAULT_TENANT)
+        assert len(registry) == 0
@@ -0,0 +1,412 @@
+"""
+Shared fixtures for tool tests
+
+FakeGoogleHttp stands in for googleapis.com behind services built from the
+bundled discovery documents. It answers plain and batch requests through a
+handler and counts HTTP round trips. FakeMailbox is a handler simulating a
+small Gmail mailbox with history; FakeCalendar simulates a calendar with
+syncTokens.
+"""
+
+from __future__ import annotations
+import base64
+import json
+from contextlib import contextmanager
+from email.parser import BytesParser
+from typing import Any, Callable, Optional
+from urllib.parse import parse_qs, urlsplit
+from zoneinfo import ZoneInfo
+
+import httplib2
+import pytest
+
+from src.tools.calendar_sync import timestamp_of
+from src.tools.discovery import DiscoveryRegistry
+
+# handler(method, path, query, body) -> (status, json-serializable response)
+Handler = Callable[[str, str, dict[str, list[str]], Optional[dict]], tuple[int, Any]]
+
+BOUNDARY = "batch_fake_boundary"
+
+
+class FakeGoogleHttp:
+    """httplib2.Http stand-in dispatching requests to a handler"""
+
+    def __init__(self, handler: Optional[Handler] = None):
+        self.handler: Handler = handler or (lambda method, path, query, body: (404, {"error": {"code": 404}}))
+        self.round_trips = 0
+        self.requests: list[tuple[str, str]] = []
+        self.headers: dict[str, str] = {}  # Of the request being handled (lowercase names)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.round_trips += 1
+        self.headers = {k.lower(): v for k, v in (headers or {}).items()}
+        url = urlsplit(uri)
+        if url.path.endswith("/batch") or url.path.startswith("/batch/"):
+            return self._batch(body, headers)
+        return self._dispatch(method, url.path, url.query, body)
+
+    def _dispatch(self, method: str, path: str, query: str, body: Any):
+        self.requests.append((method, path))
+        if isinstance(body, bytes):
+            body = body.decode("utf-8")
+        status, payload = self.handler(method, path, parse_qs(query), json.loads(body) if body else None)
+        content = json.dumps(payload).encode("utf-8")
+        return httplib2.Response({"status": str(status), "content-type": "application/json"}), content
+
+    def _batch(self, body: bytes, headers: dict[str, str]):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        message = BytesParser().parsebytes(
+            b"content-type: " + headers["content-type"].encode() + b"\r\n\r\n" + body
+        )
+        parts = []
+        for part in message.get_payload():
+            request = part.get_payload()
+            head, _, sub_body = request.partition("\r\n\r\n") if "\r\n\r\n" in request else request.partition("\n\n")
+            method, target, _ = head.splitlines()[0].split(" ", 2)
+            url = urlsplit(target)
+            response, content = self._dispatch(method, url.path, url.query, sub_body.strip() or None)
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(
+                f"--{BOUNDARY}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {response.status} X\r\nContent-Type: application/json\r\n\r\n"
+                f"{content.decode('utf-8')}\r\n"
+            )
+        content = "".join(parts) + f"--{BOUNDARY}--\r\n"
+        response = httplib2.Response({"status": "200", "content-type": f"multipart/mixed; boundary={BOUNDARY}"})
+        return response, content.encode("utf-8")
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def message_cache(monkeypatch, tmp_path):
+    """Fresh on-disk message cache used by the tools"""
+    from src.tools import message_cache as module
+
+    cache = module.MessageCache(tmp_path / "gmail_cache.sqlite3")
+    monkeypatch.setattr(module, "_cache", cache)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def search_index(monkeypatch, tmp_path):
+    """Fresh on-disk search index used by the tools"""
+    from src.tools import search_index as module
+
+    index = module.SearchIndex(tmp_path / "gmail_search.sqlite3")
+    monkeypatch.setattr(module, "_index", index)
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def label_registry(monkeypatch):
+    """Fresh label registry used by the tools"""
+    from src.tools import labels as module
+
+    registry = module.LabelRegistry(ttl=300)
+    monkeypatch.setattr(module, "_registry", registry)
+    return registry
+
+
+@pytest.fixture
+def fake_gmail(monkeypatch, message_cache, search_index, label_registry) -> FakeGoogleHttp:
+    """Route gmail_tool's services to a FakeGoogleHttp (empty cache, index and label registry, mailbox sync off)"""
+    from src import config
+    from src.tools import gmail_tool
+
+    monkeypatch.setattr(config, "GMAIL_SYNC_ENABLED", False)
+
+    http = FakeGoogleHttp()
+    service = DiscoveryRegistry().build("gmail", "v1", http=http)
+
+    @contextmanager
+    def fake_service():
+        yield service
+
+    monkeypatch.setattr(gmail_tool, "_gmail_service", fake_service)
+    return http
+
+
+@pytest.fixture
+def mailbox_sync(monkeypatch, tmp_path, fake_gmail):
+    """Fresh mailbox sync engine used by the tools (history checked on every call, backfill inline)"""
+    from src import config
+    from src.tools import mailbox_sync as module
+
+    from src.tools import gmail_tool
+
+    store = module.MailboxStore(tmp_path / "gmail_mailbox.sqlite3")
+    # Backfill runs inline on the tools' fake service
+    sync = module.MailboxSync(
+        store, min_interval=0, checkout=lambda tenant: gmail_tool._gmail_service(), submit=lambda job: job()
+    )
+    monkeypatch.setattr(config, "GMAIL_SYNC_ENABLED", True)
+    monkeypatch.setattr(module, "_sync", sync)
+    yield sync
+    store.close()
+
+
+class FakeMailbox:
+    """Gmail mailbox answering profile, labels, list, get, thread, modify, batchModify and history requests"""
+
+    def __init__(self):
+        self.messages: dict[str, dict] = {}
+        self.content: dict[str, dict] = {}
+        self.history: list[dict] = []
+        self.history_id = 100
+        self.oldest_history_id = 0
+        self.batch_modify_calls: list[int] = []
+        self.labels = [{"id": "INBOX", "name": "INBOX"}, {"id": "Label_1", "name": "Receipts"}]
+
+    def _record(self, **change) -> None:
+        self.history_id += 1
+        self.history.append({"id": str(self.history_id), **change})
+
+    def add(
+        self,
+        message_id: str,
+        labels: list[str],
+        date: int,
+        sender: str = "sender@example.com",
+        to: str = "me@example.com",
+        subject: Optional[str] = None,
+        body: str = "",
+        attachment: bool = False,
+        thread_id: Optional[str] = None,
+    ) -> None:
+        message = {"id": message_id, "threadId": thread_id or f"t-{message_id}", "labelIds": labels, "internalDate": str(date)}
+        self.messages[message_id] = message
+        self.content[message_id] = {
+            "headers": {"From": sender, "To": to, "Subject": subject or message_id},
+            "body": body,
+            "attachment": attachment,
+        }
+        # History carries no internalDate
+        self._record(messagesAdded=[{"message": {k: v for k, v in message.items() if k != "internalDate"}}])
+
+    def delete(self, message_id: str) -> None:
+        del self.messages[message_id]
+        self._record(messagesDeleted=[{"message": {"id": message_id}}])
+
+    def relabel(self, message_id: str, add=(), remove=()) -> None:
+        message = self.messages[message_id]
+        message["labelIds"] = [l for l in message["labelIds"] if l not in remove] + list(add)
+        summary = {"id": message_id, "threadId": message["threadId"], "labelIds": list(message["labelIds"])}
+        if add:
+            self._record(labelsAdded=[{"message": summary, "labelIds": list(add)}])
+        if remove:
+            self._record(labelsRemoved=[{"message": summary, "labelIds": list(remove)}])
+
+    def handler(self, method, path, query, body):
+        path = path.removeprefix("/gmail/v1/users/me/")
+        if path == "profile":
+            return 200, {"historyId": str(self.history_id)}
+        if path == "messages":
+            listed = sorted(self.messages.values(), key=lambda m: -int(m["internalDate"]))
+            start = int(query.get("pageToken", ["0"])[0])
+            size = int(query.get("maxResults", ["100"])[0])
+            page = {"messages": [{"id": m["id"], "threadId": m["threadId"]} for m in listed[start:start + size]]}
+            if start + size < len(listed):
+                page["nextPageToken"] = str(start + size)
+            return 200, page
+        if path == "history":
+            start = int(query["startHistoryId"][0])
+            if start < self.oldest_history_id:
+                return 404, {"error": {"code": 404, "message": "Requested entity was not found."}}
+            records = [h for h in self.history if int(h["id"]) > start]
+            return 200, {"history": records, "historyId": str(self.history_id)}
+        if path == "labels":
+            return 200, {"labels": self.labels}
+        if path.startswith("threads/"):
+            thread_id = path.split("/")[1]
+            listed = sorted(
+                (m for m in self.messages.values() if m["threadId"] == thread_id), key=lambda m: int(m["internalDate"])
+            )
+            if not listed:
+                return 404, {"error": {"code": 404}}
+            format = query.get("format", ["full"])[0]
+            return 200, {"id": thread_id, "messages": [self._message(m["id"], format) for m in listed]}
+        if path == "messages/batchModify":
+            self.batch_modify_calls.append(len(body["ids"]))
+            for message_id in body["ids"]:
+                if message_id in self.messages:
+                    self.relabel(message_id, body.get("addLabelIds", []), body.get("removeLabelIds", []))
+            return 204, None
+        if path.startswith("messages/") and path.endswith("/modify"):
+            message_id = path.split("/")[1]
+            if message_id not in self.messages:
+                return 404, {"error": {"code": 404}}
+            self.relabel(message_id, body.get("addLabelIds", []), body.get("removeLabelIds", []))
+            return 200, self.messages[message_id]
+        message_id = path.split("/")[1]
+        if message_id not in self.messages:
+            return 404, {"error": {"code": 404}}
+        return 200, self._message(message_id, query.get("format", ["full"])[0])
+
+    def _message(self, message_id: str, format: str) -> dict:
+        message = dict(self.messages[message_id])
+        if format == "minimal":
+            return message
+        content = self.content[message_id]
+        headers = [{"name": name, "value": value} for name, value in content["headers"].items()]
+        message["snippet"] = content["body"][:100]
+        if format == "metadata":
+            message["payload"] = {"headers": headers}
+            return message
+        data = base64.urlsafe_b64encode(content["body"].encode("utf-8")).decode("ascii")
+        parts = [{"mimeType": "text/plain", "filename": "", "body": {"data": data}}]
+        if content["attachment"]:
+            parts.append({"mimeType": "application/pdf", "filename": "file.pdf", "body": {"attachmentId": "a1"}})
+        message["payload"] = {"mimeType": "multipart/mixed", "headers": headers, "parts": parts}
+        return message
+
+
+@pytest.fixture
+def mailbox() -> FakeMailbox:
+    """Mailbox of five INBOX messages m0..m4 (newest last), odd ones unread"""
+    box = FakeMailbox()
+    for index in range(5):
+        box.add(f"m{index}", ["INBOX", "UNREAD"] if index % 2 else ["INBOX"], 1000 + index)
+    return box
+
+
+class FakeCalendar:
+    """Google Calendar answering events list (with syncTokens), get, insert, update and patch (with If-Match), delete and freeBusy"""
+
+    def __init__(self, http: Optional[FakeGoogleHttp] = None):
+        self.http = http  # Source of request headers
+        self.events: dict[str, dict] = {}
+        self.changed: dict[str, int] = {}  # Event id -> sequence number of its last change
+        self.sequence = 0
+        self.oldest_token = 0
+        self.lists: list[dict[str, list[str]]] = []
+        self.busy: dict[str, list[tuple[str, str]]] = {}  # Calendar id -> busy (start, end); others are not found
+        self.freebusy_queries: list[dict] = []
+        self.time_zone = "UTC"
+
+    def put(self, event_id: str, start: str, end: str, summary: Optional[str] = None, **fields) -> dict:
+        """Create or replace an event; times ending in a date only make it all-day"""
+        key = "date" if len(start) == 10 else "dateTime"
+        event = {
+            "id": event_id,
+            "status": "confirmed",
+            "summary": summary or event_id,
+            "start": {key: start},
+            "end": {key: end},
+            **fields,
+        }
+        self.events[event_id] = event
+        self._touch(event_id)
+        return event
+
+    def cancel(self, event_id: str) -> None:
+        self.events[event_id]["status"] = "cancelled"
+        self._touch(event_id)
+
+    def _touch(self, event_id: str) -> None:
+        self.sequence += 1
+        self.changed[event_id] = self.sequence
+        self.events[event_id]["etag"] = f'"{self.sequence}"'
+
+    def handler(self, method, path, query, body):
+        if path == "/calendar/v3/freeBusy":
+            return self._freebusy(body)
+        path = path.removeprefix("/calendar/v3/calendars/primary/events").strip("/")
+        if not path and method == "GET":
+            return self._list(query)
+        if not path and method == "POST":
+            event_id = f"new{self.sequence + 1}"
+            self.events[event_id] = {"id": event_id, "status": "confirmed", **body}
+            self._touch(event_id)
+            return 200, {**self.events[event_id], "htmlLink": f"https://calendar/{event_id}"}
+        event = self.events.get(path)
+        if event is None or event["status"] == "cancelled":
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        if method == "DELETE":
+            self.cancel(path)
+            return 204, None
+        if method in ("PUT", "PATCH"):
+            if_match = self.http.headers.get("if-match") if self.http else None
+            if if_match and if_match != event["etag"]:
+                return 412, {"error": {"code": 412, "message": "Precondition Failed"}}
+        if method == "PUT":
+            event = self.events[path] = {**body, "id": path, "status": "confirmed"}
+            self._touch(path)
+        if method == "PATCH":
+            event.update({k: v for k, v in body.items() if not isinstance(v, dict)})
+            for key in ("start", "end"):
+                if key in body:
+                    event[key] = {k: v for k, v in {**event[key], **body[key]}.items() if v is not None}
+            self._touch(path)
+        return 200, {**event, "htmlLink": f"https://calendar/{path}"}
+
+    def _freebusy(self, body):
+        self.freebusy_queries.append(body)
+        calendars = {}
+        for item in body["items"]:
+            if item["id"] in self.busy:
+                calendars[item["id"]] = {"busy": [{"start": start, "end": end} for start, end in self.busy[item["id"]]]}
+            else:
+                calendars[item["id"]] = {"busy": [], "errors": [{"domain": "global", "reason": "notFound"}]}
+        return 200, {"kind": "calendar#freeBusy", "calendars": calendars}
+
+    def _in_range(self, event, query) -> bool:
+        """Whether an event ends after timeMin and starts before timeMax"""
+        zone = ZoneInfo(self.time_zone)
+        if "timeMin" in query and timestamp_of(event["end"], zone) <= timestamp_of({"dateTime": query["timeMin"][0]}):
+            return False
+        if "timeMax" in query and timestamp_of(event["start"], zone) >= timestamp_of({"dateTime": query["timeMax"][0]}):
+            return False
+        return True
+
+    def _list(self, query):
+        self.lists.append(query)
+        if "syncToken" in query:
+            since = int(query["syncToken"][0].removeprefix("tok-"))
+            if since < self.oldest_token:
+                return 410, {"error": {"code": 410, "message": "Sync token is no longer valid"}}
+            items = [self.events[i] for i, seq in sorted(self.changed.items(), key=lambda c: c[1]) if seq > since]
+        else:
+            items = [e for e in self.events.values() if e["status"] != "cancelled" and self._in_range(e, query)]
+        start = int(query.get("pageToken", ["0"])[0])
+        size = int(query.get("maxResults", ["250"])[0])
+        page = {"items": items[start:start + size], "timeZone": self.time_zone}
+        if start + size < len(items):
+            page["nextPageToken"] = str(start + size)
+        else:
+            page["nextSyncToken"] = f"tok-{self.sequence}"
+        return 200, page
+
+
+@pytest.fixture
+def calendar() -> FakeCalendar:
+    """Empty fake calendar"""
+    return FakeCalendar()
+
+
+@pytest.fixture
+def fake_calendar_http(monkeypatch, tmp_path, calendar) -> FakeGoogleHttp:
+    """Route calendar_tool's services to the fake calendar, with a fresh calendar sync engine"""
+    from src import config
+    from src.tools import calendar_sync as module
+    from src.tools import calendar_tool
+
+    http = FakeGoogleHttp(calendar.handler)
+    calendar.http = http
+    service = DiscoveryRegistry().build("calendar", "v3", http=http)
+
+    @contextmanager
+    def fake_service():
+        yield service
+
+    monkeypatch.setattr(calendar_tool, "_calendar_service", fake_service)
+    store = module.CalendarStore(tmp_path / "calendar_events.sqlite3")
+    monkeypatch.setattr(config, "CALENDAR_SYNC_ENABLED", True)
+    monkeypatch.setattr(module, "_sync", module.CalendarSync(store, min_interval=0))
+    yield http
+    store.close()
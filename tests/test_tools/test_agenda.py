@@ -0,0 +1,106 @@
+"""
+Tests for the multi-calendar agenda
+
+Tests that calendar_agenda reads the calendar list, fetches each calendar's
+events, merges them in time order and stops paging once enough are taken.
+"""
+
+from urllib.parse import unquote
+
+import pytest
+
+from src.tools.calendar_tool import calendar_agenda
+
+
+class FakeCalendars:
+    """Several calendars answering calendarList.list and events.list (startTime order, paged)"""
+
+    def __init__(self):
+        self.calendars: dict[str, list[dict]] = {}
+        self.selected: set[str] = set()
+        self.time_zones: dict[str, str] = {}
+
+    def add(self, calendar_id: str, *starts: str, selected: bool = True) -> None:
+        """Calendar with one-hour events "<calendar_id>@<start>" at the given UTC hours of 9 March 2026"""
+        self.calendars[calendar_id] = [
+            {
+                "id": f"{calendar_id}@{start}",
+                "summary": start,
+                "start": {"dateTime": f"2026-03-09T{start}:00Z"},
+                "end": {"dateTime": f"2026-03-09T{start}:59Z"},
+            }
+            for start in sorted(starts)
+        ]
+        if selected:
+            self.selected.add(calendar_id)
+
+    def handler(self, method, path, query, body):
+        if path == "/calendar/v3/users/me/calendarList":
+            return 200, {"items": [{"id": c, "selected": c in self.selected} for c in self.calendars]}
+        calendar_id = unquote(path.removeprefix("/calendar/v3/calendars/").removesuffix("/events"))
+        if calendar_id not in self.calendars:
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        start = int(query.get("pageToken", ["0"])[0])
+        size = min(int(query["maxResults"][0]), 2)  # Small pages, as Google may return
+        items = self.calendars[calendar_id]
+        page = {"items": items[start:start + size], "timeZone": self.time_zones.get(calendar_id, "UTC")}
+        if start + size < len(items):
+            page["nextPageToken"] = str(start + size)
+        return 200, page
+
+
+@pytest.fixture
+def calendars(fake_calendar_http):
+    fake = FakeCalendars()
+    fake.add("primary", "09:00", "12:00", "15:00")
+    fake.add("team@group.calendar.google.com", "10:00", "11:00", "13:00", "16:00")
+    fake.add("holidays", "08:00", selected=False)
+    fake_calendar_http.handler = fake.handler
+    return fake
+
+
+def _event_pages(http, calendar_id):
+    return sum(1 for _, path in http.requests if unquote(path).endswith(f"/{calendar_id}/events"))
+
+
+class TestAgenda:
+    """Test calendar_agenda"""
+
+    def test_merged_in_time_order(self, fake_calendar_http, calendars):
+        """Test events of the selected calendars come back in start order, tagged with their calendar"""
+        result = calendar_agenda("2026-03-09", "2026-03-10")
+        assert [e["summary"] for e in result["events"]] == [
+            "09:00", "10:00", "11:00", "12:00", "13:00", "15:00", "16:00",
+        ]
+        assert result["events"][1]["calendar"] == "team@group.calendar.google.com"
+        assert _event_pages(fake_calendar_http, "holidays") == 0
+        assert result["errors"] == {}
+
+    def test_stops_paging_when_full(self, fake_calendar_http, calendars):
+        """Test later pages are not fetched once max_events are taken"""
+        result = calendar_agenda("2026-03-09", max_events=3)
+        assert [e["summary"] for e in result["events"]] == ["09:00", "10:00", "11:00"]
+        assert _event_pages(fake_calendar_http, "primary") == 1
+        assert _event_pages(fake_calendar_http, "team@group.calendar.google.com") == 1
+        assert fake_calendar_http.requests.count(("GET", "/calendar/v3/users/me/calendarList")) == 1
+
+    def test_explicit_calendars(self, fake_calendar_http, calendars):
+        """Test given calendar ids are used without reading the calendar list"""
+        result = calendar_agenda("2026-03-09", calendar_ids=["holidays", "primary"], max_events=2)
+        assert [e["id"] for e in result["events"]] == ["holidays@08:00", "primary@09:00"]
+        assert all("calendarList" not in path for _, path in fake_calendar_http.requests)
+
+    def test_all_day_events_in_calendar_zone(self, fake_calendar_http, calendars):
+        """Test an all-day event is merged at midnight in its calendar's time zone, not in UTC"""
+        # Midnight of 9 March in Los Angeles (PDT) is 07:00 UTC: after a 03:00 UTC event, before 09:00
+        calendars.add("early", "03:00")
+        calendars.calendars["la"] = [{"id": "day", "summary": "day", "start": {"date": "2026-03-09"}, "end": {"date": "2026-03-10"}}]
+        calendars.time_zones["la"] = "America/Los_Angeles"
+        result = calendar_agenda("2026-03-09", calendar_ids=["la", "early", "primary"], max_events=3)
+        assert [e["id"] for e in result["events"]] == ["early@03:00", "day", "primary@09:00"]
+
+    def test_unreadable_calendar_reported(self, fake_calendar_http, calendars):
+        """Test a calendar that fails is reported while the others are merged"""
+        result = calendar_agenda("2026-03-09", calendar_ids=["primary", "gone"])
+        assert len(result["events"]) == 3
+        assert list(result["errors"]) == ["gone"]
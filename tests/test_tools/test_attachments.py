@@ -0,0 +1,183 @@
+"""
+Tests for attachment download
+
+Tests chunked base64url decoding into the content-addressed store,
+deduplication, concurrent download of a message's attachments and safe
+placement of files in a caller's directory.
+"""
+
+import base64
+import hashlib
+import threading
+import tracemalloc
+
+import pytest
+
+from src.tools import attachments as module
+from src.tools.attachments import AttachmentStore
+from src.tools.gmail_tool import gmail_download_attachments
+
+
+def _encode(content: bytes) -> str:
+    return base64.urlsafe_b64encode(content).decode("ascii").rstrip("=")
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    """Fresh attachment store used by the tools"""
+    store = AttachmentStore(tmp_path / "attachments")
+    monkeypatch.setattr(module, "_store", store)
+    return store
+
+
+class AttachmentMailbox:
+    """Gmail handler serving one message with attachments"""
+
+    def __init__(self, files: dict[str, bytes], inline: dict[str, bytes] = None):
+        self.files = files
+        self.inline = inline or {}
+        self.fetched: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.release = threading.Event()
+        self.release.set()
+        self._lock = threading.Lock()
+
+    def handler(self, method, path, query, body):
+        path = path.removeprefix("/gmail/v1/users/me/messages/")
+        if "/attachments/" in path:
+            attachment_id = path.split("/")[-1]
+            with self._lock:
+                self.fetched.append(attachment_id)
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.release.wait(5)
+            with self._lock:
+                self.in_flight -= 1
+            content = self.files[attachment_id.removeprefix("att-")]
+            return 200, {"size": len(content), "data": _encode(content)}
+        parts = [{"partId": "0", "mimeType": "text/plain", "filename": "", "body": {"size": 2, "data": _encode(b"hi")}}]
+        for index, name in enumerate(self.files):
+            parts.append({
+                "partId": str(index + 1),
+                "mimeType": "application/octet-stream",
+                "filename": name,
+                "body": {"attachmentId": f"att-{name}", "size": len(self.files[name])},
+            })
+        for name, content in self.inline.items():
+            parts.append({"partId": "9", "mimeType": "text/csv", "filename": name, "body": {"data": _encode(content)}})
+        nested = {"partId": "", "mimeType": "multipart/mixed", "filename": "", "body": {"size": 0}, "parts": parts}
+        return 200, {"payload": {"mimeType": "multipart/mixed", "filename": "", "body": {"size": 0}, "parts": [nested]}}
+
+
+class TestAttachmentStore:
+    """Test AttachmentStore decodes to disk and stores content once"""
+
+    @pytest.mark.parametrize("size", [0, 1, 2, 3, 100, module.DECODE_CHUNK * 3 // 4 + 1])
+    def test_round_trip(self, store, size):
+        """Test unpadded base64url of any length decodes to the original bytes"""
+        content = bytes(range(256)) * (size // 256 + 1)
+        content = content[:size]
+        digest, stored = store.put(_encode(content))
+        assert stored == size
+        assert digest == hashlib.sha256(content).hexdigest()
+        assert store.path_of(digest).read_bytes() == content
+
+    def test_identical_content_stored_once(self, store):
+        """Test the same content decodes to one file"""
+        first, _ = store.put(_encode(b"same"))
+        second, _ = store.put(_encode(b"same"))
+        assert first == second
+        files = [p for p in store.root.rglob("*") if p.is_file()]
+        assert files == [store.path_of(first)]
+
+    def test_invalid_data_leaves_nothing(self, store):
+        """Test a bad body raises and leaves no temporary file"""
+        with pytest.raises(ValueError):
+            store.put("not*base64")
+        assert not any(p.is_file() for p in store.root.rglob("*"))
+
+    def test_memory_does_not_grow_with_size(self, store):
+        """Test decoding allocates chunks, not a copy of the attachment"""
+        data = _encode(b"\x00\xff" * (4 * 1024 * 1024))
+        tracemalloc.start()
+        store.put(data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert peak < 4 * module.DECODE_CHUNK
+
+    def test_export_keeps_names_inside_directory(self, store, tmp_path):
+        """Test exported names are reduced to their last path component"""
+        digest, _ = store.put(_encode(b"x"))
+        target = store.export(digest, tmp_path / "out", "../../etc/passwd")
+        assert target == tmp_path / "out" / "passwd"
+        assert store.export(digest, tmp_path / "out", "..") == tmp_path / "out" / f"attachment-{digest[:12]}"
+
+    def test_export_never_overwrites(self, store, tmp_path):
+        """Test a different file with the same name gets a suffixed name"""
+        (tmp_path / "out").mkdir()
+        (tmp_path / "out" / "a.txt").write_bytes(b"other")
+        digest, _ = store.put(_encode(b"mine"))
+        target = store.export(digest, tmp_path / "out", "a.txt")
+        assert target.name == "a (1).txt" and target.read_bytes() == b"mine"
+        assert (tmp_path / "out" / "a.txt").read_bytes() == b"other"
+        assert store.export(digest, tmp_path / "out", "a.txt") == target
+
+    def test_export_is_independent_copy(self, store, tmp_path):
+        """Test writing to an exported file leaves the stored file intact"""
+        digest, _ = store.put(_encode(b"mine"))
+        target = store.export(digest, tmp_path / "out", "a.txt")
+        target.write_bytes(b"edited")
+        assert store.path_of(digest).read_bytes() == b"mine"
+
+
+class TestDownloadAttachments:
+    """Test gmail_download_attachments"""
+
+    def test_downloads_all_attachments(self, fake_gmail, store, tmp_path):
+        """Test nested and inline attachments are stored and placed in save_dir"""
+        box = AttachmentMailbox({"a.pdf": b"pdf" * 1000, "b.bin": b"\x00\x01"}, inline={"c.csv": b"x,y"})
+        fake_gmail.handler = box.handler
+        results = gmail_download_attachments("m1", save_dir=str(tmp_path / "out"))
+        assert [r["filename"] for r in results] == ["a.pdf", "b.bin", "c.csv"]
+        assert sorted(box.fetched) == ["att-a.pdf", "att-b.bin"]  # c.csv came inline
+        for result, content in zip(results, [b"pdf" * 1000, b"\x00\x01", b"x,y"]):
+            assert result["size"] == len(content)
+            assert result["sha256"] == hashlib.sha256(content).hexdigest()
+            assert (tmp_path / "out" / result["filename"]).read_bytes() == content
+
+    def test_filter_by_filename(self, fake_gmail, store):
+        """Test only requested filenames are downloaded"""
+        box = AttachmentMailbox({"a.pdf": b"a", "b.pdf": b"b"})
+        fake_gmail.handler = box.handler
+        results = gmail_download_attachments("m1", filenames=["b.pdf"])
+        assert [r["filename"] for r in results] == ["b.pdf"]
+        assert box.fetched == ["att-b.pdf"]
+        assert results[0]["path"] == str(store.path_of(results[0]["sha256"]))
+
+    def test_concurrency_is_capped(self, fake_gmail, store, monkeypatch):
+        """Test attachments download in parallel, at most GMAIL_ATTACHMENT_CONCURRENCY at once"""
+        from src import config
+
+        monkeypatch.setattr(config, "GMAIL_ATTACHMENT_CONCURRENCY", 2)
+        box = AttachmentMailbox({f"f{i}": bytes([i]) * 10 for i in range(6)})
+        box.release.clear()
+        fake_gmail.handler = box.handler
+        threading.Timer(0.2, box.release.set).start()
+        results = gmail_download_attachments("m1")
+        assert len(results) == 6 and all("error" not in r for r in results)
+        assert box.max_in_flight == 2
+
+    def test_error_is_per_attachment(self, fake_gmail, store):
+        """Test a failed attachment is reported and the others still download"""
+        box = AttachmentMailbox({"ok.txt": b"ok", "gone.txt": b"gone"})
+        handler = box.handler
+
+        def failing(method, path, query, body):
+            if path.endswith("att-gone.txt"):
+                return 404, {"error": {"code": 404}}
+            return handler(method, path, query, body)
+
+        fake_gmail.handler = failing
+        results = gmail_download_attachments("m1")
+        assert "sha256" in results[0] and "error" in results[1]
@@ -0,0 +1,103 @@
+"""
+Tests for batch execution of Google API requests
+
+Tests chunking, result order, per-item errors and retries of the batch
+helper, and the round trips of the Gmail listing tools.
+"""
+
+from src.tools.batch import execute_batch
+from src.tools.discovery import DiscoveryRegistry
+from src.tools.gmail_tool import gmail_list_unread, gmail_search_messages
+
+from .conftest import FakeGoogleHttp
+
+
+def _message(path: str) -> dict:
+    message_id = path.rsplit("/", 1)[-1]
+    return {
+        "id": message_id,
+        "payload": {"headers": [{"name": "Subject", "value": f"subject {message_id}"}]},
+    }
+
+
+def _gets(service, ids):
+    return [service.users().messages().get(userId="me", id=i) for i in ids]
+
+
+class TestExecuteBatch:
+    """Test execute_batch"""
+
+    def test_results_in_request_order(self):
+        """Test responses are returned in the order of the requests"""
+        http = FakeGoogleHttp(lambda method, path, query, body: (200, _message(path)))
+        service = DiscoveryRegistry().build("gmail", "v1", http=http)
+        ids = [f"m{i}" for i in range(30)]
+        results = execute_batch(service, _gets(service, ids))
+        assert [response["id"] for response, _ in results] == ids
+        assert http.round_trips == 1
+
+    def test_chunks_of_batch_size(self):
+        """Test requests are split into batches of at most batch_size"""
+        http = FakeGoogleHttp(lambda method, path, query, body: (200, _message(path)))
+        service = DiscoveryRegistry().build("gmail", "v1", http=http)
+        execute_batch(service, _gets(service, [str(i) for i in range(250)]), batch_size=100)
+        assert http.round_trips == 3
+
+    def test_per_item_errors(self):
+        """Test a failing sub-request only fails its own result"""
+        def handler(method, path, query, body):
+            if path.endswith("/missing"):
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, _message(path)
+
+        http = FakeGoogleHttp(handler)
+        service = DiscoveryRegistry().build("gmail", "v1", http=http)
+        results = execute_batch(service, _gets(service, ["a", "missing", "b"]))
+        assert results[0][0]["id"] == "a" and results[0][1] is None
+        assert results[1][0] is None and results[1][1].resp.status == 404
+        assert results[2][0]["id"] == "b"
+
+    def test_rate_limited_items_are_retried(self):
+        """Test sub-requests answered with 429 are resent in a follow-up batch"""
+        attempts = {}
+
+        def handler(method, path, query, body):
+            attempts[path] = attempts.get(path, 0) + 1
+            if path.endswith("/busy") and attempts[path] == 1:
+                return 429, {"error": {"code": 429, "message": "Too many concurrent requests"}}
+            return 200, _message(path)
+
+        http = FakeGoogleHttp(handler)
+        service = DiscoveryRegistry().build("gmail", "v1", http=http)
+        results = execute_batch(service, _gets(service, ["a", "busy"]), backoff=0)
+        assert results[1][0]["id"] == "busy"
+        assert http.round_trips == 2
+
+
+class TestGmailListingRoundTrips:
+    """Test listing tools fetch message metadata in batches"""
+
+    def _handler(self, count):
+        def handler(method, path, query, body):
+            if path.endswith("/messages"):
+                return 200, {"messages": [{"id": f"m{i}"} for i in range(count)]}
+            if path.endswith("/m3"):
+                return 404, {"error": {"code": 404, "message": "Not Found"}}
+            return 200, _message(path)
+        return handler
+
+    def test_list_unread_costs_two_round_trips(self, fake_gmail):
+        """Test listing 50 messages takes one list and one batch call"""
+        fake_gmail.handler = self._handler(50)
+        results = gmail_list_unread(max_results=50)
+        assert fake_gmail.round_trips == 2
+        assert [r["id"] for r in results] == [f"m{i}" for i in range(50)]
+        assert results[0]["subject"] == "subject m0"
+
+    def test_search_reports_per_message_errors(self, fake_gmail):
+        """Test a message that fails to load is reported with its error"""
+        fake_gmail.handler = self._handler(5)
+        results = gmail_search_messages("from:someone", max_results=5)
+        assert results[3]["id"] == "m3"
+        assert "error" in results[3]
+        assert results[4]["subject"] == "subject m4"
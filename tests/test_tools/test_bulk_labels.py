@@ -0,0 +1,107 @@
+"""
+Tests for bulk label modification
+
+Tests that label changes on many messages are sent through
+messages.batchModify in chunks, report per-chunk status, and keep local
+mailbox state in step.
+"""
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.tools import gmail_tool
+from src.tools.gmail_tool import (
+    gmail_mark_as_read,
+    gmail_mark_as_read_bulk,
+    gmail_modify_message,
+    gmail_modify_messages_bulk,
+)
+from src.tools.mailbox_sync import MessageState
+
+
+@pytest.fixture
+def inbox(fake_gmail, mailbox):
+    """Fake Gmail serving a mailbox of 25 unread INBOX messages"""
+    for index in range(25):
+        mailbox.add(f"u{index}", ["INBOX", "UNREAD"], 2000 + index)
+    fake_gmail.handler = mailbox.handler
+    return mailbox
+
+
+class TestBulkModify:
+    """Test bulk tools chunk ids into batchModify requests"""
+
+    def test_one_request_per_chunk(self, fake_gmail, inbox, monkeypatch):
+        """Test ids are sent BATCH_MODIFY_MAX at a time with per-chunk status"""
+        monkeypatch.setattr(gmail_tool, "BATCH_MODIFY_MAX", 10)
+        ids = [f"u{index}" for index in range(25)]
+        result = gmail_mark_as_read_bulk(ids, archive=True)
+        assert inbox.batch_modify_calls == [10, 10, 5]
+        assert fake_gmail.round_trips == 3
+        assert result["requested"] == 25 and result["modified"] == 25
+        assert [(c["start"], c["count"], c["status"]) for c in result["chunks"]] == [
+            (0, 10, "ok"), (10, 10, "ok"), (20, 5, "ok"),
+        ]
+        assert all(inbox.messages[i]["labelIds"] == [] for i in ids)
+
+    def test_duplicates_sent_once(self, inbox):
+        """Test repeated ids are modified once"""
+        result = gmail_modify_messages_bulk(["u1", "u2", "u1"], add_labels=["STARRED"])
+        assert inbox.batch_modify_calls == [2]
+        assert result["modified"] == 2
+
+    def test_failed_chunk_does_not_stop_others(self, fake_gmail, inbox, monkeypatch):
+        """Test an error in one chunk is reported and later chunks still run"""
+        monkeypatch.setattr(gmail_tool, "BATCH_MODIFY_MAX", 2)
+        handler = inbox.handler
+
+        def failing(method, path, query, body):
+            if path.endswith("batchModify") and "u0" in body["ids"]:
+                return 500, {"error": {"code": 500, "message": "backend error"}}
+            return handler(method, path, query, body)
+
+        fake_gmail.handler = failing
+        result = gmail_modify_messages_bulk(["u0", "u1", "u2", "u3"], remove_labels=["UNREAD"])
+        assert [c["status"] for c in result["chunks"]] == ["error", "ok"]
+        assert result["modified"] == 2
+        assert "UNREAD" in inbox.messages["u0"]["labelIds"]
+        assert "UNREAD" not in inbox.messages["u3"]["labelIds"]
+
+    def test_requires_labels(self, inbox):
+        """Test a call without labels is rejected"""
+        with pytest.raises(ValueError):
+            gmail_modify_messages_bulk(["u1"])
+
+
+class TestSingleMessage:
+    """Test single-message tools go through the same engine"""
+
+    def test_single_message_uses_modify(self, fake_gmail, inbox):
+        """Test one message costs one modify request that returns its labels"""
+        assert gmail_mark_as_read("u3") == {"id": "u3", "labelIds": ["INBOX"]}
+        assert inbox.batch_modify_calls == []
+        assert fake_gmail.round_trips == 1
+
+    def test_single_message_error_raises(self, inbox):
+        """Test a missing message raises instead of returning a status"""
+        with pytest.raises(HttpError):
+            gmail_modify_message("missing", add_labels=["STARRED"])
+
+
+class TestLocalState:
+    """Test bulk changes are recorded in local mailbox state"""
+
+    def test_bulk_read_updates_unread_listing(self, mailbox_sync, inbox):
+        """Test messages marked read in bulk leave the local unread listing at once"""
+        gmail_tool.gmail_list_unread(max_results=50)
+        mailbox_sync.min_interval = 60
+        unread = [f"u{index}" for index in range(25)] + ["m1"]
+        gmail_mark_as_read_bulk(unread)
+        assert [m["id"] for m in gmail_tool.gmail_list_unread(max_results=50)] == ["m3"]
+
+    def test_store_relabel(self, mailbox_sync):
+        """Test relabelling changes tracked messages and ignores untracked ones"""
+        store = mailbox_sync.store
+        store.replace("t", [MessageState("a", "ta", ("INBOX", "UNREAD"), 1)], "1", True)
+        store.relabel("t", ["a", "nope"], add=["STARRED"], remove=["UNREAD"])
+        assert store.labels_of("t", ["a", "nope"]) == {"a": ("INBOX", "STARRED")}
@@ -0,0 +1,309 @@
+"""
+Tests for incremental calendar sync
+
+Tests full sync, syncToken deltas (changed and cancelled events), resync on
+410 Gone, range queries through the start-time index, the calendar tools
+served from the local store and ETag-conditional updates.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.tools.calendar_sync import CalendarStore, CalendarSync, timestamp_of
+from src.tools.calendar_tool import (
+    UPDATE_CONFLICT_RETRIES,
+    calendar_create_event,
+    calendar_delete_event,
+    calendar_get_event,
+    calendar_list_events,
+    calendar_upcoming,
+    calendar_update_event,
+)
+from src.tools.discovery import DiscoveryRegistry
+
+from .conftest import FakeGoogleHttp
+
+
+def _iso(hours: float) -> str:
+    """ISO time the given number of hours from now"""
+    return (datetime.now(timezone.utc) + timedelta(hours=hours)).replace(microsecond=0).isoformat()
+
+
+@pytest.fixture
+def engine(tmp_path, calendar):
+    http = FakeGoogleHttp(calendar.handler)
+    service = DiscoveryRegistry().build("calendar", "v3", http=http)
+    store = CalendarStore(tmp_path / "calendar.sqlite3")
+    yield CalendarSync(store, min_interval=0), service, http
+    store.close()
+
+
+class TestCalendarSync:
+    """Test CalendarSync keeps local events in step with Google"""
+
+    def test_first_sync_is_full(self, engine, calendar):
+        """Test the first sync lists every page and stores the events"""
+        sync, service, http = engine
+        for index in range(3):
+            calendar.put(f"e{index}", f"2036-03-0{index + 1}T10:00:00Z", f"2036-03-0{index + 1}T11:00:00Z")
+        assert sync.sync("t", "primary", service) == "full"
+        assert [e["id"] for e in sync.store.between("t", "primary")] == ["e0", "e1", "e2"]
+
+    def test_delta_applies_changes_and_cancellations(self, engine, calendar):
+        """Test a later sync sends the syncToken and applies only the changes"""
+        sync, service, http = engine
+        calendar.put("a", "2036-03-01T10:00:00Z", "2036-03-01T11:00:00Z")
+        calendar.put("b", "2036-03-02T10:00:00Z", "2036-03-02T11:00:00Z")
+        sync.sync("t", "primary", service)
+        calendar.put("a", "2036-03-05T10:00:00Z", "2036-03-05T11:00:00Z", summary="moved")
+        calendar.cancel("b")
+        calendar.put("c", "2036-03-03T10:00:00Z", "2036-03-03T11:00:00Z")
+        assert sync.sync("t", "primary", service) == "incremental"
+        assert calendar.lists[-1]["syncToken"] == ["tok-2"]
+        assert [(e["id"], e["summary"]) for e in sync.store.between("t", "primary")] == [("c", "c"), ("a", "moved")]
+
+    def test_unchanged_calendar_costs_one_small_request(self, engine, calendar):
+        """Test a poll of an unchanged calendar is one empty delta"""
+        sync, service, http = engine
+        calendar.put("a", "2036-03-01T10:00:00Z", "2036-03-01T11:00:00Z")
+        sync.sync("t", "primary", service)
+        http.round_trips = 0
+        sync.sync("t", "primary", service)
+        assert http.round_trips == 1
+
+    def test_gone_token_runs_full_sync(self, engine, calendar):
+        """Test 410 Gone replaces local events with a full listing"""
+        sync, service, http = engine
+        calendar.put("a", "2036-03-01T10:00:00Z", "2036-03-01T11:00:00Z")
+        sync.sync("t", "primary", service)
+        calendar.put("b", "2036-03-02T10:00:00Z", "2036-03-02T11:00:00Z")
+        calendar.oldest_token = calendar.sequence
+        assert sync.sync("t", "primary", service) == "full"
+        assert [e["id"] for e in sync.store.between("t", "primary")] == ["a", "b"]
+
+    def test_missing_token_resyncs_next_time(self, engine, calendar):
+        """Test a listing without nextSyncToken is kept and the next sync is a full one"""
+        sync, service, http = engine
+        handler = calendar.handler
+
+        def tokenless(method, path, query, body):
+            status, resp = handler(method, path, query, body)
+            resp.pop("nextSyncToken", None)
+            return status, resp
+
+        http.handler = tokenless
+        calendar.put("a", "2036-03-01T10:00:00Z", "2036-03-01T11:00:00Z")
+        assert sync.sync("t", "primary", service) == "full"
+        assert [e["id"] for e in sync.store.between("t", "primary")] == ["a"]
+        http.handler = handler
+        assert sync.sync("t", "primary", service) == "full"
+        assert sync.sync("t", "primary", service) == "incremental"
+
+    def test_full_sync_is_bounded(self, engine, calendar):
+        """Test the full listing starts past_days ago and later deltas are unbounded"""
+        sync, service, http = engine
+        sync.past_days = 30
+        calendar.put("old", _iso(-24 * 40), _iso(-24 * 40 + 1))
+        calendar.put("recent", _iso(-24 * 10), _iso(-24 * 10 + 1))
+        sync.sync("t", "primary", service)
+        assert "timeMin" in calendar.lists[0]
+        assert [e["id"] for e in sync.store.between("t", "primary")] == ["recent"]
+        assert sync.store.info("t", "primary").synced_from == pytest.approx(
+            datetime.now(timezone.utc).timestamp() - 30 * 86400, abs=60
+        )
+        sync.sync("t", "primary", service)
+        assert "timeMin" not in calendar.lists[-1]
+
+    def test_all_day_events_in_calendar_zone(self, engine, calendar):
+        """Test all-day events span midnight to midnight in the calendar's time zone"""
+        sync, service, http = engine
+        calendar.time_zone = "Europe/Madrid"
+        calendar.put("day", "2036-03-05", "2036-03-06")
+        sync.sync("t", "primary", service)
+        assert sync.store.info("t", "primary").time_zone == "Europe/Madrid"
+        # Madrid is UTC+1 in March: the day is 2036-03-04T23:00Z to 2036-03-05T23:00Z
+        late = timestamp_of({"dateTime": "2036-03-05T23:30:00Z"})
+        early = timestamp_of({"dateTime": "2036-03-04T23:30:00Z"})
+        assert sync.store.between("t", "primary", late) == []
+        assert [e["id"] for e in sync.store.between("t", "primary", early, early + 60)] == ["day"]
+
+    def test_min_interval_skips_requests(self, engine, calendar):
+        """Test a fresh calendar is not asked again, unless expired"""
+        sync, service, http = engine
+        sync.min_interval = 60
+        sync.sync("t", "primary", service)
+        assert sync.sync("t", "primary", service) == "fresh"
+        sync.expire("t", "primary")
+        assert sync.sync("t", "primary", service) == "incremental"
+
+
+class TestCalendarStore:
+    """Test range queries over the start-time index"""
+
+    def test_overlapping_events(self, tmp_path):
+        """Test a range returns events overlapping it, including long ones starting before it"""
+        store = CalendarStore(tmp_path / "c.sqlite3")
+        store.replace("t", "primary", [
+            {"id": "week", "start": {"date": "2036-03-01"}, "end": {"date": "2036-03-08"}},
+            {"id": "before", "start": {"dateTime": "2036-03-04T08:00:00Z"}, "end": {"dateTime": "2036-03-04T09:00:00Z"}},
+            {"id": "inside", "start": {"dateTime": "2036-03-04T10:00:00+01:00"}, "end": {"dateTime": "2036-03-04T12:00:00+01:00"}},
+            {"id": "after", "start": {"dateTime": "2036-03-04T12:00:00Z"}, "end": {"dateTime": "2036-03-04T13:00:00Z"}},
+        ], "tok")
+        start = timestamp_of({"dateTime": "2036-03-04T09:00:00Z"})
+        end = timestamp_of({"dateTime": "2036-03-04T12:00:00Z"})
+        assert [e["id"] for e in store.between("t", "primary", start, end)] == ["week", "inside"]
+        assert [e["id"] for e in store.between("t", "primary", start, end, limit=1)] == ["week"]
+        store.close()
+
+    def test_range_uses_start_index(self, tmp_path):
+        """Test range queries are planned on the start-time index"""
+        store = CalendarStore(tmp_path / "c.sqlite3")
+        plan = store._db.execute(
+            "EXPLAIN QUERY PLAN SELECT event FROM events WHERE tenant = ? AND calendar_id = ? "
+            "AND start_ts >= ? AND end_ts > ? AND start_ts < ? ORDER BY start_ts, id",
+            ("t", "primary", 0, 0, 1),
+        ).fetchall()
+        assert "events_start" in " ".join(row[-1] for row in plan)
+        store.close()
+
+
+class TestCalendarTools:
+    """Test calendar tools served from the synced store"""
+
+    def test_upcoming_polls_cost_one_delta(self, fake_calendar_http, calendar):
+        """Test repeated upcoming calls after the first cost one delta request each"""
+        calendar.put("past", _iso(-5), _iso(-4))
+        calendar.put("now", _iso(-1), _iso(1))
+        calendar.put("soon", _iso(2), _iso(3))
+        calendar.put("later", _iso(30), _iso(31))
+        assert [e["id"] for e in calendar_upcoming(max_events=2)] == ["now", "soon"]
+        fake_calendar_http.round_trips = 0
+        assert [e["id"] for e in calendar_upcoming(max_events=10)] == ["now", "soon", "later"]
+        assert fake_calendar_http.round_trips == 1
+        assert "syncToken" in calendar.lists[-1]
+
+    def test_failed_sync_asks_google(self, fake_calendar_http, calendar, monkeypatch):
+        """Test the tools list from Google when the sync raises"""
+        from src.tools import calendar_sync
+
+        def broken(*args):
+            raise RuntimeError("store unavailable")
+
+        monkeypatch.setattr(calendar_sync._sync, "sync", broken)
+        calendar.put("soon", _iso(2), _iso(3))
+        assert [e["id"] for e in calendar_upcoming()] == ["soon"]
+        assert "orderBy" in calendar.lists[-1]
+
+    def test_list_events_range(self, fake_calendar_http, calendar):
+        """Test a range query returns the overlapping events in start order"""
+        calendar.put("a", "2036-03-04T09:00:00Z", "2036-03-04T10:00:00Z")
+        calendar.put("b", "2036-03-05", "2036-03-06")
+        calendar.put("c", "2036-03-07T09:00:00Z", "2036-03-07T10:00:00Z")
+        assert [e["id"] for e in calendar_list_events("2036-03-04", "2036-03-06")] == ["a", "b"]
+
+    def test_range_before_window_asks_google(self, fake_calendar_http, calendar):
+        """Test a range reaching before the synced window is listed by Google"""
+        from src.tools import calendar_sync
+
+        calendar_sync._sync.past_days = 30
+        calendar.put("old", _iso(-24 * 40), _iso(-24 * 40 + 1))
+        calendar_upcoming()
+        assert [e["id"] for e in calendar_list_events(_iso(-24 * 41), _iso(-24 * 39))] == ["old"]
+        assert "orderBy" in calendar.lists[-1]
+
+    def test_get_event_is_local(self, fake_calendar_http, calendar):
+        """Test a synced event is looked up without a request of its own"""
+        calendar.put("a", "2036-03-04T09:00:00Z", "2036-03-04T10:00:00Z", location="Room 1")
+        calendar_upcoming()
+        fake_calendar_http.requests.clear()
+        assert calendar_get_event("a")["location"] == "Room 1"
+        assert all(path.endswith("/events") for _, path in fake_calendar_http.requests)
+
+    def test_changes_are_visible_at_once(self, fake_calendar_http, calendar):
+        """Test events created or deleted through the tools show up within the sync interval"""
+        from src.tools import calendar_sync
+
+        calendar_sync._sync.min_interval = 60
+        calendar.put("a", _iso(1), _iso(2))
+        calendar_upcoming()
+        created = calendar_create_event("New", _iso(3), _iso(4))
+        calendar_delete_event("a")
+        assert [e["id"] for e in calendar_upcoming()] == [created["id"]]
+
+
+class TestConditionalUpdates:
+    """Test calendar_update_event patches against the synced ETag"""
+
+    @pytest.fixture
+    def synced(self, fake_calendar_http, calendar):
+        calendar.put("a", "2036-03-04T09:00:00Z", "2036-03-04T10:00:00Z", summary="Standup")
+        calendar_upcoming()
+        fake_calendar_http.requests.clear()
+        return calendar
+
+    def test_one_conditional_patch(self, fake_calendar_http, synced):
+        """Test an update is one PATCH carrying the synced ETag, with no read first"""
+        calendar_update_event("a", summary="Retro")
+        assert fake_calendar_http.requests == [("PATCH", "/calendar/v3/calendars/primary/events/a")]
+        assert fake_calendar_http.headers["if-match"] == '"1"'
+
+    def test_store_keeps_new_version(self, fake_calendar_http, synced):
+        """Test the updated event and its new ETag are stored without a resync"""
+        from src.tools import calendar_sync
+        from src.tools.services import current_tenant
+
+        calendar_update_event("a", summary="Retro")
+        fake_calendar_http.requests.clear()
+        assert calendar_get_event("a")["summary"] == "Retro"
+        assert calendar_sync._sync.store.etag(current_tenant(), "primary", "a") == synced.events["a"]["etag"]
+        assert all(path.endswith("/events") for _, path in fake_calendar_http.requests)
+
+    def test_change_to_other_fields_is_kept(self, fake_calendar_http, synced):
+        """Test a 412 caused by a change to fields the update does not set re-reads and retries"""
+        synced.put("a", "2036-03-04T09:00:00Z", "2036-03-04T10:00:00Z", summary="Standup", location="Room 2")
+        calendar_update_event("a", summary="Retro")
+        assert [method for method, _ in fake_calendar_http.requests] == ["PATCH", "GET", "PATCH"]
+        assert synced.events["a"]["summary"] == "Retro"
+        assert synced.events["a"]["location"] == "Room 2"
+
+    def test_change_to_updated_fields_conflicts(self, fake_calendar_http, synced):
+        """Test a concurrent change to a field the update sets is reported, not overwritten"""
+        synced.put("a", "2036-03-04T09:00:00Z", "2036-03-04T10:00:00Z", summary="Planning")
+        with pytest.raises(ValueError, match="Conflict.*summary"):
+            calendar_update_event("a", summary="Retro")
+        assert synced.events["a"]["summary"] == "Planning"
+        assert [method for method, _ in fake_calendar_http.requests] == ["PATCH", "GET"]
+
+    def test_unsynced_fields_conflict(self, fake_calendar_http, synced):
+        """Test fields the store does not keep cannot be checked, so a 412 is a conflict"""
+        synced._touch("a")
+        with pytest.raises(ValueError, match="Conflict.*description"):
+            calendar_update_event("a", description="Agenda")
+
+    def test_etag_without_event_conflicts(self, fake_calendar_http, synced, monkeypatch):
+        """Test a 412 for an event whose ETag is stored but whose row is gone is a conflict"""
+        from src.tools import calendar_sync
+
+        monkeypatch.setattr(calendar_sync._sync.store, "get", lambda *args: None)
+        synced._touch("a")
+        with pytest.raises(ValueError, match="Conflict.*not in the local store"):
+            calendar_update_event("a", summary="Retro")
+        assert [method for method, _ in fake_calendar_http.requests] == ["PATCH"]
+
+    def test_conflicts_exhaust_retries(self, fake_calendar_http, synced, monkeypatch):
+        """Test an event that keeps changing fails after the retries"""
+        handler = fake_calendar_http.handler
+
+        def racing(method, path, query, body):
+            if method == "PATCH":
+                synced._touch("a")
+            return handler(method, path, query, body)
+
+        monkeypatch.setattr(fake_calendar_http, "handler", racing)
+        synced._touch("a")
+        with pytest.raises(HttpError) as error:
+            calendar_update_event("a", summary="Retro")
+        assert error.value.resp.status == 412
+        assert sum(method == "PATCH" for method, _ in fake_calendar_http.requests) == UPDATE_CONFLICT_RETRIES + 1
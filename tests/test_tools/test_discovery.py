@@ -0,0 +1,75 @@
+"""
+Tests for the offline discovery registry
+
+Tests loading bundled documents once and building services from them
+without network access.
+"""
+
+import json
+import httplib2
+import pytest
+from googleapiclient.http import HttpMock, HttpRequest
+
+from src.tools.discovery import DiscoveryRegistry
+
+
+class _NoNetworkHttp(httplib2.Http):
+    """Http that fails the test on any request"""
+
+    def request(self, *args, **kwargs):
+        raise AssertionError(f"Unexpected network request: {args}")
+
+
+class TestDiscoveryRegistry:
+    """Test DiscoveryRegistry document loading and service building"""
+
+    def test_bundled_documents_load_without_network(self):
+        """Test gmail and calendar services build without touching the network"""
+        registry = DiscoveryRegistry()
+        registry.preload()
+        gmail = registry.build("gmail", "v1", http=_NoNetworkHttp())
+        calendar = registry.build("calendar", "v3", http=_NoNetworkHttp())
+        assert hasattr(gmail.users().messages(), "get")
+        assert hasattr(calendar.events(), "list")
+
+    def test_model_is_parsed_once(self):
+        """Test repeated lookups return the same parsed model"""
+        registry = DiscoveryRegistry()
+        assert registry.model("gmail", "v1") is registry.model("gmail", "v1")
+
+    def test_build_reuses_parsed_document(self, monkeypatch, tmp_path):
+        """Test building services never reads the document again"""
+        registry = DiscoveryRegistry(spec_dir=tmp_path)
+        registry.preload([("gmail", "v1")])
+        monkeypatch.setattr(registry, "_read_document", lambda api, version: pytest.fail("document read again"))
+        registry.build("gmail", "v1", http=_NoNetworkHttp())
+        registry.build("gmail", "v1", http=_NoNetworkHttp())
+
+    def test_request_matches_online_build(self):
+        """Test requests carry the same URI and method as googleapiclient builds them"""
+        registry = DiscoveryRegistry()
+        service = registry.build("gmail", "v1", http=_NoNetworkHttp())
+        request = service.users().messages().get(userId="me", id="abc", format="metadata")
+        assert isinstance(request, HttpRequest)
+        assert request.method == "GET"
+        assert request.uri.startswith("https://gmail.googleapis.com/gmail/v1/users/me/messages/abc?")
+        assert "format=metadata" in request.uri
+
+    def test_executes_through_given_http(self):
+        """Test built requests execute through the transport passed to build"""
+        registry = DiscoveryRegistry()
+        http = HttpMock(headers={"status": "200"})
+        http.data = json.dumps({"id": "abc"}).encode()
+        service = registry.build("gmail", "v1", http=http)
+        assert service.users().messages().get(userId="me", id="abc").execute() == {"id": "abc"}
+
+    def test_falls_back_to_packaged_document(self, tmp_path):
+        """Test APIs missing from the spec directory use googleapiclient's copy"""
+        registry = DiscoveryRegistry(spec_dir=tmp_path)
+        assert registry.model("calendar", "v3").name == "calendar"
+
+    def test_unknown_api_raises(self, tmp_path):
+        """Test unknown APIs are reported instead of fetched from the network"""
+        registry = DiscoveryRegistry(spec_dir=tmp_path)
+        with pytest.raises(ValueError):
+            registry.model("nosuchapi", "v0")
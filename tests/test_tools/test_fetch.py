@@ -0,0 +1,105 @@
+"""
+Tests for concurrent bounded fetching
+
+Tests ordering, per-item errors, the concurrency cap, context propagation
+and the bulk read tools built on it.
+"""
+
+import contextvars
+import threading
+import time
+
+from src.tools.fetch import fetch_concurrently
+from src.tools.gmail_tool import gmail_get_messages_bulk, gmail_search_and_read
+
+request_var = contextvars.ContextVar("request_var", default=None)
+
+
+class TestFetchConcurrently:
+    """Test fetch_concurrently"""
+
+    def test_results_in_input_order(self):
+        """Test results follow input order even when later items finish first"""
+        def fetch(item):
+            time.sleep(0.01 * (5 - item))
+            return item * 10
+
+        results = fetch_concurrently(list(range(5)), fetch, concurrency=5)
+        assert [value for value, _ in results] == [0, 10, 20, 30, 40]
+
+    def test_per_item_errors(self):
+        """Test a failing item keeps its exception and does not stop the others"""
+        def fetch(item):
+            if item == "bad":
+                raise LookupError("missing")
+            return item
+
+        results = fetch_concurrently(["a", "bad", "c"], fetch, concurrency=3)
+        assert results[0] == ("a", None)
+        assert isinstance(results[1][1], LookupError)
+        assert results[2] == ("c", None)
+
+    def test_concurrency_cap(self):
+        """Test no more than `concurrency` items are fetched at once"""
+        lock = threading.Lock()
+        active = peak = 0
+
+        def fetch(item):
+            nonlocal active, peak
+            with lock:
+                active += 1
+                peak = max(peak, active)
+            time.sleep(0.02)
+            with lock:
+                active -= 1
+            return item
+
+        fetch_concurrently(list(range(12)), fetch, concurrency=3)
+        assert peak == 3
+
+    def test_wall_clock_follows_slowest_item(self):
+        """Test items run concurrently rather than one after another"""
+        start = time.perf_counter()
+        fetch_concurrently(list(range(8)), lambda item: time.sleep(0.1), concurrency=8)
+        assert time.perf_counter() - start < 0.4
+
+    def test_context_is_copied_into_workers(self):
+        """Test workers see the caller's contextvars (e.g. the MCP request)"""
+        request_var.set("request-1")
+        results = fetch_concurrently([1, 2, 3], lambda item: request_var.get(), concurrency=3)
+        assert [value for value, _ in results] == ["request-1"] * 3
+
+
+class TestBulkRead:
+    """Test bulk read tools use the concurrent engine"""
+
+    def _handler(self, method, path, query, body):
+        if path.endswith("/messages"):
+            return 200, {"messages": [{"id": "a"}, {"id": "missing"}, {"id": "b"}]}
+        message_id = path.rsplit("/", 1)[-1]
+        if message_id == "missing":
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        time.sleep(0.05)
+        return 200, {
+            "id": message_id,
+            "snippet": f"snippet {message_id}",
+            "payload": {
+                "mimeType": "text/plain",
+                "headers": [{"name": "Subject", "value": f"subject {message_id}"}],
+                "body": {"data": "aGVsbG8="},
+            },
+        }
+
+    def test_bulk_keeps_order_and_errors(self, fake_gmail):
+        """Test bulk results follow the given ids and keep per-message errors"""
+        fake_gmail.handler = self._handler
+        results = gmail_get_messages_bulk(["b", "missing", "a"])
+        assert [r["id"] for r in results] == ["b", "missing", "a"]
+        assert results[0]["text"] == "hello"
+        assert "error" in results[1]
+
+    def test_search_and_read(self, fake_gmail):
+        """Test search results are read in full"""
+        fake_gmail.handler = self._handler
+        results = gmail_search_and_read("subject:x", max_results=3)
+        assert [r.get("subject") for r in results] == ["subject a", None, "subject b"]
@@ -0,0 +1,145 @@
+"""
+Tests for the free/busy slot finder
+
+Tests interval merging, working hours across time zones and DST, the slot
+walk, and calendar_find_free_slots answering from one freebusy.query.
+"""
+
+from datetime import datetime, time, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from src.tools.calendar_tool import calendar_find_free_slots
+from src.tools.freebusy import FREEBUSY_MAX_CALENDARS, free_slots, merge_intervals, working_windows
+
+UTC = timezone.utc
+HOUR = 3600.0
+
+
+def _ts(value: str) -> float:
+    return datetime.fromisoformat(value).timestamp()
+
+
+class TestMergeIntervals:
+    """Test merge_intervals"""
+
+    def test_overlapping_touching_and_nested(self):
+        """Test overlapping, touching and nested intervals become one, in order"""
+        assert merge_intervals([(5, 6), (1, 3), (2, 4), (4, 4.5), (8, 9), (8.2, 8.5)]) == [(1, 4.5), (5, 6), (8, 9)]
+
+    def test_empty(self):
+        """Test no intervals merge to none"""
+        assert merge_intervals([]) == []
+
+
+class TestWorkingWindows:
+    """Test working_windows"""
+
+    def test_weekdays_clipped_to_range(self):
+        """Test working hours skip the weekend and are clipped to the range"""
+        start = datetime(2026, 3, 6, 12, tzinfo=UTC)  # Friday
+        end = datetime(2026, 3, 9, 10, tzinfo=UTC)  # Monday
+        windows = list(working_windows(start, end, UTC, time(9), time(17)))
+        assert windows == [
+            (_ts("2026-03-06T12:00:00+00:00"), _ts("2026-03-06T17:00:00+00:00")),
+            (_ts("2026-03-09T09:00:00+00:00"), _ts("2026-03-09T10:00:00+00:00")),
+        ]
+        assert len(list(working_windows(start, end, UTC, time(9), time(17), weekends=True))) == 4
+
+    def test_local_time_and_dst(self):
+        """Test working hours follow the wall clock of the zone across a DST change"""
+        zone = ZoneInfo("America/New_York")
+        start = datetime(2026, 3, 6, tzinfo=zone)
+        end = datetime(2026, 3, 10, tzinfo=zone)
+        opens = [datetime.fromtimestamp(s, UTC).hour for s, _ in working_windows(start, end, zone, time(9), time(17))]
+        assert opens == [14, 13]  # Friday 09:00 EST, Monday 09:00 EDT (DST began on 8 March)
+
+
+class TestFreeSlots:
+    """Test free_slots"""
+
+    def test_slots_avoid_busy_and_align(self):
+        """Test slots fit between busy intervals and start on the step grid"""
+        busy = merge_intervals([(9.25 * HOUR, 10 * HOUR), (11 * HOUR, 12 * HOUR)])
+        slots = list(free_slots(busy, [(9 * HOUR, 13 * HOUR)], 0.5 * HOUR))
+        assert [(s / HOUR, e / HOUR) for s, e in slots] == [
+            (10, 10.5), (10.5, 11), (12, 12.5), (12.5, 13),
+        ]
+
+    def test_busy_spanning_windows(self):
+        """Test a busy interval longer than a window blocks it and the next one up to its end"""
+        busy = [(8 * HOUR, 34 * HOUR)]
+        windows = [(9 * HOUR, 17 * HOUR), (33 * HOUR, 41 * HOUR)]
+        assert next(free_slots(busy, windows, HOUR)) == (34 * HOUR, 35 * HOUR)
+
+    def test_unaligned_window(self):
+        """Test a slot starts on the next grid point, and none is made if it no longer fits"""
+        assert list(free_slots([], [(9.1 * HOUR, 10 * HOUR)], 0.5 * HOUR)) == [(9.25 * HOUR, 9.75 * HOUR)]
+
+
+@pytest.fixture
+def team(fake_calendar_http, calendar):
+    """Primary calendar and two attendees with meetings on Monday 9 March 2026 (UTC)"""
+    calendar.busy = {
+        "primary": [("2026-03-09T09:00:00Z", "2026-03-09T10:00:00Z")],
+        "ana@example.com": [("2026-03-09T09:30:00Z", "2026-03-09T11:00:00Z")],
+        "ben@example.com": [
+            ("2026-03-09T11:30:00Z", "2026-03-09T16:00:00Z"),
+            ("2026-03-09T16:30:00Z", "2026-03-10T00:00:00Z"),
+        ],
+    }
+    return calendar
+
+
+class TestFindFreeSlots:
+    """Test calendar_find_free_slots"""
+
+    def test_common_slots_from_one_request(self, fake_calendar_http, team):
+        """Test one freebusy query covers every calendar and the earliest common slots are returned"""
+        result = calendar_find_free_slots(
+            "2026-03-09", "2026-03-11", 30, attendees=["ana@example.com", "ben@example.com"], max_slots=3,
+        )
+        assert fake_calendar_http.requests == [("POST", "/calendar/v3/freeBusy")]
+        assert [item["id"] for item in team.freebusy_queries[0]["items"]] == [
+            "primary", "ana@example.com", "ben@example.com",
+        ]
+        assert [slot["start"] for slot in result["slots"]] == [
+            "2026-03-09T11:00:00+00:00", "2026-03-09T16:00:00+00:00", "2026-03-10T09:00:00+00:00",
+        ]
+        assert result["errors"] == {}
+
+    def test_time_zone(self, fake_calendar_http, team):
+        """Test working hours and returned times are in the requested zone"""
+        result = calendar_find_free_slots(
+            "2026-03-09", "2026-03-10", 60, attendees=["ana@example.com"], time_zone="Europe/Madrid",
+            working_hours="10:00-14:00",
+        )
+        assert [slot["start"] for slot in result["slots"]] == [
+            "2026-03-09T12:00:00+01:00", "2026-03-09T13:00:00+01:00",
+        ]
+
+    def test_unreadable_calendar_reported(self, fake_calendar_http, team):
+        """Test a calendar freebusy cannot read is reported"""
+        result = calendar_find_free_slots("2026-03-09", "2026-03-10", attendees=["who@example.com"])
+        assert result["errors"] == {"who@example.com": "notFound"}
+
+    def test_many_attendees_are_chunked(self, fake_calendar_http, team):
+        """Test more calendars than one query allows are split across queries"""
+        attendees = [f"user{index}@example.com" for index in range(FREEBUSY_MAX_CALENDARS + 10)]
+        calendar_find_free_slots("2026-03-09", "2026-03-10", attendees=attendees)
+        assert [len(query["items"]) for query in team.freebusy_queries] == [FREEBUSY_MAX_CALENDARS, 11]
+
+    @pytest.mark.parametrize("kwargs", [
+        {"time_zone": "Mars/Olympus"},
+        {"working_hours": "nine to five"},
+        {"working_hours": "17:00-09:00"},
+        {"duration_minutes": 0},
+        {"time_max": "2026-03-08"},
+    ])
+    def test_invalid_arguments(self, fake_calendar_http, kwargs):
+        """Test invalid arguments fail before any request"""
+        arguments = {"time_min": "2026-03-09", "time_max": "2026-03-10", **kwargs}
+        with pytest.raises(ValueError):
+            calendar_find_free_slots(**arguments)
+        assert fake_calendar_http.round_trips == 0
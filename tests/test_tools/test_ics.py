@@ -0,0 +1,163 @@
+"""
+Tests for the streaming iCalendar writer
+
+Tests escaping, line folding, time and recurrence properties, VTIMEZONE
+generation and calendar_export_range streaming a paged listing to disk.
+"""
+
+import io
+from datetime import datetime, timezone
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.tools.calendar_tool import calendar_export_range
+from src.tools.ics import LINE_LIMIT, IcsWriter, escape_text, fold
+
+
+def _ics(*events, period=None) -> list[str]:
+    """Unfolded content lines of a calendar of events"""
+    stream = io.StringIO(newline="")
+    writer = IcsWriter(stream, period)
+    for event in events:
+        writer.write_event(event)
+    writer.close()
+    return stream.getvalue().replace("\r\n ", "").split("\r\n")[:-1]
+
+
+def _event(event_id="e1", **fields) -> dict:
+    return {
+        "id": event_id,
+        "iCalUID": f"{event_id}@google.com",
+        "status": "confirmed",
+        "start": {"dateTime": "2026-03-04T09:00:00Z"},
+        "end": {"dateTime": "2026-03-04T10:00:00Z"},
+        **fields,
+    }
+
+
+class TestEncoding:
+    """Test TEXT escaping and line folding"""
+
+    def test_escape(self):
+        """Test backslashes, separators and line breaks are escaped"""
+        assert escape_text("a\\b; c, d\r\ne\nf") == "a\\\\b\\; c\\, d\\ne\\nf"
+
+    def test_short_line_unchanged(self):
+        """Test a line within the limit only gets its CRLF"""
+        assert fold("SUMMARY:Standup") == "SUMMARY:Standup\r\n"
+
+    @pytest.mark.parametrize("text", ["x" * 200, "é" * 100, "日本語" * 40, "a" + "😀" * 50])
+    def test_fold_limits_octets(self, text):
+        """Test folded lines stay within 75 octets, never split a character and unfold to the original"""
+        line = f"DESCRIPTION:{text}"
+        folded = fold(line)
+        assert folded.endswith("\r\n")
+        physical = folded[:-2].split("\r\n")
+        assert all(len(part.encode("utf-8")) <= LINE_LIMIT for part in physical)
+        assert all(part.startswith(" ") for part in physical[1:])
+        assert folded[:-2].replace("\r\n ", "") == line
+
+
+class TestIcsWriter:
+    """Test VEVENT properties"""
+
+    def test_calendar_envelope(self):
+        """Test the calendar has its required properties and the event its UID and DTSTAMP"""
+        lines = _ics(_event(updated="2026-03-01T12:00:00.000Z"))
+        assert lines[:2] == ["BEGIN:VCALENDAR", "VERSION:2.0"]
+        assert lines[-1] == "END:VCALENDAR"
+        assert "UID:e1@google.com" in lines
+        assert "DTSTAMP:20260301T120000Z" in lines
+
+    def test_times(self):
+        """Test all-day dates, UTC times and offsets converted to UTC"""
+        lines = _ics(
+            _event("a", start={"date": "2026-03-04"}, end={"date": "2026-03-05"}),
+            _event("b", start={"dateTime": "2026-03-04T10:00:00+01:00"}, end={"dateTime": "2026-03-04T11:00:00+01:00"}),
+        )
+        assert "DTSTART;VALUE=DATE:20260304" in lines
+        assert "DTEND;VALUE=DATE:20260305" in lines
+        assert "DTSTART:20260304T090000Z" in lines
+
+    def test_text_escaped(self):
+        """Test text properties are escaped"""
+        lines = _ics(_event(summary="Plan; review, ship", description="Line 1\nLine 2"))
+        assert "SUMMARY:Plan\\; review\\, ship" in lines
+        assert "DESCRIPTION:Line 1\\nLine 2" in lines
+
+    def test_recurrence_passthrough(self):
+        """Test RRULE and EXDATE lines are kept with TZID times and a matching VTIMEZONE"""
+        series = _event(
+            start={"dateTime": "2026-03-02T10:00:00+01:00", "timeZone": "Europe/Madrid"},
+            end={"dateTime": "2026-03-02T10:30:00+01:00", "timeZone": "Europe/Madrid"},
+            recurrence=["RRULE:FREQ=WEEKLY;BYDAY=MO", "EXDATE;TZID=Europe/Madrid:20260309T100000"],
+        )
+        lines = _ics(series, period=(datetime(2026, 3, 1, tzinfo=timezone.utc), datetime(2026, 5, 1, tzinfo=timezone.utc)))
+        assert "DTSTART;TZID=Europe/Madrid:20260302T100000" in lines
+        assert "RRULE:FREQ=WEEKLY;BYDAY=MO" in lines
+        assert "EXDATE;TZID=Europe/Madrid:20260309T100000" in lines
+        assert lines.count("TZID:Europe/Madrid") == 1
+        daylight = lines.index("BEGIN:DAYLIGHT")
+        assert lines[daylight + 1:daylight + 4] == [
+            "DTSTART:20260329T020000", "TZOFFSETFROM:+0100", "TZOFFSETTO:+0200",
+        ]
+
+    def test_instances(self):
+        """Test modified and cancelled instances carry the series UID and a RECURRENCE-ID"""
+        original = {"dateTime": "2026-03-16T09:00:00Z"}
+        moved = _event("s_20260316", iCalUID="s@google.com", originalStartTime=original)
+        cancelled = {"id": "s_20260323", "iCalUID": "s@google.com", "status": "cancelled",
+                     "originalStartTime": {"dateTime": "2026-03-23T09:00:00Z"}}
+        lines = _ics(moved, cancelled, {"id": "gone", "status": "cancelled"})
+        assert lines.count("UID:s@google.com") == 2
+        assert "RECURRENCE-ID:20260316T090000Z" in lines
+        assert "RECURRENCE-ID:20260323T090000Z" in lines
+        assert "STATUS:CANCELLED" in lines
+        assert "UID:gone" not in lines
+
+
+class FakeEventPages:
+    """events.list answering pages of generated events, counting the pages served"""
+
+    def __init__(self, total: int, page_size: int):
+        self.total = total
+        self.page_size = page_size
+        self.pages = 0
+        self.fail_at = None  # Page number answered with 500
+
+    def handler(self, method, path, query, body):
+        self.pages += 1
+        if self.pages == self.fail_at:
+            return 500, {"error": {"code": 500}}
+        start = int(query.get("pageToken", ["0"])[0])
+        end = min(start + self.page_size, self.total)
+        page = {"items": [_event(f"e{index}", summary=f"Event {index}") for index in range(start, end)]}
+        if end < self.total:
+            page["nextPageToken"] = str(end)
+        return 200, page
+
+
+class TestExportRange:
+    """Test calendar_export_range"""
+
+    def test_pages_streamed_to_file(self, fake_calendar_http, tmp_path):
+        """Test every page is followed and every event written, with recurrences kept as series"""
+        pages = FakeEventPages(total=25, page_size=10)
+        fake_calendar_http.handler = pages.handler
+        result = calendar_export_range("2026-03-01", "2026-04-01", str(tmp_path / "out" / "march.ics"))
+        assert result == {"saved_to": str(tmp_path / "out" / "march.ics"), "events": 25}
+        assert pages.pages == 3
+        text = (tmp_path / "out" / "march.ics").read_bytes().decode("utf-8")
+        assert text.count("BEGIN:VEVENT") == 25
+        assert "\n" not in text.replace("\r\n", "")
+        assert fake_calendar_http.requests[0][1] == "/calendar/v3/calendars/primary/events"
+
+    def test_failure_leaves_no_file(self, fake_calendar_http, tmp_path):
+        """Test an export failing midway writes nothing at the destination"""
+        pages = FakeEventPages(total=25, page_size=10)
+        pages.fail_at = 2
+        fake_calendar_http.handler = pages.handler
+        with pytest.raises(HttpError):
+            calendar_export_range("2026-03-01", "2026-04-01", str(tmp_path / "march.ics"))
+        assert not list(tmp_path.glob("march.ics*"))
@@ -0,0 +1,124 @@
+"""
+Tests for the label registry
+
+Tests that label names resolve locally, system labels cost no request,
+unknown labels reload once, and the registry is invalidated by mailbox sync
+and by 404 answers.
+"""
+
+import pytest
+from googleapiclient.errors import HttpError
+
+from src.tools.discovery import DiscoveryRegistry
+from src.tools.gmail_tool import gmail_modify_message, gmail_modify_messages_bulk
+from src.tools.labels import LabelRegistry
+
+from .conftest import FakeGoogleHttp
+
+
+@pytest.fixture
+def labels(mailbox):
+    """Registry and a Gmail service on the fake mailbox"""
+    http = FakeGoogleHttp(mailbox.handler)
+    return LabelRegistry(ttl=300), DiscoveryRegistry().build("gmail", "v1", http=http), http
+
+
+def _label_calls(http):
+    return sum(1 for _, path in http.requests if path.endswith("/labels"))
+
+
+class TestLabelRegistry:
+    """Test LabelRegistry resolution and caching"""
+
+    def test_system_labels_need_no_request(self, labels):
+        """Test system labels resolve case-insensitively without loading labels"""
+        registry, service, http = labels
+        assert registry.resolve("t", service, ["inbox", "Unread", "STARRED"]) == ["INBOX", "UNREAD", "STARRED"]
+        assert http.round_trips == 0
+
+    def test_names_and_ids_resolve(self, labels):
+        """Test user labels resolve by name (any case) or id from one load"""
+        registry, service, http = labels
+        assert registry.resolve("t", service, ["receipts", "Label_1", "INBOX"]) == ["Label_1", "Label_1", "INBOX"]
+        assert registry.resolve("t", service, ["Receipts"]) == ["Label_1"]
+        assert _label_calls(http) == 1
+
+    def test_unknown_label_reloads_once(self, labels, mailbox):
+        """Test a label created after loading is found by one reload"""
+        registry, service, http = labels
+        registry.resolve("t", service, ["Receipts"])
+        mailbox.labels.append({"id": "Label_2", "name": "Travel"})
+        assert registry.resolve("t", service, ["Travel"]) == ["Label_2"]
+        assert _label_calls(http) == 2
+
+    def test_unknown_label_raises(self, labels):
+        """Test a label that does not exist fails locally"""
+        registry, service, http = labels
+        with pytest.raises(ValueError, match="Nope"):
+            registry.resolve("t", service, ["Receipts", "Nope"])
+
+    def test_ttl_expiry_reloads(self, labels):
+        """Test labels older than the TTL are reloaded"""
+        registry, service, http = labels
+        registry.ttl = 0
+        registry.resolve("t", service, ["Receipts"])
+        registry.resolve("t", service, ["Receipts"])
+        assert _label_calls(http) == 2
+
+    def test_unseen_label_ids_invalidate(self, labels):
+        """Test label ids missing from the registry drop the tenant's labels"""
+        registry, service, http = labels
+        registry.resolve("t", service, ["Receipts"])
+        registry.note_label_ids("t", ["INBOX", "Label_1"])
+        registry.resolve("t", service, ["Receipts"])
+        assert _label_calls(http) == 1
+        registry.note_label_ids("t", ["Label_9"])
+        registry.resolve("t", service, ["Receipts"])
+        assert _label_calls(http) == 2
+
+
+class TestToolsAcceptNames:
+    """Test label tools resolve names through the registry"""
+
+    def test_modify_by_name(self, fake_gmail, mailbox):
+        """Test a label name is sent to Gmail as its id"""
+        fake_gmail.handler = mailbox.handler
+        assert gmail_modify_message("m1", add_labels=["Receipts"], remove_labels=["unread"])["labelIds"] == [
+            "INBOX", "Label_1",
+        ]
+        gmail_modify_messages_bulk(["m2", "m3"], add_labels=["receipts"])
+        assert "Label_1" in mailbox.messages["m3"]["labelIds"]
+        assert sum(1 for _, path in fake_gmail.requests if path.endswith("/labels")) == 1
+
+    def test_unknown_label_makes_no_modify_call(self, fake_gmail, mailbox):
+        """Test an unknown label fails before any modify request"""
+        fake_gmail.handler = mailbox.handler
+        with pytest.raises(ValueError):
+            gmail_modify_message("m1", add_labels=["Typo"])
+        assert not any("modify" in path for _, path in fake_gmail.requests)
+
+    def test_not_found_invalidates(self, fake_gmail, mailbox, label_registry):
+        """Test a 404 answer drops the tenant's labels"""
+        fake_gmail.handler = mailbox.handler
+        gmail_modify_message("m1", add_labels=["Receipts"])
+        with pytest.raises(HttpError):
+            gmail_modify_message("missing", add_labels=["Receipts"])
+        gmail_modify_message("m1", add_labels=["Receipts"])
+        assert sum(1 for _, path in fake_gmail.requests if path.endswith("/labels")) == 2
+
+
+class TestSyncInvalidates:
+    """Test mailbox sync drops labels it cannot account for"""
+
+    def test_history_with_new_label(self, fake_gmail, mailbox_sync, mailbox, label_registry):
+        """Test a label id first seen in history reloads the registry"""
+        from src.tools.gmail_tool import gmail_list_unread
+        from src.tools.services import current_tenant
+
+        fake_gmail.handler = mailbox.handler
+        gmail_list_unread()
+        gmail_modify_message("m1", add_labels=["Receipts"])
+        mailbox.labels.append({"id": "Label_2", "name": "Travel"})
+        mailbox.relabel("m3", add=["Label_2"])
+        gmail_list_unread()
+        assert label_registry._current(current_tenant()) is None
@@ -0,0 +1,224 @@
+"""
+Tests for incremental Gmail mailbox sync
+
+Tests full sync, history replay (added, deleted and relabelled messages),
+resync on an expired historyId, partial local state, the paced, resumable
+background backfill and the unread listing served from local state.
+"""
+
+import time
+from contextlib import contextmanager
+
+import pytest
+
+from src.tools.batch import QuotaThrottle
+from src.tools.discovery import DiscoveryRegistry
+from src.tools.gmail_tool import gmail_list_unread, gmail_mark_as_read
+from src.tools.mailbox_sync import MailboxStore, MailboxSync
+
+from .conftest import FakeGoogleHttp
+
+
+@pytest.fixture
+def engine(tmp_path, mailbox, search_index):
+    http = FakeGoogleHttp(mailbox.handler)
+    service = DiscoveryRegistry().build("gmail", "v1", http=http)
+    store = MailboxStore(tmp_path / "mailbox.sqlite3")
+
+    @contextmanager
+    def checkout(tenant):
+        yield service
+
+    # Backfill jobs run inline, right after the sync that schedules them
+    yield MailboxSync(store, min_interval=0, checkout=checkout, submit=lambda job: job()), service, http
+    store.close()
+
+
+class TestMailboxSync:
+    """Test MailboxSync keeps local state in step with Gmail"""
+
+    def test_first_sync_is_full(self, engine):
+        """Test the first sync lists the mailbox and records labels and dates"""
+        sync, service, _ = engine
+        assert sync.sync("t", service) == "full"
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) == ["m3", "m1"]
+        assert sync.store.query("t", ["INBOX"]) == ["m4", "m3", "m2", "m1", "m0"]
+        assert sync.store.info("t").complete
+
+    def test_history_is_applied(self, engine, mailbox):
+        """Test added, deleted and relabelled messages are replayed from history"""
+        sync, service, http = engine
+        sync.sync("t", service)
+        mailbox.add("m5", ["INBOX", "UNREAD"], 2000)
+        mailbox.delete("m3")
+        mailbox.relabel("m1", remove=["UNREAD"])
+        mailbox.relabel("m0", add=["UNREAD"])
+        http.requests.clear()
+        assert sync.sync("t", service) == "incremental"
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) == ["m5", "m0"]
+        assert len(sync.store.query("t")) == 5
+        # One history call plus one get for the date of the added message
+        assert [path.rsplit("/", 1)[-1] for _, path in http.requests] == ["history", "m5"]
+
+    def test_unchanged_mailbox_costs_one_call(self, engine):
+        """Test a sync without changes makes a single history request"""
+        sync, service, http = engine
+        sync.sync("t", service)
+        trips = http.round_trips
+        assert sync.sync("t", service) == "incremental"
+        assert http.round_trips == trips + 1
+
+    def test_expired_history_runs_full_sync(self, engine, mailbox):
+        """Test a 404 from history.list triggers a full resync"""
+        sync, service, _ = engine
+        sync.sync("t", service)
+        mailbox.relabel("m2", add=["UNREAD"])
+        mailbox.oldest_history_id = mailbox.history_id
+        assert sync.sync("t", service) == "full"
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) == ["m3", "m2", "m1"]
+
+    def test_min_interval_skips_history(self, engine):
+        """Test state checked within min_interval is not synced again"""
+        sync, service, http = engine
+        sync.min_interval = 60
+        sync.sync("t", service)
+        trips = http.round_trips
+        assert sync.sync("t", service) == "fresh"
+        assert http.round_trips == trips
+
+    def test_partial_state_defers_to_gmail(self, engine):
+        """Test a full sync capped by max_messages cannot answer short listings"""
+        sync, service, _ = engine
+        sync.max_messages = 3
+        sync.sync("t", service)
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 1) == ["m3"]
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) is None
+
+    def test_tenants_are_isolated(self, engine):
+        """Test each tenant has its own state"""
+        sync, service, _ = engine
+        sync.sync("a", service)
+        assert sync.list_ids("b", ["INBOX"], 10) is None
+
+
+class TestBackfill:
+    """Test labels and dates of listed messages are fetched in paced, resumable background steps"""
+
+    @pytest.fixture
+    def jobs(self, engine):
+        """Backfill jobs scheduled by syncs, held back until the test runs them"""
+        held = []
+        engine[0].submit = held.append
+        return held
+
+    def test_full_sync_lists_ids_only(self, engine, jobs):
+        """Test the sync itself makes no per-message requests and leaves the rest to a background job"""
+        sync, service, http = engine
+        sync.sync("t", service)
+        assert [path.rsplit("/", 1)[-1] for _, path in http.requests] == ["profile", "messages"]
+        assert sync.store.info("t").pending == 5
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) is None
+        assert len(jobs) == 1
+        # Scheduled once per tenant while it runs
+        sync.sync("t", service)
+        assert len(jobs) == 1
+
+    def test_backfill_runs_in_bounded_batches(self, engine, jobs):
+        """Test pending messages are fetched newest first, one batch of batch_size at a time"""
+        sync, service, http = engine
+        sync.batch_size = 2
+        sync.sync("t", service)
+        assert sync.backfill("t", service)
+        # Newest messages are known, so short listings can be answered already
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 1) == ["m3"]
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) is None
+        jobs.pop()()
+        assert sync.store.info("t").complete
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) == ["m3", "m1"]
+        assert http.round_trips == 5  # profile, list, three batches
+
+    def test_default_worker_runs_in_background(self, engine):
+        """Test the default submit runs the backfill on a daemon thread"""
+        _, service, _ = engine
+
+        @contextmanager
+        def checkout(tenant):
+            yield service
+
+        sync = MailboxSync(engine[0].store, min_interval=0, checkout=checkout)
+        sync.sync("t", service)
+        deadline = time.monotonic() + 5
+        while not sync.store.info("t").complete and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 10) == ["m3", "m1"]
+
+    def test_rate_limit_keeps_progress(self, engine, mailbox):
+        """Test a rate-limited backfill keeps what it fetched and resumes without relisting"""
+        sync, service, http = engine
+        handler = mailbox.handler
+
+        def limited(method, path, query, body):
+            if path.endswith("/m1"):
+                return 429, {"error": {"code": 429, "message": "Too many concurrent requests for user"}}
+            return handler(method, path, query, body)
+
+        http.handler = limited
+        sync.batch_size = 2
+        sync.sync("t", service)
+        assert sync.store.info("t").pending == 2
+        assert sync.store.query("t", ["INBOX"]) == ["m4", "m3", "m2"]
+        http.handler = handler
+        http.requests.clear()
+        assert sync.sync("t", service) == "incremental"
+        assert [path.rsplit("/", 1)[-1] for _, path in http.requests] == ["history", "m1", "m0"]
+        assert sync.store.info("t").complete
+
+    def test_vanished_messages_are_dropped(self, engine, mailbox, jobs):
+        """Test messages deleted between listing and backfill are removed from local state"""
+        sync, service, _ = engine
+        sync.sync("t", service)
+        del mailbox.messages["m2"]
+        jobs.pop()()
+        assert sync.store.info("t").complete
+        assert sync.store.query("t", ["INBOX"]) == ["m4", "m3", "m1", "m0"]
+
+    def test_new_pending_messages_defer_to_gmail(self, engine, mailbox, jobs):
+        """Test messages added since the last backfill hide nothing: listings fall back until they are fetched"""
+        sync, service, _ = engine
+        sync.sync("t", service)
+        jobs.pop()()
+        mailbox.add("m5", ["INBOX", "UNREAD"], 2000)
+        sync.sync("t", service)
+        assert sync.store.info("t").pending_new == 1
+        assert sync.list_ids("t", ["INBOX", "UNREAD"], 1) is None
+        assert sync.candidates("t", ["INBOX"]) is None
+
+    def test_throttle_paces_to_quota(self, monkeypatch):
+        """Test units beyond the burst wait for the quota to replenish"""
+        slept = []
+        monkeypatch.setattr("src.tools.batch.time.sleep", slept.append)
+        throttle = QuotaThrottle(100, burst=250)
+        assert throttle.acquire(250) == 0
+        assert throttle.acquire(100) == pytest.approx(1.0, abs=0.05)
+        assert slept and slept[0] == pytest.approx(1.0, abs=0.05)
+
+
+class TestListUnreadUsesSync:
+    """Test gmail_list_unread answers from local mailbox state"""
+
+    def test_repeat_listing_is_one_history_call(self, fake_gmail, mailbox_sync, mailbox):
+        """Test a second listing only checks history (summaries come from the cache)"""
+        fake_gmail.handler = mailbox.handler
+        first = gmail_list_unread(max_results=10)
+        assert [m["id"] for m in first] == ["m3", "m1"]
+        fake_gmail.requests.clear()
+        assert gmail_list_unread(max_results=10) == first
+        assert [path for _, path in fake_gmail.requests] == ["/gmail/v1/users/me/history"]
+
+    def test_mark_as_read_updates_local_state(self, fake_gmail, mailbox_sync, mailbox):
+        """Test labels changed through the tools are visible before history reports them"""
+        fake_gmail.handler = mailbox.handler
+        gmail_list_unread(max_results=10)
+        mailbox_sync.min_interval = 60
+        gmail_mark_as_read("m3")
+        assert [m["id"] for m in gmail_list_unread(max_results=10)] == ["m1"]
@@ -0,0 +1,115 @@
+"""
+Tests for the persistent Gmail message cache
+
+Tests tier lookup, volatile fields, tenant isolation, persistence, LRU
+eviction and repeat reads through the tools.
+"""
+
+import json
+import time
+
+import pytest
+
+from src.tools.gmail_tool import gmail_get_messages_bulk, gmail_list_unread
+from src.tools.message_cache import MessageCache
+
+
+def _content(message_id: str, text: str = "body") -> dict:
+    return {"id": message_id, "from": "a@example.com", "subject": "hi", "date": "today", "text": text}
+
+
+class TestMessageCache:
+    """Test MessageCache storage rules"""
+
+    def test_put_and_get(self, tmp_path):
+        """Test stored content is returned for the same tenant, id and tier"""
+        cache = MessageCache(tmp_path / "cache.sqlite3")
+        cache.put("alice", "m1", "full", _content("m1"))
+        assert cache.get("alice", "m1", "full") == _content("m1")
+
+    def test_full_tier_serves_metadata(self, tmp_path):
+        """Test a full entry answers metadata lookups but not the reverse"""
+        cache = MessageCache(tmp_path / "cache.sqlite3")
+        cache.put("alice", "full-msg", "full", _content("full-msg"))
+        cache.put("alice", "meta-msg", "metadata", _content("meta-msg"))
+        assert cache.get("alice", "full-msg", "metadata") is not None
+        assert cache.get("alice", "meta-msg", "full") is None
+
+    def test_labels_are_not_cached(self, tmp_path):
+        """Test volatile label fields are dropped on store"""
+        cache = MessageCache(tmp_path / "cache.sqlite3")
+        cache.put("alice", "m1", "full", {**_content("m1"), "labelIds": ["UNREAD"]})
+        assert "labelIds" not in cache.get("alice", "m1", "full")
+
+    def test_tenants_are_isolated(self, tmp_path):
+        """Test one tenant never reads another tenant's messages"""
+        cache = MessageCache(tmp_path / "cache.sqlite3")
+        cache.put("alice", "m1", "full", _content("m1"))
+        assert cache.get("bob", "m1", "full") is None
+
+    def test_persists_across_instances(self, tmp_path):
+        """Test entries survive a restart"""
+        MessageCache(tmp_path / "cache.sqlite3").put("alice", "m1", "full", _content("m1"))
+        assert MessageCache(tmp_path / "cache.sqlite3").get("alice", "m1", "full") is not None
+
+    def test_least_recently_used_are_evicted(self, tmp_path):
+        """Test exceeding max_bytes evicts the least recently used entries"""
+        entry_size = len(json.dumps(_content("m0", "x" * 150)))
+        cache = MessageCache(tmp_path / "cache.sqlite3", max_bytes=int(entry_size * 5.5))
+        for i in range(5):
+            cache.put("alice", f"m{i}", "full", _content(f"m{i}", "x" * 150))
+        cache.get("alice", "m0", "full")
+        cache.put("alice", "m5", "full", _content("m5", "x" * 150))
+        assert cache.stats()["bytes"] <= cache.max_bytes
+        assert cache.get("alice", "m0", "full") is not None
+        assert cache.get("alice", "m1", "full") is None
+
+    def test_unknown_tier_rejected(self, tmp_path):
+        """Test storing an unknown tier fails loudly"""
+        cache = MessageCache(tmp_path / "cache.sqlite3")
+        with pytest.raises(ValueError):
+            cache.put("alice", "m1", "raw", _content("m1"))
+
+    def test_repeat_read_under_a_millisecond(self, tmp_path):
+        """Test cached reads are served locally in well under a millisecond"""
+        cache = MessageCache(tmp_path / "cache.sqlite3")
+        cache.put("alice", "m1", "full", _content("m1", "x" * 10000))
+        start = time.perf_counter()
+        for _ in range(100):
+            cache.get("alice", "m1", "full")
+        assert (time.perf_counter() - start) / 100 < 0.001
+
+
+class TestToolsUseCache:
+    """Test Gmail tools serve repeat reads from the cache"""
+
+    def _handler(self, method, path, query, body):
+        if path.endswith("/messages"):
+            return 200, {"messages": [{"id": "a"}, {"id": "b"}]}
+        message_id = path.rsplit("/", 1)[-1]
+        return 200, {
+            "id": message_id,
+            "labelIds": ["UNREAD"],
+            "payload": {"mimeType": "text/plain", "headers": [{"name": "Subject", "value": message_id}],
+                        "body": {"data": "aGVsbG8="}},
+        }
+
+    def test_repeat_bulk_read_is_local(self, fake_gmail):
+        """Test reading the same messages again makes no requests"""
+        fake_gmail.handler = self._handler
+        first = gmail_get_messages_bulk(["a", "b"])
+        trips = fake_gmail.round_trips
+        assert gmail_get_messages_bulk(["a", "b"]) == first
+        assert fake_gmail.round_trips == trips
+
+    def test_listing_uses_full_reads(self, fake_gmail):
+        """Test listings only fetch metadata of messages not read before"""
+        fake_gmail.handler = self._handler
+        gmail_get_messages_bulk(["a"])
+        fake_gmail.requests.clear()
+        results = gmail_list_unread(max_results=2)
+        assert [path for _, path in fake_gmail.requests] == [
+            "/gmail/v1/users/me/messages",
+            "/gmail/v1/users/me/messages/b",
+        ]
+        assert results[0] == {"id": "a", "from": None, "subject": "a", "date": None}
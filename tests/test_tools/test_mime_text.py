@@ -0,0 +1,147 @@
+"""
+Tests for bounded MIME text extraction
+
+Tests alternative selection, HTML conversion, charsets, attachments and
+that extraction stops at the character budget.
+"""
+
+import base64
+
+import pytest
+
+from src.tools import mime_text
+from src.tools.mime_text import HTMLText, extract_text, extract_text_bounded
+
+
+def _part(mime: str, content: bytes, charset: str = None, filename: str = "") -> dict:
+    content_type = f"{mime}; charset={charset}" if charset else mime
+    return {
+        "mimeType": mime,
+        "filename": filename,
+        "headers": [{"name": "Content-Type", "value": content_type}],
+        "body": {"data": base64.urlsafe_b64encode(content).decode("ascii"), "size": len(content)},
+    }
+
+
+def _multipart(mime: str, *parts: dict) -> dict:
+    return {"mimeType": mime, "filename": "", "body": {"size": 0}, "parts": list(parts)}
+
+
+class TestExtractText:
+    """Test extract_text picks, decodes and bounds body text"""
+
+    def test_plain_part(self):
+        """Test a single text/plain payload is decoded"""
+        assert extract_text(_part("text/plain", b"hello world")) == "hello world"
+
+    def test_alternative_prefers_plain(self):
+        """Test multipart/alternative uses the plain part over HTML"""
+        payload = _multipart(
+            "multipart/alternative",
+            _part("text/plain", b"plain version"),
+            _part("text/html", b"<p>html version</p>"),
+        )
+        assert extract_text(payload) == "plain version"
+
+    def test_html_only_is_converted(self):
+        """Test HTML-only mail returns its text instead of nothing"""
+        payload = _multipart(
+            "multipart/alternative",
+            _part("text/plain", b""),
+            _multipart("multipart/related", _part("text/html", b"<p>Hi&nbsp;there</p><p>Second</p>")),
+        )
+        assert extract_text(payload) == "Hi there\n\nSecond"
+
+    def test_mixed_skips_attachments(self):
+        """Test attachments are ignored and inline text parts concatenated"""
+        payload = _multipart(
+            "multipart/mixed",
+            _part("text/plain", b"first"),
+            _part("text/plain", b"not this", filename="notes.txt"),
+            _part("text/plain", b"second"),
+        )
+        assert extract_text(payload) == "first\n\nsecond"
+
+    def test_charset(self):
+        """Test parts are decoded with their declared charset"""
+        payload = _part("text/plain", "café".encode("iso-8859-1"), charset="iso-8859-1")
+        assert extract_text(payload) == "café"
+
+    def test_unknown_charset_falls_back_to_utf8(self):
+        """Test an unknown charset decodes as UTF-8"""
+        assert extract_text(_part("text/plain", "ñ".encode(), charset="x-unknown")) == "ñ"
+
+    def test_multibyte_split_across_chunks(self, monkeypatch):
+        """Test characters split between decode chunks survive"""
+        monkeypatch.setattr(mime_text, "CHUNK_SIZE", 4)
+        text = "é" * 50
+        assert extract_text(_part("text/plain", text.encode()), budget=1000) == text
+
+    def test_budget_bounds_output(self):
+        """Test output never exceeds the budget"""
+        payload = _part("text/plain", b"x" * 100_000)
+        assert len(extract_text(payload, budget=500)) == 500
+
+    @pytest.mark.parametrize("body, cut", [(b"x" * 499, False), (b"x" * 100_000, True)])
+    def test_bounded_reports_cut(self, body, cut):
+        """Test extract_text_bounded tells whether the budget left text out"""
+        text, truncated = extract_text_bounded(_part("text/plain", body), budget=500)
+        assert (len(text), truncated) == (min(len(body), 500), cut)
+
+    def test_parts_beyond_budget_count_as_cut(self):
+        """Test text parts skipped for lack of budget mark the text as cut"""
+        payload = {"mimeType": "multipart/mixed", "parts": [_part("text/plain", b"x" * 500), _part("text/plain", b"tail")]}
+        assert extract_text_bounded(payload, budget=500)[1]
+
+    def test_decoding_stops_at_budget(self, monkeypatch):
+        """Test a large part is only decoded until the budget is reached"""
+        decoded = []
+        real = base64.urlsafe_b64decode
+        monkeypatch.setattr(mime_text.base64, "urlsafe_b64decode", lambda s: decoded.append(len(s)) or real(s))
+        extract_text(_part("text/plain", b"x" * 5_000_000), budget=10_000)
+        assert sum(decoded) < 100_000
+
+
+class TestHTMLText:
+    """Test the streaming HTML converter"""
+
+    def _convert(self, html: str, budget: int = 10_000) -> str:
+        converter = HTMLText(budget)
+        converter.feed(html)
+        converter.close()
+        return converter.text()
+
+    def test_blocks_and_whitespace(self):
+        """Test block elements break lines and inline whitespace collapses"""
+        html = "<div>one   two</div><ul><li>a</li><li>b</li></ul>line<br>break"
+        assert self._convert(html) == "one two\n- a\n- b\nline\nbreak"
+
+    def test_script_and_style_dropped(self):
+        """Test non-text elements are skipped"""
+        html = "<head><title>T</title><style>p {}</style></head><body><script>x()</script>text</body>"
+        assert self._convert(html) == "text"
+
+    def test_pre_keeps_whitespace(self):
+        """Test preformatted text keeps its layout"""
+        assert self._convert("<pre>a  b\n  c</pre>") == "a  b\n  c"
+
+    def test_chunk_boundaries(self):
+        """Test tags and entities split across fed chunks convert like one feed"""
+        html = '<p class="a>b">caf&eacute; &amp; <!-- x > y --><b>tea</b></p><script>if (a<b) {}</script>done'
+        converter = HTMLText(10_000)
+        for ch in html:
+            converter.feed(ch)
+        converter.close()
+        assert converter.text() == self._convert(html) == "café & tea\n\ndone"
+
+    def test_literal_less_than(self):
+        """Test a "<" that starts no tag is kept as text"""
+        assert self._convert("a < b and c > d") == "a < b and c > d"
+
+    @pytest.mark.parametrize("budget", [1, 10, 100])
+    def test_budget(self, budget):
+        """Test conversion stops at the budget"""
+        converter = HTMLText(budget)
+        converter.feed("<p>" + "word " * 1000 + "</p>")
+        assert converter.full
+        assert len(converter.text()) <= budget
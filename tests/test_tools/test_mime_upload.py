@@ -0,0 +1,222 @@
+"""
+Tests for streamed MIME messages and resumable Gmail upload
+
+Tests random-access reads of streamed messages, the single-request path,
+chunked resumable upload, resuming from the confirmed offset after a
+failure, and constant memory use for large attachments.
+"""
+
+import hashlib
+import json
+import random
+import tracemalloc
+from contextlib import contextmanager
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+from urllib.parse import parse_qs, urlsplit
+
+import httplib2
+import pytest
+
+from src.tools import gmail_tool, mime_upload
+from src.tools.discovery import DiscoveryRegistry
+from src.tools.gmail_tool import gmail_send_message
+from src.tools.mime_upload import StreamedMessage, upload_message
+
+CHUNK = 256 * 1024
+SESSION = "https://upload.example.com/session"
+
+
+class FakeUploadHttp:
+    """httplib2.Http stand-in speaking Gmail's simple and resumable upload protocol"""
+
+    def __init__(self, fail_at=None, keep=True):
+        self.fail_at = fail_at  # Drop the connection once while this offset is in flight
+        self.keep = keep
+        self.received = bytearray()
+        self.length = 0
+        self.digest = hashlib.sha256()
+        self.metadata = None
+        self.raw = None
+        self.puts = []
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        url = urlsplit(uri)
+        if uri == SESSION:
+            return self._put(body, headers)
+        if parse_qs(url.query).get("uploadType") == ["resumable"]:
+            self.metadata = json.loads(body) if body else None
+            return httplib2.Response({"status": "200", "location": SESSION}), b""
+        self.raw = json.loads(body)["raw"]
+        return self._sent()
+
+    def _put(self, body, headers):
+        content_range = headers["content-range"]
+        if content_range.startswith("bytes */"):
+            return self._incomplete()
+        span, total = content_range.removeprefix("bytes ").split("/")
+        start, end = (int(n) for n in span.split("-"))
+        assert start == self.length, "upload must resume at the confirmed offset"
+        self.puts.append((start, end))
+        if self.fail_at is not None and start <= self.fail_at <= end:
+            self._store(body[:self.fail_at - start])
+            self.fail_at = None
+            raise ConnectionError("connection reset")
+        self._store(body)
+        return self._sent() if self.length == int(total) else self._incomplete()
+
+    def _store(self, data):
+        self.length += len(data)
+        self.digest.update(data)
+        if self.keep:
+            self.received += data
+
+    def _incomplete(self):
+        headers = {"status": "308"}
+        if self.length:
+            headers["range"] = f"bytes=0-{self.length - 1}"
+        return httplib2.Response(headers), b""
+
+    def _sent(self):
+        body = json.dumps({"id": "sent-1", "threadId": "t-1", "labelIds": ["SENT"]}).encode()
+        return httplib2.Response({"status": "200", "content-type": "application/json"}), body
+
+
+def _message(body="Hello"):
+    message = EmailMessage()
+    message["To"] = "bob@example.com"
+    message["Subject"] = "Report"
+    message.set_content(body)
+    return message
+
+
+def _file(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(random.Random(size).randbytes(size))
+    return path
+
+
+def _service(http):
+    return DiscoveryRegistry().build("gmail", "v1", http=http)
+
+
+class TestStreamedMessage:
+    """Test StreamedMessage serializes like the email package and reads any range"""
+
+    def test_attachments_round_trip(self, tmp_path):
+        """Test the streamed bytes parse back to the text and attachment contents"""
+        report = _file(tmp_path, "report.pdf", 10_000)
+        notes = _file(tmp_path, "notes.bin", 57 * 3)
+        with StreamedMessage(_message(), [report, notes]) as streamed:
+            data = streamed.read(0, streamed.size)
+        assert len(data) == streamed.size
+        parsed = message_from_bytes(data, policy=policy.default)
+        parts = list(parsed.iter_attachments())
+        assert [p.get_filename() for p in parts] == ["report.pdf", "notes.bin"]
+        assert parts[0].get_content_type() == "application/pdf"
+        assert parts[0].get_content() == report.read_bytes()
+        assert parts[1].get_content() == notes.read_bytes()
+        assert parsed.get_body().get_content().strip() == "Hello"
+
+    def test_random_ranges_match_full_read(self, tmp_path):
+        """Test reads at arbitrary offsets are slices of the full message"""
+        path = _file(tmp_path, "data.bin", 5_000)
+        with StreamedMessage(_message(), [path]) as streamed:
+            full = streamed.read(0, streamed.size)
+            rng = random.Random(7)
+            for _ in range(200):
+                offset = rng.randrange(streamed.size)
+                length = rng.randrange(1, 600)
+                assert streamed.read(offset, length) == full[offset:offset + length]
+
+    def test_missing_attachment(self, tmp_path):
+        """Test a missing attachment raises FileNotFoundError"""
+        with pytest.raises(FileNotFoundError):
+            StreamedMessage(_message(), [tmp_path / "nope.pdf"])
+
+    def test_without_attachments_matches_email_package(self):
+        """Test a message without attachments is the email package's serialization"""
+        with StreamedMessage(_message()) as streamed:
+            assert streamed.read(0, streamed.size) == _message().as_bytes()
+
+
+class TestUploadMessage:
+    """Test upload_message picks the upload path and resumes interrupted uploads"""
+
+    def test_small_message_is_one_request(self):
+        """Test messages under the simple limit go as a raw body"""
+        http = FakeUploadHttp()
+        with StreamedMessage(_message()) as streamed:
+            resp = upload_message(_service(http), streamed, {"threadId": "t-1"})
+        assert resp["id"] == "sent-1"
+        assert http.raw is not None and not http.puts
+
+    def test_large_message_is_chunked(self, tmp_path):
+        """Test larger messages are uploaded in resumable chunks with metadata"""
+        http = FakeUploadHttp()
+        path = _file(tmp_path, "big.bin", 3 * CHUNK)
+        with StreamedMessage(_message(), [path]) as streamed:
+            upload_message(_service(http), streamed, {"threadId": "t-1"}, chunk_size=CHUNK, simple_max=CHUNK)
+            assert bytes(http.received) == streamed.read(0, streamed.size)
+        assert http.metadata == {"threadId": "t-1"}
+        assert len(http.puts) == 5
+        assert all(end - start + 1 == CHUNK for start, end in http.puts[:-1])
+
+    def test_resumes_from_confirmed_offset(self, tmp_path, monkeypatch):
+        """Test a dropped connection resumes where Gmail stopped receiving"""
+        monkeypatch.setattr(mime_upload.time, "sleep", lambda seconds: None)
+        http = FakeUploadHttp(fail_at=CHUNK + 1000)
+        path = _file(tmp_path, "big.bin", 3 * CHUNK)
+        with StreamedMessage(_message(), [path]) as streamed:
+            upload_message(_service(http), streamed, chunk_size=CHUNK, simple_max=CHUNK)
+            assert bytes(http.received) == streamed.read(0, streamed.size)
+        # The interrupted chunk restarts at the byte after the last one received
+        assert (CHUNK + 1000, CHUNK + 1000 + CHUNK - 1) in http.puts
+
+    def test_gives_up_after_retries(self, tmp_path, monkeypatch):
+        """Test repeated failures raise after the configured attempts"""
+        monkeypatch.setattr(mime_upload.time, "sleep", lambda seconds: None)
+        http = FakeUploadHttp()
+        http._put = lambda body, headers: (_ for _ in ()).throw(ConnectionError("down"))
+        path = _file(tmp_path, "big.bin", 2 * CHUNK)
+        with StreamedMessage(_message(), [path]) as streamed:
+            with pytest.raises(ConnectionError):
+                upload_message(_service(http), streamed, chunk_size=CHUNK, simple_max=CHUNK, retries=2)
+
+    def test_memory_is_bounded_by_chunk(self, tmp_path):
+        """Test peak memory stays near one chunk for a large attachment"""
+        http = FakeUploadHttp(keep=False)
+        path = _file(tmp_path, "huge.bin", 20 * 1024 * 1024)
+        service = _service(http)
+        with StreamedMessage(_message(), [path]) as streamed:
+            tracemalloc.start()
+            upload_message(service, streamed, chunk_size=CHUNK, simple_max=CHUNK)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            expected = hashlib.sha256()
+            for offset in range(0, streamed.size, CHUNK):
+                expected.update(streamed.read(offset, CHUNK))
+        assert http.digest.hexdigest() == expected.hexdigest()
+        assert peak < 8 * CHUNK
+
+
+class TestSendTool:
+    """Test gmail_send_message streams attachments"""
+
+    def test_send_with_attachment(self, tmp_path, monkeypatch):
+        """Test the tool uploads a message carrying the attachment and thread"""
+        http = FakeUploadHttp()
+        service = _service(http)
+
+        @contextmanager
+        def fake_service():
+            yield service
+
+        monkeypatch.setattr(gmail_tool, "_gmail_service", fake_service)
+        path = _file(tmp_path, "scan.png", 2 * 1024 * 1024)
+        resp = gmail_send_message("bob@example.com", "Scan", "See attached", attachments=[str(path)], thread_id="t-1")
+        assert resp == {"id": "sent-1", "threadId": "t-1", "labelIds": ["SENT"]}
+        assert http.metadata == {"threadId": "t-1"}
+        parsed = message_from_bytes(bytes(http.received), policy=policy.default)
+        assert next(parsed.iter_attachments()).get_content() == path.read_bytes()
@@ -0,0 +1,131 @@
+"""
+Tests for partial-response field masks and format tiers
+
+Tests that Gmail and Calendar tools request only the fields they return and
+that callers can pick the Gmail format tier per call.
+"""
+
+from contextlib import contextmanager
+
+import pytest
+
+from src.tools import calendar_tool
+from src.tools.calendar_tool import calendar_export_event, calendar_update_event, calendar_upcoming
+from src.tools.discovery import DiscoveryRegistry
+from src.tools.gmail_tool import gmail_get_message, gmail_get_messages_bulk
+from src.tools.ics import ICS_EVENT_FIELDS
+
+from .conftest import FakeGoogleHttp
+
+
+@pytest.fixture
+def queries(fake_gmail, mailbox):
+    """Query parameters of every request sent to the fake mailbox"""
+    seen = []
+
+    def handler(method, path, query, body):
+        seen.append((method, path, query, body))
+        return mailbox.handler(method, path, query, body)
+
+    fake_gmail.handler = handler
+    return seen
+
+
+@pytest.fixture
+def fake_calendar(monkeypatch):
+    """Route calendar_tool's services to a FakeGoogleHttp recording requests (calendar sync off)"""
+    from src import config
+
+    monkeypatch.setattr(config, "CALENDAR_SYNC_ENABLED", False)
+    seen = []
+
+    def handler(method, path, query, body):
+        seen.append((method, path, query, body))
+        if path.endswith("/events"):
+            return 200, {"items": [{"id": "e1", "summary": "Standup", "start": {}, "end": {}}]}
+        return 200, {"id": "e1", "summary": "Standup", "htmlLink": "https://calendar/e1"}
+
+    service = DiscoveryRegistry().build("calendar", "v3", http=FakeGoogleHttp(handler))
+
+    @contextmanager
+    def fake_service():
+        yield service
+
+    monkeypatch.setattr(calendar_tool, "_calendar_service", fake_service)
+    return seen
+
+
+class TestGmailFormats:
+    """Test Gmail reads request the fields of the chosen format"""
+
+    @pytest.mark.parametrize("format, mask", [
+        ("minimal", "id,threadId,labelIds,snippet"),
+        ("metadata", "id,snippet,payload/headers"),
+        ("full", "id,snippet,payload(mimeType,filename,headers,body/data,parts)"),
+    ])
+    def test_get_message_sends_mask(self, queries, format, mask):
+        """Test each format sends its format and fields parameters"""
+        gmail_get_message("m1", format=format)
+        _, _, query, _ = queries[-1]
+        assert query["format"] == [format]
+        assert query["fields"] == [mask]
+
+    def test_format_decides_returned_keys(self, queries):
+        """Test minimal returns labels, metadata headers, full adds text"""
+        assert set(gmail_get_message("m1", format="minimal")) == {"id", "threadId", "labelIds", "snippet"}
+        assert set(gmail_get_message("m1", format="metadata")) == {"id", "from", "to", "subject", "date", "snippet"}
+        assert "text" in gmail_get_message("m1")
+
+    def test_minimal_is_never_cached(self, queries):
+        """Test minimal reads (labels) always go to Gmail"""
+        gmail_get_message("m1", format="minimal")
+        gmail_get_message("m1", format="minimal")
+        assert len(queries) == 2
+
+    def test_metadata_served_from_full_read(self, queries):
+        """Test a metadata read after a full read is local and has no text"""
+        gmail_get_message("m1")
+        assert "text" not in gmail_get_message("m1", format="metadata")
+        assert len(queries) == 1
+
+    def test_bulk_metadata_is_one_batch(self, fake_gmail, queries):
+        """Test bulk reads below full tier go through a single batch call"""
+        results = gmail_get_messages_bulk(["m0", "m1", "m2"], format="metadata")
+        assert [m["subject"] for m in results] == ["m0", "m1", "m2"]
+        assert fake_gmail.round_trips == 1
+
+    def test_unknown_format_rejected(self, queries):
+        """Test an unknown format raises ValueError before any request"""
+        with pytest.raises(ValueError):
+            gmail_get_message("m1", format="raw")
+        assert queries == []
+
+
+class TestCalendarMasks:
+    """Test Calendar tools request only the fields they return"""
+
+    def test_upcoming_mask(self, fake_calendar):
+        """Test event listings request only the returned event fields"""
+        calendar_upcoming()
+        _, _, query, _ = fake_calendar[0]
+        assert query["fields"] == ["items(id,summary,start,end,location),nextPageToken"]
+
+    def test_update_is_one_patch(self, fake_calendar):
+        """Test updates send only the changed fields without reading the event"""
+        assert calendar_update_event("e1", summary="Retro") == {"id": "e1", "htmlLink": "https://calendar/e1"}
+        assert len(fake_calendar) == 1
+        method, _, query, body = fake_calendar[0]
+        assert method == "PATCH"
+        assert body == {"summary": "Retro"}
+        assert query["fields"] == ["id,status,etag,summary,start,end,location,htmlLink"]
+
+    def test_update_can_switch_to_all_day(self, fake_calendar):
+        """Test a date-only start clears the timed start"""
+        calendar_update_event("e1", start="2026-01-05")
+        assert fake_calendar[0][3]["start"] == {"date": "2026-01-05", "dateTime": None}
+
+    def test_export_mask(self, fake_calendar, tmp_path):
+        """Test exports request only the exported fields"""
+        calendar_export_event("e1", str(tmp_path / "e1.ics"))
+        _, _, query, _ = fake_calendar[0]
+        assert query["fields"] == [ICS_EVENT_FIELDS]
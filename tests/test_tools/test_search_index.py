@@ -0,0 +1,184 @@
+"""
+Tests for the local full-text search index
+
+Tests query parsing, indexing tiers, matching, and gmail_local_search
+answering from the index or falling back to Gmail search.
+"""
+
+import time
+
+import pytest
+
+from src.auth.google_auth import DEFAULT_TENANT
+from src.tools.gmail_tool import gmail_get_messages_bulk, gmail_list_unread, gmail_local_search
+from src.tools.search_index import LocalQuery, SearchIndex, parse_query
+
+
+class TestParseQuery:
+    """Test parse_query reduces supported Gmail queries"""
+
+    def test_operators(self):
+        """Test supported operators are mapped to terms, labels and filters"""
+        query = parse_query('from:alice subject:"q3 invoice" is:unread newer_than:2d has:attachment report')
+        assert query.terms == [("sender", "alice"), ("subject", "q3 invoice"), (None, "report")]
+        assert query.with_labels == ["UNREAD"]
+        assert query.newer_than == 2 * 86400
+        assert query.has_attachment
+
+    def test_is_read_excludes_unread(self):
+        """Test is:read becomes a label exclusion"""
+        assert parse_query("is:read").without_labels == ["UNREAD"]
+
+    @pytest.mark.parametrize("text", [
+        "from:alice OR from:bob",
+        "-from:alice",
+        "label:work",
+        "older_than:1y",
+        "in:sent",
+        "(invoice receipt)",
+    ])
+    def test_unsupported_queries(self, text):
+        """Test queries outside the supported subset return None"""
+        assert parse_query(text) is None
+
+    def test_tier(self):
+        """Test header-only queries need metadata, words and attachments need full reads"""
+        assert parse_query("is:unread").tier is None
+        assert parse_query("from:alice").tier == "metadata"
+        assert parse_query("from:alice invoice").tier == "full"
+        assert parse_query("has:attachment").tier == "full"
+
+    def test_fts_expression_quotes_terms(self):
+        """Test terms are quoted so FTS5 syntax in them is literal"""
+        query = LocalQuery(terms=[("sender", 'a"b'), (None, "NOT")])
+        assert query.fts_expression() == 'sender : "a""b" AND "NOT"'
+
+
+class TestSearchIndex:
+    """Test SearchIndex storage and matching"""
+
+    def test_match_by_column(self, tmp_path):
+        """Test column terms only match their column"""
+        index = SearchIndex(tmp_path / "index.sqlite3")
+        index.add("t", "a", "metadata", "Alice <alice@example.com>", "me@example.com", "Invoice", "")
+        index.add("t", "b", "metadata", "Bob <bob@example.com>", "alice@example.com", "Lunch", "")
+        assert index.match("t", parse_query("from:alice")) == {"a"}
+        assert index.match("t", parse_query("to:alice@example.com")) == {"b"}
+        assert index.match("t", parse_query("alice")) == {"a", "b"}
+
+    def test_full_document_is_not_downgraded(self, tmp_path):
+        """Test a metadata update does not replace a full document"""
+        index = SearchIndex(tmp_path / "index.sqlite3")
+        index.add("t", "a", "full", "alice", "me", "hi", "quarterly numbers", has_attachment=True)
+        index.add("t", "a", "metadata", "alice", "me", "hi", "")
+        assert index.tiers("t", ["a", "b"]) == {"a": "full"}
+        assert index.match("t", parse_query("quarterly has:attachment")) == {"a"}
+
+    def test_tenants_are_isolated(self, tmp_path):
+        """Test documents of one tenant never match for another"""
+        index = SearchIndex(tmp_path / "index.sqlite3")
+        index.add("t1", "a", "metadata", "alice", "me", "hi", "")
+        assert index.match("t2", parse_query("from:alice")) == set()
+
+    def test_unknown_tier_rejected(self, tmp_path):
+        """Test adding with an unknown tier raises ValueError"""
+        index = SearchIndex(tmp_path / "index.sqlite3")
+        with pytest.raises(ValueError):
+            index.add("t", "a", "raw", "alice", "me", "hi", "")
+
+    def test_query_takes_milliseconds(self, tmp_path):
+        """Test a query over thousands of documents stays in the millisecond range"""
+        index = SearchIndex(tmp_path / "index.sqlite3")
+        for n in range(2000):
+            index.add("t", f"m{n}", "full", f"user{n % 50}@example.com", "me", f"subject {n}", f"body text {n}")
+        query = parse_query("from:user7 body")
+        start = time.perf_counter()
+        assert len(index.match("t", query)) == 40
+        assert time.perf_counter() - start < 0.05
+
+
+class TestLocalSearchTool:
+    """Test gmail_local_search answers locally or falls back to Gmail"""
+
+    @pytest.fixture
+    def recent_mailbox(self, mailbox):
+        now = int(time.time() * 1000)
+        mailbox.add("r1", ["INBOX", "UNREAD"], now - 3600_000, sender="Alice <alice@example.com>",
+                    subject="Invoice", body="quarterly numbers", attachment=True)
+        mailbox.add("r2", ["INBOX"], now - 1800_000, sender="Bob <bob@example.com>", body="lunch plans")
+        return mailbox
+
+    def test_header_query_is_local(self, fake_gmail, mailbox_sync, recent_mailbox, search_index):
+        """Test header terms are matched against headers indexed by the sync, with one history call"""
+        fake_gmail.handler = recent_mailbox.handler
+        assert [m["id"] for m in gmail_local_search("from:alice")] == ["r1"]
+        assert search_index.stats()["documents"] == 7
+        fake_gmail.requests.clear()
+        assert [m["id"] for m in gmail_local_search("from:bob is:read")] == ["r2"]
+        # History, then the summary of the result
+        assert [path for _, path in fake_gmail.requests] == ["/gmail/v1/users/me/history", "/gmail/v1/users/me/messages/r2"]
+
+    def test_label_and_date_query_needs_no_index(self, fake_gmail, mailbox_sync, recent_mailbox):
+        """Test is: and newer_than: come from sync state"""
+        fake_gmail.handler = recent_mailbox.handler
+        gmail_list_unread()
+        fake_gmail.requests.clear()
+        assert [m["id"] for m in gmail_local_search("is:unread newer_than:1d")] == ["r1"]
+        assert [path for _, path in fake_gmail.requests] == ["/gmail/v1/users/me/history"]
+
+    def test_body_words_need_full_reads(self, fake_gmail, mailbox_sync, recent_mailbox):
+        """Test body words fall back to Gmail until every candidate was read in full"""
+        fake_gmail.handler = recent_mailbox.handler
+        gmail_local_search("newer_than:1d quarterly")
+        assert ("GET", "/gmail/v1/users/me/messages") in fake_gmail.requests
+
+        gmail_get_messages_bulk(["r1", "r2"])
+        fake_gmail.requests.clear()
+        assert [m["id"] for m in gmail_local_search("newer_than:1d quarterly has:attachment")] == ["r1"]
+        assert [path for _, path in fake_gmail.requests] == ["/gmail/v1/users/me/history"]
+
+    def test_partial_state_answers_newest_matches(self, fake_gmail, mailbox_sync, recent_mailbox):
+        """Test partial local state answers a query without newer_than when enough recent messages match"""
+        fake_gmail.handler = recent_mailbox.handler
+        mailbox_sync.max_messages = 3
+        assert [m["id"] for m in gmail_local_search("is:unread", max_results=1)] == ["r1"]
+        assert [m["id"] for m in gmail_local_search("from:example.com", max_results=2)] == ["r2", "r1"]
+        fake_gmail.requests.clear()
+        # Older matches may exist beyond the synced messages
+        gmail_local_search("from:alice", max_results=2)
+        assert ("GET", "/gmail/v1/users/me/messages") in fake_gmail.requests
+
+    def test_unindexed_candidates_defer_to_gmail(self, fake_gmail, mailbox_sync, recent_mailbox, search_index):
+        """Test header queries are not answered (or backfilled inline) while candidates lack indexed headers"""
+        fake_gmail.handler = recent_mailbox.handler
+        gmail_list_unread()
+        search_index.forget(DEFAULT_TENANT)
+        fake_gmail.requests.clear()
+        gmail_local_search("from:alice")
+        assert [path for _, path in fake_gmail.requests][:2] == ["/gmail/v1/users/me/history", "/gmail/v1/users/me/messages"]
+
+    def test_truncated_body_defers_to_gmail(self, fake_gmail, mailbox_sync, recent_mailbox):
+        """Test body words missing from a partly indexed body are not ruled out locally"""
+        body = "filler " * 1500 + "appendix"  # Beyond the 10k characters returned and indexed
+        recent_mailbox.add("r3", ["INBOX"], int(time.time() * 1000) - 7200_000, body=body)
+        fake_gmail.handler = recent_mailbox.handler
+        gmail_list_unread()
+        gmail_get_messages_bulk(["r1", "r2", "r3"])
+        fake_gmail.requests.clear()
+        # r3 is older than the first match, so its missing text does not matter
+        assert [m["id"] for m in gmail_local_search("newer_than:1d quarterly", max_results=1)] == ["r1"]
+        assert [path for _, path in fake_gmail.requests] == ["/gmail/v1/users/me/history"]
+        gmail_local_search("newer_than:1d appendix")
+        assert ("GET", "/gmail/v1/users/me/messages") in fake_gmail.requests
+
+    def test_unsupported_query_goes_to_gmail(self, fake_gmail, mailbox_sync, recent_mailbox):
+        """Test queries outside the supported subset use Gmail search"""
+        fake_gmail.handler = recent_mailbox.handler
+        gmail_local_search("from:alice OR from:bob")
+        assert fake_gmail.requests[0] == ("GET", "/gmail/v1/users/me/messages")
+
+    def test_without_sync_goes_to_gmail(self, fake_gmail, recent_mailbox):
+        """Test local search defers to Gmail when mailbox sync is disabled"""
+        fake_gmail.handler = recent_mailbox.handler
+        gmail_local_search("from:alice")
+        assert fake_gmail.requests[0] == ("GET", "/gmail/v1/users/me/messages")
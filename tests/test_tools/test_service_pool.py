@@ -0,0 +1,123 @@
+"""
+Tests for the Google API service pool
+
+Tests reuse, credential keying, caps, idle eviction and tenant invalidation.
+"""
+
+import threading
+import time
+import httplib2
+import pytest
+
+from src.tools.service_pool import ServicePool
+
+KEY = ("default", "gmail", "v1")
+
+
+class FakeService:
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestServicePool:
+    """Test ServicePool checkout/checkin behaviour"""
+
+    def test_checked_in_service_is_reused(self):
+        """Test a returned service is handed out again"""
+        pool = ServicePool()
+        creds = object()
+        first = pool.checkout(KEY, creds, FakeService)
+        pool.checkin(first)
+        assert pool.checkout(KEY, creds, FakeService) is first
+        assert pool.stats()["created"] == 1
+        assert pool.stats()["reused"] == 1
+
+    def test_concurrent_checkouts_get_distinct_services(self):
+        """Test a checked out service is never handed to another caller"""
+        pool = ServicePool(max_per_key=2)
+        creds = object()
+        first = pool.checkout(KEY, creds, FakeService)
+        second = pool.checkout(KEY, creds, FakeService)
+        assert first is not second
+
+    def test_new_credentials_replace_idle_services(self):
+        """Test services built for old credentials are closed, not reused"""
+        pool = ServicePool()
+        old = pool.checkout(KEY, object(), FakeService)
+        pool.checkin(old)
+        new_creds = object()
+        service = pool.checkout(KEY, new_creds, FakeService)
+        assert service is not old
+        assert service.credentials is new_creds
+        assert old.closed
+
+    def test_per_key_cap_waits_then_times_out(self):
+        """Test checkout fails when the key's services stay checked out"""
+        pool = ServicePool(max_per_key=1, checkout_timeout=0.05)
+        creds = object()
+        pool.checkout(KEY, creds, FakeService)
+        with pytest.raises(TimeoutError):
+            pool.checkout(KEY, creds, FakeService)
+
+    def test_waiter_gets_checked_in_service(self):
+        """Test a blocked checkout resumes when a service is checked in"""
+        pool = ServicePool(max_per_key=1, checkout_timeout=5)
+        creds = object()
+        service = pool.checkout(KEY, creds, FakeService)
+        threading.Timer(0.05, pool.checkin, args=(service,)).start()
+        assert pool.checkout(KEY, creds, FakeService) is service
+
+    def test_total_cap_evicts_idle_service_of_other_key(self):
+        """Test the least recently used idle service makes room for a new key"""
+        pool = ServicePool(max_total=1)
+        creds = object()
+        gmail = pool.checkout(KEY, creds, FakeService)
+        pool.checkin(gmail)
+        pool.checkout(("default", "calendar", "v3"), creds, FakeService)
+        assert gmail.closed
+
+    def test_idle_services_expire(self):
+        """Test services idle past idle_timeout are closed"""
+        pool = ServicePool(idle_timeout=0.01)
+        service = pool.checkout(KEY, object(), FakeService)
+        pool.checkin(service)
+        time.sleep(0.02)
+        assert pool.evict_idle() == 1
+        assert service.closed
+
+    def test_invalidate_tenant(self):
+        """Test invalidating a tenant closes idle and later checked in services"""
+        pool = ServicePool(max_per_key=2)
+        creds = object()
+        idle = pool.checkout(KEY, creds, FakeService)
+        busy = pool.checkout(KEY, creds, FakeService)
+        pool.checkin(idle)
+        pool.invalidate("default")
+        assert idle.closed
+        pool.checkin(busy)
+        assert busy.closed
+        assert pool.stats()["idle"] == 0
+
+    def test_transport_error_discards_service(self):
+        """Test lease() drops services whose connection failed"""
+        pool = ServicePool()
+        creds = object()
+        with pytest.raises(httplib2.ServerNotFoundError), pool.lease(KEY, creds, FakeService) as service:
+            raise httplib2.ServerNotFoundError("down")
+        assert service.closed
+        assert pool.checkout(KEY, creds, FakeService) is not service
+
+    def test_failed_build_releases_slot(self):
+        """Test a failing factory does not leak capacity"""
+        pool = ServicePool(max_per_key=1, checkout_timeout=0.05)
+
+        def broken(credentials):
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            pool.checkout(KEY, object(), broken)
+        assert isinstance(pool.checkout(KEY, object(), FakeService), FakeService)
@@ -0,0 +1,106 @@
+"""
+Tests for thread retrieval
+
+Tests that gmail_get_thread reads a conversation with one request, extracts
+every message and strips quoted replies.
+"""
+
+import pytest
+
+from src.tools.gmail_tool import gmail_get_message, gmail_get_thread
+from src.tools.mime_text import strip_quotes
+
+
+@pytest.fixture
+def conversation(fake_gmail, mailbox):
+    """Three-message thread "conv" where each reply quotes the previous message"""
+    mailbox.add("c1", ["INBOX"], 3000, sender="alice@example.com", subject="Plan", body="Shall we meet at 10?", thread_id="conv")
+    mailbox.add(
+        "c2", ["INBOX"], 3001, sender="bob@example.com", subject="Re: Plan", thread_id="conv",
+        body="10 works.\n\nOn Mon, 3 Jun 2024 at 09:00, Alice <alice@example.com> wrote:\n> Shall we meet at 10?",
+    )
+    mailbox.add(
+        "c3", ["INBOX", "UNREAD"], 3002, sender="alice@example.com", subject="Re: Plan", thread_id="conv",
+        body="Great, see you.\n\nOn Mon, 3 Jun 2024 at 09:05, Bob <bob@example.com> wrote:\n> 10 works.\n>\n> On Mon, 3 Jun 2024 ...",
+    )
+    fake_gmail.handler = mailbox.handler
+    return mailbox
+
+
+class TestGetThread:
+    """Test gmail_get_thread"""
+
+    def test_one_request_per_thread(self, fake_gmail, conversation):
+        """Test the whole conversation comes back from one threads.get call, oldest first"""
+        thread = gmail_get_thread("conv")
+        assert fake_gmail.round_trips == 1
+        assert thread["id"] == "conv"
+        assert [m["id"] for m in thread["messages"]] == ["c1", "c2", "c3"]
+        assert thread["messages"][1]["from"] == "bob@example.com"
+
+    def test_quotes_stripped(self, conversation):
+        """Test replies only carry their new text"""
+        texts = [m["text"] for m in gmail_get_thread("conv")["messages"]]
+        assert texts == ["Shall we meet at 10?", "10 works.", "Great, see you."]
+
+    def test_quotes_stripped_before_budget(self, fake_gmail, conversation):
+        """Test a reply whose quote starts at the 10k budget is stripped, not cut inside its header"""
+        reply = "x" * 9990
+        conversation.add(
+            "c4", ["INBOX"], 3003, subject="Re: Plan", thread_id="conv",
+            body=f"{reply}\n\nOn Mon, 3 Jun 2024 at 09:10, Alice <alice@example.com> wrote:\n> Great, see you.",
+        )
+        assert gmail_get_thread("conv")["messages"][-1]["text"] == reply
+        fake_gmail.round_trips = 0
+        assert len(gmail_get_message("c4")["text"]) == 10000
+        assert fake_gmail.round_trips == 0
+
+    def test_quotes_kept_on_request(self, conversation):
+        """Test strip_quotes=False returns bodies unchanged"""
+        text = gmail_get_thread("conv", strip_quotes=False)["messages"][1]["text"]
+        assert "> Shall we meet at 10?" in text
+
+    def test_metadata_format(self, fake_gmail, conversation):
+        """Test lower tiers return the same keys as gmail_get_message"""
+        thread = gmail_get_thread("conv", format="metadata")
+        assert set(thread["messages"][0]) == {"id", "from", "to", "subject", "date", "snippet"}
+
+    def test_messages_are_cached(self, fake_gmail, conversation):
+        """Test messages read through a thread are served from the cache afterwards"""
+        gmail_get_thread("conv")
+        fake_gmail.round_trips = 0
+        assert gmail_get_message("c2")["subject"] == "Re: Plan"
+        assert fake_gmail.round_trips == 0
+
+    def test_invalid_format(self, conversation):
+        """Test an unknown format is rejected"""
+        with pytest.raises(ValueError):
+            gmail_get_thread("conv", format="raw")
+
+
+class TestStripQuotes:
+    """Test quoted reply detection"""
+
+    @pytest.mark.parametrize("text", [
+        "Thanks!\n\nOn Mon, 3 Jun 2024 at 10:00, Bob <bob@example.com> wrote:\n> hi",
+        "Thanks!\n\nOn Mon, 3 Jun 2024 at 10:00, Bob Smith <bob@example.com>\nwrote:\n\nhi",
+        "Thanks!\n\n-----Original Message-----\nFrom: Bob\nSent: Monday\nSubject: hi\n\nhi",
+        "Thanks!\n\nFrom: Bob\nSent: Monday\nTo: Alice\nSubject: hi\n\nhi",
+        "Thanks!\n> hi\n> there",
+    ])
+    def test_reply_headers(self, text):
+        """Test common reply formats are cut at their quote"""
+        assert strip_quotes(text) == "Thanks!"
+
+    def test_inline_replies_keep_text(self):
+        """Test text between quoted lines is kept"""
+        assert strip_quotes("> question?\nanswer\n> other?\nsecond answer") == "answer\nsecond answer"
+
+    def test_plain_text_unchanged(self):
+        """Test prose mentioning "On" and "wrote:" on separate lines is not a quote"""
+        text = "On second thought, no.\nLet's wait.\nBob\nand then he wrote:\nmore"
+        assert strip_quotes(text) == text
+
+    def test_only_quote_is_kept(self):
+        """Test a body that is only a quote is returned unchanged"""
+        assert strip_quotes("> forwarded line") == "> forwarded line"